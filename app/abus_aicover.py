@@ -1,6 +1,8 @@
-import gc
+import time
+import threading
 import librosa
 import soundfile as sf
+import torch
 from pydub import AudioSegment
 from pedalboard import Pedalboard, Reverb, Compressor, HighpassFilter
 from pedalboard.io import AudioFile
@@ -9,22 +11,94 @@ from src.aicover.rvc import Config, load_hubert, get_vc, rvc_infer
 
 
 from app.abus_path import *
+from app.abus_model_registry import *
+
+import structlog
+logger = structlog.get_logger()
+
+
+class AICoverRVCPool:
+    """
+    AI 커버(src/aicover/rvc.py) RVC 모델 풀.
+
+    커버마다 HuBERT 와 목소리 합성기(net_g, VC)를 다시 읽지 않도록 모델 레지스트리에 보관합니다.
+    - HuBERT 는 (경로, 장치, half) 키로 하나만 두고, 목소리는 (.pth 경로, 수정 시간, 장치, half) 키로 보관합니다.
+    - 메모리 예산을 넘으면 레지스트리가 가장 오래 사용되지 않은 목소리부터 내립니다.
+    - CUDA 가 없으면 CPU(또는 MPS)에서 float32 로 실행합니다.
+    """
+    def __init__(self, device=None, is_half=False):
+        self.device = device or ("cuda:0" if torch.cuda.is_available() else "cpu")
+        self.is_half = is_half
+        self.hubert_path = os.path.join(os.getcwd(), 'model', 'rvc-model', 'hubert_base.pt')
+        self._config = None
+        self._lock = threading.Lock()
+        self.timings = []
+
+
+    @property
+    def config(self):
+        # Config 는 GPU 에 따라 설정 파일을 고치므로 한 번만 만든다
+        with self._lock:
+            if self._config is None:
+                config = Config(self.device, self.is_half)
+                if config.device == "cpu":
+                    # Config 는 CPU 에서 half 를 켜지만 CPU 는 float32 로 실행한다 (x_pad 등은 float32 설정)
+                    config.is_half = False
+                    config.x_pad, config.x_query, config.x_center, config.x_max = 1, 6, 38, 41
+                logger.debug(f'[abus_aicover.py] AICoverRVCPool.config - device = {config.device}, is_half = {config.is_half}')
+                self._config = config
+            return self._config
+
+
+    def hubert_key(self):
+        config = self.config
+        return ('aicover-hubert', os.path.abspath(self.hubert_path), config.device, config.is_half)
+
+
+    def voice_key(self, voice_pth_path):
+        config = self.config
+        return ('aicover-rvc', os.path.abspath(voice_pth_path), os.stat(voice_pth_path).st_mtime_ns, config.device, config.is_half)
+
+
+    @staticmethod
+    def _size_mb(file_path):
+        return os.path.getsize(file_path) // (1024 * 1024)
+
+
+    def convert(self, input_path, output_path, voice_pth_path, voice_index_path, pitch_change, f0_method, index_rate, filter_radius, rms_mix_rate, protect, crepe_hop_length):
+        start_time = time.perf_counter()
+        config = self.config
+        models_loaded = model_registry.misses
+        with model_registry.borrow(self.hubert_key(), lambda: load_hubert(config.device, config.is_half, self.hubert_path), self._size_mb(self.hubert_path)) as hubert_model, \
+             model_registry.borrow(self.voice_key(voice_pth_path), lambda: get_vc(config.device, config.is_half, config, voice_pth_path), self._size_mb(voice_pth_path)) as voice:
+            load_time = time.perf_counter() - start_time
+            cpt, version, net_g, tgt_sr, vc = voice
+            rvc_infer(voice_index_path, index_rate, input_path, output_path, pitch_change, f0_method, cpt, version, net_g, filter_radius, tgt_sr, rms_mix_rate, protect, crepe_hop_length, vc, hubert_model)
+
+        total_time = time.perf_counter() - start_time
+        timing = {
+            'voice': os.path.basename(voice_pth_path),
+            'models_loaded': model_registry.misses - models_loaded,
+            'load': load_time,
+            'convert': total_time - load_time,
+            'total': total_time,
+        }
+        self.timings.append(timing)
+        logger.debug(f"[abus_aicover.py] AICoverRVCPool.convert - {timing['voice']}: load {load_time:.2f}s, convert {timing['convert']:.2f}s, models_loaded = {timing['models_loaded']}")
+        return output_path
+
+
+aicover_rvc_pool = AICoverRVCPool()
+
 
 
 def rvc_change_voice(input_path, output_path, rvc_voice, pitch_change, f0_method, index_rate, filter_radius, rms_mix_rate, protect, crepe_hop_length):
     voice_model_folder = os.path.join(os.getcwd(), 'model', 'rvc-voice', rvc_voice)
     voice_pth_path = path_subfile(voice_model_folder, ".pth")
     voice_index_path = path_subfile(voice_model_folder, ".index")
-    
-    device = 'cuda:0'
-    config = Config(device, False)
-    hubert_model = load_hubert(device, config.is_half, os.path.join(os.getcwd(), 'model', 'rvc-model', 'hubert_base.pt'))
-    cpt, version, net_g, tgt_sr, vc = get_vc(device, config.is_half, config, voice_pth_path)
 
     # convert main vocals
-    rvc_infer(voice_index_path, index_rate, input_path, output_path, pitch_change, f0_method, cpt, version, net_g, filter_radius, tgt_sr, rms_mix_rate, protect, crepe_hop_length, vc, hubert_model)
-    del hubert_model, cpt
-    gc.collect()
+    aicover_rvc_pool.convert(input_path, output_path, voice_pth_path, voice_index_path, pitch_change, f0_method, index_rate, filter_radius, rms_mix_rate, protect, crepe_hop_length)
     
     
 def rvc_add_effects(input_path, output_path, reverb_rm_size, reverb_wet, reverb_dry, reverb_damping):
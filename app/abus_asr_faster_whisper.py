@@ -21,20 +21,29 @@ import pysubs2
 from app.abus_subtitle import get_srt, get_vtt, get_txt, write_file, get_srt_wordlevel, get_vtt_block
 from app.abus_path import *
 from app.abus_asr_parameters import *
+from app.abus_model_registry import *
+from src.vad import VoiceActivityDetection
 
 import structlog
 logger = structlog.get_logger()
 
 
+VAD_SAMPLE_RATE = 16000
+VAD_MAX_CHUNK_SECONDS = 30      # whisper 입력 길이
+VAD_WINDOW_SAMPLES = 512
+
+
 class FasterWhisperInference:
     def __init__(self):
         self.set_environment()
         
         self.current_model_size = None
         self.model = None
+        self.model_key = None
         self.translatable_models = ["large", "large-v1", "large-v2", "large-v3"]
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.current_compute_type = "default"        
+        self.current_cpu_threads = 0
         
 
     @staticmethod
@@ -76,6 +85,15 @@ class FasterWhisperInference:
             torch.cuda.reset_max_memory_allocated()
             logger.debug(f'[abus_asr_faster_whisper.py] release_cuda_memory - OK!! ')
 
+
+    def release_model(self):
+        """빌려온 모델을 레지스트리에 반납합니다. 모델은 메모리에 남아 다음 파일에서 재사용됩니다."""
+        if self.model_key is not None:
+            model_registry.release(self.model_key)
+        self.model = None
+        self.model_key = None
+
+
     @staticmethod
     def remove_input_files(file_paths: List[str]):
         if not file_paths:
@@ -151,7 +169,7 @@ class FasterWhisperInference:
         except Exception as e:
             logger.error(f"[abus_asr_faster_whisper.py] transcribe_file - An error occurred: {e}")
         finally:
-            self.model = None
+            self.release_model()
             self.release_cuda_memory()
             
         
@@ -164,8 +182,10 @@ class FasterWhisperInference:
 
         start_time = time.time()
         
-        if params.model_size != self.current_model_size or self.model is None or params.compute_type != self.current_compute_type:
-            self.update_model(params.model_size, params.compute_type, progress)
+        cpu_threads = self.resolve_cpu_threads(params)
+        
+        if params.model_size != self.current_model_size or self.model is None or params.compute_type != self.current_compute_type or cpu_threads != self.current_cpu_threads:
+            self.update_model(params.model_size, params.compute_type, progress, cpu_threads)
 
         if params.lang == "Automatic Detection":
             params.lang = None
@@ -173,24 +193,27 @@ class FasterWhisperInference:
             language_code_dict = {value: key for key, value in whisper.tokenizer.LANGUAGES.items()}
             params.lang = language_code_dict[params.lang]
 
-        segments, info = self.model.transcribe(
-                audio=audio,
-                language=params.lang,
-                task="translate" if params.is_translate and self.current_model_size in self.translatable_models else "transcribe",
-                vad_filter=params.vad_filter,
-                # beam_size=params.beam_size,
-                # log_prob_threshold=params.log_prob_threshold,
-                # no_speech_threshold=params.no_speech_threshold,                
-                # best_of=params.best_of,
-                patience=params.patience,                
-                condition_on_previous_text=params.condition_on_previous_text,
-                temperature=params.temperature,
-                word_timestamps=params.word_timestamps,
-                hallucination_silence_threshold=params.hallucination_silence_threshold,
-                repetition_penalty=params.repetition_penalty,
-                vad_parameters=params.vad_parameters,
-                initial_prompt=params.initial_prompt       
-                )
+        if params.batched:
+            segments, info = self.transcribe_batched(audio, params, progress)
+        else:
+            segments, info = self.model.transcribe(
+                    audio=audio,
+                    language=params.lang,
+                    task="translate" if params.is_translate and self.current_model_size in self.translatable_models else "transcribe",
+                    vad_filter=params.vad_filter,
+                    # beam_size=params.beam_size,
+                    # log_prob_threshold=params.log_prob_threshold,
+                    # no_speech_threshold=params.no_speech_threshold,                
+                    # best_of=params.best_of,
+                    patience=params.patience,                
+                    condition_on_previous_text=params.condition_on_previous_text,
+                    temperature=params.temperature,
+                    word_timestamps=params.word_timestamps,
+                    hallucination_silence_threshold=params.hallucination_silence_threshold,
+                    repetition_penalty=params.repetition_penalty,
+                    vad_parameters=params.vad_parameters,
+                    initial_prompt=params.initial_prompt       
+                    )
         
         if progress is not None: 
             progress(0, desc="Loading audio..")
@@ -208,10 +231,80 @@ class FasterWhisperInference:
         return segments_result, elapsed_time    
         
 
+    def resolve_cpu_threads(self, params: WhisperParameters) -> int:
+        # 배치 모드에서는 CPU 코어를 모두 사용하도록 스레드 수를 지정한다
+        if not params.cpu_threads and params.batched and self.device == "cpu":
+            return os.cpu_count() or 0
+        return params.cpu_threads
+
+
+    def transcribe_batched(self,
+                           audio: Union[str, BinaryIO, np.ndarray],
+                           params: WhisperParameters,
+                           progress: gr.Progress):
+        """
+        VAD 구간을 30초 이하의 청크로 묶어 BatchedInferencePipeline 으로 배치 디코딩합니다.
+        세그먼트 시간은 원본 오디오 기준으로 반환되므로 순차 모드와 같은 방식으로 사용할 수 있습니다.
+        """
+        if not isinstance(audio, np.ndarray):
+            audio = faster_whisper.decode_audio(audio, sampling_rate=VAD_SAMPLE_RATE)
+
+        if progress is not None: 
+            progress(0, desc="Detecting speech..")
+        clip_timestamps = self.vad_chunks(audio, params)
+        logger.debug(f'[abus_asr_faster_whisper.py] transcribe_batched - {len(clip_timestamps)} chunks, batch_size = {params.batch_size}, cpu_threads = {self.current_cpu_threads}')
+
+        if not clip_timestamps:
+            return [], None
+
+        pipeline = faster_whisper.BatchedInferencePipeline(model=self.model)
+        return pipeline.transcribe(
+                audio=audio,
+                language=params.lang,
+                task="translate" if params.is_translate and self.current_model_size in self.translatable_models else "transcribe",
+                batch_size=params.batch_size,
+                vad_filter=False,
+                clip_timestamps=clip_timestamps,
+                patience=params.patience,
+                temperature=params.temperature,
+                word_timestamps=params.word_timestamps,
+                repetition_penalty=params.repetition_penalty,
+                initial_prompt=params.initial_prompt
+                )
+
+
+    def vad_chunks(self, audio: np.ndarray, params: WhisperParameters) -> List[dict]:
+        """
+        silero VAD 로 찾은 발화 구간을 최대 30초 청크로 묶습니다.
+
+        :param audio: 16kHz mono float32 오디오
+        :return: [{'start': sample, 'end': sample}, ...]
+        """
+        if len(audio) < VAD_WINDOW_SAMPLES:
+            return []
+
+        min_silence_duration_ms = (params.vad_parameters or {}).get('min_silence_duration_ms', 100)
+        with model_registry.borrow(('silero-vad', 'onnx', 'float32', 'cpu'), VoiceActivityDetection, size_mb=2) as vad:
+            speeches = vad.speech_timestamps(audio, VAD_SAMPLE_RATE, min_silence_duration_ms=min_silence_duration_ms)
+
+        max_samples = VAD_SAMPLE_RATE * VAD_MAX_CHUNK_SECONDS
+        chunks = []
+        for speech in speeches:
+            # 30초보다 긴 발화는 잘라서 넣는다
+            for start in range(speech['start'], speech['end'], max_samples):
+                end = min(speech['end'], start + max_samples)
+                if chunks and end - chunks[-1]['start'] <= max_samples:
+                    chunks[-1]['end'] = end
+                else:
+                    chunks.append({'start': start, 'end': end})
+        return chunks
+
+
     def update_model(self,
                      model_size: str,
                      compute_type: str,
-                     progress: gr.Progress
+                     progress: gr.Progress,
+                     cpu_threads: int = 0
                      ):
      
         if progress is not None: 
@@ -219,13 +312,21 @@ class FasterWhisperInference:
             
         self.current_model_size = model_size
         self.current_compute_type = compute_type
+        self.current_cpu_threads = cpu_threads
         
         
-        self.model = faster_whisper.WhisperModel(
-            device=self.device,
-            model_size_or_path=model_size,
-            download_root=os.path.join("model", "faster-whisper"),
-            compute_type=self.current_compute_type
+        self.release_model()
+        self.model_key = ('faster-whisper', model_size, compute_type, self.device, cpu_threads)
+        self.model = model_registry.acquire(
+            self.model_key,
+            lambda: faster_whisper.WhisperModel(
+                device=self.device,
+                model_size_or_path=model_size,
+                download_root=os.path.join("model", "faster-whisper"),
+                compute_type=compute_type,
+                cpu_threads=cpu_threads
+            ),
+            size_mb=whisper_model_size_mb(model_size, compute_type)
         )
         
 
@@ -1,6 +1,8 @@
-from dataclasses import dataclass, fields
+from dataclasses import dataclass, field, fields
 import copy
 
+from app.abus_config import get_asr_batched, get_asr_batch_size, get_asr_cpu_threads
+
 @dataclass
 class WhisperParameters:
     model_size: str = 'medium'
@@ -20,6 +22,9 @@ class WhisperParameters:
     repetition_penalty = 1.1                            # 1 - default
     vad_parameters = dict(min_silence_duration_ms=100)  # None - default
     denoise_level: int = 0
+    batched: bool = field(default_factory=get_asr_batched)            # faster-whisper 전용, VAD 구간을 배치로 디코딩
+    batch_size: int = field(default_factory=get_asr_batch_size)
+    cpu_threads: int = field(default_factory=get_asr_cpu_threads)     # 0 - CTranslate2 default
     initial_prompt: str = 'We use all the standard punctuation and capitalization rules of the English language. Sentences start with a capital letter, and end with a full stop. Of course, where appropriate, commas are included.'
     """
     A data class to use Whisper parameters in your function after Gradio pre-processing.
@@ -28,3 +33,24 @@ class WhisperParameters:
     
     def copy(self):
         return copy.copy(self)
+
+
+# 모델 레지스트리 메모리 예산 계산용 파라미터 수(백만 단위)
+WHISPER_MODEL_PARAMS = {
+    'tiny': 39, 'base': 74, 'small': 244, 'medium': 769,
+    'large': 1550, 'large-v1': 1550, 'large-v2': 1550, 'large-v3': 1550,
+    'turbo': 809, 'large-v3-turbo': 809,
+    'distil-small.en': 166, 'distil-medium.en': 394, 'distil-large-v2': 756, 'distil-large-v3': 756,
+}
+
+
+def whisper_model_size_mb(model_size: str, compute_type: str = 'default') -> int:
+    """모델 크기와 compute_type 으로 메모리 사용량(MB)을 추정합니다."""
+    params = WHISPER_MODEL_PARAMS.get(model_size, 769)
+    if compute_type.startswith('int8'):
+        bytes_per_param = 1
+    elif compute_type == 'float32':
+        bytes_per_param = 4
+    else:
+        bytes_per_param = 2
+    return int(params * bytes_per_param * 1.2)     # 가중치 외 버퍼 여유분
@@ -17,6 +17,7 @@ import pysubs2
 
 from app.abus_path import *
 from app.abus_asr_parameters import *
+from app.abus_model_registry import *
 
 from src.whisperProgressHook import create_progress_listener_handle
 
@@ -44,6 +45,7 @@ class WhisperInference:
     def __init__(self):
         self.current_model_size = None
         self.model = None
+        self.model_key = None
         self.translatable_models = ["large", "large-v1", "large-v2", "large-v3"]
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.current_compute_type = "default"        
@@ -58,6 +60,15 @@ class WhisperInference:
             torch.cuda.reset_max_memory_allocated()
             logger.debug(f'[abus_asr_whisper.py] release_cuda_memory - OK!! ')
 
+
+    def release_model(self):
+        """빌려온 모델을 레지스트리에 반납합니다. 모델은 메모리에 남아 다음 파일에서 재사용됩니다."""
+        if self.model_key is not None:
+            model_registry.release(self.model_key)
+        self.model = None
+        self.model_key = None
+
+
     @staticmethod
     def remove_input_files(file_paths: List[str]):
         if not file_paths:
@@ -110,7 +121,7 @@ class WhisperInference:
         except Exception as e:
             logger.error(f"[abus_asr_whisper.py] transcribe_file - An error occurred: {e}")
         finally:
-            self.model = None
+            self.release_model()
             self.release_cuda_memory()
             
         
@@ -196,10 +207,17 @@ class WhisperInference:
         self.current_compute_type = compute_type
         
         
-        self.model = whisper.load_model(
-            device=self.device,
-            name=model_size,
-            download_root=os.path.join("model", "whisper")
+        # openai-whisper 는 compute_type 과 관계없이 같은 가중치를 사용한다
+        self.release_model()
+        self.model_key = ('whisper', model_size, 'default', self.device)
+        self.model = model_registry.acquire(
+            self.model_key,
+            lambda: whisper.load_model(
+                device=self.device,
+                name=model_size,
+                download_root=os.path.join("model", "whisper")
+            ),
+            size_mb=whisper_model_size_mb(model_size, 'float32')
         )
         
 
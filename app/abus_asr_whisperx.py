@@ -19,6 +19,7 @@ import gradio as gr
 
 from app.abus_path import *
 from app.abus_asr_parameters import *
+from app.abus_model_registry import *
 
 
 import structlog
@@ -49,6 +50,7 @@ class WhisperXInference:
         
         self.current_model_size = None
         self.model = None
+        self.model_key = None
         self.translatable_models = ["large", "large-v1", "large-v2", "large-v3"]
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.current_compute_type = "default"        
@@ -93,6 +95,15 @@ class WhisperXInference:
             torch.cuda.reset_max_memory_allocated()
             logger.debug(f'[abus_asr_whisperx.py] release_cuda_memory - OK!! ')
 
+
+    def release_model(self):
+        """빌려온 모델을 레지스트리에 반납합니다. 모델은 메모리에 남아 다음 파일에서 재사용됩니다."""
+        if self.model_key is not None:
+            model_registry.release(self.model_key)
+        self.model = None
+        self.model_key = None
+
+
     @staticmethod
     def remove_input_files(file_paths: List[str]):
         if not file_paths:
@@ -167,7 +178,7 @@ class WhisperXInference:
         except Exception as e:
             logger.error(f"[abus_asr_whisperx.py] transcribe_file - An error occurred: {e}")
         finally:
-            self.model = None
+            self.release_model()
             self.release_cuda_memory()
             
         
@@ -248,12 +259,19 @@ class WhisperXInference:
         }        
         
         
-        self.model = whisperx.load_model(
-            whisper_arch=params.model_size,
-            device=self.device,
-            compute_type=params.compute_type,
-            download_root=os.path.join("model", "faster-whisper"),
-            asr_options=asr_options
+        # asr_options 는 로드 시점에 파이프라인에 고정되므로 키에 포함한다
+        self.release_model()
+        self.model_key = ('whisperX', params.model_size, params.compute_type, self.device, repr(sorted(asr_options.items())))
+        self.model = model_registry.acquire(
+            self.model_key,
+            lambda: whisperx.load_model(
+                whisper_arch=params.model_size,
+                device=self.device,
+                compute_type=params.compute_type,
+                download_root=os.path.join("model", "faster-whisper"),
+                asr_options=asr_options
+            ),
+            size_mb=whisper_model_size_mb(params.model_size, params.compute_type)
         )
         
 
@@ -1,11 +1,20 @@
+import io
+import os
+
 from pydub import AudioSegment
 from pydub.silence import detect_leading_silence
+import numpy as np
 
 
 import structlog
 logger = structlog.get_logger()
 
 
+# TTS 세그먼트와 최종 믹스의 출력 형식 (기존 ffmpeg_to_stereo의 -ar 48000 -ac 2)
+TTS_SAMPLE_RATE = 48000
+TTS_CHANNELS = 2
+
+
 class AbusAudio():
     def __init__(self):
         pass
@@ -31,6 +40,158 @@ class AbusAudio():
         
         
         
+    @staticmethod
+    def audio_to_array(audio_segment, sample_rate=None, channels=None):
+        """
+        AudioSegment를 (samples, channels) 형태의 float32 배열로 변환합니다.
+        
+        :param audio_segment: 입력 파일 경로 또는 AudioSegment 객체
+        :param sample_rate: 변환할 샘플레이트 (None이면 원본 유지)
+        :param channels: 변환할 채널 수 (None이면 원본 유지)
+        :return: -1.0 ~ 1.0 범위의 float32 배열
+        """
+        if isinstance(audio_segment, str):
+            audio = AudioSegment.from_file(audio_segment)
+        else:
+            audio = audio_segment
+            
+        if sample_rate is not None and audio.frame_rate != sample_rate:
+            audio = audio.set_frame_rate(sample_rate)
+        if channels is not None and audio.channels != channels:
+            audio = audio.set_channels(channels)
+            
+        samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+        samples = samples.reshape(-1, audio.channels)
+        return samples / float(1 << (8 * audio.sample_width - 1))
+    
+    
+    @staticmethod
+    def array_to_audio(samples, sample_rate, sample_width=2):
+        """
+        (samples, channels) 형태의 float 배열을 AudioSegment로 변환합니다.
+        
+        :param samples: -1.0 ~ 1.0 범위의 배열 (1차원이면 모노)
+        :param sample_rate: 샘플레이트
+        :param sample_width: 출력 샘플 크기(바이트)
+        :return: AudioSegment 객체
+        """
+        samples = np.asarray(samples)
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+            
+        max_value = float(1 << (8 * sample_width - 1))
+        dtype = {1: np.int8, 2: np.int16, 4: np.int32}[sample_width]
+        pcm = np.clip(samples * max_value, -max_value, max_value - 1).astype(dtype)
+        return AudioSegment(
+            pcm.tobytes(),
+            frame_rate=sample_rate,
+            sample_width=sample_width,
+            channels=samples.shape[1]
+        )
+        
+        
+    @staticmethod
+    def _sound_range_ms(samples, frame_rate, duration_ms, start_silence_threshold=-50.0, end_silence_threshold=-50.0, chunk_size=10, max_amplitude=1.0, integer_rms=False):
+        """
+        chunk_size(ms) 단위 RMS를 블록 단위로 한 번에 계산하여 처음과 마지막 소리 위치(ms)를 찾습니다.
+        pydub의 슬라이싱/dBFS 계산 규칙(끝 청크 무음 패딩, 정수 RMS)을 그대로 따릅니다.
+        
+        :param samples: (frames, channels) 또는 1차원 샘플 배열
+        :param frame_rate: 샘플레이트
+        :param duration_ms: 오디오 길이(밀리초)
+        :param max_amplitude: 0 dBFS에 해당하는 진폭
+        :param integer_rms: audioop.rms처럼 RMS를 정수로 내림할지 여부
+        :return: (start_ms, end_ms)
+        """
+        frames = samples.reshape(len(samples), -1)
+        channels = frames.shape[1]
+        frame_count = len(frames)
+        exact = np.issubdtype(frames.dtype, np.integer) and frames.dtype.itemsize <= 2
+        
+        ms_starts = np.arange(0, duration_ms, chunk_size, dtype=np.int64)
+        ms_ends = np.minimum(ms_starts + chunk_size, duration_ms)
+        starts = (ms_starts * (frame_rate / 1000.0)).astype(np.int64)
+        ends = (ms_ends * (frame_rate / 1000.0)).astype(np.int64)
+        
+        def first_loud(lo, hi, threshold, block=64):
+            """청크 블록 단위로 RMS를 계산하고 임계값을 넘는 첫 청크를 반환합니다."""
+            count = (hi - lo) * channels
+            # 범위를 벗어난 부분은 무음으로 채워진 것으로 간주
+            lo = np.clip(lo, 0, frame_count)
+            hi = np.clip(hi, 0, frame_count)
+            
+            k0 = 0
+            while k0 < len(lo):
+                k1 = min(k0 + block, len(lo))
+                f0 = int(min(lo[k0:k1].min(), hi[k0:k1].min()))
+                f1 = int(max(lo[k0:k1].max(), hi[k0:k1].max()))
+                
+                # 인터리브된 샘플을 그대로 제곱하여 청크 경계마다 합산 (16비트 이하 정수는 int64로 정확하게 계산)
+                energy = np.square(frames[f0:f1].ravel(), dtype=np.int64 if exact else np.float64)
+                total = np.zeros(k1 - k0, dtype=energy.dtype)
+                valid = np.nonzero(hi[k0:k1] > lo[k0:k1])[0]
+                if len(valid) > 0:
+                    valid = valid[np.argsort(lo[k0:k1][valid])]
+                    total[valid] = np.add.reduceat(energy, (lo[k0:k1][valid] - f0) * channels)
+                
+                n = count[k0:k1]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    rms = np.where(n > 0, np.sqrt(total / np.maximum(n, 1)), 0.0)
+                    if integer_rms:
+                        rms = np.floor(rms)
+                    dbfs = 20 * np.log10(rms / max_amplitude)
+                loud = (rms > 0) & (dbfs > threshold)
+                if loud.any():
+                    return k0 + int(np.argmax(loud))
+                
+                k0 = k1
+                block *= 2
+            return None
+        
+        # 시작 부분: 앞에서부터 청크 단위로 검사
+        k = first_loud(starts, ends, start_silence_threshold)
+        start_ms = int(ms_starts[k]) if k is not None else duration_ms
+        
+        # 끝 부분: 뒤집은 오디오를 앞에서부터 검사하는 것과 동일한 청크
+        k = first_loud(frame_count - ends, frame_count - starts, end_silence_threshold)
+        end_ms = int(duration_ms - (ms_starts[k] + chunk_size)) if k is not None else 0
+        
+        return start_ms, end_ms
+    
+    
+    @staticmethod
+    def trim_silence_array(samples, sample_rate, start_silence_threshold=-50.0, end_silence_threshold=-50.0, chunk_size=10, padding_duration=100):
+        """
+        메모리 상의 샘플 배열에서 시작과 끝 부분의 무음을 제거합니다.
+        
+        :param samples: (frames, channels) 또는 1차원 float 배열 (-1.0 ~ 1.0)
+        :param sample_rate: 샘플레이트
+        :param start_silence_threshold: 시작 부분 무음으로 간주할 dBFS 임계값
+        :param end_silence_threshold: 끝부분 무음으로 간주할 dBFS 임계값
+        :param chunk_size: 분석할 청크의 크기(밀리초)
+        :param padding_duration: 결과 오디오 끝에 추가할 패딩(밀리초)
+        :return: 무음이 제거된 샘플 배열 (입력과 같은 차원)
+        """
+        samples = np.asarray(samples)
+        duration_ms = int(round(1000 * len(samples) / sample_rate))
+        start_ms, end_ms = AbusAudio._sound_range_ms(samples, sample_rate, duration_ms, start_silence_threshold, end_silence_threshold, chunk_size)
+        
+        # AudioSegment[start_ms:end_ms] 와 같은 규칙으로 자른다
+        start_ms = min(start_ms, duration_ms)
+        end_ms = min(end_ms, duration_ms)
+        if end_ms < 0:
+            end_ms = max(duration_ms + end_ms, 0)
+        start = int(start_ms * (sample_rate / 1000.0))
+        end = int(end_ms * (sample_rate / 1000.0))
+        trimmed = samples[start:max(start, end)]
+        
+        padding_frames = int(padding_duration * (sample_rate / 1000.0)) if padding_duration > 0 else 0
+        if padding_frames > 0:
+            padding = np.zeros((padding_frames,) + trimmed.shape[1:], dtype=trimmed.dtype)
+            trimmed = np.concatenate([trimmed, padding])
+        return trimmed
+        
+        
     @staticmethod    
     def trim_silence_audio(audio_segment, start_silence_threshold=-50.0, end_silence_threshold=-50.0, chunk_size=10, padding_duration=100):
         """
@@ -48,27 +209,21 @@ class AbusAudio():
             audio = AudioSegment.from_file(audio_segment)
         else:
             audio = audio_segment
-            
-        def detect_first_sound_index(asg, threshold=-50.0, chunk_size=10):
-            """시작 부분의 첫 번째 소리 인덱스를 찾습니다."""
-            for i in range(0, len(asg), chunk_size):
-                chunk = asg[i:i + chunk_size]
-                if chunk.dBFS > threshold and chunk.dBFS != float('-inf'):
-                    return i
-            return len(asg)  # 모두 무음이면 전체 길이 반환
-
-        def detect_last_sound_index(asg, threshold=-50.0, chunk_size=10):
-            """끝 부분의 마지막 소리 인덱스를 찾습니다."""
-            reversed_audio = asg.reverse()
-            for i in range(0, len(reversed_audio), chunk_size):
-                chunk = reversed_audio[i:i + chunk_size]
-                if chunk.dBFS > threshold and chunk.dBFS != float('-inf'):
-                    return len(asg) - (i + chunk_size)
-            return 0  # 모두 무음이면 0 반환
+        
+        # 디코딩된 원본 PCM을 복사 없이 그대로 분석
+        dtype = {1: np.int8, 2: np.int16, 4: np.int32}.get(audio.sample_width)
+        if dtype is not None:
+            samples = np.frombuffer(audio.raw_data, dtype=dtype)
+        else:
+            samples = np.array(audio.get_array_of_samples())
+        samples = samples.reshape(-1, audio.channels)
 
         # 시작과 끝 부분의 무음 인덱스 탐지
-        start_index = detect_first_sound_index(audio, start_silence_threshold, chunk_size)
-        end_index = detect_last_sound_index(audio, end_silence_threshold, chunk_size)
+        start_index, end_index = AbusAudio._sound_range_ms(
+            samples, audio.frame_rate, len(audio),
+            start_silence_threshold, end_silence_threshold, chunk_size,
+            max_amplitude=audio.max_possible_amplitude, integer_rms=True
+        )
 
         # 무음 구간 제거
         trimmed_audio = audio[start_index:end_index]
@@ -95,4 +250,66 @@ class AbusAudio():
         :param padding_duration: 패딩 길이
         """
         audio = AbusAudio.trim_silence_audio(input_file, start_silence_threshold, end_silence_threshold, chunk_size, padding_duration)
-        audio.export(output_file)
\ No newline at end of file
+        audio.export(output_file)
+
+
+    @staticmethod
+    def decode_array(data, format=None):
+        """
+        메모리 상의 인코딩된 오디오(mp3, wav 등)를 디코딩합니다.
+        
+        :param data: 인코딩된 오디오 바이트
+        :param format: 오디오 형식 (None이면 자동 감지)
+        :return: ((samples, channels) float32 배열, 샘플레이트)
+        """
+        audio = AudioSegment.from_file(io.BytesIO(data), format=format)
+        return AbusAudio.audio_to_array(audio), audio.frame_rate
+    
+    
+    @staticmethod
+    def resample_array(samples, orig_sr, target_sr):
+        """(samples, channels) 배열의 샘플레이트를 변환합니다."""
+        if orig_sr == target_sr or len(samples) == 0:
+            return samples
+        import librosa
+        return librosa.resample(samples, orig_sr=orig_sr, target_sr=target_sr, axis=0)
+    
+    
+    @staticmethod
+    def to_channels(samples, channels=TTS_CHANNELS):
+        """모노/스테레오 배열을 (samples, channels) 형태로 맞춥니다."""
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        if samples.shape[1] == channels:
+            return samples
+        if samples.shape[1] == 1:
+            return np.repeat(samples, channels, axis=1)
+        return np.repeat(samples.mean(axis=1, keepdims=True), channels, axis=1)
+    
+    
+    @staticmethod
+    def prepare_segment(samples, sample_rate, target_rate=TTS_SAMPLE_RATE, channels=TTS_CHANNELS):
+        """
+        합성된 TTS 음성을 무음 제거 -> 리샘플링 -> 스테레오 변환까지 메모리에서 처리합니다.
+        trim_silence_file + ffmpeg_to_stereo 를 거치던 파일 경로를 대신합니다.
+        
+        :param samples: 1차원 또는 (samples, channels) float 배열
+        :param sample_rate: 입력 샘플레이트
+        :return: (samples, channels) float32 배열 (target_rate)
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        samples = AbusAudio.trim_silence_array(samples, sample_rate)
+        samples = AbusAudio.resample_array(samples, sample_rate, target_rate)
+        return AbusAudio.to_channels(samples, channels)
+    
+    
+    @staticmethod
+    def write_array(output_file, samples, sample_rate=TTS_SAMPLE_RATE):
+        """배열을 파일 확장자에 맞는 형식으로 저장합니다."""
+        _, ext = os.path.splitext(output_file)
+        audio_format = ext[1:].lower() if ext else "wav"
+        AbusAudio.array_to_audio(samples, sample_rate).export(output_file, format=audio_format)
+        return output_file
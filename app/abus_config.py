@@ -86,3 +86,166 @@ def azure_translator_available() -> bool:
     )
 
 
+
+
+def get_env_int(key: str, default: int) -> int:
+    """Get integer environment variable value, falling back to default on missing or invalid input."""
+    value = get_env(key)
+    try:
+        return int(value) if value is not None else default
+    except ValueError:
+        return default
+
+
+def get_env_float(key: str, default: float) -> float:
+    """Get float environment variable value, falling back to default on missing or invalid input."""
+    value = get_env(key)
+    try:
+        return float(value) if value is not None else default
+    except ValueError:
+        return default
+
+
+def get_edge_tts_concurrency() -> int:
+    """Get the maximum number of Edge TTS requests in flight at once."""
+    return max(1, get_env_int('EDGE_TTS_CONCURRENCY', 8))
+
+
+def get_edge_tts_max_retries() -> int:
+    """Get the number of retries for a failed Edge TTS request."""
+    return max(0, get_env_int('EDGE_TTS_MAX_RETRIES', 3))
+
+
+def get_tts_keep_segments() -> bool:
+    """Whether per-line TTS segment files are written next to the final mix."""
+    return (get_env('TTS_KEEP_SEGMENTS') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_model_registry_budget_mb() -> int:
+    """Get the memory budget (MB) for resident models. 0 disables LRU eviction."""
+    return max(0, get_env_int('MODEL_REGISTRY_BUDGET_MB', 8192))
+
+
+def get_model_registry_idle_timeout() -> float:
+    """Get the number of idle seconds after which an unused model is unloaded. 0 keeps models until evicted."""
+    return max(0.0, get_env_float('MODEL_REGISTRY_IDLE_TIMEOUT', 900))
+
+
+def get_asr_batched() -> bool:
+    """Whether faster-whisper transcribes VAD chunks in batches instead of sequentially."""
+    return (get_env('ASR_BATCHED') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_asr_batch_size() -> int:
+    """Get the number of VAD chunks decoded together in batched ASR mode."""
+    return max(1, get_env_int('ASR_BATCH_SIZE', 8))
+
+
+def get_asr_cpu_threads() -> int:
+    """Get the number of CPU threads for faster-whisper. 0 keeps the CTranslate2 default (every core in batched mode)."""
+    return max(0, get_env_int('ASR_CPU_THREADS', 0))
+
+
+def get_mdx_intra_op_threads() -> int:
+    """Get the onnxruntime intra-op thread count for MDX-Net sessions. 0 uses the onnxruntime default."""
+    return max(0, get_env_int('MDX_INTRA_OP_THREADS', 0))
+
+
+def get_mdx_inter_op_threads() -> int:
+    """Get the onnxruntime inter-op thread count for MDX-Net sessions."""
+    return max(0, get_env_int('MDX_INTER_OP_THREADS', 1))
+
+
+def get_mdx_batch_size() -> int:
+    """Get the number of MDX-Net chunks per onnxruntime call. 0 picks it from MDX_BATCH_MEMORY_MB."""
+    return max(0, get_env_int('MDX_BATCH_SIZE', 0))
+
+
+def get_mdx_batch_memory_mb() -> int:
+    """Get the memory budget (MB) used to pick the MDX-Net batch size."""
+    return max(1, get_env_int('MDX_BATCH_MEMORY_MB', 512))
+
+
+def get_rvc_batch_size() -> int:
+    """Get the maximum number of segments converted together by RVC batch conversion."""
+    return max(1, get_env_int('RVC_BATCH_SIZE', 8))
+
+
+def get_cosyvoice_prompt_cache_size() -> int:
+    """Get the number of CosyVoice speaker prompts kept in memory. 0 disables the in-memory cache."""
+    return max(0, get_env_int('COSYVOICE_PROMPT_CACHE_SIZE', 16))
+
+
+def get_cosyvoice_prompt_cache_dir() -> str:
+    """Get the folder for persistent CosyVoice speaker prompts. Empty keeps prompts in memory only."""
+    return (get_env('COSYVOICE_PROMPT_CACHE_DIR') or '').strip()
+
+
+def get_cosyvoice_batch_size() -> int:
+    """Get the number of lines CosyVoice2 synthesizes together. 1 synthesizes one line at a time."""
+    return max(1, get_env_int('COSYVOICE_BATCH_SIZE', 1))
+
+
+def get_cosyvoice_flow_solver() -> str:
+    """Get the CosyVoice2 flow solver preset (reference, balanced, fast, draft)."""
+    return (get_env('COSYVOICE_FLOW_SOLVER') or 'reference').strip()
+
+
+def get_cosyvoice_flow_steps() -> int:
+    """Get the number of flow solver steps. 0 keeps the preset's step count."""
+    return max(0, get_env_int('COSYVOICE_FLOW_STEPS', 0))
+
+
+def get_demucs_segment_batch() -> int:
+    """Get the number of Demucs segments per forward pass. 0 picks it from DEMUCS_BATCH_MEMORY_MB."""
+    return max(0, get_env_int('DEMUCS_SEGMENT_BATCH', 0))
+
+
+def get_demucs_batch_memory_mb() -> int:
+    """Get the memory budget (MB) used to pick the Demucs segment batch."""
+    return max(1, get_env_int('DEMUCS_BATCH_MEMORY_MB', 1024))
+
+
+def get_demucs_parallel_jobs() -> int:
+    """Get the number of Demucs bag models / shifts run concurrently. 0 or 1 runs them one after another."""
+    return max(0, get_env_int('DEMUCS_PARALLEL_JOBS', 0))
+
+
+def get_demucs_threads_per_job() -> int:
+    """Get the torch intra-op threads of each parallel Demucs job. 0 splits the threads between the jobs."""
+    return max(0, get_env_int('DEMUCS_THREADS_PER_JOB', 0))
+
+
+def get_demucs_stream_minutes() -> int:
+    """Get the duration (minutes) from which Demucs separates in streaming mode. 0 always separates in memory."""
+    return max(0, get_env_int('DEMUCS_STREAM_MINUTES', 20))
+
+
+def get_stem_cache_max_mb() -> int:
+    """Get the disk budget (MB) of the separated stem cache. 0 disables the cache."""
+    return max(0, get_env_int('STEM_CACHE_MAX_MB', 10240))
+
+
+def get_stem_cache_dir() -> str:
+    """Get the folder of the separated stem cache. Empty uses workspace/.stem_cache."""
+    return (get_env('STEM_CACHE_DIR') or '').strip()
+
+
+def get_kokoro_batch_size() -> int:
+    """Get the number of subtitle lines Kokoro synthesizes in one padded batch. 1 synthesizes line by line."""
+    return max(1, get_env_int('KOKORO_BATCH_SIZE', 1))
+
+
+def get_f5_reference_cache_size() -> int:
+    """Get the number of F5-TTS reference voices kept in memory. 0 disables the cache."""
+    return max(0, get_env_int('F5_REFERENCE_CACHE_SIZE', 8))
+
+
+def get_f5_nfe_step() -> int:
+    """Get the number of F5-TTS ODE sampling steps (4 ~ 64). Fewer steps are faster at some quality cost."""
+    return max(1, get_env_int('F5_NFE_STEP', 32))
+
+
+def get_f5_batch_size() -> int:
+    """Get the number of F5-TTS text chunks sampled in one padded batch. 1 synthesizes line by line."""
+    return max(1, get_env_int('F5_BATCH_SIZE', 1))
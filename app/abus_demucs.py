@@ -1,9 +1,19 @@
 import os
-import subprocess
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+import torch
 
 from app.abus_ffmpeg import *
 from app.abus_path import *
 from app.abus_downloader import *
+from app.abus_model_registry import *
+from app.abus_stem_cache import stem_cache
+from app.abus_config import get_demucs_segment_batch, get_demucs_batch_memory_mb, get_demucs_parallel_jobs, get_demucs_threads_per_job, get_demucs_stream_minutes
+from src.demucs.api import Separator
+from src.demucs.audio import AudioFile, prevent_clip
 
 
 import structlog
@@ -11,43 +21,207 @@ logger = structlog.get_logger()
 
 
 
-# step1. split to wav / step2. convert to flac,mp3 ...
-def demucs_split_file(input_path: str, output_dir, demucs_model: str, audio_format: str, progress = gr.Progress()):
-    temp_directory = os.path.join(path_workspace_folder(), "demucs")
-    if not os.path.exists(temp_directory):
-        os.makedirs(temp_directory, exist_ok=True)
-        
-    output_option = "--float32"        
-    file_name = os.path.splitext(os.path.basename(input_path))[0]  
-    
-    logger.debug(f'temp_directory: {temp_directory}')
-    logger.debug(f'demucs_model: {demucs_model}')
-    logger.debug(f'file_name: {file_name}')
-    logger.debug(f'audio_format: {audio_format}')
-    
-    demucs_inst_file = os.path.join(temp_directory, demucs_model, file_name, "no_vocals.wav")
-    demucs_vocal_file = os.path.join(temp_directory, demucs_model, file_name, "vocals.wav")
-
-    command = f'python -m demucs.separate -n {demucs_model} --two-stems=vocals "{input_path}" -o "{temp_directory}" {output_option}'
-    command += f' --repo model/demucs'
-    logger.debug(f'[abus:demucs_split_file] {command}')
-    
-    with subprocess.Popen(command, text=True, shell=True, stderr=subprocess.PIPE, bufsize=1, universal_newlines=True) as sp:
-        for line in sp.stderr:
-            print(f'{line}', end='', flush=True)
-            tokens = [item for item in line.split("%|") if item]
-            if len(tokens) < 2:
-                continue
-            progress(float(tokens[0]) / 100.0, desc="Demucs")
-            
-            
-    inst_audio_file = os.path.join(output_dir, file_name + f"_{demucs_model}_inst." + audio_format)
-    vocal_audio_file = os.path.join(output_dir, file_name + f"_{demucs_model}_vocal." + audio_format)
-    
-    ffmpeg_convert_audio(demucs_inst_file, inst_audio_file, audio_format)
-    ffmpeg_convert_audio(demucs_vocal_file, vocal_audio_file, audio_format)
-    os.remove(demucs_inst_file)
-    os.remove(demucs_vocal_file)
-
-    return inst_audio_file, vocal_audio_file
+class DemucsSeparator:
+    """
+    Demucs 분리 서비스 (프로세스 내부).
+
+    python -m demucs.separate 서브프로세스를 대신합니다.
+    - 로드한 모델(Separator)은 모델 레지스트리에 (모델 이름, 저장소, 장치) 키로 보관해 파일마다 다시 읽지 않습니다.
+    - 파형을 메모리로 받아 분리하고, 스템은 최종 형식으로 한 번만 인코딩해 저장합니다.
+    - 진행률은 apply_model 의 callback 으로 받아 전달합니다.
+    - DEMUCS_STREAM_MINUTES 보다 긴 파일은 블록 단위로 읽고 분리해 끝난 구간부터 바로 인코딩합니다 (메모리 사용량이 길이와 무관).
+    """
+    def __init__(self, repo=None, device=None, shifts=1, overlap=0.25, jobs=0, segment_batch=None, batch_memory_mb=None,
+                 parallel_jobs=None, threads_per_job=None):
+        self.repo = repo or os.path.join(path_model_folder(), "demucs")
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.shifts = shifts
+        self.overlap = overlap
+        self.jobs = jobs
+        self.segment_batch = get_demucs_segment_batch() if segment_batch is None else segment_batch      # 0 - 메모리 예산으로 결정
+        self.batch_memory_mb = get_demucs_batch_memory_mb() if batch_memory_mb is None else batch_memory_mb
+        self.parallel_jobs = get_demucs_parallel_jobs() if parallel_jobs is None else parallel_jobs           # 백 모델 / shift 동시 실행
+        self.threads_per_job = get_demucs_threads_per_job() if threads_per_job is None else threads_per_job
+        self._lock = threading.Lock()      # Separator 의 파라미터(callback)를 호출마다 바꾸므로 한 번에 하나씩 분리한다
+        self.timings = []
+
+
+    def model_key(self, demucs_model):
+        return ('demucs', demucs_model, os.path.abspath(self.repo), self.device)
+
+
+    def model_files(self, demucs_model):
+        """저장소에서 모델(.yaml)에 적힌 하위 모델 가중치 파일 이름 (이름에 가중치 해시가 들어 있다)"""
+        yaml_file = os.path.join(self.repo, f"{demucs_model}.yaml")
+        if not os.path.exists(yaml_file):
+            return []
+        with open(yaml_file, encoding="utf-8") as f:
+            text = f.read()
+        return sorted(file for file in os.listdir(self.repo) if file.endswith(".th") and file.split("-")[0].split(".")[0] in text)
+
+
+    def cache_identity(self, demucs_model, audio_format):
+        """스템 캐시 키에 들어가는 모델 식별값과 결과에 영향을 주는 파라미터"""
+        return {
+            'model': demucs_model,
+            'model_files': self.model_files(demucs_model),
+            'shifts': self.shifts,
+            'overlap': self.overlap,
+            'format': audio_format,
+            'stream_minutes': get_demucs_stream_minutes(),
+        }
+
+
+    def model_size_mb(self, demucs_model):
+        """저장소의 .yaml 에 적힌 하위 모델 가중치 파일 크기의 합 (모델 레지스트리 메모리 예산용)"""
+        size = sum(os.path.getsize(os.path.join(self.repo, file)) for file in self.model_files(demucs_model))
+        return size // (1024 * 1024)
+
+
+    def _load(self, demucs_model):
+        logger.debug(f'[abus_demucs.py] DemucsSeparator._load - {demucs_model}, repo = {self.repo}, device = {self.device}')
+        return Separator(model=demucs_model, repo=Path(self.repo), device=self.device, shifts=self.shifts, overlap=self.overlap, jobs=self.jobs,
+                         segment_batch=self.segment_batch, batch_memory_mb=self.batch_memory_mb,
+                         parallel_jobs=self.parallel_jobs, threads_per_job=self.threads_per_job)
+
+
+    def _progress_callback(self, progress, streaming=False):
+        """apply_model callback -> progress(0~1, desc='Demucs')"""
+        if progress is None:
+            return None
+        shifts = max(1, self.shifts)
+        done = [0.0]
+
+        def callback(info):
+            if info["state"] != "end":
+                return
+            in_shift = min(1.0, info["segment_offset"] / max(1, info["audio_length"]))
+            if streaming:       # 모든 모델 / shift 가 함께 앞으로 나아간다
+                fraction = in_shift
+            else:
+                fraction = (info["model_idx_in_bag"] + (info["shift_idx"] + in_shift) / shifts) / info["models"]
+            # jobs / parallel_jobs 를 쓰면 조각이 순서 없이 끝나므로 줄어들지 않게 한다
+            if fraction > done[0]:
+                done[0] = fraction
+                progress(fraction, desc="Demucs")
+        return callback
+
+
+    def load_audio(self, input_path, demucs_model):
+        """모델의 샘플레이트 / 채널 수로 파일을 읽습니다. :return: (channels, samples) 텐서"""
+        with model_registry.borrow(self.model_key(demucs_model), lambda: self._load(demucs_model), self.model_size_mb(demucs_model)) as separator:
+            return AudioFile(input_path).read(streams=0, samplerate=separator.samplerate, channels=separator.audio_channels)
+
+
+    def separate(self, wave, sample_rate, demucs_model, progress=None):
+        """
+        메모리의 파형을 분리합니다.
 
+        :param wave: (channels, samples) float 텐서 또는 배열
+        :param sample_rate: 입력 샘플레이트 (모델과 다르면 변환)
+        :return: ({스템 이름: (channels, samples) 텐서}, 모델 샘플레이트)
+        """
+        wave = torch.as_tensor(wave, dtype=torch.float32).clone()
+        with model_registry.borrow(self.model_key(demucs_model), lambda: self._load(demucs_model), self.model_size_mb(demucs_model)) as separator:
+            with self._lock:
+                separator.update_parameter(device=self.device, shifts=self.shifts, overlap=self.overlap, jobs=self.jobs,
+                                           segment_batch=self.segment_batch, batch_memory_mb=self.batch_memory_mb,
+                                           parallel_jobs=self.parallel_jobs, threads_per_job=self.threads_per_job,
+                                           callback=self._progress_callback(progress), callback_arg={})
+                _, stems = separator.separate_tensor(wave, sample_rate)
+            return stems, separator.samplerate
+
+
+    def split_two_stems(self, wave, sample_rate, demucs_model, progress=None):
+        """
+        --two-stems=vocals 와 같이 보컬과 나머지 스템의 합(no_vocals)으로 나눕니다.
+
+        :return: (vocals, no_vocals, 모델 샘플레이트)
+        """
+        stems, samplerate = self.separate(wave, sample_rate, demucs_model, progress)
+        vocals = stems.pop("vocals")
+        no_vocals = torch.zeros_like(vocals)
+        for stem in stems.values():
+            no_vocals += stem
+        return vocals, no_vocals, samplerate
+
+
+    @staticmethod
+    def write_stem(stem, sample_rate, output_file, audio_format):
+        """demucs.separate 와 같이 클리핑을 막은 뒤(rescale) 최종 형식으로 한 번에 인코딩합니다."""
+        samples = prevent_clip(stem, mode="rescale").cpu().numpy().T
+        return ffmpeg_encode_array(samples, sample_rate, output_file, audio_format)
+
+
+    def split_file_stream(self, input_path: str, inst_audio_file, vocal_audio_file, demucs_model: str, audio_format: str, progress=None):
+        """
+        긴 파일용. 블록 단위로 분리하면서 끝난 구간을 ffmpeg 인코더에 바로 씁니다.
+        전체 길이를 알 수 없으므로 prevent_clip 은 rescale 대신 clamp 로 자릅니다.
+        """
+        with model_registry.borrow(self.model_key(demucs_model), lambda: self._load(demucs_model), self.model_size_mb(demucs_model)) as separator:
+            with self._lock:
+                separator.update_parameter(device=self.device, shifts=self.shifts, overlap=self.overlap,
+                                           callback=self._progress_callback(progress, streaming=True), callback_arg={})
+                encoders = [ffmpeg_open_encoder(separator.samplerate, separator.audio_channels, output_file, audio_format)
+                            for output_file in (inst_audio_file, vocal_audio_file)]
+                try:
+                    for stems in separator.separate_audio_file_stream(Path(input_path)):
+                        vocals = stems.pop("vocals")
+                        no_vocals = torch.zeros_like(vocals)
+                        for stem in stems.values():
+                            no_vocals += stem
+                        for encoder, stem in zip(encoders, (no_vocals, vocals)):
+                            encoder.stdin.write(prevent_clip(stem, mode="clamp").cpu().numpy().T.astype(np.float32).tobytes())
+                finally:
+                    for encoder in encoders:
+                        ffmpeg_close_encoder(encoder)
+        return inst_audio_file, vocal_audio_file
+
+
+    def split_file(self, input_path: str, output_dir, demucs_model: str, audio_format: str, progress=None):
+        stream_minutes = get_demucs_stream_minutes()
+        if stream_minutes and ffmpeg_get_duration(input_path) > stream_minutes * 60:
+            start_time = time.perf_counter()
+            file_name = os.path.splitext(os.path.basename(input_path))[0]
+            inst_audio_file = os.path.join(output_dir, file_name + f"_{demucs_model}_inst." + audio_format)
+            vocal_audio_file = os.path.join(output_dir, file_name + f"_{demucs_model}_vocal." + audio_format)
+            self.split_file_stream(input_path, inst_audio_file, vocal_audio_file, demucs_model, audio_format, progress)
+            logger.debug(f"[abus_demucs.py] split_file - {file_name}: streaming, total {time.perf_counter() - start_time:.2f}s")
+            return inst_audio_file, vocal_audio_file
+
+        start_time = time.perf_counter()
+        file_name = os.path.splitext(os.path.basename(input_path))[0]
+        models_loaded = model_registry.misses
+
+        wave = self.load_audio(input_path, demucs_model)
+        load_time = time.perf_counter() - start_time
+        vocals, no_vocals, samplerate = self.split_two_stems(wave, None, demucs_model, progress)
+        separate_time = time.perf_counter() - start_time - load_time
+
+        inst_audio_file = os.path.join(output_dir, file_name + f"_{demucs_model}_inst." + audio_format)
+        vocal_audio_file = os.path.join(output_dir, file_name + f"_{demucs_model}_vocal." + audio_format)
+        self.write_stem(no_vocals, samplerate, inst_audio_file, audio_format)
+        self.write_stem(vocals, samplerate, vocal_audio_file, audio_format)
+
+        total_time = time.perf_counter() - start_time
+        timing = {
+            'model': demucs_model,
+            'model_loaded': model_registry.misses > models_loaded,
+            'load': load_time,
+            'separate': separate_time,
+            'write': total_time - load_time - separate_time,
+            'total': total_time,
+        }
+        self.timings.append(timing)
+        logger.debug(f"[abus_demucs.py] split_file - {file_name}: load {load_time:.2f}s, separate {separate_time:.2f}s, write {timing['write']:.2f}s, model_loaded = {timing['model_loaded']}")
+        return inst_audio_file, vocal_audio_file
+
+
+demucs_separator = DemucsSeparator()
+
+
+
+def demucs_split_file(input_path: str, output_dir, demucs_model: str, audio_format: str, progress = gr.Progress()):
+    logger.debug(f'[abus:demucs_split_file] input_path = {input_path}, demucs_model = {demucs_model}, audio_format = {audio_format}')
+    return stem_cache.fetch_or_separate('demucs', input_path, output_dir, demucs_separator.cache_identity(demucs_model, audio_format),
+                                        lambda: demucs_separator.split_file(input_path, output_dir, demucs_model, audio_format, progress))
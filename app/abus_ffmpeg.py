@@ -3,6 +3,7 @@ import subprocess
 import json
 import ffmpeg
 import shutil
+import numpy as np
 import gradio as gr
 import re
 from typing import Optional
@@ -188,7 +189,7 @@ def ffmpeg_mix_audio(audio_path1: str, audio_path2: str, output_path: str, audio
 
 
 
-def ffmpeg_convert_audio(input_path: str, output_path: str, audio_format: str):
+def ffmpeg_audio_encoding_options(audio_format: str):
     encoding_options = "-c:a pcm_s16le -ar 48000 -b:a 320k -ac 2"
     if audio_format=="flac":
         encoding_options = "-c:a flac -ar 48000 -compression_level 0 -ac 2"
@@ -196,6 +197,12 @@ def ffmpeg_convert_audio(input_path: str, output_path: str, audio_format: str):
         encoding_options = "-c:a libmp3lame -qscale:a 0 -ar 48000 -ac 2"      # -ar 48000 -ab 320k
     elif audio_format=="ogg":
         encoding_options = "-c:a libvorbis -ar 48000 -b:a 320k -ac 2"
+    return encoding_options
+
+
+
+def ffmpeg_convert_audio(input_path: str, output_path: str, audio_format: str):
+    encoding_options = ffmpeg_audio_encoding_options(audio_format)
         
     command = f'ffmpeg -y -i "{input_path}" {encoding_options} "{output_path}" -nostdin'             
     logger.debug(f'[abus:ffmpeg_convert_audio] {command}')
@@ -203,6 +210,44 @@ def ffmpeg_convert_audio(input_path: str, output_path: str, audio_format: str):
 
 
 
+def ffmpeg_encode_array(samples, sample_rate: int, output_path: str, audio_format: str):
+    """
+    메모리의 파형을 중간 WAV 없이 ffmpeg 표준 입력으로 넘겨 ffmpeg_convert_audio 와 같은 설정으로 인코딩합니다.
+    
+    :param samples: (samples, channels) float 배열
+    :param sample_rate: 입력 샘플레이트
+    """
+    samples = np.ascontiguousarray(samples, dtype=np.float32)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0']
+    command += ffmpeg_audio_encoding_options(audio_format).split() + [output_path]
+    logger.debug(f'[abus:ffmpeg_encode_array] {" ".join(command)}')
+    subprocess.run(command, input=samples.tobytes(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    return output_path
+
+
+
+def ffmpeg_open_encoder(sample_rate: int, channels: int, output_path: str, audio_format: str, sample_format: str = 'f32le'):
+    """
+    ffmpeg_encode_array 의 스트리밍 버전. (samples, channels) 바이트를 stdin 에 나눠 쓰고 ffmpeg_close_encoder 로 마칩니다.
+
+    :param sample_format: stdin 으로 넘기는 샘플 형식 ('f32le' 또는 's16le')
+    :return: ffmpeg 프로세스 (subprocess.Popen)
+    """
+    command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', sample_format, '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0']
+    command += ffmpeg_audio_encoding_options(audio_format).split() + [output_path]
+    logger.debug(f'[abus:ffmpeg_open_encoder] {" ".join(command)}')
+    return subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+
+def ffmpeg_close_encoder(process):
+    _, stderr = process.communicate()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, process.args, stderr=stderr)
+
+
+
 def ffmpeg_to_mono(input_path: str, left_path: str, right_path: str, audio_format: str = "wav"):
     filter_complex = "[0:a]channelsplit=channel_layout=stereo[left][right]"
     
@@ -1,9 +1,13 @@
 import os
 import subprocess
+import time
 
 from app.abus_ffmpeg import *
 from app.abus_path import *
 from app.abus_downloader import *
+from app.abus_config import *
+from app.abus_model_registry import *
+from app.abus_stem_cache import stem_cache
 from src.aicover.mdx import *
 
 import structlog
@@ -11,14 +15,14 @@ logger = structlog.get_logger()
 
 
 
-def run_mdx(model_params, output_dir, model_path, filename, exclude_main=False, exclude_inversion=False, suffix=None, invert_suffix=None, denoise=False, keep_orig=True, m_threads=2):
+def mdx_device_threads():
     if torch.cuda.is_available():
         device = torch.device('cuda:0')
         device_properties = torch.cuda.get_device_properties(device)
         allocated_memory = torch.cuda.memory_allocated(device)
         total_vram_gb = device_properties.total_memory / 1024**3
         free_vram_gb = (device_properties.total_memory - allocated_memory) / 1024**3
-        m_threads = 1 if free_vram_gb < 10 else 2        
+        m_threads = 1 if free_vram_gb < 10 else 2
     else:
         device = torch.device('cpu')
         total_vram_gb = 0
@@ -27,50 +31,191 @@ def run_mdx(model_params, output_dir, model_path, filename, exclude_main=False,
 
     logger.debug(f'run_mdx: device = {device}')
     logger.debug(f'run_mdx: total_vram_gb = {total_vram_gb}, free_vram_gb = {free_vram_gb} m_threads = {m_threads}')
-        
-
-    model_hash = MDX.get_hash(model_path)
-    mp = model_params.get(model_hash)
-    model = MDXModel(
-        device,
-        dim_f=mp["mdx_dim_f_set"],
-        dim_t=2 ** mp["mdx_dim_t_set"],
-        n_fft=mp["mdx_n_fft_scale_set"],
-        stem_name=mp["primary_stem"],
-        compensation=mp["compensate"]
-    )
-
-    mdx_sess = MDX(model_path, model)
+    return device, m_threads
+
+
+
+# run_vocal_chain 의 단계별 모델: 보컬 / 반주, 메인 / 백업 보컬, 리버브 제거
+VOCAL_CHAIN_MODELS = ('UVR-MDX-NET-Voc_FT.onnx', 'UVR_MDXNET_KARA_2.onnx', 'Reverb_HQ_By_FoxJoy.onnx')
+
+
+class MDXSeparator:
+    """
+    MDX-Net 분리 서비스.
+
+    - 모델 해시는 파일 경로/수정 시간/크기별로 한 번만 계산합니다.
+    - ONNX 세션(워밍업 포함)은 모델 레지스트리에 (경로, 해시, 스레드 수) 키로 보관해 재사용합니다.
+    - 파형을 메모리로 주고받으므로 여러 단계를 이어서 실행할 때 WAV를 다시 읽지 않습니다.
+    """
+    def __init__(self, intra_op_threads=None, inter_op_threads=None, batch_size=None, batch_memory_mb=None):
+        self.intra_op_threads = get_mdx_intra_op_threads() if intra_op_threads is None else intra_op_threads
+        self.inter_op_threads = get_mdx_inter_op_threads() if inter_op_threads is None else inter_op_threads
+        self.batch_size = get_mdx_batch_size() if batch_size is None else batch_size       # 0 - 메모리 예산으로 결정
+        self.batch_memory_mb = get_mdx_batch_memory_mb() if batch_memory_mb is None else batch_memory_mb
+        self._hashes = {}
+        self.timings = []       # 단계별 소요 시간
+
+
+    def get_hash(self, model_path):
+        stat = os.stat(model_path)
+        key = (os.path.abspath(model_path), stat.st_mtime_ns, stat.st_size)
+        model_hash = self._hashes.get(key)
+        if model_hash is None:
+            model_hash = MDX.get_hash(model_path)
+            self._hashes[key] = model_hash
+        return model_hash
+
+
+    def session_key(self, model_path, model_hash):
+        return ('mdx', os.path.abspath(model_path), model_hash, self.intra_op_threads, self.inter_op_threads)
+
+
+    def _load_session(self, model_params, model_path, model_hash, device):
+        mp = model_params.get(model_hash)
+        model = MDXModel(
+            device,
+            dim_f=mp["mdx_dim_f_set"],
+            dim_t=2 ** mp["mdx_dim_t_set"],
+            n_fft=mp["mdx_n_fft_scale_set"],
+            stem_name=mp["primary_stem"],
+            compensation=mp["compensate"]
+        )
+        return MDX(model_path, model, self.intra_op_threads, self.inter_op_threads)
+
+
+    def separate(self, model_params, model_path, wave, denoise=False):
+        """
+        파형에서 모델의 주 스템을 분리합니다.
+
+        :param wave: (2, samples) float 배열, DEFAULT_SR
+        :return: (wave_processed, mdx_model, peak) 주 스템 파형, 모델 파라미터(stem_name, compensation), 입력 정규화에 사용한 피크
+        """
+        device, m_threads = mdx_device_threads()
+        model_hash = self.get_hash(model_path)
+        key = self.session_key(model_path, model_hash)
+        size_mb = os.path.getsize(model_path) // (1024 * 1024)
+
+        with model_registry.borrow(key, lambda: self._load_session(model_params, model_path, model_hash, device), size_mb) as mdx_sess:
+            batch_size = self.batch_size or mdx_sess.batch_size_for(self.batch_memory_mb)
+            logger.debug(f'[abus_mdx.py] MDXSeparator.separate - {os.path.basename(model_path)}, batch_size = {batch_size}')
+
+            # normalizing input wave gives better output
+            peak = max(np.max(wave), abs(np.min(wave)))
+            wave = wave / peak
+            if denoise:
+                wave_processed = -(mdx_sess.process_wave(-wave, m_threads, batch_size)) + (mdx_sess.process_wave(wave, m_threads, batch_size))
+                wave_processed *= 0.5
+            else:
+                wave_processed = mdx_sess.process_wave(wave, m_threads, batch_size)
+            # return to previous peak
+            wave_processed *= peak
+            return wave_processed, mdx_sess.model, peak
+
+
+    def run(self, model_params, output_dir, model_path, wave, basename, exclude_main=False, exclude_inversion=False, suffix=None, invert_suffix=None, denoise=False):
+        """
+        run_mdx 와 같은 규칙으로 분리 결과를 저장하고, 다음 단계에서 사용할 수 있도록 파형도 함께 반환합니다.
+
+        :param wave: (2, samples) float 배열, DEFAULT_SR
+        :param basename: 출력 파일 이름 앞부분 (입력 파일 이름에서 확장자를 뺀 것)
+        :return: (main_filepath, invert_filepath, main_wave, invert_wave)
+        """
+        start_time = time.perf_counter()
+        sessions_loaded = model_registry.misses
+        wave_processed, model, peak = self.separate(model_params, model_path, wave, denoise)
+        separate_time = time.perf_counter() - start_time
+        stem_name = model.stem_name if suffix is None else suffix
+
+        main_filepath = None
+        if not exclude_main:
+            main_filepath = os.path.join(output_dir, f"{basename}_{stem_name}.wav")
+            sf.write(main_filepath, wave_processed.T, DEFAULT_SR)
+
+        invert_filepath = None
+        invert_wave = None
+        if not exclude_inversion:
+            diff_stem_name = stem_naming.get(stem_name) if invert_suffix is None else invert_suffix
+            stem_name = f"{stem_name}_diff" if diff_stem_name is None else diff_stem_name
+            invert_filepath = os.path.join(output_dir, f"{basename}_{stem_name}.wav")
+            # 기존 run_mdx 와 같이 정규화된 입력에서 주 스템을 뺀다
+            invert_wave = (-wave_processed * model.compensation) + wave / peak
+            sf.write(invert_filepath, invert_wave.T, DEFAULT_SR)
+
+        total_time = time.perf_counter() - start_time
+        timing = {
+            'model': os.path.basename(model_path),
+            'session_loaded': model_registry.misses > sessions_loaded,
+            'separate': separate_time,
+            'write': total_time - separate_time,
+            'total': total_time,
+        }
+        self.timings.append(timing)
+        logger.debug(f"[abus_mdx.py] MDXSeparator.run - {timing['model']}: separate {separate_time:.2f}s, write {timing['write']:.2f}s, session_loaded = {timing['session_loaded']}")
+        return main_filepath, invert_filepath, wave_processed, invert_wave
+
+
+    def run_vocal_chain(self, model_params, models_dir, output_dir, source_audio, progress=None):
+        """
+        Voc_FT -> KARA_2 -> Reverb_HQ 3단계 분리. 앞 단계 결과 파형을 메모리에서 바로 다음 단계로 넘깁니다.
+        같은 입력 오디오 / 모델이면 스템 캐시에 저장된 결과를 사용합니다.
+
+        :return: (instrumentals_path, vocals_path, backup_vocals_path, main_vocals_path, main_vocals_dereverb_path)
+        """
+        model_hashes = [self.get_hash(os.path.join(models_dir, name)) for name in VOCAL_CHAIN_MODELS]
+        identity = {
+            'models': model_hashes,
+            'params': [model_params.get(model_hash) for model_hash in model_hashes],
+        }
+        return stem_cache.fetch_or_separate('mdx_vocal_chain', source_audio, output_dir, identity,
+                                            lambda: self._run_vocal_chain(model_params, models_dir, output_dir, source_audio, progress))
+
+
+    def _run_vocal_chain(self, model_params, models_dir, output_dir, source_audio, progress=None):
+        self.timings = []
+        start_time = time.perf_counter()
+        wave, _ = librosa.load(source_audio, mono=False, sr=DEFAULT_SR)
+        load_time = time.perf_counter() - start_time
+        basename = os.path.splitext(os.path.basename(source_audio))[0]
+
+        if progress is not None:
+            progress(0.2, desc=f'Separating vocals and instrumental...')
+        mdxnet_voc_ft = os.path.join(models_dir, VOCAL_CHAIN_MODELS[0])
+        vocals_path, instrumentals_path, vocals_wave, _ = self.run(model_params, output_dir, mdxnet_voc_ft, wave, basename, denoise=True)
+
+        if progress is not None:
+            progress(0.6, desc=f'Separating main vocals and backup vocals...')
+        mdxnet_kara2 = os.path.join(models_dir, VOCAL_CHAIN_MODELS[1])
+        basename = os.path.splitext(os.path.basename(vocals_path))[0]
+        backup_vocals_path, main_vocals_path, _, main_vocals_wave = self.run(model_params, output_dir, mdxnet_kara2, vocals_wave, basename, suffix='Backup', invert_suffix='Main', denoise=True)
+
+        if progress is not None:
+            progress(0.6, desc=f'Separating reverb...')
+        mdxnet_reverb = os.path.join(models_dir, VOCAL_CHAIN_MODELS[2])
+        basename = os.path.splitext(os.path.basename(main_vocals_path))[0]
+        _, main_vocals_dereverb_path, _, _ = self.run(model_params, output_dir, mdxnet_reverb, main_vocals_wave, basename, invert_suffix='DeReverb', exclude_main=True, denoise=True)
+
+        if progress is not None:
+            progress(1, desc=f'demixing complete')
+
+        total_time = time.perf_counter() - start_time
+        stages = ', '.join(f"{t['model']} {t['total']:.2f}s" for t in self.timings)
+        logger.debug(f'[abus_mdx.py] run_vocal_chain - load {load_time:.2f}s, {stages}, total {total_time:.2f}s')
+        return instrumentals_path, vocals_path, backup_vocals_path, main_vocals_path, main_vocals_dereverb_path
+
+
+mdx_separator = MDXSeparator()
+
+
+
+def run_mdx(model_params, output_dir, model_path, filename, exclude_main=False, exclude_inversion=False, suffix=None, invert_suffix=None, denoise=False, keep_orig=True, m_threads=2):
     wave, sr = librosa.load(filename, mono=False, sr=DEFAULT_SR)
-    # normalizing input wave gives better output
-    peak = max(np.max(wave), abs(np.min(wave)))
-    wave /= peak
-    if denoise:
-        wave_processed = -(mdx_sess.process_wave(-wave, m_threads)) + (mdx_sess.process_wave(wave, m_threads))
-        wave_processed *= 0.5
-    else:
-        wave_processed = mdx_sess.process_wave(wave, m_threads)
-    # return to previous peak
-    wave_processed *= peak
-    stem_name = model.stem_name if suffix is None else suffix
-
-    main_filepath = None
-    if not exclude_main:
-        main_filepath = os.path.join(output_dir, f"{os.path.basename(os.path.splitext(filename)[0])}_{stem_name}.wav")
-        sf.write(main_filepath, wave_processed.T, sr)
-
-    invert_filepath = None
-    if not exclude_inversion:
-        diff_stem_name = stem_naming.get(stem_name) if invert_suffix is None else invert_suffix
-        stem_name = f"{stem_name}_diff" if diff_stem_name is None else diff_stem_name
-        invert_filepath = os.path.join(output_dir, f"{os.path.basename(os.path.splitext(filename)[0])}_{stem_name}.wav")
-        sf.write(invert_filepath, (-wave_processed.T * model.compensation) + wave.T, sr)
+    basename = os.path.basename(os.path.splitext(filename)[0])
+    main_filepath, invert_filepath, _, _ = mdx_separator.run(model_params, output_dir, model_path, wave, basename,
+                                                             exclude_main, exclude_inversion, suffix, invert_suffix, denoise)
 
     if not keep_orig:
         os.remove(filename)
 
-    del mdx_sess, wave_processed, wave
+    del wave
     gc.collect()
     return main_filepath, invert_filepath
-
-
@@ -0,0 +1,251 @@
+import gc
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app.abus_config import *
+
+import structlog
+logger = structlog.get_logger()
+
+
+class _RegistryEntry:
+    def __init__(self, model, size_mb, load_time):
+        self.model = model
+        self.size_mb = size_mb
+        self.load_time = load_time      # 로드에 걸린 시간(초), 재사용 시 절약된 시간 계산에 사용
+        self.refs = 0                   # 현재 빌려간 엔진 수
+        self.hits = 0
+        self.last_used = time.monotonic()
+
+
+class AbusModelRegistry:
+    """
+    프로세스 전역 모델 레지스트리.
+
+    파일마다 수 GB짜리 모델을 다시 읽지 않도록 로드한 모델을 키별로 보관하고 엔진에 빌려줍니다.
+    - 메모리 예산(budget_mb)을 넘으면 사용 중이 아니고 고정되지 않은 모델부터 LRU 순서로 내립니다.
+    - idle_timeout 초 동안 사용되지 않은 모델은 백그라운드에서 내립니다.
+    - pin 된 모델은 예산이나 유휴 시간과 관계없이 유지됩니다.
+    """
+    def __init__(self, budget_mb=None, idle_timeout=None):
+        self.budget_mb = get_model_registry_budget_mb() if budget_mb is None else budget_mb
+        self.idle_timeout = get_model_registry_idle_timeout() if idle_timeout is None else idle_timeout
+
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()   # key -> _RegistryEntry, 앞쪽이 가장 오래 사용되지 않은 모델
+        self._key_locks = {}
+        self._pinned = set()
+        self._sweeper = None
+        self._stop = threading.Event()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+        self.saved_time = 0.0
+
+
+    def acquire(self, key, loader, size_mb=0):
+        """
+        키에 해당하는 모델을 빌려옵니다. 없으면 loader()로 로드해 등록합니다.
+        사용이 끝나면 반드시 release(key)를 호출해야 합니다.
+
+        :param key: (engine, model_size, compute_type, device) 형태의 튜플
+        :param loader: 모델을 생성하는 인자 없는 함수
+        :param size_mb: 모델이 차지하는 메모리 추정치(MB)
+        :return: 모델 객체
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # 같은 모델을 동시에 두 번 로드하지 않도록 키 단위로 잠근다
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    entry.refs += 1
+                    entry.hits += 1
+                    entry.last_used = time.monotonic()
+                    self.hits += 1
+                    self.saved_time += entry.load_time
+                    logger.debug(f'[abus_model_registry.py] acquire - hit {key}, saved {entry.load_time:.2f}s')
+                    return entry.model
+
+                self.misses += 1
+                self._evict(size_mb)
+
+            start_time = time.perf_counter()
+            model = loader()
+            load_time = time.perf_counter() - start_time
+
+            with self._lock:
+                entry = _RegistryEntry(model, size_mb, load_time)
+                entry.refs = 1
+                self._entries[key] = entry
+                self.load_time += load_time
+                logger.debug(f'[abus_model_registry.py] acquire - loaded {key} in {load_time:.2f}s, size = {size_mb}MB')
+
+        self._start_sweeper()
+        return model
+
+
+    def release(self, key):
+        """빌려간 모델을 반납합니다. 모델은 레지스트리에 남아 다음 요청에 재사용됩니다."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs = max(0, entry.refs - 1)
+            entry.last_used = time.monotonic()
+            evicted = self._evict()
+        if evicted:
+            self._release_memory()
+
+
+    @contextmanager
+    def borrow(self, key, loader, size_mb=0):
+        model = self.acquire(key, loader, size_mb)
+        try:
+            yield model
+        finally:
+            self.release(key)
+
+
+    def pin(self, key):
+        """모델을 고정합니다. 아직 로드되지 않은 키도 고정할 수 있습니다."""
+        with self._lock:
+            self._pinned.add(key)
+
+
+    def unpin(self, key):
+        with self._lock:
+            self._pinned.discard(key)
+            evicted = self._evict()
+        if evicted:
+            self._release_memory()
+
+
+    def unload(self, key):
+        """사용 중이 아닌 모델을 즉시 내립니다. 고정 여부는 무시합니다."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refs > 0:
+                return False
+            self._remove(key)
+        self._release_memory()
+        return True
+
+
+    def clear(self):
+        """사용 중이 아닌 모든 모델을 내립니다."""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry.refs == 0]
+            for key in keys:
+                self._remove(key)
+        if keys:
+            self._release_memory()
+
+
+    def sweep_idle(self):
+        """idle_timeout 동안 사용되지 않은 모델을 내립니다."""
+        if self.idle_timeout <= 0:
+            return []
+
+        now = time.monotonic()
+        with self._lock:
+            keys = [key for key, entry in self._entries.items()
+                    if entry.refs == 0 and key not in self._pinned and now - entry.last_used >= self.idle_timeout]
+            for key in keys:
+                logger.debug(f'[abus_model_registry.py] sweep_idle - unload {key}')
+                self._remove(key)
+        if keys:
+            self._release_memory()
+        return keys
+
+
+    def used_mb(self):
+        with self._lock:
+            return sum(entry.size_mb for entry in self._entries.values())
+
+
+    def stats(self):
+        """히트/미스 횟수, 누적 로드 시간, 재사용으로 절약한 로드 시간과 모델별 상태를 반환합니다."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'load_time': self.load_time,
+                'saved_time': self.saved_time,
+                'used_mb': sum(entry.size_mb for entry in self._entries.values()),
+                'budget_mb': self.budget_mb,
+                'models': [{
+                    'key': key,
+                    'size_mb': entry.size_mb,
+                    'refs': entry.refs,
+                    'hits': entry.hits,
+                    'pinned': key in self._pinned,
+                    'load_time': entry.load_time,
+                    'idle': now - entry.last_used,
+                } for key, entry in self._entries.items()],
+            }
+
+
+    def _evict(self, incoming_mb=0):
+        """예산을 넘으면 LRU 순서로 모델을 내립니다. self._lock 을 잡은 상태에서 호출해야 합니다."""
+        if self.budget_mb <= 0:
+            return []
+
+        evicted = []
+        used_mb = sum(entry.size_mb for entry in self._entries.values())
+        for key in list(self._entries.keys()):
+            if used_mb + incoming_mb <= self.budget_mb:
+                break
+            entry = self._entries[key]
+            if entry.refs > 0 or key in self._pinned:
+                continue
+            logger.debug(f'[abus_model_registry.py] _evict - unload {key}, used = {used_mb}MB, budget = {self.budget_mb}MB')
+            used_mb -= entry.size_mb
+            self._remove(key)
+            evicted.append(key)
+        return evicted
+
+
+    def _remove(self, key):
+        del self._entries[key]
+        self.evictions += 1
+
+
+    def _start_sweeper(self):
+        if self.idle_timeout <= 0 or self._sweeper is not None:
+            return
+
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='abus-model-registry', daemon=True)
+            self._sweeper.start()
+
+
+    def _sweep_loop(self):
+        interval = max(1.0, min(60.0, self.idle_timeout / 2))
+        while not self._stop.wait(interval):
+            self.sweep_idle()
+
+
+    @staticmethod
+    def _release_memory():
+        gc.collect()
+        try:
+            import torch
+        except ImportError:
+            return
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+model_registry = AbusModelRegistry()
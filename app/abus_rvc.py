@@ -7,11 +7,14 @@ from rvc.infer.infer import VoiceConverter
 from app.abus_path import path_subfolders, path_subfile, path_live_folder
 from app.abus_ffmpeg import *
 from app.abus_path import *
+from app.abus_audio import *
+from app.abus_config import get_rvc_batch_size
 
 import structlog
 logger = structlog.get_logger()
 
-infer_pipeline = VoiceConverter().infer_pipeline
+voice_converter = VoiceConverter()
+infer_pipeline = voice_converter.infer_pipeline
 
 class RVC:
     def __init__(self):
@@ -119,6 +122,46 @@ class RVC:
                 
 
 
+    def convert_segments(self, segments, sample_rate, rvc_voice, batch_size=None):
+        """
+        메모리 상의 여러 세그먼트(TTS 문장 등)를 simple_inference 와 같은 설정으로 한 번에 변환합니다.
+        길이가 비슷한 세그먼트끼리 묶어 임베더와 생성기를 배치로 실행합니다.
+        
+        :param segments: 1차원 또는 (samples, channels) float 배열 목록 (None 은 건너뜀)
+        :param sample_rate: 입력 샘플레이트
+        :param batch_size: 한 번에 변환할 세그먼트 수 (None 이면 RVC_BATCH_SIZE)
+        :return: 입력 순서와 같은 순서의 (samples, 2) float32 배열 목록 (TTS_SAMPLE_RATE, 실패한 세그먼트는 None)
+        """
+        pth_path, index_path = self.get_voice(rvc_voice)
+        batch_size = get_rvc_batch_size() if batch_size is None else batch_size
+        logger.debug(f"[abus_rvc.py] convert_segments - pth_path = {pth_path}, segments = {len(segments)}, batch_size = {batch_size}")
+        
+        voice_converter.get_vc(pth_path, 0)
+        output_sr, outputs = voice_converter.convert_batch(
+            segments,
+            sample_rate,
+            f0_up_key=0,
+            f0_method="rmvpe",
+            file_index=index_path,
+            index_rate=0.3,
+            rms_mix_rate=1,
+            protect=0.23,
+            hop_length=256,
+            filter_radius=3,
+            embedder_model="contentvec",
+            clean_audio=True,
+            clean_strength=0.2,
+            batch_size=batch_size,
+        )
+        
+        results = []
+        for samples in outputs:
+            if samples is not None:
+                samples = AbusAudio.to_channels(AbusAudio.resample_array(samples, output_sr, TTS_SAMPLE_RATE))
+            results.append(samples)
+        return results
+    
+    
     def call_infer_pipeline(self, input_path, output_path, rvc_voice, 
                             f0_up_key, filter_radius, index_rate, rms_mix_rate, protect, hop_length, clean_strength, export_format = "wav"):
         output_voice_file = os.path.join(path_live_folder(), path_new_filename(ext = f".{export_format}"))
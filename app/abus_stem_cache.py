@@ -0,0 +1,316 @@
+"""
+분리(디노이즈) 스템 캐시
+
+같은 음원을 다시 처리하거나 다른 탭으로 옮겨 가도 Demucs / MDX-Net 분리를 다시 하지 않도록
+(입력 오디오 내용 해시, 모델 식별값, 분리 파라미터) 키로 스템을 작업 폴더에 한 번만 저장합니다.
+
+    python -m app.abus_stem_cache stats
+    python -m app.abus_stem_cache list
+    python -m app.abus_stem_cache prune --max-mb 4096 --older-than-days 30
+    python -m app.abus_stem_cache clear
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+
+from app.abus_config import *
+
+import structlog
+logger = structlog.get_logger()
+
+
+META_FILE = 'meta.json'
+BASENAME = '{basename}'
+
+
+class AbusStemCache:
+    """
+    내용 주소 방식의 스템 캐시.
+
+    - 항목 폴더 이름은 (종류, 입력 해시, 모델 / 파라미터)의 해시이고, 스템 파일과 meta.json 을 담습니다.
+    - 항목에는 작업 폴더 출력 파일의 사본을 저장하고, 적중하면 다시 사본을 만들어 돌려줍니다.
+      분리기 / 후처리가 출력 파일을 제자리에서 덮어써도 (ffmpeg -y, open 'wb') 캐시 항목은 바뀌지 않습니다.
+    - 파일 이름은 입력 파일 이름을 {basename} 으로 바꾼 틀로 저장해, 같은 내용의 다른 파일에도 규칙대로 이름을 붙입니다.
+    - 전체 크기가 max_mb 를 넘으면 가장 오래 사용되지 않은 항목부터 지웁니다.
+    """
+    def __init__(self, cache_dir=None, max_mb=None):
+        self.cache_dir = cache_dir or get_stem_cache_dir() or os.path.join(os.getcwd(), 'workspace', '.stem_cache')
+        self.max_mb = get_stem_cache_max_mb() if max_mb is None else max_mb
+
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._hashes = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_time = 0.0
+
+
+    @property
+    def enabled(self):
+        return self.max_mb > 0
+
+
+    def file_hash(self, file_path):
+        """파일 내용의 sha1. 경로 / 수정 시간 / 크기별로 한 번만 계산합니다."""
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        file_hash = self._hashes.get(memo_key)
+        if file_hash is None:
+            digest = hashlib.sha1()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            file_hash = digest.hexdigest()
+            self._hashes[memo_key] = file_hash
+        return file_hash
+
+
+    def make_key(self, kind, input_path, identity):
+        """
+        :param kind: 분리 종류 ('demucs', 'mdx_vocal_chain' ...)
+        :param identity: 결과에 영향을 주는 모델 식별값과 파라미터 (JSON 으로 바꿀 수 있는 dict)
+        """
+        digest = hashlib.sha1()
+        digest.update(f'{kind}\0{self.file_hash(input_path)}\0'.encode('utf-8'))
+        digest.update(json.dumps(identity, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+
+    @staticmethod
+    def _read_meta(entry_dir):
+        try:
+            with open(os.path.join(entry_dir, META_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    @staticmethod
+    def _write_meta(entry_dir, meta):
+        meta_file = os.path.join(entry_dir, META_FILE)
+        with open(meta_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(meta_file + '.tmp', meta_file)
+
+
+    @staticmethod
+    def _copy(from_file, to_file):
+        """
+        from_file 을 to_file 로 복사합니다.
+        임시 파일에 쓴 뒤 바꿔치기해, to_file 이 다른 파일의 하드 링크였더라도 그 파일에는 쓰지 않습니다.
+        """
+        tmp_file = to_file + '.tmp'
+        shutil.copyfile(from_file, tmp_file)
+        os.replace(tmp_file, to_file)
+
+
+    def fetch_or_separate(self, kind, input_path, output_dir, identity, separate):
+        """
+        캐시에 있으면 스템을 output_dir 에 바로 만들어 반환하고, 없으면 separate() 를 실행해 결과를 저장합니다.
+
+        :param separate: 분리를 실행하고 출력 파일 경로 튜플을 반환하는 인자 없는 함수 (None 항목 허용)
+        :return: separate() 와 같은 형태의 경로 튜플
+        """
+        if not self.enabled:
+            return separate()
+
+        basename = os.path.splitext(os.path.basename(input_path))[0]
+        key = self.make_key(kind, input_path, identity)
+        entry_dir = self._entry_dir(key)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # 같은 항목을 동시에 두 번 분리하지 않도록 키 단위로 잠근다
+        with key_lock:
+            outputs = self._fetch(entry_dir, basename, output_dir)
+            if outputs is not None:
+                return outputs
+
+            with self._lock:
+                self.misses += 1
+            start_time = time.perf_counter()
+            outputs = separate()
+            separate_time = time.perf_counter() - start_time
+            try:
+                self._store(entry_dir, kind, identity, basename, outputs, separate_time)
+            except OSError as e:
+                logger.warning(f'[abus_stem_cache.py] fetch_or_separate - failed to store {key}: {e}')
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            self.prune(self.max_mb)
+            return outputs
+
+
+    def _fetch(self, entry_dir, basename, output_dir):
+        meta = self._read_meta(entry_dir)
+        if meta is None:
+            return None
+        stems = meta['stems']
+        if any(stem is not None and not os.path.exists(os.path.join(entry_dir, stem['file'])) for stem in stems):
+            logger.warning(f'[abus_stem_cache.py] _fetch - incomplete entry {entry_dir}, removed')
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = []
+        for stem in stems:
+            if stem is None:
+                outputs.append(None)
+                continue
+            output_file = os.path.join(output_dir, stem['name'].replace(BASENAME, basename))
+            self._copy(os.path.join(entry_dir, stem['file']), output_file)
+            outputs.append(output_file)
+
+        meta['hits'] = meta.get('hits', 0) + 1
+        meta['last_used'] = time.time()
+        self._write_meta(entry_dir, meta)
+        with self._lock:
+            self.hits += 1
+            self.saved_time += meta.get('separate_time', 0.0)
+        logger.debug(f"[abus_stem_cache.py] _fetch - hit {meta['kind']} {os.path.basename(entry_dir)[:12]}, saved {meta.get('separate_time', 0.0):.2f}s")
+        return tuple(outputs)
+
+
+    def _store(self, entry_dir, kind, identity, basename, outputs, separate_time):
+        os.makedirs(entry_dir, exist_ok=True)
+        stems = []
+        size = 0
+        for index, output_file in enumerate(outputs):
+            if not output_file:
+                stems.append(None)
+                continue
+            name = os.path.basename(output_file)
+            if name.startswith(basename):
+                name = BASENAME + name[len(basename):]
+            stem_file = f'{index}{os.path.splitext(name)[1]}'
+            self._copy(output_file, os.path.join(entry_dir, stem_file))
+            size += os.path.getsize(output_file)
+            stems.append({'name': name, 'file': stem_file})
+
+        now = time.time()
+        self._write_meta(entry_dir, {
+            'kind': kind,
+            'identity': identity,
+            'source': basename,
+            'stems': stems,
+            'size': size,
+            'separate_time': separate_time,
+            'created': now,
+            'last_used': now,
+            'hits': 0,
+        })
+
+
+    def entries(self):
+        """저장된 항목의 meta 목록 (가장 오래 사용되지 않은 항목이 앞)"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                meta = self._read_meta(os.path.join(prefix_dir, key))
+                if meta is not None:
+                    meta['key'] = key
+                    entries.append(meta)
+        entries.sort(key=lambda meta: meta.get('last_used', 0))
+        return entries
+
+
+    def remove(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+
+    def prune(self, max_mb=None, older_than_days=None):
+        """
+        크기 제한(max_mb, 0 이하면 제한 없음)을 넘거나 older_than_days 일 동안 사용되지 않은 항목을 지웁니다.
+
+        :return: 지운 항목 수
+        """
+        entries = self.entries()
+        total = sum(meta.get('size', 0) for meta in entries)
+        limit = max_mb * 1024 * 1024 if max_mb and max_mb > 0 else None
+        deadline = time.time() - older_than_days * 86400 if older_than_days else None
+        removed = 0
+        for meta in entries:
+            expired = deadline is not None and meta.get('last_used', 0) < deadline
+            if not expired and (limit is None or total <= limit):
+                continue
+            self.remove(meta['key'])
+            total -= meta.get('size', 0)
+            removed += 1
+            logger.debug(f"[abus_stem_cache.py] prune - removed {meta['kind']} {meta['source']} ({meta.get('size', 0) // (1024 * 1024)}MB)")
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+
+    def clear(self):
+        removed = len(self.entries())
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        return removed
+
+
+    def stats(self):
+        entries = self.entries()
+        with self._lock:
+            return {
+                'cache_dir': self.cache_dir,
+                'max_mb': self.max_mb,
+                'entries': len(entries),
+                'size_mb': sum(meta.get('size', 0) for meta in entries) / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'saved_time': self.saved_time,
+                'stored_hits': sum(meta.get('hits', 0) for meta in entries),
+                'stored_saved_time': sum(meta.get('hits', 0) * meta.get('separate_time', 0.0) for meta in entries),
+            }
+
+
+stem_cache = AbusStemCache()
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=None, help='캐시 폴더 (기본값: STEM_CACHE_DIR 또는 workspace/.stem_cache)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='항목 수, 크기, 누적 적중 수')
+    commands.add_parser('list', help='항목 목록 (가장 오래 사용되지 않은 항목부터)')
+    prune = commands.add_parser('prune', help='크기 제한 / 유휴 기간을 넘는 항목 삭제')
+    prune.add_argument('--max-mb', type=int, default=None, help='기본값: STEM_CACHE_MAX_MB')
+    prune.add_argument('--older-than-days', type=float, default=None)
+    commands.add_parser('clear', help='모든 항목 삭제')
+    args = parser.parse_args()
+
+    cache = AbusStemCache(cache_dir=args.dir)
+    if args.command == 'stats':
+        stats = cache.stats()
+        print(f"{stats['cache_dir']}: {stats['entries']} entries, {stats['size_mb']:.1f}MB / {stats['max_mb']}MB")
+        print(f"hits {stats['stored_hits']}, saved {stats['stored_saved_time']:.1f}s of separation")
+    elif args.command == 'list':
+        for meta in cache.entries():
+            last_used = time.strftime('%Y-%m-%d %H:%M', time.localtime(meta.get('last_used', 0)))
+            print(f"{meta['key'][:12]}  {meta['kind']:16s} {meta.get('size', 0) / (1024 * 1024):8.1f}MB  "
+                  f"hits {meta.get('hits', 0):3d}  {last_used}  {meta['source']}")
+    elif args.command == 'prune':
+        max_mb = cache.max_mb if args.max_mb is None else args.max_mb
+        print(f'removed {cache.prune(max_mb, args.older_than_days)} entries')
+    elif args.command == 'clear':
+        print(f'removed {cache.clear()} entries')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import numpy as np
+
+from app.abus_audio import *
+from app.abus_ffmpeg import ffmpeg_open_encoder, ffmpeg_close_encoder
+
+import structlog
+logger = structlog.get_logger()
+
+
+class AbusTimeline:
+    """
+    자막 타이밍에 맞춰 TTS 세그먼트를 하나의 float32 버퍼에 배치합니다.
+
+    AudioSegment += 로 이어 붙이면 줄마다 전체 버퍼가 복사되므로,
+    자막 끝 시간으로 버퍼를 미리 할당하고 각 세그먼트를 샘플 오프셋에 직접 기록합니다.
+
+    export 는 버퍼를 블록 단위로 int16 으로 바꿔 ffmpeg 에 바로 넘기므로 버퍼 전체의 사본을 만들지 않습니다.
+
+    배치 규칙은 기존 srt_to_voice와 동일합니다.
+    - 세그먼트는 자막 시작 시간에 배치됩니다.
+    - 이전 세그먼트가 아직 끝나지 않았다면 다음 세그먼트는 이전 세그먼트 끝으로 밀립니다.
+    """
+    def __init__(self, duration_ms=0, sample_rate=TTS_SAMPLE_RATE, channels=TTS_CHANNELS):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.buffer = np.zeros((self.ms_to_samples(duration_ms), channels), dtype=np.float32)
+        self.cursor = 0     # 마지막 세그먼트가 끝난 위치(샘플)
+
+
+    def ms_to_samples(self, ms):
+        return max(0, int(round(ms * self.sample_rate / 1000)))
+
+
+    def samples_to_ms(self, samples):
+        return samples * 1000 / self.sample_rate
+
+
+    def _reserve(self, length):
+        if length <= len(self.buffer):
+            return
+
+        # 자막 끝 시간을 넘는 경우에만 여유 있게 늘린다
+        new_length = max(length, int(len(self.buffer) * 1.5))
+        buffer = np.zeros((new_length, self.channels), dtype=np.float32)
+        buffer[:len(self.buffer)] = self.buffer
+        self.buffer = buffer
+
+
+    def write(self, samples, offset):
+        """샘플 오프셋에 세그먼트를 믹스합니다."""
+        samples = AbusAudio.to_channels(samples, self.channels)
+        end = offset + len(samples)
+        self._reserve(end)
+        self.buffer[offset:end] += samples
+        return end
+
+
+    def place(self, samples, start_ms):
+        """
+        자막 시작 시간에 세그먼트를 배치합니다. 앞 세그먼트와 겹치면 뒤로 밀어냅니다.
+
+        :param samples: (samples, channels) float 배열, 합성 실패 시 None
+        :param start_ms: 자막 시작 시간(밀리초)
+        :return: 실제로 배치된 시작 시간(밀리초)
+        """
+        offset = max(self.cursor, self.ms_to_samples(start_ms))
+        if samples is not None:
+            self.cursor = self.write(samples, offset)
+        return self.samples_to_ms(offset)
+
+
+    def append(self, samples):
+        """마지막 세그먼트 바로 뒤에 이어 붙입니다."""
+        return self.place(samples, 0)
+
+
+    def place_audio(self, audio_segment, start_ms):
+        samples = None
+        if audio_segment is not None:
+            samples = AbusAudio.audio_to_array(audio_segment, self.sample_rate, self.channels)
+        return self.place(samples, start_ms)
+
+
+    def append_audio(self, audio_segment):
+        return self.place_audio(audio_segment, 0)
+
+
+    def to_array(self):
+        return self.buffer[:self.cursor]
+
+
+    def to_audio(self):
+        return AbusAudio.array_to_audio(self.to_array(), self.sample_rate)
+
+
+    def export(self, output_file, audio_format, block_seconds=10):
+        """
+        ffmpeg 으로 인코딩합니다. array_to_audio 와 같은 방법으로 블록마다 int16 으로 바꿔 stdin 에 씁니다.
+        (AudioSegment 를 거치면 버퍼 전체의 배율 / 클리핑 / int16 사본과 pydub 임시 WAV 가 생깁니다)
+        """
+        logger.debug(f'[abus_timeline.py] export - {output_file}, duration = {self.samples_to_ms(self.cursor):.0f}ms')
+        if self.cursor == 0:
+            self.to_audio().export(output_file, format=audio_format)
+            return output_file
+        
+        block = max(1, int(block_seconds * self.sample_rate))
+        encoder = ffmpeg_open_encoder(self.sample_rate, self.channels, output_file, audio_format, sample_format='s16le')
+        try:
+            for start in range(0, self.cursor, block):
+                samples = self.buffer[start:min(start + block, self.cursor)]
+                encoder.stdin.write(np.clip(samples * 32768.0, -32768, 32767).astype(np.int16).tobytes())
+        finally:
+            ffmpeg_close_encoder(encoder)
+        return output_file
@@ -1,6 +1,7 @@
 import pysubs2
 
 from pydub import AudioSegment
+import numpy as np
 import gradio as gr
 
 from app.abus_genuine import *
@@ -9,7 +10,8 @@ from app.abus_ffmpeg import *
 from app.abus_text import *
 from app.abus_nlp_spacy import *
 from app.abus_audio import *
-from app.abus_config import get_azure_speech_key, get_azure_speech_region
+from app.abus_timeline import *
+from app.abus_config import get_azure_speech_key, get_azure_speech_region, get_tts_keep_segments
 
 import azure.cognitiveservices.speech as speechsdk
 
@@ -48,14 +50,14 @@ class AzureTTS:
     # Voice styles and roles
     # https://learn.microsoft.com/ko-kr/azure/ai-services/speech-service/speech-synthesis-markup-voice
     # https://learn.microsoft.com/en-us/azure/ai-services/speech-service/language-support?tabs=tts#voice-styles-and-roles
-    def generate_audio(self, text, voice, output_file, rate=0, volume=0, pitch=0):
+    def generate_audio(self, text, voice, rate=0, volume=0, pitch=0):
         rate_options = f'+{rate}%' if rate>=0 else f'{rate}%'
         volume_options = f'+{volume}%' if volume>=0 else f'{volume}%'
         pitch_options = f'+{pitch}Hz' if pitch>= 0 else f'{pitch}Hz'
         
-        self.speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Audio48Khz192KBitRateMonoMp3)     # Riff48Khz16BitMonoPcm   
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=output_file)
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=audio_config)
+        # 파일 대신 메모리로 raw PCM을 받아 디코딩 없이 바로 사용
+        self.speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Raw48Khz16BitMonoPcm)     # Audio48Khz192KBitRateMonoMp3
+        synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
                
         # SSML을 사용하여 prosody 설정
         logger.debug(f'voice = {voice}')
@@ -72,13 +74,13 @@ class AzureTTS:
         
         # Checks result.
         if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-            success, msg = self._validate_file(output_file)
+            success, msg = self._validate_audio(result.audio_data)
             if True == success:
                 logger.debug("Speech synthesized to speaker for text [{}]".format(text))
-                return True
+                return np.frombuffer(result.audio_data, dtype=np.int16).astype(np.float32) / 32768.0
             else:
                 logger.warning(f"Speech synthesis for '{text}' failed. reason: {msg}")
-                return False
+                return None
                 
         
         elif result.reason == speechsdk.ResultReason.Canceled:
@@ -88,36 +90,33 @@ class AzureTTS:
                 if cancellation_details.error_details:
                     print("Error details: {}".format(cancellation_details.error_details))
             logger.warning("Did you update the subscription info?")
-            return False
+            return None
 
     
     
-    def request_tts(self, line: str, output_file: str, voice_name: str, semitones, speed_factor, volume_factor, audio_format):
-        # Audio48Khz192KBitRateMonoMp3
-        output_voice_file = os.path.join(path_dubbing_folder(), path_new_filename(ext = ".mp3"))
+    def synthesize(self, line: str, voice_name: str, semitones, speed_factor, volume_factor):
         line = AbusText.normalize_text(line)
         if len(line) < 1:
-            logger.warning(f"[abus_tts_azure.py] request_tts - error: no line")
-            return False
+            logger.warning(f"[abus_tts_azure.py] synthesize - error: no line")
+            return None
         
-        logger.debug(f'[abus_tts_azure.py] request_tts - line = {line}')
+        logger.debug(f'[abus_tts_azure.py] synthesize - line = {line}')
         
-        if False == self.generate_audio(line, voice_name, output_voice_file, rate=speed_factor, volume=volume_factor, pitch=semitones):
-            logger.warning(f"[abus_tts_azure.py] request_tts - error: API returns False")
-            return False
+        samples = self.generate_audio(line, voice_name, rate=speed_factor, volume=volume_factor, pitch=semitones)
+        if samples is None:
+            logger.warning(f"[abus_tts_azure.py] synthesize - error: API returns None")
+            return None
                 
-        trimed_voice_file = path_add_postfix(output_voice_file, "_trimed")
-        AbusAudio.trim_silence_file(output_voice_file, trimed_voice_file)
-        
-        ffmpeg_to_stereo(trimed_voice_file, output_file)
-        
-        try:
-            os.remove(output_voice_file)
-            os.remove(trimed_voice_file)
-        except Exception as e:
-            logger.error(f"[abus_tts_azure.py] request_tts - error: {e}")
+        # Raw48Khz16BitMonoPcm
+        return AbusAudio.prepare_segment(samples, 48000)
+    
+    
+    def request_tts(self, line: str, output_file: str, voice_name: str, semitones, speed_factor, volume_factor, audio_format):
+        samples = self.synthesize(line, voice_name, semitones, speed_factor, volume_factor)
+        if samples is None:
             return False
         
+        AbusAudio.write_array(output_file, samples)
         return True
     
     
@@ -128,58 +127,44 @@ class AzureTTS:
         AbusSpacy.process_subtitle_for_tts(subtitle_file, tts_subtitle_file)
   
 
-        segments_folder = path_tts_segments_folder(subtitle_file)
+        segments_folder = path_tts_segments_folder(subtitle_file) if get_tts_keep_segments() else None
         full_subs = pysubs2.load(tts_subtitle_file, encoding="utf-8")
         subs = full_subs
         
-        combined_audio = AudioSegment.empty()
+        timeline = AbusTimeline(duration_ms=subs[-1].end if len(subs) > 0 else 0)
         for i in progress.tqdm(range(len(subs)), desc='Generating...'):
             line = subs[i]
-            next_line = subs[i+1] if i < len(subs)-1 else None
             
-            if i == 0:
-                silence = AudioSegment.silent(duration=line.start)
-                combined_audio += silence   
+            samples = self.synthesize(line.text, voice_name, semitones, speed_factor, volume_factor)
 
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1}.{audio_format}')
-            tts_result = self.request_tts(line.text, tts_segment_file, voice_name, semitones, speed_factor, volume_factor, audio_format)
-
-            if tts_result == False:
-                if next_line:
-                    silence = AudioSegment.silent(duration=next_line.start-line.start)
-                    combined_audio += silence
+            if samples is None:
                 continue        
             
-            combined_audio += AudioSegment.from_file(tts_segment_file)
-
-            if next_line and len(combined_audio) < next_line.start:
-                silence_length = next_line.start - len(combined_audio)
-                silence = AudioSegment.silent(duration=silence_length)
-                combined_audio += silence
-            elif next_line:
-                next_line.start = len(combined_audio)
-                next_line.end = next_line.start + (next_line.end - next_line.start)
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1}.{audio_format}'), samples)
+            timeline.place(samples, line.start)
                 
-        combined_audio.export(output_file, format=audio_format)
+        timeline.export(output_file, audio_format)
         cmd_delete_file(tts_subtitle_file)                        
           
 
     def text_to_voice(self, text: str, output_file: str, voice_name: str, semitones, speed_factor, volume_factor, audio_format, progress=gr.Progress()):
-        segments_folder = path_tts_segments_folder(output_file)  
+        segments_folder = path_tts_segments_folder(output_file) if get_tts_keep_segments() else None
         
         use_punctuation = AbusText.has_punctuation_marks(text)
         lines = AbusText.split_into_sentences(text, use_punctuation)
         lines = lines
         
-        combined_audio = AudioSegment.empty() 
+        timeline = AbusTimeline()
         for i in progress.tqdm(range(len(lines)), desc='Generating...'):
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}')    
-            tts_result = self.request_tts(lines[i], tts_segment_file, voice_name, semitones, speed_factor, volume_factor, audio_format)
-            if tts_result == False:
+            samples = self.synthesize(lines[i], voice_name, semitones, speed_factor, volume_factor)
+            if samples is None:
                 continue
-            combined_audio += AudioSegment.from_file(tts_segment_file)
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}'), samples)
+            timeline.append(samples)
             
-        combined_audio.export(output_file, format=audio_format)
+        timeline.export(output_file, audio_format)
 
 
     def infer(self, text: str, output_file: str, voice_name: str, semitones, speed_factor, volume_factor, audio_format, progress=gr.Progress()):
@@ -197,17 +182,9 @@ class AzureTTS:
             self.text_to_voice(text, output_file, voice_name, semitones, speed_factor, volume_factor, audio_format, progress)
         
     
-    def _validate_file(self, file_path):
-        # Check file existence
-        if not os.path.exists(file_path):
-            return False, "File does not exist."
-        
-        if not os.path.isfile(file_path):
-            return False, "The path is not a file."
-
-        # Check file size
-        file_size = os.path.getsize(file_path)
-        if file_size <= 0:
-            return False, "File size is not greater than 0."
+    def _validate_audio(self, audio_data):
+        # Check audio size
+        if audio_data is None or len(audio_data) <= 0:
+            return False, "Audio size is not greater than 0."
 
-        return True, "File is valid."
+        return True, "Audio is valid."
@@ -13,6 +13,8 @@ from app.abus_hf_file import *
 from app.abus_text import *
 from app.abus_nlp_spacy import *
 from app.abus_audio import *
+from app.abus_timeline import *
+from app.abus_config import get_tts_keep_segments, get_cosyvoice_prompt_cache_size, get_cosyvoice_prompt_cache_dir, get_cosyvoice_batch_size, get_cosyvoice_flow_solver, get_cosyvoice_flow_steps
 
 import structlog
 logger = structlog.get_logger()
@@ -32,6 +34,7 @@ prompt_sr = 16000
 
 import torchaudio
 from cosyvoice.cli.cosyvoice import CosyVoice2
+from cosyvoice.cli.prompt_cache import SpeakerPromptCache
 from cosyvoice.utils.file_utils import load_wav
 from cosyvoice.utils.common import set_all_random_seed
 
@@ -52,6 +55,7 @@ class CosyVoiceInference:
         # snapshot_download('iic/CosyVoice2-0.5B', local_dir=self.model_dir)        
         # self._download_model()
         self._cosyvoice = None
+        self._prompt_speech = (None, None)     # (ref_audio, mtime), 후처리된 16kHz 프롬프트 음성
        
 
     def __getattr__(self, name):
@@ -59,6 +63,9 @@ class CosyVoiceInference:
             if self._cosyvoice is None:
                 print("Creating CosyVoice2...")
                 self._cosyvoice = CosyVoice2(self.model_dir)
+                self._cosyvoice.frontend.prompt_cache = SpeakerPromptCache(get_cosyvoice_prompt_cache_size(), get_cosyvoice_prompt_cache_dir() or None)
+                flow_steps = get_cosyvoice_flow_steps()
+                self._cosyvoice.set_flow_solver(get_cosyvoice_flow_solver(), **({'n_timesteps': flow_steps} if flow_steps else {}))
             return self._cosyvoice
         else:
             raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
@@ -83,50 +90,70 @@ class CosyVoiceInference:
         set_all_random_seed(seed)
     
     
-    def _save_audio_removing_ref(self, output_file, tts_speech, ref_audio_len_samples):
+    def _remove_ref_audio(self, tts_speech, ref_audio_len_samples):
         if tts_speech.shape[1] > ref_audio_len_samples:
             tts_speech = tts_speech[:, ref_audio_len_samples:]
             logger.info(f"[abus_tts_cosyvoice.py] Removed reference audio ({ref_audio_len_samples} samples) from generated wave")
-        torchaudio.save(output_file, tts_speech, self.cosyvoice.sample_rate)
+        return tts_speech.squeeze(0).cpu().numpy()
 
-    def generate_audio_zero_shot(self, dubbing_text:str, output_file, ref_audio, ref_text, speed_factor):       
+    def generate_audio_zero_shot(self, dubbing_text:str, ref_audio, ref_text, speed_factor):       
         logger.debug(f"[abus_tts_cosyvoice.py] generate_audio_zero_shot - ref_audio = {ref_audio}, ref_text = {ref_text}, dubbing_text = {dubbing_text}")
     
         # zero_shot usage    
-        prompt_speech_16k = self.postprocess(load_wav(ref_audio, prompt_sr))
+        prompt_speech_16k = self.load_prompt_speech(ref_audio)
         
         # Calculate reference audio length in target sample rate
         ref_audio_len_samples = int((prompt_speech_16k.shape[1] / prompt_sr) * self.cosyvoice.sample_rate)
         
+        speech = None
         for i, j in enumerate(self.cosyvoice.inference_zero_shot(dubbing_text, ref_text, prompt_speech_16k, stream=False, speed=speed_factor, text_frontend=False)):
-            self._save_audio_removing_ref(output_file, j['tts_speech'], ref_audio_len_samples)
+            speech = self._remove_ref_audio(j['tts_speech'], ref_audio_len_samples)
+        return speech
         
            
-    def generate_audio_cross_lingual(self, dubbing_text:str, output_file, ref_audio, ref_text, speed_factor):       
+    def generate_audio_cross_lingual(self, dubbing_text:str, ref_audio, ref_text, speed_factor):       
         logger.debug(f"[abus_tts_cosyvoice.py] generate_audio_cross_lingual - ref_audio = {ref_audio}, ref_text = {ref_text}, dubbing_text = {dubbing_text}")
     
         # fine grained control, for supported control, check cosyvoice/tokenizer/tokenizer.py#L248    
-        prompt_speech_16k = self.postprocess(load_wav(ref_audio, prompt_sr))
+        prompt_speech_16k = self.load_prompt_speech(ref_audio)
         
         # Calculate reference audio length in target sample rate
         ref_audio_len_samples = int((prompt_speech_16k.shape[1] / prompt_sr) * self.cosyvoice.sample_rate)
 
+        speech = None
         for i, j in enumerate(self.cosyvoice.inference_cross_lingual(dubbing_text, prompt_speech_16k, speed=speed_factor, stream=False)):
-            self._save_audio_removing_ref(output_file, j['tts_speech'], ref_audio_len_samples)
+            speech = self._remove_ref_audio(j['tts_speech'], ref_audio_len_samples)
+        return speech
     
-    def generate_audio_instruct(self, dubbing_text:str, output_file, ref_audio, ref_text, speed_factor):       
+    def generate_audio_instruct(self, dubbing_text:str, ref_audio, ref_text, speed_factor):       
         logger.debug(f"[abus_tts_cosyvoice.py] generate_audio_instruct - ref_audio = {ref_audio}, ref_text = {ref_text}, dubbing_text = {dubbing_text}")
     
         # instruct usage
-        prompt_speech_16k = self.postprocess(load_wav(ref_audio, prompt_sr))
+        prompt_speech_16k = self.load_prompt_speech(ref_audio)
         
         # Calculate reference audio length in target sample rate
         ref_audio_len_samples = int((prompt_speech_16k.shape[1] / prompt_sr) * self.cosyvoice.sample_rate)
 
+        speech = None
         for i, j in enumerate(self.cosyvoice.inference_instruct2(dubbing_text, '', prompt_speech_16k, stream=False)):
-            self._save_audio_removing_ref(output_file, j['tts_speech'], ref_audio_len_samples)
+            speech = self._remove_ref_audio(j['tts_speech'], ref_audio_len_samples)
+        return speech
                     
     
+    def load_prompt_speech(self, ref_audio):
+        """
+        참조 음성을 16kHz로 읽어 후처리합니다. 한 작업 안에서는 참조 음성이 같으므로 파일이 바뀌지 않았다면 이전 결과를 재사용합니다.
+        
+        :return: (1, samples) 프롬프트 음성 텐서
+        """
+        key = (os.path.abspath(ref_audio), os.path.getmtime(ref_audio))
+        cached_key, prompt_speech_16k = self._prompt_speech
+        if cached_key != key:
+            prompt_speech_16k = self.postprocess(load_wav(ref_audio, prompt_sr))
+            self._prompt_speech = (key, prompt_speech_16k)
+        return prompt_speech_16k
+    
+    
     def postprocess(self, speech, top_db=60, hop_length=220, win_length=440):
         speech, _ = librosa.effects.trim(
             speech, top_db=top_db,
@@ -140,33 +167,88 @@ class CosyVoiceInference:
     
     
     
-    def request_tts(self, line: str, output_file: str, ref_audio, ref_text, inference_mode, speed_factor, audio_format):
-        output_voice_file = os.path.join(path_dubbing_folder(), path_new_filename(ext = f".{audio_format}"))
+    def synthesize(self, line: str, ref_audio, ref_text, inference_mode, speed_factor):
         line = AbusText.normalize_text(line)
         if len(line) < 1:
-            logger.warning(f"[abus_tts_cosyvoice.py] request_tts - error: no line")
-            return False
+            logger.warning(f"[abus_tts_cosyvoice.py] synthesize - error: no line")
+            return None
         
-        logger.debug(f'[abus_tts_cosyvoice.py] request_tts - line = {line}')
+        logger.debug(f'[abus_tts_cosyvoice.py] synthesize - line = {line}')
 
         if inference_mode == "Cross-Lingual":
-            self.generate_audio_cross_lingual(line, output_voice_file, ref_audio, ref_text, speed_factor)
+            speech = self.generate_audio_cross_lingual(line, ref_audio, ref_text, speed_factor)
         elif inference_mode == "Instruct":
-            self.generate_audio_instruct(line, output_voice_file, ref_audio, ref_text, speed_factor)            
+            speech = self.generate_audio_instruct(line, ref_audio, ref_text, speed_factor)            
         else:
-            self.generate_audio_zero_shot(line, output_voice_file, ref_audio, ref_text, speed_factor)
-            
+            speech = self.generate_audio_zero_shot(line, ref_audio, ref_text, speed_factor)
+        
+        if speech is None:
+            logger.warning(f"[abus_tts_cosyvoice.py] synthesize - error: no speech generated")
+            return None
+        return AbusAudio.prepare_segment(speech, self.cosyvoice.sample_rate)
+    
+    
+    def synthesize_batch(self, lines, ref_audio, ref_text, inference_mode, speed_factor, batch_size=None):
+        """
+        같은 참조 음성으로 여러 줄을 함께 합성합니다. 길이가 비슷한 줄끼리 묶어 LLM / flow / HiFT 를 배치로 실행합니다.
+        
+        :param lines: 합성할 문장 목록
+        :param batch_size: 함께 합성할 최대 줄 수 (None 이면 설정값)
+        :return: 줄마다 synthesize 와 같은 형식의 샘플 (합성하지 못한 줄은 None)
+        """
+        batch_size = batch_size or get_cosyvoice_batch_size()
+        lines = [AbusText.normalize_text(line) for line in lines]
+        texts = [line for line in lines if len(line) > 0]
+        logger.debug(f'[abus_tts_cosyvoice.py] synthesize_batch - {len(texts)} lines, batch_size = {batch_size}')
+        if len(texts) == 0:
+            return [None] * len(lines)
+        
+        prompt_speech_16k = self.load_prompt_speech(ref_audio)
+        ref_audio_len_samples = int((prompt_speech_16k.shape[1] / prompt_sr) * self.cosyvoice.sample_rate)
+        
+        if inference_mode == "Cross-Lingual":
+            speeches = self.cosyvoice.inference_cross_lingual_batch(texts, prompt_speech_16k, speed=speed_factor, batch_size=batch_size)
+        elif inference_mode == "Instruct":
+            speeches = self.cosyvoice.inference_instruct2_batch(texts, '', prompt_speech_16k, batch_size=batch_size)
+        else:
+            speeches = self.cosyvoice.inference_zero_shot_batch(texts, ref_text, prompt_speech_16k, speed=speed_factor, text_frontend=False, batch_size=batch_size)
         
-        trimed_voice_file = path_add_postfix(output_voice_file, "_trimed")
-        AbusAudio.trim_silence_file(output_voice_file, trimed_voice_file)        
-        ffmpeg_to_stereo(trimed_voice_file, output_file)
+        speeches = iter(speeches)
+        results = []
+        for line in lines:
+            speech = next(speeches) if len(line) > 0 else None
+            if speech is None or speech.shape[1] == 0:
+                results.append(None)
+                continue
+            speech = self._remove_ref_audio(speech, ref_audio_len_samples)
+            results.append(AbusAudio.prepare_segment(speech, self.cosyvoice.sample_rate))
+        return results
+    
+    
+    def synthesize_lines(self, lines, ref_audio, ref_text, inference_mode, speed_factor, progress, desc='Generating...'):
+        """
+        줄 목록을 합성해 (번호, 샘플) 을 순서대로 돌려줍니다. COSYVOICE_BATCH_SIZE 가 1 이면 한 줄씩 합성합니다.
+        """
+        batch_size = get_cosyvoice_batch_size()
+        if batch_size <= 1:
+            for i in progress.tqdm(range(len(lines)), desc=desc):
+                yield i, self.synthesize(lines[i], ref_audio, ref_text, inference_mode, speed_factor)
+            return
         
-        try:
-            os.remove(output_voice_file)
-            os.remove(trimed_voice_file)
-        except Exception as e:
-            logger.error(f"[abus_tts_cosyvoice.py] request_tts - error: {e}")
-            return False        
+        # 진행률을 보여줄 수 있도록 여러 배치 분량씩 나누어 합성한다
+        chunk = batch_size * 4
+        for start in progress.tqdm(range(0, len(lines), chunk), desc=desc):
+            samples = self.synthesize_batch(lines[start:start + chunk], ref_audio, ref_text, inference_mode, speed_factor, batch_size)
+            for i, segment in enumerate(samples):
+                yield start + i, segment
+    
+    
+    def request_tts(self, line: str, output_file: str, ref_audio, ref_text, inference_mode, speed_factor, audio_format):
+        samples = self.synthesize(line, ref_audio, ref_text, inference_mode, speed_factor)
+        if samples is None:
+            return False
+        
+        AbusAudio.write_array(output_file, samples)
         return True
     
 
@@ -176,58 +258,41 @@ class CosyVoiceInference:
         # AbusText.process_subtitle_for_tts(subtitle_file, tts_subtitle_file)
         AbusSpacy.process_subtitle_for_tts(subtitle_file, tts_subtitle_file)   
 
-        segments_folder = path_tts_segments_folder(subtitle_file)
+        segments_folder = path_tts_segments_folder(subtitle_file) if get_tts_keep_segments() else None
         full_subs = pysubs2.load(tts_subtitle_file, encoding="utf-8")
         subs = full_subs
         
-        combined_audio = AudioSegment.empty()
-        for i in progress.tqdm(range(len(subs)), desc='Generating...'):
+        timeline = AbusTimeline(duration_ms=subs[-1].end if len(subs) > 0 else 0)
+        for i, samples in self.synthesize_lines([line.text for line in subs], ref_audio, ref_text, inference_mode, speed_factor, progress):
             line = subs[i]
-            next_line = subs[i+1] if i < len(subs)-1 else None
-            
-            if i == 0:
-                silence = AudioSegment.silent(duration=line.start)
-                combined_audio += silence   
-
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1}.{audio_format}')
-            tts_result = self.request_tts(line.text, tts_segment_file, ref_audio, ref_text, inference_mode, speed_factor, audio_format)
 
-            if tts_result == False:
-                if next_line:
-                    silence = AudioSegment.silent(duration=next_line.start-line.start)
-                    combined_audio += silence
+            if samples is None:
                 continue        
             
-            combined_audio += AudioSegment.from_file(tts_segment_file)
-
-            if next_line and len(combined_audio) < next_line.start:
-                silence_length = next_line.start - len(combined_audio)
-                silence = AudioSegment.silent(duration=silence_length)
-                combined_audio += silence
-            elif next_line:
-                next_line.start = len(combined_audio)
-                next_line.end = next_line.start + (next_line.end - next_line.start)
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1}.{audio_format}'), samples)
+            timeline.place(samples, line.start)
                 
-        combined_audio.export(output_file, format=audio_format)   
+        timeline.export(output_file, audio_format)   
         cmd_delete_file(tts_subtitle_file)        
      
     
     def text_to_voice(self, dubbing_text: str, output_file: str, ref_audio, ref_text, inference_mode, speed_factor, audio_format, progress=gr.Progress()):
-        segments_folder = path_tts_segments_folder(output_file)
+        segments_folder = path_tts_segments_folder(output_file) if get_tts_keep_segments() else None
                   
         use_punctuation = AbusText.has_punctuation_marks(dubbing_text)
         lines = AbusText.split_into_sentences(dubbing_text, use_punctuation)
         lines = lines
         
-        combined_audio = AudioSegment.empty() 
-        for i in progress.tqdm(range(len(lines)), desc='Generating...'):
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}')    
-            tts_result = self.request_tts(lines[i], tts_segment_file, ref_audio, ref_text, inference_mode, speed_factor, audio_format)
-            if tts_result == False:
+        timeline = AbusTimeline()
+        for i, samples in self.synthesize_lines(lines, ref_audio, ref_text, inference_mode, speed_factor, progress):
+            if samples is None:
                 continue
-            combined_audio += AudioSegment.from_file(tts_segment_file)
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}'), samples)
+            timeline.append(samples)
             
-        combined_audio.export(output_file, format=audio_format)
+        timeline.export(output_file, audio_format)
 
     
     
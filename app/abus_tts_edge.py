@@ -17,50 +17,135 @@ from app.abus_ffmpeg import *
 from app.abus_text import *
 from app.abus_nlp_spacy import *
 from app.abus_audio import *
+from app.abus_timeline import *
+from app.abus_config import get_edge_tts_concurrency, get_edge_tts_max_retries, get_tts_keep_segments
 
 import structlog
 logger = structlog.get_logger()
 
 
 class EdgeTTS:
-    def __init__(self):
-        pass
+    def __init__(self, concurrency=None, max_retries=None, retry_delay=0.5, communicate=None):
+        self.concurrency = concurrency if concurrency is not None else get_edge_tts_concurrency()
+        self.max_retries = max_retries if max_retries is not None else get_edge_tts_max_retries()
+        self.retry_delay = retry_delay
+        
+        # edge_tts.Communicate 호환 클래스 (오프라인 벤치마크용 가짜 객체로 교체 가능)
+        self.communicate = communicate if communicate is not None else edge_tts.Communicate
     
     async def generate_audio(self, text, voice, output_file, rate=0, volume=0, pitch=0):
+        data = await self.generate_audio_bytes(text, voice, rate=rate, volume=volume, pitch=pitch)
+        with open(output_file, "wb") as f:
+            f.write(data)
+    
+    
+    async def generate_audio_bytes(self, text, voice, rate=0, volume=0, pitch=0):
         rate_options = f'+{rate}%' if rate>=0 else f'{rate}%'
         volume_options = f'+{volume}%' if volume>=0 else f'{volume}%'
         pitch_options = f'+{pitch}Hz' if pitch>= 0 else f'{pitch}Hz'
         
-        logger.debug(f'[abus_tts_edge.py] generate_audio - text = {text}, voice = {voice}, rate_options = {rate_options}, volume_options = {volume_options}, pitch_options = {pitch_options}')
-        communicate = edge_tts.Communicate(text, voice, rate=rate_options, volume=volume_options, pitch=pitch_options)
-        await communicate.save(output_file)
+        logger.debug(f'[abus_tts_edge.py] generate_audio_bytes - text = {text}, voice = {voice}, rate_options = {rate_options}, volume_options = {volume_options}, pitch_options = {pitch_options}')
+        communicate = self.communicate(text, voice, rate=rate_options, volume=volume_options, pitch=pitch_options)
+        
+        # 파일로 저장하지 않고 mp3 스트림을 메모리에 모은다
+        chunks = []
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+        data = b"".join(chunks)
+        if len(data) < 1:
+            raise ValueError("no audio received")
+        return data
     
     
-    def request_tts(self, line: str, output_file: str, voice_name: str, semitones, speed_factor, volume_factor, audio_format):
-        output_voice_file = os.path.join(path_dubbing_folder(), path_new_filename(ext = f".{audio_format}"))
-        line = AbusText.normalize_text(line)
-        if len(line) < 1:
-            logger.warning(f"[abus_tts_edge.py] request_tts - error: no line")
-            return False
+    async def generate_audio_retry(self, text, voice, rate=0, volume=0, pitch=0):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.generate_audio_bytes(text, voice, rate=rate, volume=volume, pitch=pitch)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"[abus_tts_edge.py] generate_audio_retry - error: {e}")
+                    return None
+                delay = self.retry_delay * (2 ** attempt)
+                logger.warning(f"[abus_tts_edge.py] generate_audio_retry - attempt {attempt+1} failed: {e}, retry in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        return None
+    
+    
+    async def generate_audio_batch(self, texts: list, voice, rate=0, volume=0, pitch=0, progress=None):
+        """
+        여러 문장을 하나의 이벤트 루프에서 동시에 합성합니다.
+        
+        :param texts: 합성할 문장 목록
+        :param progress: 완료될 때마다 (완료 수, 전체 수)로 호출되는 콜백
+        :return: 입력 순서와 같은 순서의 mp3 바이트 목록 (실패한 문장은 None)
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        total = len(texts)
+        done = 0
         
-        logger.debug(f'[abus_tts_edge.py] request_tts - line = {line}, voice_name = {voice_name}')
+        async def worker(text):
+            nonlocal done
+            async with semaphore:
+                result = await self.generate_audio_retry(text, voice, rate=rate, volume=volume, pitch=pitch)
+            done += 1
+            if progress is not None:
+                progress(done, total)
+            return result
         
-        asyncio.run(self.generate_audio(line, voice_name, output_voice_file, rate=speed_factor, volume=volume_factor, pitch=semitones))
+        return await asyncio.gather(*[worker(text) for text in texts])
+    
+    
+    def synthesize_batch(self, lines: list, voice_name: str, semitones, speed_factor, volume_factor, progress=None):
+        """
+        여러 문장을 합성하여 무음 제거/스테레오 변환까지 메모리에서 처리합니다.
+        
+        :return: 입력 순서와 같은 순서의 (samples, 2) float32 배열 목록 (실패한 문장은 None)
+        """
+        results = [None] * len(lines)
+        
+        texts, indexes = [], []
+        for i, line in enumerate(lines):
+            line = AbusText.normalize_text(line)
+            if len(line) < 1:
+                logger.warning(f"[abus_tts_edge.py] synthesize_batch - error: no line {i+1}")
+                continue
+            texts.append(line)
+            indexes.append(i)
         
-        logger.debug(f'[abus_tts_edge.py] request_tts - output_voice_file = {output_voice_file}')
+        if len(texts) < 1:
+            return results
         
-        trimed_voice_file = path_add_postfix(output_voice_file, "_trimed")
-        AbusAudio.trim_silence_file(output_voice_file, trimed_voice_file)
+        logger.debug(f'[abus_tts_edge.py] synthesize_batch - lines = {len(texts)}, voice_name = {voice_name}, concurrency = {self.concurrency}')
         
-        ffmpeg_to_stereo(trimed_voice_file, output_file)
+        def on_progress(done, total):
+            if progress is not None:
+                progress((done, total), desc='Generating...')
         
-        try:
-            os.remove(output_voice_file)
-            os.remove(trimed_voice_file)
-        except Exception as e:
-            logger.error(f"[abus_tts_edge.py] request_tts - error: {e}")
+        generated = asyncio.run(self.generate_audio_batch(texts, voice_name, rate=speed_factor, volume=volume_factor, pitch=semitones, progress=on_progress))
+        
+        for i, data in zip(indexes, generated):
+            if data is None:
+                continue
+            try:
+                samples, sample_rate = AbusAudio.decode_array(data, format="mp3")
+                results[i] = AbusAudio.prepare_segment(samples, sample_rate)
+            except Exception as e:
+                logger.error(f"[abus_tts_edge.py] synthesize_batch - line {i+1} error: {e}")
+        
+        return results
+    
+    
+    def synthesize(self, line: str, voice_name: str, semitones, speed_factor, volume_factor):
+        return self.synthesize_batch([line], voice_name, semitones, speed_factor, volume_factor)[0]
+    
+    
+    def request_tts(self, line: str, output_file: str, voice_name: str, semitones, speed_factor, volume_factor, audio_format):
+        samples = self.synthesize(line, voice_name, semitones, speed_factor, volume_factor)
+        if samples is None:
             return False
         
+        AbusAudio.write_array(output_file, samples)
         return True
     
 
@@ -71,58 +156,47 @@ class EdgeTTS:
         AbusSpacy.process_subtitle_for_tts(subtitle_file, tts_subtitle_file)
             
 
-        segments_folder = path_tts_segments_folder(subtitle_file)
+        segments_folder = path_tts_segments_folder(subtitle_file) if get_tts_keep_segments() else None
         full_subs = pysubs2.load(tts_subtitle_file, encoding="utf-8")
         subs = full_subs
         
-        combined_audio = AudioSegment.empty()
-        for i in progress.tqdm(range(len(subs)), desc='Generating...'):
+        # 모든 문장을 먼저 합성한 뒤 타이밍을 맞춘다
+        segments = self.synthesize_batch([line.text for line in subs], voice_name, semitones, speed_factor, volume_factor, progress)
+        
+        timeline = AbusTimeline(duration_ms=subs[-1].end if len(subs) > 0 else 0)
+        for i in range(len(subs)):
             line = subs[i]
-            next_line = subs[i+1] if i < len(subs)-1 else None
-            
-            if i == 0:
-                silence = AudioSegment.silent(duration=line.start)
-                combined_audio += silence   
+            samples = segments[i]
 
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1}.{audio_format}')
-            tts_result = self.request_tts(line.text, tts_segment_file, voice_name, semitones, speed_factor, volume_factor, audio_format)
-
-            if tts_result == False:
-                if next_line:
-                    silence = AudioSegment.silent(duration=next_line.start-line.start)
-                    combined_audio += silence
+            if samples is None:
                 continue        
             
-            combined_audio += AudioSegment.from_file(tts_segment_file)
-
-            if next_line and len(combined_audio) < next_line.start:
-                silence_length = next_line.start - len(combined_audio)
-                silence = AudioSegment.silent(duration=silence_length)
-                combined_audio += silence
-            elif next_line:
-                next_line.start = len(combined_audio)
-                next_line.end = next_line.start + (next_line.end - next_line.start)
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1}.{audio_format}'), samples)
+            timeline.place(samples, line.start)
                 
-        combined_audio.export(output_file, format=audio_format)       
+        timeline.export(output_file, audio_format)       
         cmd_delete_file(tts_subtitle_file)    
       
     
     def text_to_voice(self, text: str, output_file: str, voice_name: str, semitones, speed_factor, volume_factor, audio_format, progress=gr.Progress()):
-        segments_folder = path_tts_segments_folder(output_file)  
+        segments_folder = path_tts_segments_folder(output_file) if get_tts_keep_segments() else None
         
         use_punctuation = AbusText.has_punctuation_marks(text)
         lines = AbusText.split_into_sentences(text, use_punctuation)
         lines = lines
         
-        combined_audio = AudioSegment.empty() 
-        for i in progress.tqdm(range(len(lines)), desc='Generating...'):
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}')    
-            tts_result = self.request_tts(lines[i], tts_segment_file, voice_name, semitones, speed_factor, volume_factor, audio_format)
-            if tts_result == False:
+        segments = self.synthesize_batch(lines, voice_name, semitones, speed_factor, volume_factor, progress)
+        
+        timeline = AbusTimeline()
+        for i, samples in enumerate(segments):
+            if samples is None:
                 continue
-            combined_audio += AudioSegment.from_file(tts_segment_file)
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}'), samples)
+            timeline.append(samples)
             
-        combined_audio.export(output_file, format=audio_format)
+        timeline.export(output_file, audio_format)
 
     
     def infer(self, text: str, output_file: str, voice_name: str, semitones, speed_factor, volume_factor, audio_format, progress=gr.Progress()):
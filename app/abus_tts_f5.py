@@ -1,4 +1,7 @@
 import time
+import hashlib
+import threading
+from collections import OrderedDict
 import pysubs2
 import re
 import unicodedata
@@ -17,12 +20,15 @@ from app.abus_ffmpeg import *
 from app.abus_text import *
 from app.abus_nlp_spacy import *
 from app.abus_audio import *
+from app.abus_timeline import *
+from app.abus_config import get_tts_keep_segments, get_f5_reference_cache_size, get_f5_nfe_step, get_f5_batch_size
 
 import structlog
 logger = structlog.get_logger()
 
 
 import soundfile as sf
+import torchaudio
 
 
 from cached_path import cached_path
@@ -34,7 +40,14 @@ from f5_tts.infer.utils_infer import (
     infer_process,
     remove_silence_for_generated_wav,
     save_spectrogram,
+    chunk_text,
+    hop_length,
+    target_sample_rate,
+    target_rms,
+    cfg_strength,
+    sway_sampling_coef,
 )
+from f5_tts.model.utils import convert_char_to_pinyin
 
 try:
     import spaces
@@ -105,6 +118,190 @@ class ModelPathManager:
 
 
 
+F5_SLOT_MIN_RATIO = 0.7         # 자막 구간의 70% 보다 짧게 예측되면 속도를 늦춘다
+F5_SLOT_TARGET_RATIO = 0.9      # 늦출 때의 목표 길이 (자막 구간의 90%)
+F5_MIN_SPEED = 0.6
+F5_CROSS_FADE_DURATION = 0.15
+
+
+class F5Reference:
+    """
+    infer_process 가 줄마다 다시 만들던 참조 음성 값. 여러 줄 / 작업이 함께 쓰므로 읽기 전용으로 다룹니다.
+
+    - audio: 모노 / RMS 정규화 / 24kHz 로 바꾼 참조 파형 (1, samples)
+    - mel: audio 의 멜 특징 (1, frames, n_mels), CFM.sample 의 cond 로 바로 들어갑니다.
+    - tokens: 참조 대사를 convert_char_to_pinyin 으로 바꾼 문자 목록
+    """
+    def __init__(self, file, text, audio, rms, mel, tokens, max_chars):
+        self.file = file
+        self.text = text
+        self.audio = audio
+        self.rms = rms
+        self.mel = mel
+        self.frames = audio.shape[-1] // hop_length
+        self.text_len = len(text.encode("utf-8"))
+        self.tokens = tokens
+        self.max_chars = max_chars
+
+
+
+class F5ReferenceCache:
+    """
+    F5-TTS 참조 음성 캐시.
+
+    - preprocess: preprocess_ref_audio_text 결과(잘라 내고 무음을 정리한 참조 wav, 마침표를 붙인 대사)를
+      원본 음성 내용 해시와 대사로 보관해, 같은 목소리로 다시 작업할 때 pydub 무음 분할을 건너뜁니다.
+    - reference: 정규화한 참조 파형, 멜 특징, 토큰화한 참조 대사를 참조 wav 내용 해시 / 대사 / 장치별로 보관해
+      모든 줄이 함께 씁니다. (모델과 무관하므로 작업마다 모델을 다시 읽어도 그대로 재사용합니다)
+    - 항목 수가 max_entries 를 넘으면 가장 오래 사용되지 않은 항목부터 버립니다. 0 이면 캐시하지 않습니다.
+    """
+    def __init__(self, max_entries=None):
+        self.max_entries = get_f5_reference_cache_size() if max_entries is None else max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    def file_hash(self, file_path):
+        """파일 내용의 sha1. 경로 / 수정 시간 / 크기별로 한 번만 계산합니다."""
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        file_hash = self._hashes.get(memo_key)
+        if file_hash is None:
+            digest = hashlib.sha1()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            file_hash = digest.hexdigest()
+            self._hashes[memo_key] = file_hash
+        return file_hash
+
+
+    def _get(self, key, compute, valid=lambda value: True):
+        if self.max_entries <= 0:
+            self.misses += 1
+            return compute()
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None and valid(value):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        
+        self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+    def preprocess(self, ref_audio_orig, ref_text):
+        """preprocess_ref_audio_text 의 캐시 버전. :return: (참조 wav 경로, 참조 대사)"""
+        key = ('preprocess', self.file_hash(ref_audio_orig), ref_text)
+        return self._get(key, lambda: preprocess_ref_audio_text(ref_audio_orig, ref_text), lambda value: os.path.exists(value[0]))
+
+
+    def reference(self, ref_file, ref_text, model) -> F5Reference:
+        """infer_batch_process 와 같은 방법으로 참조 음성 값을 만들어 보관합니다."""
+        key = ('reference', self.file_hash(ref_file), ref_text, str(model.device))
+        return self._get(key, lambda: self._load_reference(ref_file, ref_text, model))
+
+
+    @staticmethod
+    @torch.inference_mode()
+    def _load_reference(ref_file, ref_text, model):
+        start_time = time.perf_counter()
+        audio, sr = torchaudio.load(ref_file)
+        max_chars = int(len(ref_text.encode("utf-8")) / (audio.shape[-1] / sr) * (22 - audio.shape[-1] / sr))
+        
+        if audio.shape[0] > 1:
+            audio = torch.mean(audio, dim=0, keepdim=True)
+        rms = torch.sqrt(torch.mean(torch.square(audio)))
+        if rms < target_rms:
+            audio = audio * target_rms / rms
+        if sr != target_sample_rate:
+            audio = torchaudio.transforms.Resample(sr, target_sample_rate)(audio)
+        audio = audio.to(model.device)
+        mel = model.mel_spec(audio).permute(0, 2, 1)
+        
+        if len(ref_text[-1].encode("utf-8")) == 1:
+            ref_text = ref_text + " "
+        tokens = convert_char_to_pinyin([ref_text])[0]
+        
+        logger.debug(f'[abus_tts_f5.py] F5ReferenceCache._load_reference - {ref_file}, {mel.shape[1]} frames, {time.perf_counter() - start_time:.2f}s')
+        return F5Reference(ref_file, ref_text, audio, rms, mel, tokens, max_chars)
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'max_entries': self.max_entries}
+
+
+f5_reference_cache = F5ReferenceCache()
+
+
+
+class F5DurationPlanner:
+    """
+    F5-TTS 합성 길이 예측기.
+
+    infer_process 는 생성할 길이를 (참조 음성 길이 / 참조 대사 바이트 수) x 대사 바이트 수 / 속도로 정하므로
+    합성하지 않고도 줄마다 음성 길이를 알 수 있습니다. srt_to_voice 는 이 값으로 자막 구간에 맞는 속도를
+    합성 전에 정해 두고 줄마다 한 번만 합성합니다. (합성한 뒤 길이를 재고 다시 합성하던 2차 패스를 대신합니다)
+    조각 / 프레임 수는 합성과 같은 F5Reference 와 F5TTS.chunk_frames 로 계산합니다.
+    """
+    def __init__(self, reference: F5Reference):
+        self.reference = reference
+    
+    
+    def predict(self, line: str, speed: float) -> float:
+        """infer_process 가 만들 음성 길이(초). 무음 제거 전 길이입니다."""
+        durations = [frames * hop_length / target_sample_rate for _, frames in F5TTS.chunk_frames(self.reference, line, speed)]
+        cross_fades = sum(min(F5_CROSS_FADE_DURATION, a, b) for a, b in zip(durations, durations[1:]))
+        return sum(durations) - cross_fades
+    
+    
+    def plan(self, line: str, slot_duration: float, speed: float) -> float:
+        """
+        자막 구간에 맞춰 줄의 합성 속도를 정합니다.
+        예측 길이가 구간의 70% 보다 짧으면 구간의 90% 가 되는 속도(최소 0.6)로 늦추고, 그 외에는 speed 를 그대로 씁니다.
+
+        :param slot_duration: 자막 구간 길이(초)
+        :return: 합성 속도
+        """
+        duration = self.predict(line, speed)
+        if duration >= slot_duration * F5_SLOT_MIN_RATIO:
+            return speed
+        
+        # 10 바이트 미만 조각은 속도와 무관하게 길이가 고정되므로, 늦춰도 길어지지 않으면 그대로 둔다
+        target_duration = slot_duration * F5_SLOT_TARGET_RATIO
+        slowest = self.predict(line, F5_MIN_SPEED)
+        if slowest <= duration:
+            return speed
+        
+        # 예측 길이는 속도에 대해 단조 감소하므로 목표 길이가 되는 가장 빠른 속도를 이분 탐색으로 찾는다
+        new_speed = F5_MIN_SPEED
+        if slowest > target_duration:
+            fast = speed
+            for _ in range(16):
+                middle = (new_speed + fast) / 2
+                if self.predict(line, middle) >= target_duration:
+                    new_speed = middle
+                else:
+                    fast = middle
+        return new_speed if new_speed < speed - 0.1 else speed
+
+
+
 class F5TTS:
     def __init__(self):
         config_path = os.path.join(Path(__file__).resolve().parent, "abus_tts_f5_models.json")
@@ -175,22 +372,147 @@ class F5TTS:
             logger.debug(f'[abus_tts_f5.py] release_cuda_memory - OK!! ')
                 
                 
+    @staticmethod
+    def cross_fade(waves, cross_fade_duration=F5_CROSS_FADE_DURATION):
+        """infer_batch_process 와 같이 조각 파형을 cross-fade 로 잇습니다."""
+        final_wave = waves[0]
+        for next_wave in waves[1:]:
+            cross_fade_samples = min(int(cross_fade_duration * target_sample_rate), len(final_wave), len(next_wave))
+            if cross_fade_samples <= 0:
+                final_wave = np.concatenate([final_wave, next_wave])
+                continue
+            
+            fade_out = np.linspace(1, 0, cross_fade_samples)
+            fade_in = np.linspace(0, 1, cross_fade_samples)
+            cross_faded_overlap = final_wave[-cross_fade_samples:] * fade_out + next_wave[:cross_fade_samples] * fade_in
+            final_wave = np.concatenate([final_wave[:-cross_fade_samples], cross_faded_overlap, next_wave[cross_fade_samples:]])
+        return final_wave
+
+
+    @staticmethod
+    def chunk_frames(reference: F5Reference, gen_text: str, speed):
+        """infer_process 와 같이 대사를 조각으로 나누고 조각별 생성 프레임 수를 정합니다. :return: 조각별 (조각, 프레임 수)"""
+        chunks = []
+        for chunk in chunk_text(gen_text, max_chars=reference.max_chars):
+            local_speed = 0.3 if len(chunk.encode("utf-8")) < 10 else speed
+            chunks.append((chunk, int(reference.frames / reference.text_len * len(chunk.encode("utf-8")) / local_speed)))
+        return chunks
+
+
+    @staticmethod
+    def split_chunks(reference: F5Reference, gen_text: str, speed):
+        """chunk_frames 의 조각을 토큰화합니다. :return: 조각별 (참조 + 조각 토큰, 생성할 프레임 수)"""
+        return [(reference.tokens + convert_char_to_pinyin([chunk])[0], frames) for chunk, frames in F5TTS.chunk_frames(reference, gen_text, speed)]
+
+
+    @torch.inference_mode()
+    def sample_batch(self, reference: F5Reference, chunks, nfe_step):
+        """
+        조각들을 패딩한 배치 하나로 ODE 샘플링하고 조각마다 제 길이의 프레임만 Vocos 로 보코딩합니다.
+        CFM.sample 은 조각마다 다른 길이(duration)로 마스크를 만듭니다.
+        조각이 하나면 infer_process 와 같은 계산입니다.
+
+        :param chunks: split_chunks 의 (토큰, 프레임 수) 목록
+        :return: 조각별 파형 (numpy) 목록
+        """
+        cond = reference.mel.expand(len(chunks), -1, -1)
+        durations = torch.tensor([reference.frames + frames for _, frames in chunks], device=cond.device, dtype=torch.long)
+        generated, _ = self.ema_model.sample(
+            cond=cond,
+            text=[tokens for tokens, _ in chunks],
+            duration=durations,
+            steps=nfe_step,
+            cfg_strength=cfg_strength,
+            sway_sampling_coef=sway_sampling_coef,
+        )
+        
+        # CFM.sample 이 실제로 쓴 길이 (토큰 수 / 참조 길이보다 길게, 최대 4096 프레임)
+        durations = torch.maximum(durations, torch.tensor([max(len(tokens), cond.shape[1]) + 1 for tokens, _ in chunks], device=cond.device))
+        lengths = (durations.clamp(max=generated.shape[1]) - reference.frames).tolist()
+        generated = generated.to(torch.float32)[:, reference.frames:, :]
+        
+        # 조각마다 제 길이의 프레임만 보코딩한다. 패딩 프레임을 함께 보코딩하면 (멜은 log(clamp(mel, 1e-5)) 라
+        # 0 도 무음이 아니다) Vocos 의 컨볼루션 / ISTFT 겹침이 짧은 조각의 끝부분에 섞여 들어간다
+        waves = []
+        for b, length in enumerate(lengths):
+            generated_wave = self.vocoder.decode(generated[b:b + 1, :length].permute(0, 2, 1))
+            if reference.rms < target_rms:
+                generated_wave = generated_wave * reference.rms / target_rms
+            waves.append(generated_wave.squeeze().cpu().numpy())
+        return waves
+
+
+    def infer_reference(self, reference: F5Reference, gen_text: str, speed, nfe_step=None):
+        """
+        infer_process 와 같은 합성을 캐시된 참조 음성 값(F5Reference)으로 실행합니다.
+        참조 wav 읽기 / 정규화 / 멜 특징 / 참조 대사 토큰화를 줄마다 반복하지 않습니다.
+
+        :param nfe_step: ODE 샘플링 단계 수 (None 이면 F5_NFE_STEP)
+        :return: (파형, 샘플레이트)
+        """
+        nfe_step = get_f5_nfe_step() if nfe_step is None else nfe_step
+        waves = [self.sample_batch(reference, [chunk], nfe_step)[0] for chunk in self.split_chunks(reference, gen_text, speed)]
+        if not waves:
+            return None, target_sample_rate
+        return self.cross_fade(waves), target_sample_rate
+
+
     @gpu_decorator
-    def generate_audio(self, dubbing_text:str, output_file, ref_audio, ref_text, speed_factor, progress=gr.Progress()):
+    def infer_reference_batch(self, reference: F5Reference, items, nfe_step=None, batch_size=None, progress=None):
+        """
+        같은 참조 음성을 쓰는 여러 줄을 한꺼번에 합성합니다.
+
+        모든 줄을 조각으로 나눈 뒤 생성할 길이순으로 batch_size 조각씩 묶어(길이 버킷) sample_batch 로 합성하고,
+        줄마다 조각 파형을 cross-fade 로 잇습니다.
+
+        :param items: 줄별 (대사, 속도) 목록
+        :param nfe_step: ODE 샘플링 단계 수 (None 이면 F5_NFE_STEP)
+        :param batch_size: 한 번에 샘플링할 조각 수 (None 이면 F5_BATCH_SIZE)
+        :return: 줄별 파형 목록 (조각이 없거나 조각이 든 버킷을 합성하지 못한 줄은 None)
+        """
+        nfe_step = get_f5_nfe_step() if nfe_step is None else nfe_step
+        batch_size = max(1, get_f5_batch_size() if batch_size is None else batch_size)
+        
+        chunks = []
+        owners = []
+        for index, (gen_text, speed) in enumerate(items):
+            for chunk in self.split_chunks(reference, gen_text, speed):
+                chunks.append(chunk)
+                owners.append(index)
+        
+        order = sorted(range(len(chunks)), key=lambda i: chunks[i][1])
+        buckets = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+        logger.debug(f'[abus_tts_f5.py] infer_reference_batch - {len(items)} lines, {len(chunks)} chunks, {len(buckets)} batches, nfe_step = {nfe_step}')
+        
+        waves = [None] * len(chunks)
+        for bucket in (progress.tqdm(buckets, desc='Generating...') if progress else buckets):
+            # 버킷 하나가 실패해도 (메모리 부족 등) 나머지 버킷은 계속 합성한다
+            try:
+                for i, wave in zip(bucket, self.sample_batch(reference, [chunks[i] for i in bucket], nfe_step)):
+                    waves[i] = wave
+            except Exception as e:
+                logger.error(f"[abus_tts_f5.py] infer_reference_batch - error: {e}, lines {sorted(set(owners[i] for i in bucket))}")
+        
+        results = []
+        for index in range(len(items)):
+            line_waves = [wave for owner, wave in zip(owners, waves) if owner == index]
+            results.append(self.cross_fade(line_waves) if line_waves and all(wave is not None for wave in line_waves) else None)
+        return results
+
+
+    @gpu_decorator
+    def generate_audio(self, dubbing_text:str, ref_audio, ref_text, speed_factor, progress=gr.Progress()):
         logger.debug(f'[abus_tts_f5.py] generate_audio - {dubbing_text}')
         
         try:
-            final_wave, final_sample_rate, _ = infer_process(
-                ref_audio,
-                ref_text,
+            reference = f5_reference_cache.reference(ref_audio, ref_text, self.ema_model)
+            final_wave, final_sample_rate = self.infer_reference(
+                reference,
                 dubbing_text,
-                self.ema_model,
-                self.vocoder,
-                cross_fade_duration=0.15,
-                nfe_step=32,                # denoising steps, 4 ~ 64
-                speed=speed_factor,
-                progress=progress
+                speed_factor,
             )
+            if final_wave is None:
+                return None, None
             
             # Remove reference audio from the generated wave
             if isinstance(ref_audio, torch.Tensor):
@@ -207,34 +529,72 @@ class F5TTS:
             logger.debug(f'[abus_tts_f5.py] final_sample_rate - {final_sample_rate}')
             logger.debug(f'[abus_tts_f5.py] final_wave - {final_wave}')
             
-            sf.write(output_file, final_wave, final_sample_rate)
+            return final_wave, final_sample_rate
         except Exception as e:
-            logger.error(f"[abus_tts_f5.py] infer_process - error: {e}")        
+            logger.error(f"[abus_tts_f5.py] generate_audio - error: {e}")        
+            return None, None
         
         
                     
     
     
-    def request_tts(self, line: str, output_file: str, ref_audio, ref_text, speed_factor, audio_format):
-        output_voice_file = os.path.join(path_dubbing_folder(), path_new_filename(ext = f".{audio_format}"))
+    def synthesize(self, line: str, ref_audio, ref_text, speed_factor):
         line = AbusText.normalize_text(line)
         if len(line) < 1:
-            logger.warning(f"[abus_tts_f5.py] request_tts - error: no line")
-            return False
+            logger.warning(f"[abus_tts_f5.py] synthesize - error: no line")
+            return None
         
-        logger.debug(f'[abus_tts_f5.py] request_tts - line = {line}')
-        self.generate_audio(line, output_voice_file, ref_audio, ref_text, speed_factor)
+        logger.debug(f'[abus_tts_f5.py] synthesize - line = {line}')
+        final_wave, final_sample_rate = self.generate_audio(line, ref_audio, ref_text, speed_factor)
+        if final_wave is None:
+            return None
         
-        trimed_voice_file = path_add_postfix(output_voice_file, "_trimed")
-        AbusAudio.trim_silence_file(output_voice_file, trimed_voice_file)        
-        ffmpeg_to_stereo(trimed_voice_file, output_file)
+        return AbusAudio.prepare_segment(final_wave, final_sample_rate)
+    
+    
+    def synthesize_batch(self, lines, ref_audio, ref_text, speed_factors, batch_size=None, progress=None):
+        """
+        같은 참조 음성으로 여러 줄을 합성합니다.
+        batch_size 가 1 이면 줄마다 synthesize 와 같은 경로로 합성하고, 그보다 크면 infer_reference_batch 로 묶어 합성합니다.
+        배치로 합성하지 못한 줄은 synthesize 로 한 줄씩 다시 합성합니다.
+
+        :param speed_factors: 줄별 속도 목록 또는 모든 줄에 쓸 속도
+        :param batch_size: 한 번에 샘플링할 조각 수 (None 이면 F5_BATCH_SIZE)
+        :return: 줄별 samples 목록 (합성하지 못한 줄은 None)
+        """
+        if not isinstance(speed_factors, (list, tuple)):
+            speed_factors = [speed_factors] * len(lines)
+        batch_size = max(1, get_f5_batch_size() if batch_size is None else batch_size)
         
+        if batch_size == 1:
+            indices = progress.tqdm(range(len(lines)), desc='Generating...') if progress else range(len(lines))
+            return [self.synthesize(lines[i], ref_audio, ref_text, speed_factors[i]) for i in indices]
+        
+        lines = [AbusText.normalize_text(line) for line in lines]
+        indices = [i for i, line in enumerate(lines) if len(line) > 0]
+        results = [None] * len(lines)
         try:
-            os.remove(output_voice_file)
-            os.remove(trimed_voice_file)
+            reference = f5_reference_cache.reference(ref_audio, ref_text, self.ema_model)
         except Exception as e:
-            logger.error(f"[abus_tts_f5.py] request_tts - error: {e}")
-            return False        
+            logger.error(f"[abus_tts_f5.py] synthesize_batch - error: {e}")
+            return results
+        
+        waves = self.infer_reference_batch(reference, [(lines[i], speed_factors[i]) for i in indices], batch_size=batch_size, progress=progress)
+        for i, wave in zip(indices, waves):
+            if wave is not None:
+                results[i] = AbusAudio.prepare_segment(wave, target_sample_rate)
+            else:
+                # 배치로 합성하지 못한 줄은 한 줄씩 다시 합성한다
+                results[i] = self.synthesize(lines[i], ref_audio, ref_text, speed_factors[i])
+        return results
+    
+    
+    def request_tts(self, line: str, output_file: str, ref_audio, ref_text, speed_factor, audio_format):
+        samples = self.synthesize(line, ref_audio, ref_text, speed_factor)
+        if samples is None:
+            return False
+        
+        AbusAudio.write_array(output_file, samples)
         return True
     
 
@@ -244,88 +604,62 @@ class F5TTS:
         # AbusText.process_subtitle_for_tts(subtitle_file, tts_subtitle_file)
         AbusSpacy.process_subtitle_for_tts(subtitle_file, tts_subtitle_file)    
 
-        segments_folder = path_tts_segments_folder(subtitle_file)
+        segments_folder = path_tts_segments_folder(subtitle_file) if get_tts_keep_segments() else None
         full_subs = pysubs2.load(tts_subtitle_file, encoding="utf-8")
         subs = full_subs
         
-        combined_audio = AudioSegment.empty()
-        for i in progress.tqdm(range(len(subs)), desc='Generating...'):
+        timeline = AbusTimeline(duration_ms=subs[-1].end if len(subs) > 0 else 0)
+        planner = F5DurationPlanner(f5_reference_cache.reference(ref_audio, ref_text, self.ema_model))
+        
+        # 자막 구간에 맞는 속도를 합성 전에 정한다 (한 줄에 한 번만 합성)
+        speeds = []
+        for i, line in enumerate(subs):
+            target_duration_sec = (line.end - line.start) / 1000.0
+            line_speed = planner.plan(AbusText.normalize_text(line.text), target_duration_sec, speed_factor)
+            if line_speed != speed_factor:
+                logger.info(f"Speed adjustment for line {i+1}: {speed_factor} -> {line_speed:.2f} (Target: {target_duration_sec:.2f}s)")
+            speeds.append(line_speed)
+        adjusted = sum(1 for line_speed in speeds if line_speed != speed_factor)
+        
+        samples_list = self.synthesize_batch([line.text for line in subs], ref_audio, ref_text, speeds, progress=progress)
+        for i, samples in enumerate(samples_list):
             line = subs[i]
-            next_line = subs[i+1] if i < len(subs)-1 else None
             
-            # Calculate target duration in seconds
-            target_duration_ms = line.end - line.start
-            target_duration_sec = target_duration_ms / 1000.0
-            
-            if i == 0:
-                silence = AudioSegment.silent(duration=line.start)
-                combined_audio += silence   
-
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1}.{audio_format}')
-            
-            # First pass generation
-            tts_result = self.request_tts(line.text, tts_segment_file, ref_audio, ref_text, speed_factor, audio_format)
-
-            if tts_result:
-                # Check duration and adjust speed if too fast
-                segment = AudioSegment.from_file(tts_segment_file)
-                seg_duration_ms = len(segment)
-                seg_duration_sec = seg_duration_ms / 1000.0
-                
-                # If generated audio is significantly shorter than subtitle slot (e.g. < 70%), 
-                # and we have a minimum speed limit (e.g. 0.6)
-                # We try to slow it down to fit better.
-                if seg_duration_sec < target_duration_sec * 0.7:
-                    new_speed = speed_factor * (seg_duration_sec / (target_duration_sec * 0.9)) # Target 90% of slot
-                    new_speed = max(0.6, new_speed) # Don't go below 0.6
-                    
-                    if new_speed < speed_factor - 0.1: # Only if significant change
-                        logger.info(f"Speed adjustment for line {i+1}: {speed_factor} -> {new_speed:.2f} (Duration: {seg_duration_sec:.2f}s -> Target: {target_duration_sec:.2f}s)")
-                        self.request_tts(line.text, tts_segment_file, ref_audio, ref_text, new_speed, audio_format)
-                        segment = AudioSegment.from_file(tts_segment_file) # Reload
-            
-            if tts_result == False:
-                if next_line:
-                    silence = AudioSegment.silent(duration=next_line.start-line.start)
-                    combined_audio += silence
+            if samples is None:
                 continue        
             
-            combined_audio += segment
-
-            if next_line and len(combined_audio) < next_line.start:
-                silence_length = next_line.start - len(combined_audio)
-                silence = AudioSegment.silent(duration=silence_length)
-                combined_audio += silence
-            elif next_line:
-                next_line.start = len(combined_audio)
-                next_line.end = next_line.start + (next_line.end - next_line.start)
-                
-        combined_audio.export(output_file, format=audio_format)         
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1}.{audio_format}'), samples)
+            timeline.place(samples, line.start)
+        
+        logger.debug(f'[abus_tts_f5.py] srt_to_voice - {len(subs)} lines, {adjusted} lines planned at a slower speed')
+        timeline.export(output_file, audio_format)         
         cmd_delete_file(tts_subtitle_file)    
       
     
     def text_to_voice(self, dubbing_text: str, output_file: str, ref_audio, ref_text, speed_factor, audio_format, progress=gr.Progress()):
-        segments_folder = path_tts_segments_folder(output_file)          
+        segments_folder = path_tts_segments_folder(output_file) if get_tts_keep_segments() else None
 
         use_punctuation = AbusText.has_punctuation_marks(dubbing_text)
         lines = AbusText.split_into_sentences(dubbing_text, use_punctuation)
         lines = lines
         
-        combined_audio = AudioSegment.empty() 
-        for i in progress.tqdm(range(len(lines)), desc='Generating...'):
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}')    
-            tts_result = self.request_tts(lines[i], tts_segment_file, ref_audio, ref_text, speed_factor, audio_format)
-            if tts_result == False:
+        timeline = AbusTimeline()
+        samples_list = self.synthesize_batch(lines, ref_audio, ref_text, speed_factor, progress=progress)
+        for i, samples in enumerate(samples_list):
+            if samples is None:
                 continue
-            combined_audio += AudioSegment.from_file(tts_segment_file)
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}'), samples)
+            timeline.append(samples)
             
-        combined_audio.export(output_file, format=audio_format)
+        timeline.export(output_file, audio_format)
 
     
     
     def infer_single(self, dubbing_text:str, output_file, celeb_audio, celeb_transcript, model_choice, speed_factor, audio_format: str, progress=gr.Progress()):
         self.select_model(model_choice)
-        ref_audio, ref_text = preprocess_ref_audio_text(celeb_audio, celeb_transcript)
+        ref_audio, ref_text = f5_reference_cache.preprocess(celeb_audio, celeb_transcript)
         
         subtitle_file = None
         if AbusText.is_subtitle_format(dubbing_text):
@@ -345,29 +679,33 @@ class F5TTS:
             
     def infer_multi(self, dubbing_text:str, output_file, celeb_audio1, celeb_transcript1, celeb_audio2, celeb_transcript2, model_choice, speed_factor, audio_format: str, progress=gr.Progress()):
         self.select_model(model_choice)
-        ref_audio1, ref_text1 = preprocess_ref_audio_text(celeb_audio1, celeb_transcript1)
-        ref_audio2, ref_text2 = preprocess_ref_audio_text(celeb_audio2, celeb_transcript2)
+        ref_audio1, ref_text1 = f5_reference_cache.preprocess(celeb_audio1, celeb_transcript1)
+        ref_audio2, ref_text2 = f5_reference_cache.preprocess(celeb_audio2, celeb_transcript2)
         
         try:
-            segments_folder = path_tts_segments_folder(output_file)          
+            segments_folder = path_tts_segments_folder(output_file) if get_tts_keep_segments() else None
             conversations = self._parse_conversation_regex(dubbing_text)
             conversations = conversations
                 
-            combined_audio = AudioSegment.empty() 
-            for i in progress.tqdm(range(len(conversations)), desc='Generating...'):
-                tts_segment_file = os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}') 
-                
-                conversation = conversations[i]
-                if conversation['speaker'] == 'spk1':
-                    tts_result = self.request_tts(conversation['message'], tts_segment_file, ref_audio1, ref_text1, speed_factor, audio_format)
-                else:
-                    tts_result = self.request_tts(conversation['message'], tts_segment_file, ref_audio2, ref_text2, speed_factor, audio_format)
+            # 화자별로 묶어 합성한 뒤 대화 순서대로 잇는다
+            samples_list = [None] * len(conversations)
+            for is_spk1, ref_audio, ref_text in ((True, ref_audio1, ref_text1), (False, ref_audio2, ref_text2)):
+                indices = [i for i, conversation in enumerate(conversations) if (conversation['speaker'] == 'spk1') == is_spk1]
+                if not indices:
+                    continue
+                speaker_samples = self.synthesize_batch([conversations[i]['message'] for i in indices], ref_audio, ref_text, speed_factor, progress=progress)
+                for i, samples in zip(indices, speaker_samples):
+                    samples_list[i] = samples
                 
-                if tts_result == False:
+            timeline = AbusTimeline()
+            for i, samples in enumerate(samples_list):
+                if samples is None:
                     continue
-                combined_audio += AudioSegment.from_file(tts_segment_file)
+                if segments_folder:
+                    AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}'), samples)
+                timeline.append(samples)
         
-            combined_audio.export(output_file, format=audio_format)
+            timeline.export(output_file, audio_format)
         except Exception as e:
             logger.error(f"[abus_tts_f5.py] infer_multi - An error occurred: {e}")
         finally:
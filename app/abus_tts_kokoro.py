@@ -1,4 +1,6 @@
 import os
+import time
+import threading
 import platform
 
 
@@ -10,8 +12,10 @@ from pydub import AudioSegment
 from pydub.silence import detect_leading_silence
 import gradio as gr
 
-from kokoro import KPipeline
-import soundfile as sf
+from kokoro import KPipeline, KModel
+import numpy as np
+import torch
+import torch.nn.functional as F
 
 from app.abus_genuine import *
 from app.abus_path import *
@@ -20,6 +24,9 @@ from app.abus_voice_kokoro import *
 from app.abus_text import *
 from app.abus_nlp_spacy import *
 from app.abus_audio import *
+from app.abus_timeline import *
+from app.abus_model_registry import *
+from app.abus_config import get_tts_keep_segments, get_kokoro_batch_size
 
 from phonemizer.backend.espeak.wrapper import EspeakWrapper
 
@@ -28,6 +35,189 @@ import structlog
 logger = structlog.get_logger()
 
 
+KOKORO_REPO_ID = 'hexgrad/Kokoro-82M'
+KOKORO_MODEL_MB = 330       # Kokoro-82M float32 가중치
+KOKORO_G2P_MB = 100         # misaki G2P (spaCy 모델, 사전)
+
+
+
+class KokoroPipelinePool:
+    """
+    Kokoro 파이프라인 풀.
+
+    줄마다 KPipeline 을 만들면 Kokoro 모델과 G2P(phonemizer / misaki)를 매번 다시 읽으므로 모델 레지스트리에 보관합니다.
+    - G2P 파이프라인(model=False)은 lang_code 별로, Kokoro 모델(KModel)은 장치별로 하나만 두고 모든 언어가 함께 씁니다.
+    - 목소리 팩(voice_code)은 풀에 보관된 파이프라인의 voices 에 한 번만 읽어 둡니다.
+    - 사용하지 않으면 레지스트리의 유휴 시간(MODEL_REGISTRY_IDLE_TIMEOUT)이 지난 뒤 내려갑니다.
+    """
+    def __init__(self, device=None, repo_id=KOKORO_REPO_ID):
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.repo_id = repo_id
+
+
+    def model_key(self):
+        return ('kokoro', self.repo_id, self.device)
+
+
+    def pipeline_key(self, lang_code):
+        return ('kokoro-g2p', self.repo_id, lang_code)
+
+
+    def _load_model(self):
+        logger.debug(f'[abus_tts_kokoro.py] KokoroPipelinePool._load_model - {self.repo_id}, device = {self.device}')
+        return KModel(repo_id=self.repo_id).to(self.device).eval()
+
+
+    def _load_pipeline(self, lang_code):
+        logger.debug(f'[abus_tts_kokoro.py] KokoroPipelinePool._load_pipeline - lang_code = {lang_code}')
+        return KPipeline(lang_code=lang_code, repo_id=self.repo_id, model=False)
+
+
+    def acquire(self, lang_code, voice_code):
+        """
+        파이프라인과 모델을 빌려옵니다. 사용이 끝나면 반드시 release(lang_code)를 호출해야 합니다.
+
+        :return: (G2P 파이프라인, KModel)
+        """
+        pipeline = model_registry.acquire(self.pipeline_key(lang_code), lambda: self._load_pipeline(lang_code), KOKORO_G2P_MB)
+        try:
+            model = model_registry.acquire(self.model_key(), self._load_model, KOKORO_MODEL_MB)
+        except Exception:
+            model_registry.release(self.pipeline_key(lang_code))
+            raise
+
+        if voice_code not in pipeline.voices:
+            start_time = time.perf_counter()
+            pipeline.load_voice(voice_code)
+            logger.debug(f'[abus_tts_kokoro.py] KokoroPipelinePool.acquire - voice {voice_code} loaded in {time.perf_counter() - start_time:.2f}s')
+        return pipeline, model
+
+
+    def release(self, lang_code):
+        model_registry.release(self.model_key())
+        model_registry.release(self.pipeline_key(lang_code))
+
+
+kokoro_pipeline_pool = KokoroPipelinePool()
+
+
+
+_batch_state = threading.local()
+
+
+def _frame_mask(length):
+    """(B, 1, length) 마스크. 업샘플링된 층에서는 줄별 프레임 길이를 같은 비율로 늘려 적용합니다."""
+    masks = _batch_state.masks
+    if length not in masks:
+        frames = _batch_state.frames
+        valid = torch.tensor([-(-frame_length * length // frames) for frame_length in _batch_state.frame_lengths])
+        masks[length] = (torch.arange(length)[None, :] < valid[:, None]).unsqueeze(1).to(_batch_state.device)
+    return masks[length]
+
+
+def _mask_padding_hook(module, inputs):
+    """Conv1d / ConvTranspose1d 입력의 패딩 구간을 0 으로 만들어 한 줄씩 합성할 때의 zero padding 과 같게 합니다."""
+    if getattr(_batch_state, 'frame_lengths', None) is None:
+        return None
+    x = inputs[0]
+    return (x * _frame_mask(x.shape[-1]),) + tuple(inputs[1:])
+
+
+def _masked_instance_norm_hook(module, inputs, output):
+    """InstanceNorm1d 가 줄마다 실제 길이 안에서만 평균 / 분산을 계산하도록 출력을 다시 계산합니다."""
+    if getattr(_batch_state, 'frame_lengths', None) is None:
+        return None
+    x = inputs[0]
+    mask = _frame_mask(x.shape[-1])
+    output = torch.zeros_like(output)
+    for b, valid in enumerate(mask.sum(-1).flatten().tolist()):
+        output[b:b + 1, :, :valid] = F.instance_norm(x[b:b + 1, :, :valid], weight=module.weight, bias=module.bias, eps=module.eps)
+    return output
+
+
+def _packed_lstm(lstm, x, lengths):
+    """패딩이 역방향 LSTM 에 섞이지 않도록 실제 길이만 실행합니다. x: (B, T, C)"""
+    x = torch.nn.utils.rnn.pack_padded_sequence(x, lengths.cpu(), batch_first=True, enforce_sorted=False)
+    x, _ = lstm(x)
+    x, _ = torch.nn.utils.rnn.pad_packed_sequence(x, batch_first=True, total_length=int(lengths.max()))
+    return x
+
+
+@torch.no_grad()
+def kokoro_forward_batch(model, phonemes, ref_s, speed):
+    """
+    여러 줄을 패딩한 배치로 한 번에 합성합니다 (KModel.forward_with_tokens 의 배치 버전).
+    - 텍스트 / 길이 예측은 줄별 마스크와 packed LSTM 으로, 디코더는 줄별 InstanceNorm 으로 실행합니다.
+    - 패딩된 프레임에서 나온 소리는 잘라 내고 줄마다 실제 길이의 오디오를 반환합니다.
+
+    :param phonemes: 줄별 음소열
+    :param ref_s: (B, 256) 줄별 목소리 스타일 (목소리 팩[len(음소열) - 1])
+    :param speed: 속도
+    :return: 줄별 오디오 (CPU 텐서) 목록
+    """
+    device = model.device
+    input_ids = []
+    for ps in phonemes:
+        ids = [i for i in map(model.vocab.get, ps) if i is not None]
+        assert len(ids) + 2 <= model.context_length, (len(ids) + 2, model.context_length)
+        input_ids.append([0, *ids, 0])
+
+    input_lengths = torch.tensor([len(ids) for ids in input_ids], dtype=torch.long)
+    tokens = torch.zeros((len(input_ids), int(input_lengths.max())), dtype=torch.long)
+    for b, ids in enumerate(input_ids):
+        tokens[b, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+    tokens = tokens.to(device)
+    text_mask = (torch.arange(tokens.shape[1])[None, :] >= input_lengths[:, None]).to(device)
+    ref_s = ref_s.to(device)
+    s = ref_s[:, 128:]
+
+    bert_dur = model.bert(tokens, attention_mask=(~text_mask).int())
+    d_en = model.bert_encoder(bert_dur).transpose(-1, -2)
+    d = model.predictor.text_encoder(d_en, s, input_lengths, text_mask)
+    x = _packed_lstm(model.predictor.lstm, d, input_lengths)
+    duration = torch.sigmoid(model.predictor.duration_proj(x)).sum(axis=-1) / speed
+    pred_dur = torch.round(duration).clamp(min=1).long().masked_fill(text_mask, 0)
+
+    frame_lengths = pred_dur.sum(-1).tolist()
+    frames = max(frame_lengths)
+    pred_aln_trg = torch.zeros((len(input_ids), tokens.shape[1], frames), device=device)
+    for b, length in enumerate(frame_lengths):
+        indices = torch.repeat_interleave(torch.arange(tokens.shape[1], device=device), pred_dur[b])
+        pred_aln_trg[b, indices, torch.arange(length, device=device)] = 1
+    en = d.transpose(-1, -2) @ pred_aln_trg
+
+    t_en = model.text_encoder(tokens, input_lengths, text_mask)
+    asr = t_en @ pred_aln_trg
+
+    # 프레임 단위 층(운율 예측기의 F0 / N, 디코더)은 hook 으로 줄별 길이를 지킨다
+    handles = []
+    for module in list(model.predictor.modules()) + list(model.decoder.modules()):
+        if isinstance(module, torch.nn.InstanceNorm1d):
+            handles.append(module.register_forward_hook(_masked_instance_norm_hook))
+        elif isinstance(module, (torch.nn.Conv1d, torch.nn.ConvTranspose1d)):
+            handles.append(module.register_forward_pre_hook(_mask_padding_hook))
+    _batch_state.frame_lengths, _batch_state.frames, _batch_state.device, _batch_state.masks = frame_lengths, frames, device, {}
+    try:
+        # ProsodyPredictor.F0Ntrain
+        x = _packed_lstm(model.predictor.shared, en.transpose(-1, -2), torch.tensor(frame_lengths)).transpose(-1, -2)
+        F0, N = x, x
+        for block in model.predictor.F0:
+            F0 = block(F0, s)
+        for block in model.predictor.N:
+            N = block(N, s)
+        F0_pred = model.predictor.F0_proj(F0).squeeze(1)
+        N_pred = model.predictor.N_proj(N).squeeze(1)
+        audio = model.decoder(asr, F0_pred, N_pred, ref_s[:, :128]).reshape(len(input_ids), -1)
+    finally:
+        _batch_state.frame_lengths = _batch_state.masks = None
+        for handle in handles:
+            handle.remove()
+
+    hop = audio.shape[-1] // frames
+    return [audio[b, :length * hop].cpu() for b, length in enumerate(frame_lengths)]
+
+
+
 class KokoroTTS:
     def __init__(self):      
         self.set_environment()        
@@ -68,54 +258,97 @@ class KokoroTTS:
 
 
     
-    def request_tts(self, line: str, output_file: str, kokoro_voice, speed_factor, audio_format):
-        output_voice_file = os.path.join(path_dubbing_folder(), path_new_filename(ext = f".{audio_format}"))
+    def synthesize(self, line: str, kokoro_voice, speed_factor):
         line = AbusText.normalize_text(line)
         if len(line) < 1:
-            logger.warning(f"[abus_tts_kokoro.py] request_tts - error: no line")
-            return False
+            logger.warning(f"[abus_tts_kokoro.py] synthesize - error: no line")
+            return None
         
-        # logger.debug(f'[abus_tts_kokoro.py] request_tts - line = {line}, kokoro_voice = {kokoro_voice}')
+        # logger.debug(f'[abus_tts_kokoro.py] synthesize - line = {line}, kokoro_voice = {kokoro_voice}')
         
         try:
-            pipeline = KPipeline(lang_code=kokoro_voice.lang_code)
+            pipeline, model = kokoro_pipeline_pool.acquire(kokoro_voice.lang_code, kokoro_voice.voice_code)
         except Exception as e:
-            logger.error(f"[abus_tts_kokoro.py] request_tts - Failed to initialize KPipeline: {e}")
-            return False
-                
-        # pipeline = KPipeline(lang_code=kokoro_voice.lang_code)
-        # logger.debug(f'[abus_tts_kokoro.py] request_tts - pipeline = {pipeline}')
-        
-        generator = pipeline(
-            line, 
-            voice=kokoro_voice.voice_code,
-            speed=speed_factor, 
-            split_pattern=None
-        )
-        
-        # logger.debug(f'[abus_tts_kokoro.py] request_tts - generator = {generator}')
-        
-        for i, (gs, ps, audio) in enumerate(generator):
-            # print(i)  # i => index
-            # print(gs) # gs => graphemes/text
-            # print(ps) # ps => phonemes
-            sf.write(output_voice_file, audio, 24000)
-            break
-                
-        # logger.debug(f'[abus_tts_kokoro.py] request_tts - output_voice_file = {output_voice_file}')
+            logger.error(f"[abus_tts_kokoro.py] synthesize - Failed to initialize KPipeline: {e}")
+            return None
         
-        trimed_voice_file = path_add_postfix(output_voice_file, "_trimed")
-        AbusAudio.trim_silence_file(output_voice_file, trimed_voice_file)
+        try:
+            generator = pipeline(
+                line, 
+                voice=kokoro_voice.voice_code,
+                speed=speed_factor, 
+                split_pattern=None,
+                model=model
+            )
+            
+            for i, (gs, ps, audio) in enumerate(generator):
+                # print(i)  # i => index
+                # print(gs) # gs => graphemes/text
+                # print(ps) # ps => phonemes
+                return AbusAudio.prepare_segment(np.asarray(audio, dtype=np.float32), 24000)
+        finally:
+            kokoro_pipeline_pool.release(kokoro_voice.lang_code)
         
-        ffmpeg_to_stereo(trimed_voice_file, output_file)
+        return None
+    
+    
+    @staticmethod
+    def phonemize(pipeline, line: str):
+        """synthesize 와 같이 첫 조각만 음소로 바꿉니다. (G2P 파이프라인이라 합성은 하지 않습니다)"""
+        for result in pipeline(line, split_pattern=None):
+            return result.phonemes
+        return None
+
+
+    def synthesize_batch(self, lines, kokoro_voice, speed_factor, batch_size=None, progress=None):
+        """
+        여러 줄을 한꺼번에 합성합니다.
+
+        모든 줄을 먼저 음소로 바꾼 뒤 음소 길이순으로 batch_size 줄씩 묶어(길이 버킷) 패딩한 배치로 합성합니다.
+        batch_size 가 1 이면 입력 순서대로 한 줄씩 synthesize 와 같은 경로로 합성하므로 결과가 같습니다.
+
+        :param batch_size: 한 번에 합성할 줄 수 (None 이면 KOKORO_BATCH_SIZE)
+        :return: 줄별 samples 목록 (합성하지 못한 줄은 None)
+        """
+        batch_size = max(1, get_kokoro_batch_size() if batch_size is None else batch_size)
+        lines = [AbusText.normalize_text(line) for line in lines]
+        results = [None] * len(lines)
         
         try:
-            os.remove(output_voice_file)
-            os.remove(trimed_voice_file)
+            pipeline, model = kokoro_pipeline_pool.acquire(kokoro_voice.lang_code, kokoro_voice.voice_code)
         except Exception as e:
-            logger.error(f"[abus_tts_kokoro.py] request_tts - error: {e}")
+            logger.error(f"[abus_tts_kokoro.py] synthesize_batch - Failed to initialize KPipeline: {e}")
+            return results
+        
+        try:
+            pack = pipeline.load_voice(kokoro_voice.voice_code).to(model.device)
+            phonemes = [self.phonemize(pipeline, line) if len(line) > 0 else None for line in lines]
+            order = [i for i, ps in enumerate(phonemes) if ps]
+            if batch_size > 1:
+                order.sort(key=lambda i: len(phonemes[i]))
+            buckets = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+            logger.debug(f'[abus_tts_kokoro.py] synthesize_batch - {len(lines)} lines, {len(buckets)} batches, batch_size = {batch_size}')
+            
+            for bucket in (progress.tqdm(buckets, desc='Generating...') if progress else buckets):
+                if len(bucket) == 1:
+                    audios = [KPipeline.infer(model, phonemes[bucket[0]], pack, speed_factor).audio]
+                else:
+                    ref_s = torch.cat([pack[len(phonemes[i]) - 1] for i in bucket])
+                    audios = kokoro_forward_batch(model, [phonemes[i] for i in bucket], ref_s, speed_factor)
+                for i, audio in zip(bucket, audios):
+                    results[i] = AbusAudio.prepare_segment(np.asarray(audio, dtype=np.float32), 24000)
+        finally:
+            kokoro_pipeline_pool.release(kokoro_voice.lang_code)
+        
+        return results
+    
+    
+    def request_tts(self, line: str, output_file: str, kokoro_voice, speed_factor, audio_format):
+        samples = self.synthesize(line, kokoro_voice, speed_factor)
+        if samples is None:
             return False
         
+        AbusAudio.write_array(output_file, samples)
         return True
     
     
@@ -126,58 +359,43 @@ class KokoroTTS:
         AbusSpacy.process_subtitle_for_tts(subtitle_file, tts_subtitle_file)
         
 
-        segments_folder = path_tts_segments_folder(subtitle_file)
+        segments_folder = path_tts_segments_folder(subtitle_file) if get_tts_keep_segments() else None
         full_subs = pysubs2.load(tts_subtitle_file, encoding="utf-8")
         subs = full_subs
         
-        combined_audio = AudioSegment.empty()
-        for i in progress.tqdm(range(len(subs)), desc='Generating...'):
+        timeline = AbusTimeline(duration_ms=subs[-1].end if len(subs) > 0 else 0)
+        samples_list = self.synthesize_batch([line.text for line in subs], kokoro_voice, speed_factor, progress=progress)
+        for i, samples in enumerate(samples_list):
             line = subs[i]
-            next_line = subs[i+1] if i < len(subs)-1 else None
             
-            if i == 0:
-                silence = AudioSegment.silent(duration=line.start)
-                combined_audio += silence   
-
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1}.{audio_format}')
-            tts_result = self.request_tts(line.text, tts_segment_file, kokoro_voice, speed_factor, audio_format)
-
-            if tts_result == False:
-                if next_line:
-                    silence = AudioSegment.silent(duration=next_line.start-line.start)
-                    combined_audio += silence
+            if samples is None:
                 continue        
             
-            combined_audio += AudioSegment.from_file(tts_segment_file)
-
-            if next_line and len(combined_audio) < next_line.start:
-                silence_length = next_line.start - len(combined_audio)
-                silence = AudioSegment.silent(duration=silence_length)
-                combined_audio += silence
-            elif next_line:
-                next_line.start = len(combined_audio)
-                next_line.end = next_line.start + (next_line.end - next_line.start)
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1}.{audio_format}'), samples)
+            timeline.place(samples, line.start)
                 
-        combined_audio.export(output_file, format=audio_format)                 
+        timeline.export(output_file, audio_format)                 
         cmd_delete_file(tts_subtitle_file)    
         
     
     def text_to_voice(self, text: str, output_file: str, kokoro_voice, speed_factor, audio_format, progress=gr.Progress()):
-        segments_folder = path_tts_segments_folder(output_file)  
+        segments_folder = path_tts_segments_folder(output_file) if get_tts_keep_segments() else None
         
         use_punctuation = AbusText.has_punctuation_marks(text)
         lines = AbusText.split_into_sentences(text, use_punctuation)
         lines = lines
         
-        combined_audio = AudioSegment.empty() 
-        for i in progress.tqdm(range(len(lines)), desc='Generating...'):
-            tts_segment_file = os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}')    
-            tts_result = self.request_tts(lines[i], tts_segment_file, kokoro_voice, speed_factor, audio_format)
-            if tts_result == False:
+        timeline = AbusTimeline()
+        samples_list = self.synthesize_batch(lines, kokoro_voice, speed_factor, progress=progress)
+        for i, samples in enumerate(samples_list):
+            if samples is None:
                 continue
-            combined_audio += AudioSegment.from_file(tts_segment_file)
+            if segments_folder:
+                AbusAudio.write_array(os.path.join(segments_folder, f'tts_{i+1:06}.{audio_format}'), samples)
+            timeline.append(samples)
             
-        combined_audio.export(output_file, format=audio_format)
+        timeline.export(output_file, audio_format)
 
     
     def infer(self, text: str, output_file: str, kokoro_voice, speed_factor, audio_format, progress=gr.Progress()):
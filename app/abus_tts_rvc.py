@@ -24,6 +24,8 @@ from app.abus_translate_azure import *
 from app.abus_rvc import *
 from app.abus_text import *
 from app.abus_audio import *
+from app.abus_timeline import *
+from app.abus_config import get_tts_keep_segments
 
 
 class TTSRVC:
@@ -50,50 +52,43 @@ class TTSRVC:
         rvc_audio_file = path_add_postfix(subtitle_file, f"-{tts_voice}-{rvc_voice}", f".{audio_format}")        
         rvc_subtitle_file = path_add_postfix(subtitle_file, f"-{tts_voice}-{rvc_voice}", ".srt")
         
-        tts_segments_folder = path_tts_segments_folder(subtitle_file)   
-        rvc_segments_folder = path_rvc_segments_folder(subtitle_file)      
-
-        combined_tts_audio = AudioSegment.empty()
-        combined_rvc_audio = AudioSegment.empty()
+        keep_segments = get_tts_keep_segments()
+        tts_segments_folder = path_tts_segments_folder(subtitle_file) if keep_segments else None
+        rvc_segments_folder = path_rvc_segments_folder(subtitle_file) if keep_segments else None
 
         full_subs = pysubs2.load(subtitle_file, encoding="utf-8")
         subs = full_subs
         
-        for i in progress.tqdm(range(len(subs)), desc='Generating...'):
-            line = subs[i]
-            next_line = subs[i+1] if i < len(subs)-1 else None
-
-            if i == 0:
-                silence = AudioSegment.silent(duration=line.start)
-                combined_tts_audio += silence
-                combined_rvc_audio += silence
+        # 모든 문장을 먼저 합성한 뒤 길이가 비슷한 문장끼리 묶어 RVC 변환한다
+        if isinstance(self.tts, EdgeTTS):
+            tts_segments = self.tts.synthesize_batch([line.text for line in subs], tts_voice, semitones, speed_factor, volume_factor, progress)
+        else:
+            tts_segments = [self.tts.synthesize(subs[i].text, tts_voice, semitones, speed_factor, volume_factor) for i in progress.tqdm(range(len(subs)), desc='Generating...')]
+        
+        progress(0.9, desc='Converting voice...')
+        rvc_segments = self.rvc.convert_segments(tts_segments, TTS_SAMPLE_RATE, rvc_voice)
 
-            tts_segment_file = os.path.join(tts_segments_folder, f'tts_{i+1:06}.{audio_format}')    
-            if False == self.tts.line_to_voice(line.text, tts_segment_file, tts_voice, semitones, speed_factor, volume_factor, audio_format):
-                silence = AudioSegment.silent(duration=next_line.start-line.start)
-                combined_tts_audio += silence
-                combined_rvc_audio += silence
+        duration_ms = subs[-1].end if len(subs) > 0 else 0
+        tts_timeline = AbusTimeline(duration_ms=duration_ms)
+        rvc_timeline = AbusTimeline(duration_ms=duration_ms)
+        for i in range(len(subs)):
+            line = subs[i]
+            if rvc_segments[i] is None:
                 continue
             
-            rvc_segment_file = os.path.join(rvc_segments_folder, f'rvc_{i+1:06}.{audio_format}')    
-            self.rvc.simple_inference(tts_segment_file, rvc_segment_file, rvc_voice, audio_format)
-            
-            combined_tts_audio += AudioSegment.from_file(tts_segment_file)
-            combined_rvc_audio += AudioSegment.from_file(rvc_segment_file)
-            
-            line.end = len(combined_rvc_audio)
+            if keep_segments:
+                AbusAudio.write_array(os.path.join(tts_segments_folder, f'tts_{i+1:06}.{audio_format}'), tts_segments[i])
+                AbusAudio.write_array(os.path.join(rvc_segments_folder, f'rvc_{i+1:06}.{audio_format}'), rvc_segments[i])
             
-            if next_line and len(combined_rvc_audio) < next_line.start:
-                silence_length = next_line.start - len(combined_rvc_audio)
-                silence = AudioSegment.silent(duration=silence_length)
-                combined_tts_audio += silence
-                combined_rvc_audio += silence
-            elif next_line:
-                next_line.start = len(combined_rvc_audio)
-                next_line.end = next_line.start + (next_line.end - next_line.start)
+            # TTS 트랙은 RVC 트랙과 같은 위치에 놓고, 자막은 RVC 음성 길이에 맞춘다
+            start_ms = rvc_timeline.place(rvc_segments[i], line.start)
+            offset = rvc_timeline.ms_to_samples(start_ms)
+            tts_timeline.cursor = max(tts_timeline.cursor, tts_timeline.write(tts_segments[i], offset))
+            line.start = int(start_ms)
+            line.end = int(rvc_timeline.samples_to_ms(rvc_timeline.cursor))
 
-        combined_tts_audio.export(tts_audio_file, format=audio_format)
-        combined_rvc_audio.export(rvc_audio_file, format=audio_format)     
+        tts_timeline.export(tts_audio_file, audio_format)
+        rvc_timeline.export(rvc_audio_file, audio_format)
         subs.save(rvc_subtitle_file)
         
         return tts_audio_file, rvc_audio_file
@@ -107,19 +107,8 @@ class GradioAICover:
         
         output_dir = os.path.dirname(self.source_file)  
             
-        progress(0.2, desc=f'Separating vocals and instrumental...')
-        mdxnet_voc_ft = os.path.join(self.mdxnet_models_dir, 'UVR-MDX-NET-Voc_FT.onnx')     
-        vocals_path, instrumentals_path = run_mdx(self.mdx_model_params, output_dir, mdxnet_voc_ft, self.fm.get_split("Source.audio"), denoise=True, keep_orig=True)
-
-        progress(0.6, desc=f'Separating main vocals and backup vocals...')
-        mdxnet_kara2 = os.path.join(self.mdxnet_models_dir, 'UVR_MDXNET_KARA_2.onnx')
-        backup_vocals_path, main_vocals_path = run_mdx(self.mdx_model_params, output_dir, mdxnet_kara2, vocals_path, suffix='Backup', invert_suffix='Main', denoise=True)
-
-        progress(0.6, desc=f'Separating reverb...')
-        mdxnet_reverb = os.path.join(self.mdxnet_models_dir, 'Reverb_HQ_By_FoxJoy.onnx')
-        _, main_vocals_dereverb_path = run_mdx(self.mdx_model_params, output_dir, mdxnet_reverb, main_vocals_path, invert_suffix='DeReverb', exclude_main=True, denoise=True)
-            
-        progress(1, desc=f'demixing complete')
+        instrumentals_path, vocals_path, backup_vocals_path, main_vocals_path, main_vocals_dereverb_path = mdx_separator.run_vocal_chain(
+            self.mdx_model_params, self.mdxnet_models_dir, output_dir, self.fm.get_split("Source.audio"), progress)
                     
         self.fm.set_split("Instrumental.audio", instrumentals_path)
         self.fm.set_split("Vocals.audio", vocals_path)        
@@ -0,0 +1,70 @@
+"""
+AI 커버 RVC 모델 풀 벤치마크
+
+같은 목소리로 음정(pitch_change)만 바꿔 가며 rvc_change_voice 를 연달아 실행하면서
+변환마다 모델 로드 시간과 변환 시간을 출력합니다.
+- reload: 변환마다 HuBERT / 목소리 모델을 레지스트리에서 내려 다시 읽는 기존 동작을 재현
+- pool  : 첫 변환에서 읽은 모델을 계속 재사용
+
+입력은 발화와 비슷한 합성 신호입니다 (model/rvc-model/hubert_base.pt, rmvpe.pt 와 목소리 모델 필요).
+
+    python -m benchmarks.bench_aicover_rvc_pool --voice choi --runs 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+from app.abus_aicover import aicover_rvc_pool, rvc_change_voice
+from app.abus_model_registry import model_registry
+from app.abus_path import path_subfile
+
+
+SAMPLE_RATE = 44100
+
+
+def make_vocal(path, seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    f0 = rng.uniform(150, 250) + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12)) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    sf.write(path, (0.2 * voice).astype(np.float32), SAMPLE_RATE)
+
+
+def bench(name, voice, input_path, folder, runs, reload):
+    voice_pth_path = path_subfile(os.path.join(os.getcwd(), 'model', 'rvc-voice', voice), ".pth")
+    aicover_rvc_pool.timings = []
+    for i in range(runs):
+        if reload:
+            model_registry.unload(aicover_rvc_pool.hubert_key())
+            model_registry.unload(aicover_rvc_pool.voice_key(voice_pth_path))
+        rvc_change_voice(input_path, os.path.join(folder, f'{name}_{i}.wav'), voice, i % 3 - 1, 'rmvpe', 0.5, 3, 0.25, 0.33, 128)
+    loads = [timing['load'] for timing in aicover_rvc_pool.timings]
+    totals = [timing['total'] for timing in aicover_rvc_pool.timings]
+    print(f'{name:6s}: load {" ".join(f"{load:5.2f}" for load in loads)}s, '
+          f'mean total {statistics.mean(totals):6.2f}s, sum {sum(totals):6.1f}s')
+    return sum(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--voice', required=True, help='model/rvc-voice 아래 목소리 폴더 이름')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f'device = {aicover_rvc_pool.config.device}, is_half = {aicover_rvc_pool.config.is_half}')
+    with tempfile.TemporaryDirectory() as folder:
+        input_path = os.path.join(folder, 'vocals.wav')
+        make_vocal(input_path, args.seconds)
+        reload_time = bench('reload', args.voice, input_path, folder, args.runs, reload=True)
+        pool_time = bench('pool', args.voice, input_path, folder, args.runs, reload=False)
+        print(f'saved {reload_time - pool_time:.1f}s over {args.runs} conversions, registry: {model_registry.stats()["saved_time"]:.1f}s load time saved')
+
+
+if __name__ == '__main__':
+    main()
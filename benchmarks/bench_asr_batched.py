@@ -0,0 +1,73 @@
+"""
+배치 ASR 벤치마크
+
+FasterWhisperInference의 순차 모드와 배치 모드(VAD 청크 + BatchedInferencePipeline)의
+처리량을 오디오 초 / 실제 초 단위로 비교합니다.
+--input 을 지정하지 않으면 발화와 무음이 번갈아 나오는 합성 오디오를 사용합니다.
+
+    python -m benchmarks.bench_asr_batched --seconds 600 --model small --compute-type int8
+    python -m benchmarks.bench_asr_batched --input long_audio.wav --batch-size 16 --cpu-threads 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.abus_asr_faster_whisper import FasterWhisperInference, VAD_SAMPLE_RATE
+from app.abus_asr_parameters import WhisperParameters
+
+
+def make_long_audio(seconds, sample_rate=VAD_SAMPLE_RATE, seed=0):
+    """1~6초 발화(하모닉 + 진폭 변조)와 0.3~2초 무음이 번갈아 나오는 합성 오디오"""
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(0, 1e-3, int(sample_rate * seconds)).astype(np.float32)
+    position = sample_rate
+    while position < len(audio) - sample_rate * 7:
+        length = int(rng.uniform(1, 6) * sample_rate)
+        t = np.arange(length) / sample_rate
+        f0 = rng.uniform(100, 220) + 40 * np.sin(2 * np.pi * 0.5 * t)
+        phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+        voice = sum(np.sin(k * phase) / k for k in range(1, 15)) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))
+        audio[position:position + length] += 0.1 * voice.astype(np.float32)
+        position += length + int(rng.uniform(0.3, 2) * sample_rate)
+    return audio
+
+
+def bench(whisper_inf, audio, params):
+    # 모델 로드 시간은 제외하고 측정한다
+    whisper_inf.update_model(params.model_size, params.compute_type, None, whisper_inf.resolve_cpu_threads(params))
+    segments, elapsed_time = whisper_inf.transcribe(audio, params, None)
+    return segments, elapsed_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default=None)
+    parser.add_argument('--seconds', type=float, default=600)
+    parser.add_argument('--model', default='small')
+    parser.add_argument('--compute-type', default='int8')
+    parser.add_argument('--lang', default='english')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--cpu-threads', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.input:
+        import faster_whisper
+        audio = faster_whisper.decode_audio(args.input, sampling_rate=VAD_SAMPLE_RATE)
+    else:
+        audio = make_long_audio(args.seconds)
+    duration = len(audio) / VAD_SAMPLE_RATE
+
+    whisper_inf = FasterWhisperInference()
+    for batched in (False, True):
+        params = WhisperParameters(model_size=args.model, lang=args.lang, compute_type=args.compute_type,
+                                   batched=batched, batch_size=args.batch_size, cpu_threads=args.cpu_threads)
+        segments, elapsed_time = bench(whisper_inf, audio, params)
+        mode = f'batched(batch_size={args.batch_size})' if batched else 'sequential'
+        print(f'{mode:24s}: {duration:7.1f}s audio in {elapsed_time:7.2f}s, '
+              f'{duration / elapsed_time:6.1f} audio-s/s, {len(segments)} segments')
+    whisper_inf.release_model()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+CosyVoice2 배치 합성 벤치마크 (CPU)
+
+같은 참조 음성으로 --lines 개의 문장을 합성하면서 분당 처리 발화 수(utterances/min)를 출력합니다.
+- sequential: 줄마다 inference_zero_shot 을 호출하는 기존 방식
+- batch N   : inference_zero_shot_batch 로 길이가 비슷한 N 줄씩 LLM / flow / HiFT 를 함께 실행
+
+model/cosyvoice/CosyVoice2-0.5B 모델이 필요합니다. 샘플링 결과가 달라지므로 줄마다 음성 길이는 방식별로 조금씩 다릅니다.
+
+    python -m benchmarks.bench_cosyvoice_batch --ref-audio ref.wav --ref-text "참조 음성 대사" --batch-sizes 1 4 8
+"""
+import argparse
+import time
+
+import torch
+
+from app.abus_tts_cosyvoice import CosyVoiceInference
+from cosyvoice.utils.common import set_all_random_seed
+
+
+WORDS = ('the quick brown fox jumps over a lazy dog while seven bright stars '
+         'shine above the quiet harbor and distant ships return home').split()
+
+
+def make_lines(lines):
+    return [' '.join(WORDS[(i * 3 + j) % len(WORDS)] for j in range(6 + i % 10)).capitalize() + '.' for i in range(lines)]
+
+
+def report(name, elapsed, lines, seconds):
+    print(f'  {name:12s}: {elapsed:7.1f}s, {lines / elapsed * 60:6.1f} utterances/min, '
+          f'{seconds:6.1f}s of speech, rtf {elapsed / seconds:.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ref-audio', required=True)
+    parser.add_argument('--ref-text', required=True)
+    parser.add_argument('--lines', type=int, default=16)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--no-sequential', action='store_true', help='기존 줄 단위 합성은 측정하지 않음')
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    inference = CosyVoiceInference()
+    cosyvoice = inference.cosyvoice
+    prompt_speech_16k = inference.load_prompt_speech(args.ref_audio)
+    lines = make_lines(args.lines)
+    print(f'{len(lines)} lines, torch threads = {torch.get_num_threads()}')
+
+    # 모델 로드와 워밍업은 제외한다
+    cosyvoice.inference_zero_shot_batch(lines[:1], args.ref_text, prompt_speech_16k, text_frontend=False, batch_size=1)
+
+    if not args.no_sequential:
+        set_all_random_seed(0)
+        start = time.perf_counter()
+        samples = 0
+        for line in lines:
+            for output in cosyvoice.inference_zero_shot(line, args.ref_text, prompt_speech_16k, stream=False, text_frontend=False):
+                samples += output['tts_speech'].shape[1]
+        report('sequential', time.perf_counter() - start, len(lines), samples / cosyvoice.sample_rate)
+
+    for batch_size in args.batch_sizes:
+        set_all_random_seed(0)
+        start = time.perf_counter()
+        speeches = cosyvoice.inference_zero_shot_batch(lines, args.ref_text, prompt_speech_16k, text_frontend=False, batch_size=batch_size)
+        samples = sum(speech.shape[1] for speech in speeches if speech is not None)
+        report(f'batch {batch_size}', time.perf_counter() - start, len(lines), samples / cosyvoice.sample_rate)
+
+
+if __name__ == '__main__':
+    main()
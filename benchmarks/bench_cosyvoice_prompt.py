@@ -0,0 +1,75 @@
+"""
+CosyVoice 화자 프롬프트 캐시 벤치마크
+
+자막 줄마다 CosyVoice2 프런트엔드(참조 음성 로드/후처리 + frontend_zero_shot)만 실행하면서
+줄당 지연 시간을 측정합니다. LLM / flow / HiFT 추론은 포함하지 않습니다.
+- cold: 줄마다 참조 음성을 다시 읽고 프롬프트 특징(토큰, 음성 특징, 화자 임베딩)을 다시 계산하는 기존 동작
+- warm: 첫 줄에서 계산한 프롬프트를 재사용하고 새 문장만 토큰화
+- disk: --cache-dir 을 지정한 경우, 메모리 캐시를 비우고 디스크에 저장된 프롬프트를 읽음
+
+    python -m benchmarks.bench_cosyvoice_prompt --ref-audio ref.wav --ref-text "참조 음성 대사" --lines 100
+"""
+import argparse
+import statistics
+import time
+
+from app.abus_tts_cosyvoice import CosyVoiceInference, prompt_sr
+from cosyvoice.cli.prompt_cache import SpeakerPromptCache
+
+
+WORDS = ('the quick brown fox jumps over a lazy dog while seven bright stars '
+         'shine above the quiet harbor and distant ships return home').split()
+
+
+def make_lines(lines):
+    return [' '.join(WORDS[(i * 3 + j) % len(WORDS)] for j in range(6 + i % 10)).capitalize() + '.' for i in range(lines)]
+
+
+def bench(inference, lines, ref_audio, ref_text, reset):
+    frontend = inference.cosyvoice.frontend
+    latencies = []
+    for line in lines:
+        reset()
+        start = time.perf_counter()
+        prompt_speech_16k = inference.load_prompt_speech(ref_audio)
+        frontend.frontend_zero_shot(line, ref_text, prompt_speech_16k, inference.cosyvoice.sample_rate)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f'{name:5s}: mean {statistics.mean(latencies) * 1000:7.1f}ms, '
+          f'p50 {statistics.median(latencies) * 1000:7.1f}ms, p95 {p95 * 1000:7.1f}ms, total {sum(latencies):6.1f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ref-audio', required=True)
+    parser.add_argument('--ref-text', required=True)
+    parser.add_argument('--lines', type=int, default=100)
+    parser.add_argument('--cache-dir', default=None)
+    args = parser.parse_args()
+
+    inference = CosyVoiceInference()
+    frontend = inference.cosyvoice.frontend
+    lines = make_lines(args.lines)
+    print(f'{len(lines)} lines, prompt {inference.load_prompt_speech(args.ref_audio).shape[1] / prompt_sr:.1f}s')
+
+    def reset_all():
+        inference._prompt_speech = (None, None)
+
+    frontend.prompt_cache = SpeakerPromptCache(0)
+    report('cold', bench(inference, lines, args.ref_audio, args.ref_text, reset_all))
+
+    frontend.prompt_cache = SpeakerPromptCache(16, args.cache_dir)
+    report('warm', bench(inference, lines, args.ref_audio, args.ref_text, lambda: None))
+
+    if args.cache_dir:
+        report('disk', bench(inference, lines, args.ref_audio, args.ref_text, frontend.prompt_cache.clear))
+    print(f'prompt cache: {frontend.prompt_cache.stats()}')
+
+
+if __name__ == '__main__':
+    main()
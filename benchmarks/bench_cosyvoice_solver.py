@@ -0,0 +1,99 @@
+"""
+CosyVoice2 flow 솔버 벤치마크 (CPU)
+
+LLM 으로 음성 토큰을 한 번만 만든 뒤, 솔버 설정별로 flow(멜 생성) + HiFT(보코더) 만 다시 실행해
+실시간 배율(RTF)과 10스텝 euler 기준(reference) 멜과의 스펙트럼 거리(log-mel 평균 절대 오차)를 출력합니다.
+거리가 작을수록 기준 음질에 가깝고, RTF 가 작을수록 빠릅니다. 결과를 보고 COSYVOICE_FLOW_SOLVER / COSYVOICE_FLOW_STEPS 를 고릅니다.
+
+기본으로 FlowSolver.PRESETS 를 모두 측정하고, --methods / --steps 를 지정하면 그 조합도 측정합니다.
+model/cosyvoice/CosyVoice2-0.5B 모델이 필요합니다.
+
+    python -m benchmarks.bench_cosyvoice_solver --ref-audio ref.wav --ref-text "참조 음성 대사"
+    python -m benchmarks.bench_cosyvoice_solver --ref-audio ref.wav --ref-text "참조 음성 대사" --methods euler heun --steps 3 5 8
+"""
+import argparse
+import time
+
+import torch
+
+from app.abus_tts_cosyvoice import CosyVoiceInference
+from cosyvoice.flow.flow_matching import FlowSolver
+from cosyvoice.utils.common import pad_list
+
+
+WORDS = ('the quick brown fox jumps over a lazy dog while seven bright stars '
+         'shine above the quiet harbor and distant ships return home').split()
+
+
+def make_lines(lines):
+    return [' '.join(WORDS[(i * 3 + j) % len(WORDS)] for j in range(6 + i % 10)).capitalize() + '.' for i in range(lines)]
+
+
+def speech_tokens(cosyvoice, lines, prompt):
+    model = cosyvoice.model
+    text = [cosyvoice.frontend._extract_text_token(line)[0][0] for line in lines]
+    return model.llm.inference_batch(text=pad_list(text, 0).to(model.device),
+                                     text_len=torch.tensor([len(t) for t in text], dtype=torch.int32).to(model.device),
+                                     prompt_text=prompt['prompt_text'].to(model.device),
+                                     prompt_text_len=prompt['prompt_text_len'].to(model.device),
+                                     prompt_speech_token=prompt['llm_prompt_speech_token'].to(model.device),
+                                     prompt_speech_token_len=prompt['llm_prompt_speech_token_len'].to(model.device),
+                                     embedding=prompt['llm_embedding'].to(model.device))
+
+
+def token2mel(cosyvoice, tokens, prompt, solver):
+    model = cosyvoice.model
+    mels = []
+    for token in tokens:
+        mels += model.flow.inference_batch(token=torch.tensor([token]).to(model.device),
+                                           token_len=torch.tensor([len(token)], dtype=torch.int32).to(model.device),
+                                           prompt_token=prompt['flow_prompt_speech_token'].to(model.device),
+                                           prompt_token_len=prompt['flow_prompt_speech_token_len'].to(model.device),
+                                           prompt_feat=prompt['prompt_speech_feat'].to(model.device),
+                                           prompt_feat_len=prompt['prompt_speech_feat_len'].to(model.device),
+                                           embedding=prompt['flow_embedding'].to(model.device),
+                                           solver=solver)
+    return mels
+
+
+def bench(cosyvoice, tokens, prompt, solver):
+    start = time.perf_counter()
+    mels = token2mel(cosyvoice, tokens, prompt, solver)
+    samples = sum(cosyvoice.model.hift.inference(speech_feat=mel, cache_source=torch.zeros(1, 1, 0))[0].shape[1] for mel in mels)
+    elapsed = time.perf_counter() - start
+    return mels, elapsed / (samples / cosyvoice.sample_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ref-audio', required=True)
+    parser.add_argument('--ref-text', required=True)
+    parser.add_argument('--lines', type=int, default=8)
+    parser.add_argument('--methods', nargs='*', default=[], choices=FlowSolver.METHODS)
+    parser.add_argument('--steps', type=int, nargs='*', default=[])
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    inference = CosyVoiceInference()
+    cosyvoice = inference.cosyvoice
+    lines = make_lines(args.lines)
+    prompt_speech_16k = inference.load_prompt_speech(args.ref_audio)
+    prompt = cosyvoice.frontend.frontend_zero_shot(lines[0], args.ref_text, prompt_speech_16k, cosyvoice.sample_rate)
+    tokens = [token for token in speech_tokens(cosyvoice, lines, prompt) if len(token) > 0]
+    print(f'{len(tokens)} lines, {sum(len(token) for token in tokens)} speech tokens, torch threads = {torch.get_num_threads()}')
+
+    solvers = [(name, FlowSolver.from_preset(name)) for name in FlowSolver.PRESETS]
+    solvers += [(f'{method}-{steps}', FlowSolver(method, steps)) for method in args.methods for steps in args.steps]
+
+    bench(cosyvoice, tokens[:1], prompt, None)      # 워밍업
+    reference, _ = bench(cosyvoice, tokens, prompt, FlowSolver.from_preset('reference'))
+    for name, solver in solvers:
+        mels, rtf = bench(cosyvoice, tokens, prompt, solver)
+        distance = sum((mel - ref).abs().mean().item() for mel, ref in zip(mels, reference)) / len(mels)
+        print(f'  {name:12s}: rtf {rtf:6.3f}, log-mel L1 {distance:.4f}  {solver}')
+
+
+if __name__ == '__main__':
+    main()
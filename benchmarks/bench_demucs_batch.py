@@ -0,0 +1,56 @@
+"""
+Demucs 배치 분할(split) 추론 벤치마크 (CPU)
+
+임의로 초기화한 작은 HTDemucs 로 스테레오 클립을 분리하면서
+apply_model 의 segment_batch(K, 한 번의 forward 에 넣는 조각 수)별 처리 시간과
+K=1 결과와의 차이를 출력합니다. K=0 은 --memory-mb 예산으로 K 를 정합니다.
+K=1 은 조각마다 모델을 한 번씩 실행하는 기존 방식과 같습니다.
+
+    python -m benchmarks.bench_demucs_batch --seconds 60 --batch-sizes 1 2 4 8 0
+    python -m benchmarks.bench_demucs_batch --jobs 2 --channels 48
+"""
+import argparse
+import time
+
+import torch
+
+from src.demucs.apply import apply_model, segment_batch_size, DEFAULT_BATCH_MEMORY_MB
+from src.demucs.htdemucs import HTDemucs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 0])
+    parser.add_argument('--channels', type=int, default=16, help='HTDemucs channels (pretrained htdemucs: 48)')
+    parser.add_argument('--segment', type=float, default=7.8)
+    parser.add_argument('--memory-mb', type=float, default=DEFAULT_BATCH_MEMORY_MB)
+    parser.add_argument('--jobs', type=int, default=0, help='apply_model num_workers')
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    model = HTDemucs(sources=['drums', 'bass', 'other', 'vocals'], channels=args.channels, segment=args.segment).eval()
+    mix = torch.randn(1, model.audio_channels, int(args.seconds * model.samplerate)) * 0.1
+    segment_length = int(args.segment * model.samplerate)
+    print(f'{args.seconds:.0f}s clip, {len(range(0, mix.shape[-1], int(0.75 * segment_length)))} segments of {args.segment}s, '
+          f'channels = {args.channels}, jobs = {args.jobs}, torch threads = {torch.get_num_threads()}, '
+          f'auto K = {segment_batch_size(model, segment_length, 1, args.memory_mb)} ({args.memory_mb:.0f}MB)')
+
+    apply_model(model, mix[..., :segment_length], shifts=0, split=True)     # 워밍업
+    reference = None
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        out = apply_model(model, mix, shifts=0, split=True, overlap=0.25, num_workers=args.jobs,
+                          segment_batch=batch_size, batch_memory_mb=args.memory_mb)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = out
+        diff = (out - reference).abs().max().item()
+        print(f'  K {batch_size:3d}: {elapsed:7.2f}s, RTF {elapsed / args.seconds:.3f}, max diff {diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Demucs 분리 경로 벤치마크
+
+짧은 트랙 --tracks 개를 보컬 / 반주로 분리하면서 파일당 소요 시간을 비교합니다.
+- subprocess: 파일마다 python -m demucs.separate 를 실행하고 float32 WAV 를 ffmpeg 로 다시 인코딩하는 기존 경로
+- inprocess : DemucsSeparator 로 모델을 상주시키고 파형을 메모리에서 분리해 최종 형식으로 한 번만 저장
+
+입력은 합성 신호입니다 (model/demucs 의 사전 학습 모델 필요, subprocess 경로는 demucs 패키지 필요).
+
+    python -m benchmarks.bench_demucs_inprocess --tracks 20 --seconds 15 --model htdemucs
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+import torch
+
+from app.abus_demucs import DemucsSeparator
+from app.abus_ffmpeg import ffmpeg_convert_audio
+
+
+SAMPLE_RATE = 44100
+
+
+def make_track(path, seconds, seed):
+    """드럼(잡음 펄스) + 베이스 + 화음 + 보컬과 비슷한 신호"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    beat = (np.sin(2 * np.pi * 2 * t) > 0.95) * rng.standard_normal(len(t)) * 0.3
+    bass = 0.2 * np.sin(2 * np.pi * rng.uniform(50, 80) * t)
+    chord = sum(0.05 * np.sin(2 * np.pi * f * t) for f in rng.uniform(200, 500, 3))
+    f0 = rng.uniform(150, 300) + 20 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8)) * 0.1 * (np.sin(2 * np.pi * 0.3 * t) > 0)
+    mix = beat + bass + chord + voice
+    sf.write(path, np.stack([mix, mix * 0.9], axis=1).astype(np.float32), SAMPLE_RATE)
+
+
+def subprocess_split(input_path, output_dir, demucs_model, audio_format, repo):
+    """변경 전 demucs_split_file"""
+    temp_directory = os.path.join(output_dir, "demucs")
+    file_name = os.path.splitext(os.path.basename(input_path))[0]
+    command = f'"{sys.executable}" -m demucs.separate -n {demucs_model} --two-stems=vocals "{input_path}" -o "{temp_directory}" --float32 --repo "{repo}"'
+    subprocess.run(command, shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for stem, suffix in (("no_vocals", "inst"), ("vocals", "vocal")):
+        stem_file = os.path.join(temp_directory, demucs_model, file_name, f"{stem}.wav")
+        ffmpeg_convert_audio(stem_file, os.path.join(output_dir, f"{file_name}_{demucs_model}_{suffix}.{audio_format}"), audio_format)
+        os.remove(stem_file)
+
+
+def report(name, latencies):
+    rest = latencies[1:] or latencies
+    print(f'{name:10s}: first {latencies[0]:6.2f}s, then mean {statistics.mean(rest):6.2f}s '
+          f'(p50 {statistics.median(rest):6.2f}s), total {sum(latencies):7.1f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--model', default='htdemucs')
+    parser.add_argument('--repo', default=os.path.join('model', 'demucs'))
+    parser.add_argument('--format', default='flac')
+    parser.add_argument('--skip-subprocess', action='store_true')
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory() as folder:
+        tracks = []
+        for i in range(args.tracks):
+            path = os.path.join(folder, f'track_{i:02}.wav')
+            make_track(path, args.seconds, i)
+            tracks.append(path)
+        print(f'{len(tracks)} tracks x {args.seconds:.0f}s, model {args.model}')
+
+        if not args.skip_subprocess:
+            latencies = []
+            for path in tracks:
+                start = time.perf_counter()
+                subprocess_split(path, folder, args.model, args.format, args.repo)
+                latencies.append(time.perf_counter() - start)
+            report('subprocess', latencies)
+
+        separator = DemucsSeparator(repo=args.repo)
+        latencies = []
+        for path in tracks:
+            start = time.perf_counter()
+            separator.split_file(path, folder, args.model, args.format)
+            latencies.append(time.perf_counter() - start)
+        report('inprocess', latencies)
+        for name in ('load', 'separate', 'write'):
+            print(f'  inprocess {name:8s}: mean {statistics.mean(t[name] for t in separator.timings):6.2f}s')
+
+
+if __name__ == '__main__':
+    main()
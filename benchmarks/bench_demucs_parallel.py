@@ -0,0 +1,60 @@
+"""
+Demucs 백 모델 / shift 병렬 실행 벤치마크 (CPU)
+
+임의로 초기화한 작은 HTDemucs --models 개의 백(htdemucs_ft 와 같은 구성)으로 스테레오 클립을 분리하면서
+apply_model 의 parallel_jobs 별 처리 시간과 순차 실행 결과와의 차이를 출력합니다.
+parallel_jobs=0 은 하위 모델과 shift 를 하나씩 실행하는 기존 방식입니다.
+shift 위치는 매번 같게 고정해 결과를 비교합니다. 코어가 여러 개인 장비에서 실행하세요.
+
+    python -m benchmarks.bench_demucs_parallel --models 4 --jobs 0 2 4
+    python -m benchmarks.bench_demucs_parallel --models 1 --shifts 4 --jobs 0 4 --threads-per-job 2
+"""
+import argparse
+import os
+import random
+import time
+
+import torch
+
+from src.demucs.apply import apply_model, BagOfModels
+from src.demucs.htdemucs import HTDemucs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--models', type=int, default=4, help='bag size (htdemucs_ft: 4)')
+    parser.add_argument('--shifts', type=int, default=1)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[0, 2, 4], help='parallel_jobs values')
+    parser.add_argument('--threads-per-job', type=int, default=0, help='0 = split the threads between the jobs')
+    parser.add_argument('--channels', type=int, default=16, help='HTDemucs channels (pretrained htdemucs: 48)')
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    # 병렬 실행은 shift 위치를 미리 뽑으므로 난수 순서가 달라진다. 비교를 위해 가운데로 고정한다
+    random.randint = lambda a, b: (a + b) // 2
+    torch.manual_seed(0)
+    sources = ['drums', 'bass', 'other', 'vocals']
+    models = [HTDemucs(sources=sources, channels=args.channels, segment=7.8).eval() for _ in range(args.models)]
+    model = BagOfModels(models) if len(models) > 1 else models[0]
+    mix = torch.randn(1, 2, int(args.seconds * models[0].samplerate)) * 0.1
+    print(f'{args.seconds:.0f}s clip, {args.models} models x {args.shifts} shifts, channels = {args.channels}, '
+          f'torch threads = {torch.get_num_threads()}, cpus = {os.cpu_count()}')
+
+    apply_model(models[0], mix[..., :models[0].samplerate], shifts=0)      # 워밍업
+    reference = None
+    for jobs in args.jobs:
+        start = time.perf_counter()
+        out = apply_model(model, mix, shifts=args.shifts, split=True, overlap=0.25,
+                          parallel_jobs=jobs, threads_per_job=args.threads_per_job)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = out
+        diff = (out - reference).abs().max().item()
+        print(f'  parallel_jobs {jobs:2d}: {elapsed:7.2f}s, RTF {elapsed / args.seconds:.3f}, max diff {diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+F5-TTS 배치 생성 벤치마크 (CPU, 작은 랜덤 DiT)
+
+같은 참조 음성을 쓰는 자막 줄을 F5TTS.infer_reference_batch 로 합성하면서 배치(길이 버킷) 크기와
+ODE 샘플링 단계 수(nfe_step)별 처리량을 비교합니다. 체크포인트 없이 돌도록 DiT / Vocos 를 작은 랜덤 설정으로 만듭니다.
+- batch 1: 조각마다 따로 샘플링하고 보코딩 (infer_reference 와 같은 경로)
+- batch N: 생성 길이순으로 N 조각씩 묶어 패딩한 배치로 샘플링 (보코딩은 조각마다 제 길이로)
+
+    python -m benchmarks.bench_f5_batch --lines 64 --batch-sizes 1,4,8,16 --nfe-steps 32,16
+"""
+import argparse
+import os
+import string
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+import torch
+
+from app.abus_tts_f5 import F5TTS, F5ReferenceCache
+from f5_tts.model import CFM, DiT
+from vocos import Vocos
+from vocos.feature_extractors import MelSpectrogramFeatures
+from vocos.models import VocosBackbone
+from vocos.heads import ISTFTHead
+
+
+WORDS = ('the quick brown fox jumps over a lazy dog while seven bright stars '
+         'shine above the quiet harbor and distant ships return home').split()
+
+REF_TEXT = 'Seven bright stars shine above the quiet harbor. '
+
+
+def make_lines(lines):
+    return [' '.join(WORDS[(i * 3 + j) % len(WORDS)] for j in range(4 + i % 12)).capitalize() + '.' for i in range(lines)]
+
+
+def make_model(dim, depth):
+    vocab_char_map = {c: i for i, c in enumerate(string.printable)}
+    transformer = DiT(dim=dim, depth=depth, heads=2, dim_head=dim // 2, ff_mult=2, text_dim=dim // 2,
+                      conv_layers=1, text_num_embeds=len(vocab_char_map), mel_dim=100)
+    model = CFM(
+        transformer=transformer,
+        mel_spec_kwargs=dict(n_fft=1024, hop_length=256, win_length=1024, n_mel_channels=100,
+                             target_sample_rate=24000, mel_spec_type='vocos'),
+        odeint_kwargs=dict(method='euler'),
+        vocab_char_map=vocab_char_map,
+    )
+    return model.eval()
+
+
+def make_vocoder(dim):
+    vocoder = Vocos(
+        MelSpectrogramFeatures(sample_rate=24000, n_fft=1024, hop_length=256, n_mels=100, padding='center'),
+        VocosBackbone(input_channels=100, dim=dim, intermediate_dim=dim * 3, num_layers=2),
+        ISTFTHead(dim=dim, n_fft=1024, hop_length=256, padding='center'),
+    )
+    return vocoder.eval()
+
+
+def make_reference(model, seconds=3.0):
+    ref_file = os.path.join(tempfile.mkdtemp(), 'ref.wav')
+    t = np.arange(int(24000 * seconds)) / 24000
+    sf.write(ref_file, (0.2 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), 24000)
+    return F5ReferenceCache(max_entries=0).reference(ref_file, REF_TEXT, model)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=64)
+    parser.add_argument('--batch-sizes', default='1,4,8,16')
+    parser.add_argument('--nfe-steps', default='32,16')
+    parser.add_argument('--dim', type=int, default=128)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+
+    tts = F5TTS.__new__(F5TTS)      # 체크포인트 / 보코더 다운로드 없이 모델만 끼운다
+    tts.ema_model = make_model(args.dim, args.depth)
+    tts.vocoder = make_vocoder(args.dim)
+    reference = make_reference(tts.ema_model)
+    items = [(line, 1.0) for line in make_lines(args.lines)]
+    print(f'{len(items)} lines, DiT dim {args.dim} x {args.depth}, reference {reference.frames} frames, threads = {torch.get_num_threads()}')
+
+    # 첫 호출의 초기화 비용을 측정에서 뺀다
+    tts.infer_reference_batch(reference, items[:2], nfe_step=2, batch_size=2)
+
+    for nfe_step in [int(step) for step in args.nfe_steps.split(',')]:
+        baseline = None
+        for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+            start = time.perf_counter()
+            waves = tts.infer_reference_batch(reference, items, nfe_step=nfe_step, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            audio = sum(len(wave) for wave in waves if wave is not None) / 24000
+            baseline = baseline or elapsed
+            print(f'nfe {nfe_step:3d}, batch {batch_size:3d}: {elapsed:7.2f}s, {len(items) / elapsed:6.2f} lines/s, '
+                  f'RTF {elapsed / max(1e-9, audio):.3f}, x{baseline / elapsed:.2f}')
+
+
+if __name__ == '__main__':
+    main()
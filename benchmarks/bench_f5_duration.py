@@ -0,0 +1,112 @@
+"""
+F5-TTS 길이 계획 벤치마크
+
+자막 줄을 F5TTS 로 합성할 때 자막 구간에 맞추려고 다시 합성하던 횟수를 비교합니다.
+- before: 줄마다 합성한 뒤 길이를 재고, 구간의 70% 보다 짧으면 속도를 늦춰 한 번 더 합성하는 기존 동작
+- after: F5DurationPlanner 로 합성 전에 속도를 정해 줄마다 한 번만 합성
+
+기본은 계획만 실행해 다시 합성하지 않게 된 줄 수를 셉니다. --synthesize N 을 주면 앞쪽 N 줄을 실제로 합성해
+before / after 의 합성 횟수와 시간을 잽니다.
+
+    python -m benchmarks.bench_f5_duration --ref-audio ref.wav --ref-text "참조 음성 대사" --lines 200
+    python -m benchmarks.bench_f5_duration --ref-audio ref.wav --ref-text "참조 음성 대사" --srt subtitle.srt --synthesize 20
+"""
+import argparse
+import time
+
+import pysubs2
+
+from app.abus_tts_f5 import F5TTS, F5DurationPlanner, f5_reference_cache, F5_SLOT_MIN_RATIO, F5_SLOT_TARGET_RATIO, F5_MIN_SPEED
+from app.abus_audio import TTS_SAMPLE_RATE
+from app.abus_text import AbusText
+from benchmarks.bench_f5_reference import MelModel
+from f5_tts.infer.utils_infer import preprocess_ref_audio_text, device, hop_length, target_sample_rate
+
+
+WORDS = ('the quick brown fox jumps over a lazy dog while seven bright stars '
+         'shine above the quiet harbor and distant ships return home').split()
+
+
+def make_subs(lines):
+    """대사 길이와 자막 구간 길이가 줄마다 다른 자막 (짧은 대사에 긴 구간이 섞인다)"""
+    subs = pysubs2.SSAFile()
+    start = 0
+    for i in range(lines):
+        text = ' '.join(WORDS[(i * 3 + j) % len(WORDS)] for j in range(2 + i % 12)).capitalize() + '.'
+        slot = 1500 + (i * 7919) % 5000
+        subs.append(pysubs2.SSAEvent(start=start, end=start + slot, text=text))
+        start += slot + 300
+    return subs
+
+
+def synthesize_before(tts, line, ref_audio, ref_text, speed_factor, target_duration_sec):
+    """길이 계획 도입 전의 srt_to_voice 한 줄 (합성 -> 길이 측정 -> 필요하면 다시 합성)"""
+    samples = tts.synthesize(line, ref_audio, ref_text, speed_factor)
+    passes = 1
+    if samples is not None:
+        seg_duration_sec = len(samples) / TTS_SAMPLE_RATE
+        if seg_duration_sec < target_duration_sec * F5_SLOT_MIN_RATIO:
+            new_speed = max(F5_MIN_SPEED, speed_factor * (seg_duration_sec / (target_duration_sec * F5_SLOT_TARGET_RATIO)))
+            if new_speed < speed_factor - 0.1:
+                regenerated = tts.synthesize(line, ref_audio, ref_text, new_speed)
+                passes += 1
+                if regenerated is not None:
+                    samples = regenerated
+    return samples, passes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ref-audio', required=True)
+    parser.add_argument('--ref-text', required=True)
+    parser.add_argument('--srt', default=None, help='자막 파일 (없으면 --lines 줄짜리 자막을 만듭니다)')
+    parser.add_argument('--lines', type=int, default=200)
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--synthesize', type=int, default=0, help='실제로 합성해 비교할 줄 수 (0 = 계획만)')
+    parser.add_argument('--model', default='SWivid/F5-TTS_v1')
+    args = parser.parse_args()
+
+    subs = pysubs2.load(args.srt, encoding='utf-8') if args.srt else make_subs(args.lines)
+    ref_audio, ref_text = preprocess_ref_audio_text(args.ref_audio, args.ref_text)
+    reference = f5_reference_cache.reference(ref_audio, ref_text, MelModel().to(device))
+    planner = F5DurationPlanner(reference)
+
+    start = time.perf_counter()
+    planned = []
+    for line in subs:
+        slot = (line.end - line.start) / 1000.0
+        text = AbusText.normalize_text(line.text)
+        planned.append((planner.predict(text, args.speed), planner.plan(text, slot, args.speed), slot))
+    elapsed = time.perf_counter() - start
+
+    adjusted = sum(1 for _, speed, _ in planned if speed != args.speed)
+    print(f'{len(subs)} lines, reference {reference.frames * hop_length / target_sample_rate:.2f}s, planned in {elapsed * 1000:.1f}ms')
+    print(f'planned at a slower speed: {adjusted} lines -> {adjusted} regenerations avoided '
+          f'({len(subs) + adjusted} -> {len(subs)} infer_process calls)')
+
+    if args.synthesize:
+        tts = F5TTS()
+        tts.select_model(args.model)
+        lines = list(subs)[:args.synthesize]
+
+        start = time.perf_counter()
+        passes = 0
+        for line in lines:
+            _, line_passes = synthesize_before(tts, line.text, ref_audio, ref_text, args.speed, (line.end - line.start) / 1000.0)
+            passes += line_passes
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fits = 0
+        for line, (_, speed, slot) in zip(lines, planned):
+            samples = tts.synthesize(line.text, ref_audio, ref_text, speed)
+            fits += samples is not None and len(samples) / TTS_SAMPLE_RATE >= slot * F5_SLOT_MIN_RATIO
+        after = time.perf_counter() - start
+
+        print(f'before: {passes} passes for {len(lines)} lines, {before:.1f}s')
+        print(f'after : {len(lines)} passes for {len(lines)} lines, {after:.1f}s, x{before / max(1e-9, after):.2f}, '
+              f'{fits}/{len(lines)} lines fill at least {F5_SLOT_MIN_RATIO:.0%} of the slot')
+
+
+if __name__ == '__main__':
+    main()
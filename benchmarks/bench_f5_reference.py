@@ -0,0 +1,119 @@
+"""
+F5-TTS 참조 음성 캐시 벤치마크
+
+두 화자 대화(infer_multi)를 합성할 때 DiT / 보코더 앞의 참조 음성 준비 시간만 잽니다.
+- before: 작업마다 preprocess_ref_audio_text, 줄마다 참조 wav 읽기 / 정규화 / 리샘플링 / 멜 특징 / 참조 대사 토큰화
+- after: F5ReferenceCache 에 보관한 값을 재사용하고 줄마다 새 대사만 토큰화
+
+    python -m benchmarks.bench_f5_reference --ref-audio1 spk1.wav --ref-text1 "대사 1" --ref-audio2 spk2.wav --ref-text2 "대사 2" --turns 200
+"""
+import argparse
+import statistics
+import time
+
+import torch
+import torchaudio
+
+from app.abus_tts_f5 import F5ReferenceCache
+from f5_tts.infer.utils_infer import preprocess_ref_audio_text, target_sample_rate, target_rms, device
+from f5_tts.model.modules import MelSpec
+from f5_tts.model.utils import convert_char_to_pinyin
+
+
+WORDS = ('the quick brown fox jumps over a lazy dog while seven bright stars '
+         'shine above the quiet harbor and distant ships return home').split()
+
+
+class MelModel(torch.nn.Module):
+    """F5 모델 대신 멜 변환만 가진 객체 (F5ReferenceCache.reference 는 model.mel_spec / model.device 만 씁니다)"""
+    def __init__(self):
+        super().__init__()
+        self.mel_spec = MelSpec(mel_spec_type='vocos')
+        self.register_buffer('anchor', torch.zeros(1))
+
+    @property
+    def device(self):
+        return self.anchor.device
+
+
+def make_turns(turns):
+    return [('spk1' if i % 2 == 0 else 'spk2',
+             ' '.join(WORDS[(i * 3 + j) % len(WORDS)] for j in range(4 + i % 10)).capitalize() + '.') for i in range(turns)]
+
+
+@torch.inference_mode()
+def prepare_before(ref_file, ref_text, gen_text, mel_spec):
+    """캐시 도입 전 infer_process 가 줄마다 하던 참조 음성 준비"""
+    audio, sr = torchaudio.load(ref_file)
+    if audio.shape[0] > 1:
+        audio = torch.mean(audio, dim=0, keepdim=True)
+    rms = torch.sqrt(torch.mean(torch.square(audio)))
+    if rms < target_rms:
+        audio = audio * target_rms / rms
+    if sr != target_sample_rate:
+        audio = torchaudio.transforms.Resample(sr, target_sample_rate)(audio)
+    audio = audio.to(device)
+    if len(ref_text[-1].encode("utf-8")) == 1:
+        ref_text = ref_text + " "
+    text = convert_char_to_pinyin([ref_text + gen_text])
+    return mel_spec(audio).permute(0, 2, 1), text
+
+
+def run_job(turns, speakers, model, cache):
+    latencies = []
+    start = time.perf_counter()
+    if cache is None:
+        refs = {spk: preprocess_ref_audio_text(audio, text, show_info=lambda *args: None) for spk, (audio, text) in speakers.items()}
+    else:
+        refs = {spk: cache.preprocess(audio, text) for spk, (audio, text) in speakers.items()}
+    job_overhead = time.perf_counter() - start
+
+    for spk, message in turns:
+        ref_file, ref_text = refs[spk]
+        start = time.perf_counter()
+        if cache is None:
+            prepare_before(ref_file, ref_text, message, model.mel_spec)
+        else:
+            reference = cache.reference(ref_file, ref_text, model)
+            text = [reference.tokens + convert_char_to_pinyin([message])[0]]
+        latencies.append(time.perf_counter() - start)
+    return job_overhead, latencies
+
+
+def report(name, job_overhead, latencies):
+    print(f'{name:6s}: job setup {job_overhead * 1000:8.1f}ms, per line mean {statistics.mean(latencies) * 1000:6.2f}ms, '
+          f'p50 {statistics.median(latencies) * 1000:6.2f}ms, total {(job_overhead + sum(latencies)):6.2f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ref-audio1', required=True)
+    parser.add_argument('--ref-text1', required=True)
+    parser.add_argument('--ref-audio2', required=True)
+    parser.add_argument('--ref-text2', required=True)
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--jobs', type=int, default=2, help='같은 화자로 반복하는 작업 수 (두 번째 작업부터 전처리 캐시 적중)')
+    args = parser.parse_args()
+
+    speakers = {'spk1': (args.ref_audio1, args.ref_text1), 'spk2': (args.ref_audio2, args.ref_text2)}
+    turns = make_turns(args.turns)
+    model = MelModel().to(device)
+    cache = F5ReferenceCache(max_entries=8)
+    print(f'{len(turns)} turns, 2 speakers, {args.jobs} jobs, device = {device}')
+
+    before_lines = []
+    after_lines = []
+    for job in range(args.jobs):
+        job_overhead, latencies = run_job(turns, speakers, model, None)
+        report('before', job_overhead, latencies)
+        before_lines += latencies
+        job_overhead, latencies = run_job(turns, speakers, model, cache)
+        report('after', job_overhead, latencies)
+        after_lines += latencies
+
+    saved = statistics.mean(before_lines) - statistics.mean(after_lines)
+    print(f'saved per line: {saved * 1000:.2f}ms ({saved * len(turns):.2f}s per {len(turns)}-turn job), cache {cache.stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Kokoro 배치 합성 벤치마크
+
+자막 줄을 KokoroTTS.synthesize_batch 로 합성하면서 배치(길이 버킷) 크기별 처리량을 비교합니다.
+- batch 1: 한 줄씩 합성 (synthesize 와 같은 결과)
+- batch N: 음소 길이순으로 N 줄씩 묶어 패딩한 배치로 합성
+batch 1 결과와의 차이(잡음을 끈 파형의 상대 RMS 오차)는 --check 로 확인합니다.
+
+    python -m benchmarks.bench_kokoro_batch --lines 200 --batch-sizes 1,2,4,8,16 --lang-code a --voice af_heart
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pysubs2
+import torch
+
+from app.abus_tts_kokoro import KokoroTTS, kokoro_pipeline_pool
+from app.abus_voice_kokoro import KokoroVoice
+from app.abus_audio import TTS_SAMPLE_RATE
+from benchmarks.bench_kokoro_pool import make_srt
+
+
+def bench(tts, lines, kokoro_voice, speed_factor, batch_size):
+    torch.manual_seed(0)
+    start = time.perf_counter()
+    results = tts.synthesize_batch(lines, kokoro_voice, speed_factor, batch_size=batch_size)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--srt', default=None, help='자막 파일 (없으면 --lines 줄짜리 자막을 만듭니다)')
+    parser.add_argument('--lines', type=int, default=200)
+    parser.add_argument('--batch-sizes', default='1,2,4,8,16')
+    parser.add_argument('--lang-code', default='a')
+    parser.add_argument('--voice', default='af_heart')
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--check', action='store_true', help='batch 1 과의 오차 측정 (잡음 생성을 끄고 한 번 더 합성)')
+    parser.add_argument('--threads', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    srt_file = args.srt
+    if srt_file is None:
+        srt_file = os.path.join(tempfile.mkdtemp(), 'bench.srt')
+        make_srt(args.lines, srt_file)
+    lines = [line.text for line in pysubs2.load(srt_file, encoding='utf-8')]
+    kokoro_voice = KokoroVoice('', args.lang_code, args.voice, '', args.voice, '')
+    tts = KokoroTTS()
+    print(f'{len(lines)} lines, lang_code = {args.lang_code}, voice = {args.voice}, device = {kokoro_pipeline_pool.device}, threads = {torch.get_num_threads()}')
+
+    # 모델 / G2P / 목소리 팩 로드를 측정에서 뺀다
+    tts.synthesize_batch(lines[:1], kokoro_voice, args.speed, batch_size=1)
+
+    baseline = None
+    for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+        elapsed, results = bench(tts, lines, kokoro_voice, args.speed, batch_size)
+        audio = sum(len(samples) for samples in results if samples is not None) / TTS_SAMPLE_RATE
+        baseline = baseline or elapsed
+        print(f'batch {batch_size:3d}: {elapsed:7.2f}s, {len(lines) / elapsed:6.2f} lines/s, '
+              f'RTF {elapsed / max(1e-9, audio):.3f}, x{baseline / elapsed:.2f}')
+
+    if args.check:
+        # SineGen 의 잡음 / 초기 위상을 끄면 batch 1 과 배치 결과를 직접 비교할 수 있다
+        rand, randn_like = torch.rand, torch.randn_like
+        torch.randn_like = lambda x, *args, **kwargs: torch.zeros_like(x)
+        torch.rand = lambda *size, **kwargs: torch.zeros(*size, device=kwargs.get('device'))
+        try:
+            reference = tts.synthesize_batch(lines, kokoro_voice, args.speed, batch_size=1)
+            for batch_size in [int(size) for size in args.batch_sizes.split(',')][1:]:
+                results = tts.synthesize_batch(lines, kokoro_voice, args.speed, batch_size=batch_size)
+                errors = []
+                for a, b in zip(reference, results):
+                    if a is None or b is None or len(a) != len(b):
+                        continue
+                    errors.append(np.sqrt(np.mean((a - b) ** 2)) / (np.sqrt(np.mean(a ** 2)) + 1e-9))
+                print(f'batch {batch_size:3d}: same length {len(errors)}/{len(lines)}, '
+                      f'relative RMS error mean {np.mean(errors):.2e}, max {np.max(errors):.2e}')
+        finally:
+            torch.rand, torch.randn_like = rand, randn_like
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Kokoro 파이프라인 풀 벤치마크
+
+자막 줄마다 Kokoro 합성(KokoroTTS.synthesize)을 실행하면서 초당 처리 줄 수를 비교합니다.
+- before: 줄마다 KPipeline(lang_code=...)을 새로 만들어 모델 / G2P / 목소리 팩을 다시 읽는 기존 동작
+          (오래 걸리므로 앞쪽 --before-lines 줄만 측정합니다)
+- after: 모델 레지스트리에 보관된 파이프라인 풀을 재사용
+
+    python -m benchmarks.bench_kokoro_pool --lines 300 --lang-code a --voice af_heart
+    python -m benchmarks.bench_kokoro_pool --srt subtitle.srt --lang-code a --voice af_heart
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pysubs2
+import torch
+
+from app.abus_tts_kokoro import KokoroTTS, KOKORO_REPO_ID, kokoro_pipeline_pool
+from app.abus_voice_kokoro import KokoroVoice
+from app.abus_model_registry import model_registry
+from app.abus_audio import AbusAudio
+from app.abus_text import AbusText
+from kokoro import KPipeline
+
+
+WORDS = ('the quick brown fox jumps over a lazy dog while seven bright stars '
+         'shine above the quiet harbor and distant ships return home').split()
+
+
+def make_srt(lines, srt_file):
+    subs = pysubs2.SSAFile()
+    for i in range(lines):
+        text = ' '.join(WORDS[(i * 3 + j) % len(WORDS)] for j in range(4 + i % 10)).capitalize() + '.'
+        subs.append(pysubs2.SSAEvent(start=i * 3000, end=i * 3000 + 2500, text=text))
+    subs.save(srt_file)
+
+
+def synthesize_before(line, kokoro_voice, speed_factor):
+    """풀 도입 전의 KokoroTTS.synthesize"""
+    line = AbusText.normalize_text(line)
+    pipeline = KPipeline(lang_code=kokoro_voice.lang_code, repo_id=KOKORO_REPO_ID)
+    for gs, ps, audio in pipeline(line, voice=kokoro_voice.voice_code, speed=speed_factor, split_pattern=None):
+        return AbusAudio.prepare_segment(np.asarray(audio, dtype=np.float32), 24000)
+    return None
+
+
+def bench(synthesize, lines, kokoro_voice, speed_factor):
+    start = time.perf_counter()
+    samples = 0
+    for line in lines:
+        audio = synthesize(line, kokoro_voice, speed_factor)
+        samples += 0 if audio is None else len(audio)
+    elapsed = time.perf_counter() - start
+    return elapsed, samples
+
+
+def report(name, lines, elapsed, samples):
+    print(f'{name:6s}: {lines:4d} lines in {elapsed:7.2f}s, {lines / elapsed:6.2f} lines/s, '
+          f'{elapsed / lines * 1000:7.1f}ms/line, audio {samples / 24000:7.1f}s, RTF {elapsed / max(1e-9, samples / 24000):.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--srt', default=None, help='자막 파일 (없으면 --lines 줄짜리 자막을 만듭니다)')
+    parser.add_argument('--lines', type=int, default=300)
+    parser.add_argument('--before-lines', type=int, default=30)
+    parser.add_argument('--lang-code', default='a')
+    parser.add_argument('--voice', default='af_heart')
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--skip-before', action='store_true')
+    parser.add_argument('--threads', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    srt_file = args.srt
+    if srt_file is None:
+        srt_file = os.path.join(tempfile.mkdtemp(), 'bench.srt')
+        make_srt(args.lines, srt_file)
+    lines = [line.text for line in pysubs2.load(srt_file, encoding='utf-8')]
+    kokoro_voice = KokoroVoice('', args.lang_code, args.voice, '', args.voice, '')
+    tts = KokoroTTS()
+    print(f'{len(lines)} lines, lang_code = {args.lang_code}, voice = {args.voice}, device = {kokoro_pipeline_pool.device}, threads = {torch.get_num_threads()}')
+
+    if not args.skip_before:
+        before_lines = lines[:args.before_lines]
+        report('before', len(before_lines), *bench(synthesize_before, before_lines, kokoro_voice, args.speed))
+
+    report('after', len(lines), *bench(tts.synthesize, lines, kokoro_voice, args.speed))
+    stats = model_registry.stats()
+    print(f"model registry: hits {stats['hits']}, misses {stats['misses']}, saved {stats['saved_time']:.1f}s of loading")
+
+
+if __name__ == '__main__':
+    main()
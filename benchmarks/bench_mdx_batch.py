@@ -0,0 +1,84 @@
+"""
+MDX-Net 배치 추론 벤치마크 (CPU)
+
+5분 길이 스테레오 클립에 대해 MDX.process_wave 를 배치 크기별로 실행하고
+처리 시간과 batch_size=1 결과와의 차이를 출력합니다.
+--model 을 지정하지 않으면 Voc_FT 와 같은 입력 크기(dim_f=3072, dim_t=256, n_fft=7680)의
+2층 합성곱 ONNX 모델을 만들어 사용합니다 (onnx 패키지 필요).
+
+    python -m benchmarks.bench_mdx_batch --batch-sizes 1 2 4 8
+    python -m benchmarks.bench_mdx_batch --model model/mdxnet-model/UVR-MDX-NET-Voc_FT.onnx
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from src.aicover.mdx import MDX, MDXModel, DEFAULT_SR
+
+
+def make_stand_in_model(path, dim_f, dim_t, channels=32, seed=0):
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+
+    rng = np.random.default_rng(seed)
+    w1 = numpy_helper.from_array((rng.standard_normal((channels, 4, 3, 3)) * 0.1).astype(np.float32), 'w1')
+    w2 = numpy_helper.from_array((rng.standard_normal((4, channels, 3, 3)) * 0.1).astype(np.float32), 'w2')
+    nodes = [
+        helper.make_node('Conv', ['input', 'w1'], ['h1'], pads=[1, 1, 1, 1]),
+        helper.make_node('Relu', ['h1'], ['h2']),
+        helper.make_node('Conv', ['h2', 'w2'], ['output'], pads=[1, 1, 1, 1]),
+    ]
+    graph = helper.make_graph(nodes, 'mdx_stand_in',
+                              [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['batch', 4, dim_f, dim_t])],
+                              [helper.make_tensor_value_info('output', TensorProto.FLOAT, ['batch', 4, dim_f, dim_t])],
+                              [w1, w2])
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--model-data', default=os.path.join('model', 'mdxnet-model', 'model_data.json'))
+    parser.add_argument('--seconds', type=float, default=300)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=0, help='onnxruntime intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.model:
+            with open(args.model_data) as infile:
+                mp = json.load(infile)[MDX.get_hash(args.model)]
+            dim_f, dim_t, n_fft = mp['mdx_dim_f_set'], 2 ** mp['mdx_dim_t_set'], mp['mdx_n_fft_scale_set']
+            model_path = args.model
+        else:
+            dim_f, dim_t, n_fft = 3072, 256, 7680
+            model_path = os.path.join(folder, 'stand_in.onnx')
+            make_stand_in_model(model_path, dim_f, dim_t)
+
+        params = MDXModel(torch.device('cpu'), dim_f=dim_f, dim_t=dim_t, n_fft=n_fft)
+        mdx = MDX(model_path, params, intra_op_threads=args.threads)
+
+        rng = np.random.default_rng(0)
+        wave = (0.1 * rng.standard_normal((2, int(DEFAULT_SR * args.seconds)))).astype(np.float32)
+        print(f'{args.seconds:.0f}s stereo, dim_f={dim_f}, dim_t={dim_t}, adaptive batch size = {mdx.batch_size_for()}')
+
+        reference = None
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            processed = mdx.process_wave(wave, 1, batch_size)
+            elapsed = time.perf_counter() - start
+            if reference is None:
+                reference = processed
+            diff = np.abs(processed - reference).max()
+            print(f'  batch_size {batch_size:3d}: {elapsed:7.2f}s, {args.seconds / elapsed:6.1f}x realtime, max diff {diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+모델 레지스트리 벤치마크
+
+파일마다 모델을 새로 로드하던 기존 방식과 AbusModelRegistry에서 빌려 쓰는 방식을 비교합니다.
+기본값은 디스크에서 가중치 파일을 읽는 가짜 모델이며, faster-whisper가 설치되어 있으면
+--model 옵션으로 실제 CTranslate2 모델을 사용할 수 있습니다.
+
+    python -m benchmarks.bench_model_registry --files 10 --size-mb 512
+    python -m benchmarks.bench_model_registry --files 5 --model tiny --compute-type int8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.abus_model_registry import AbusModelRegistry
+
+
+def make_fake_loader(size_mb, folder):
+    path = os.path.join(folder, 'weights.npy')
+    np.save(path, np.ones(size_mb * 1024 * 1024 // 4, dtype=np.float32))
+
+    def loader():
+        return np.load(path)
+    return loader
+
+
+def make_whisper_loader(model_size, compute_type):
+    import faster_whisper
+
+    def loader():
+        return faster_whisper.WhisperModel(
+            model_size_or_path=model_size,
+            device='cpu',
+            download_root=os.path.join('model', 'faster-whisper'),
+            compute_type=compute_type
+        )
+    return loader
+
+
+def bench_reload(loader, files):
+    start = time.perf_counter()
+    for _ in range(files):
+        model = loader()
+        del model
+    return time.perf_counter() - start
+
+
+def bench_registry(loader, files, key, size_mb):
+    registry = AbusModelRegistry(budget_mb=0, idle_timeout=0)
+    start = time.perf_counter()
+    for _ in range(files):
+        with registry.borrow(key, loader, size_mb):
+            pass
+    return time.perf_counter() - start, registry.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--size-mb', type=int, default=512)
+    parser.add_argument('--model', default=None, help='faster-whisper 모델 크기 (예: tiny)')
+    parser.add_argument('--compute-type', default='int8')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.model:
+            loader = make_whisper_loader(args.model, args.compute_type)
+            key = ('faster-whisper', args.model, args.compute_type, 'cpu')
+        else:
+            loader = make_fake_loader(args.size_mb, folder)
+            key = ('fake', f'{args.size_mb}MB', 'float32', 'cpu')
+
+        reload_time = bench_reload(loader, args.files)
+        registry_time, stats = bench_registry(loader, args.files, key, args.size_mb)
+
+    print(f'{args.files} files: reload {reload_time:8.2f}s, registry {registry_time:8.2f}s, speedup {reload_time / registry_time:6.1f}x')
+    print(f'  hits = {stats["hits"]}, misses = {stats["misses"]}, '
+          f'load_time = {stats["load_time"]:.2f}s, saved_time = {stats["saved_time"]:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+CosyVoice2 Qwen2LM 디코딩 토큰 처리량 벤치마크 (CPU)
+
+임의 가중치의 작은 Qwen2 설정으로 Qwen2LM 을 만들어 음성 토큰 생성 속도(tokens/s)를 측정합니다.
+- legacy: 스텝마다 (L, L) tril 마스크를 새로 만들고 HF past_key_values 가 늘어나는 기존 디코딩 (lm_head 포함)
+- static: 미리 할당한 StaticCache 와 미리 만든 인과 마스크의 행 뷰를 쓰는 Qwen2LM.inference
+
+EOS 와 특수 토큰을 고르지 않는 greedy 샘플링이므로 두 방식 모두 정확히 max_len 개의 토큰을 만들며, 결과가 같은지도 확인합니다.
+--vocab 기본값은 Qwen2 어휘 크기로, legacy 경로의 lm_head 비용이 실제와 같은 비율로 포함됩니다.
+
+    python -m benchmarks.bench_qwen2lm_decode --text-lens 10 25 50
+"""
+import argparse
+import tempfile
+import time
+
+import torch
+from transformers import Qwen2Config, Qwen2ForCausalLM
+
+from cosyvoice.llm.llm import Qwen2LM, Qwen2Encoder
+
+
+SPEECH_TOKEN_SIZE = 6561
+
+
+def greedy(weighted_scores, decoded_tokens, sampling):
+    # eos 와 특수 토큰은 고르지 않는다
+    return weighted_scores[:SPEECH_TOKEN_SIZE].argmax().unsqueeze(0)
+
+
+def build(folder, hidden, layers, vocab):
+    config = Qwen2Config(vocab_size=vocab, hidden_size=hidden, intermediate_size=hidden * 4, num_hidden_layers=layers,
+                         num_attention_heads=hidden // 64, num_key_value_heads=max(1, hidden // 256), max_position_embeddings=32768)
+    Qwen2ForCausalLM(config).save_pretrained(folder)
+    return Qwen2LM(hidden, hidden, SPEECH_TOKEN_SIZE, Qwen2Encoder(folder), greedy).eval()
+
+
+@torch.inference_mode()
+def legacy(lm, text, prompt_text, prompt_speech_token, max_len):
+    """변경 전 Qwen2LM.inference 의 디코딩 루프"""
+    text = lm.llm.model.model.embed_tokens(torch.concat([prompt_text, text], dim=1))
+    sos_eos_emb = lm.llm_embedding.weight[lm.sos_eos].reshape(1, 1, -1)
+    task_id_emb = lm.llm_embedding.weight[lm.task_id].reshape(1, 1, -1)
+    lm_input = torch.concat([sos_eos_emb, text, task_id_emb, lm.speech_embedding(prompt_speech_token)], dim=1)
+    out_tokens = []
+    cache = None
+    for i in range(max_len):
+        y_pred, cache = lm.llm.forward_one_step(lm_input,
+                                                masks=torch.tril(torch.ones((1, lm_input.shape[1], lm_input.shape[1]), device=lm_input.device)).to(torch.bool),
+                                                cache=cache)
+        logp = lm.llm_decoder(y_pred[:, -1]).log_softmax(dim=-1)
+        top_ids = lm.sampling_ids(logp.squeeze(dim=0), out_tokens, 25, ignore_eos=True).item()
+        out_tokens.append(top_ids)
+        lm_input = lm.speech_embedding.weight[top_ids].reshape(1, 1, -1)
+    return out_tokens
+
+
+def static(lm, text, prompt_text, prompt_speech_token, max_len):
+    return list(lm.inference(text, torch.tensor([text.shape[1]], dtype=torch.int32), prompt_text,
+                             torch.tensor([prompt_text.shape[1]], dtype=torch.int32), prompt_speech_token,
+                             torch.tensor([prompt_speech_token.shape[1]], dtype=torch.int32), torch.zeros(0, 192)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hidden', type=int, default=256)
+    parser.add_argument('--layers', type=int, default=4)
+    parser.add_argument('--vocab', type=int, default=151936)
+    parser.add_argument('--text-lens', type=int, nargs='+', default=[10, 25, 50], help='문장 토큰 수 (음성 토큰은 20배)')
+    parser.add_argument('--prompt-text-len', type=int, default=20)
+    parser.add_argument('--prompt-speech-len', type=int, default=150)
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    with tempfile.TemporaryDirectory() as folder:
+        lm = build(folder, args.hidden, args.layers, args.vocab)
+    prompt_text = torch.randint(0, args.vocab, (1, args.prompt_text_len))
+    prompt_speech_token = torch.randint(0, SPEECH_TOKEN_SIZE, (1, args.prompt_speech_len))
+    print(f'hidden {args.hidden}, layers {args.layers}, vocab {args.vocab}, torch threads = {torch.get_num_threads()}')
+
+    static(lm, torch.randint(0, args.vocab, (1, 2)), prompt_text, prompt_speech_token, 40)     # 워밍업
+    for text_len in args.text_lens:
+        text = torch.randint(0, args.vocab, (1, text_len))
+        max_len = text_len * 20
+        results = {}
+        for name, decode in (('legacy', legacy), ('static', static)):
+            start = time.perf_counter()
+            results[name] = decode(lm, text, prompt_text, prompt_speech_token, max_len)
+            elapsed = time.perf_counter() - start
+            print(f'  text {text_len:3d}, {len(results[name]):4d} tokens, {name}: {elapsed:6.2f}s, {len(results[name]) / elapsed:7.1f} tokens/s')
+        print(f'  same tokens: {results["legacy"] == results["static"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+RVC 자산 캐시 벤치마크
+
+자막 줄마다 RVC 변환을 실행하면서 줄당 지연 시간을 측정합니다.
+- before: 줄마다 asset_cache 를 비워 RMVPE / 임베더 / FAISS 인덱스를 다시 읽는 기존 동작을 재현
+- after : 첫 줄에서 읽은 자산을 계속 재사용
+
+줄 길이는 --srt 의 자막 길이를 사용하고, 없으면 1~4초 사이의 길이로 --lines 개를 만듭니다.
+입력은 발화와 비슷한 합성 신호입니다 (rvc/models 의 사전 학습 모델과 목소리 모델 필요).
+
+    python -m benchmarks.bench_rvc_assets --voice model/rvc-voice/choi --lines 200
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from app.abus_path import path_subfile
+from rvc.infer.infer import VoiceConverter
+from rvc.infer.assets import asset_cache
+
+
+SAMPLE_RATE = 16000
+
+
+def line_durations(srt_file, lines, seed=0):
+    if srt_file:
+        import pysubs2
+        subs = pysubs2.load(srt_file, encoding="utf-8")
+        return [max(0.5, (line.end - line.start) / 1000) for line in subs][:lines]
+    rng = np.random.default_rng(seed)
+    return list(rng.uniform(1, 4, lines))
+
+
+def make_line(path, seconds, seed):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    f0 = rng.uniform(100, 220) + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12)) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))
+    sf.write(path, (0.2 * voice).astype(np.float32), SAMPLE_RATE)
+
+
+def bench(converter, files, index_path, cold):
+    latencies = []
+    for path in files:
+        if cold:
+            asset_cache.evict()
+            converter.hubert_model = None
+        start = time.perf_counter()
+        converter.voice_conversion(
+            sid=0,
+            input_audio_path=path,
+            f0_up_key=0,
+            f0_method="rmvpe",
+            file_index=index_path,
+            index_rate=0.3,
+            rms_mix_rate=1,
+            protect=0.23,
+            hop_length=256,
+            filter_radius=3,
+            embedder_model="contentvec",
+            embedder_model_custom=None,
+        )
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f'{name:7s}: mean {statistics.mean(latencies) * 1000:7.1f}ms, '
+          f'p50 {statistics.median(latencies) * 1000:7.1f}ms, p95 {p95 * 1000:7.1f}ms, total {sum(latencies):7.1f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--voice', required=True, help='.pth / .index 가 들어 있는 목소리 폴더')
+    parser.add_argument('--srt', default=None)
+    parser.add_argument('--lines', type=int, default=200)
+    args = parser.parse_args()
+
+    pth_path = path_subfile(args.voice, ".pth")
+    index_path = path_subfile(args.voice, ".index")
+
+    converter = VoiceConverter()
+    converter.get_vc(pth_path, 0)
+
+    with tempfile.TemporaryDirectory() as folder:
+        files = []
+        for i, seconds in enumerate(line_durations(args.srt, args.lines)):
+            path = os.path.join(folder, f'line_{i:04}.wav')
+            make_line(path, seconds, i)
+            files.append(path)
+
+        print(f'{len(files)} lines, {sum(sf.info(path).duration for path in files):.0f}s of audio')
+        report('before', bench(converter, files, index_path, cold=True))
+        asset_cache.evict()
+        report('after', bench(converter, files, index_path, cold=False))
+        print(f'asset cache: {asset_cache.stats()}')
+
+
+if __name__ == '__main__':
+    main()
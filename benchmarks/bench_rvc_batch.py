@@ -0,0 +1,155 @@
+"""
+RVC 배치 변환 벤치마크 (CPU)
+
+TTS 줄 길이(1~4초)의 합성 발화 --lines 개를 메모리에서 변환하면서
+배치(버킷) 크기별 처리량(lines/s)과 batch_size=1 결과와의 차이를 출력합니다.
+batch_size=1 은 줄마다 임베더와 net_g.infer 를 한 번씩 실행하는 기존 방식과 같습니다.
+
+--voice 를 지정하면 실제 목소리 모델(.pth / .index)과 rvc/models 의 임베더, RMVPE 를 사용합니다.
+지정하지 않으면 ContentVec 과 같은 합성곱 프런트엔드 + Transformer 임베더와
+업샘플링 합성곱 생성기로 이루어진 대역 모델, pm F0, 임의의 FAISS 인덱스를 사용합니다.
+대역 모델은 배치 처리의 동작과 오버헤드를 확인하기 위한 것이며 실제 모델과 연산량이 다릅니다.
+
+    python -m benchmarks.bench_rvc_batch --batch-sizes 1 2 4 8
+    python -m benchmarks.bench_rvc_batch --voice model/rvc-voice/choi --lines 200
+"""
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from rvc.infer.pipeline import Pipeline, EMBEDDER_CONV_LAYERS
+
+
+SAMPLE_RATE = 16000
+
+
+def make_lines(lines, seed=0):
+    """1~4초 길이의 발화와 비슷한 합성 신호 목록"""
+    rng = np.random.default_rng(seed)
+    audios = []
+    for _ in range(lines):
+        t = np.arange(int(SAMPLE_RATE * rng.uniform(1, 4))) / SAMPLE_RATE
+        f0 = rng.uniform(100, 220) + 30 * np.sin(2 * np.pi * 0.7 * t)
+        phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+        voice = sum(np.sin(k * phase) / k for k in range(1, 12)) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))
+        audios.append((0.2 * voice).astype(np.float32))
+    return audios
+
+
+class StandInEmbedder(torch.nn.Module):
+    """ContentVec 과 같은 프레임 간격(320 샘플)의 합성곱 프런트엔드 + 마스크를 쓰는 Transformer"""
+    def __init__(self, dim=768, layers=4):
+        super().__init__()
+        channels = [1] + [512] * len(EMBEDDER_CONV_LAYERS)
+        self.convs = torch.nn.ModuleList(
+            torch.nn.Conv1d(channels[i], channels[i + 1], kernel, stride)
+            for i, (kernel, stride) in enumerate(EMBEDDER_CONV_LAYERS)
+        )
+        self.proj = torch.nn.Linear(512, dim)
+        layer = torch.nn.TransformerEncoderLayer(dim, 12, dim * 4, dropout=0.0, batch_first=True)
+        self.encoder = torch.nn.TransformerEncoder(layer, layers, enable_nested_tensor=False)
+
+    def extract_features(self, source, padding_mask, output_layer):
+        x = source.unsqueeze(1)
+        for conv in self.convs:
+            x = F.gelu(conv(x))
+        x = self.proj(x.transpose(1, 2))
+        lengths = (~padding_mask).sum(dim=1).tolist()
+        frames = torch.tensor([Pipeline.embedder_frames(length) for length in lengths])
+        mask = torch.arange(x.shape[1])[None, :] >= frames[:, None]
+        return self.encoder(x, src_key_padding_mask=mask), mask
+
+
+class StandInGenerator(torch.nn.Module):
+    """특징 + 피치 임베딩을 400배(40kHz) 업샘플링하는 합성곱 생성기"""
+    def __init__(self, dim=768, hidden=192):
+        super().__init__()
+        self.pre = torch.nn.Conv1d(dim, hidden, 5, padding=2)
+        self.pitch = torch.nn.Embedding(256, hidden)
+        self.ups = torch.nn.ModuleList([
+            torch.nn.ConvTranspose1d(hidden, 96, 20, 10, padding=5),
+            torch.nn.ConvTranspose1d(96, 48, 20, 10, padding=5),
+            torch.nn.ConvTranspose1d(48, 24, 8, 4, padding=2),
+        ])
+        self.post = torch.nn.Conv1d(24, 1, 7, padding=3)
+
+    def infer(self, phone, phone_lengths, pitch, nsff0, sid):
+        mask = (torch.arange(phone.shape[1])[None, :] < phone_lengths[:, None]).unsqueeze(1).float()
+        x = (self.pre(phone.transpose(1, 2)) + self.pitch(pitch).transpose(1, 2)) * mask
+        for up in self.ups:
+            x = F.leaky_relu(up(x), 0.1)
+        return torch.tanh(self.post(x)), mask
+
+
+def stand_in(folder, dim=768, index_size=2000, seed=0):
+    torch.manual_seed(seed)
+    import faiss
+    index = faiss.IndexFlatL2(dim)
+    index.add(np.random.default_rng(seed).standard_normal((index_size, dim)).astype(np.float32))
+    index_path = os.path.join(folder, 'stand_in.index')
+    faiss.write_index(index, index_path)
+
+    config = SimpleNamespace(x_pad=1, x_query=6, x_center=38, x_max=41, is_half=False, device='cpu')
+    tgt_sr = 40000
+    vc = Pipeline(tgt_sr, config)
+    embedder, net_g = StandInEmbedder(dim).eval(), StandInGenerator(dim).eval()
+
+    def convert(audios, batch_size):
+        outputs = vc.pipeline_batch(embedder, net_g, 0, audios, 0, 'pm', index_path, 0.3, 1, 3,
+                                    tgt_sr, 0, 1, 'v2', 0.33, 128, False, batch_size=batch_size)
+        return [audio.astype(np.float32) / 32768 for audio in outputs]
+    return convert
+
+
+def real(voice):
+    from app.abus_path import path_subfile
+    from rvc.infer.infer import VoiceConverter
+
+    converter = VoiceConverter()
+    converter.get_vc(path_subfile(voice, ".pth"), 0)
+    index_path = path_subfile(voice, ".index")
+
+    def convert(audios, batch_size):
+        _, outputs = converter.convert_batch(audios, SAMPLE_RATE, f0_method='rmvpe', file_index=index_path,
+                                             index_rate=0.3, protect=0.23, hop_length=256, batch_size=batch_size)
+        return outputs
+    return convert
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--voice', default=None, help='.pth / .index 가 들어 있는 목소리 폴더')
+    parser.add_argument('--lines', type=int, default=64)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    audios = make_lines(args.lines)
+    print(f'{len(audios)} lines, {sum(len(audio) for audio in audios) / SAMPLE_RATE:.0f}s of audio, '
+          f'torch threads = {torch.get_num_threads()}')
+
+    with tempfile.TemporaryDirectory() as folder:
+        convert = real(args.voice) if args.voice else stand_in(folder)
+        convert(audios[:2], 1)      # 모델 / 인덱스 로드와 워밍업은 제외한다
+
+        reference = None
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            outputs = convert(audios, batch_size)
+            elapsed = time.perf_counter() - start
+            if reference is None:
+                reference = outputs
+            diff = max(np.abs(a - b).max() for a, b in zip(outputs, reference))
+            print(f'  batch_size {batch_size:3d}: {elapsed:7.2f}s, {len(audios) / elapsed:6.2f} lines/s, max diff {diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
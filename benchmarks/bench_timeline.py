@@ -0,0 +1,108 @@
+"""
+타임라인 믹서 벤치마크
+
+기존 srt_to_voice 방식(AudioSegment += 로 이어 붙이기)과 AbusTimeline을 비교합니다.
+세그먼트는 메모리에서 생성하므로 디코딩 비용은 포함되지 않습니다.
+
+    python -m benchmarks.bench_timeline --segments 100 1000 5000
+"""
+import argparse
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+from app.abus_audio import AbusAudio
+from app.abus_timeline import AbusTimeline
+
+
+SAMPLE_RATE = 48000
+
+
+class Line:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+def make_subtitles(count, seed=0):
+    rng = np.random.default_rng(seed)
+    lines, position = [], 0
+    for _ in range(count):
+        position += int(rng.integers(200, 800))
+        duration = int(rng.integers(800, 2500))
+        lines.append(Line(position, position + duration))
+        position += duration
+    return lines
+
+
+def make_segments(lines, pool_size=64, seed=0):
+    rng = np.random.default_rng(seed)
+
+    # 메모리를 아끼기 위해 길이가 다른 세그먼트 몇 개를 돌려 쓴다
+    # 일부는 자막 구간보다 길어서 밀어내기 규칙이 적용된다
+    pool = []
+    for _ in range(pool_size):
+        duration_ms = int(rng.integers(600, 3000))
+        samples = rng.uniform(-0.3, 0.3, size=(SAMPLE_RATE * duration_ms // 1000, 2)).astype(np.float32)
+        pool.append(AbusAudio.array_to_audio(samples, SAMPLE_RATE))
+    return [pool[i % pool_size] for i in range(len(lines))]
+
+
+def render_concat(lines, segments):
+    """기존 srt_to_voice의 결합 방식"""
+    lines = [Line(line.start, line.end) for line in lines]
+    combined_audio = AudioSegment.empty()
+    for i in range(len(lines)):
+        line = lines[i]
+        next_line = lines[i+1] if i < len(lines)-1 else None
+
+        if i == 0:
+            combined_audio += AudioSegment.silent(duration=line.start)
+
+        combined_audio += segments[i]
+
+        if next_line and len(combined_audio) < next_line.start:
+            combined_audio += AudioSegment.silent(duration=next_line.start - len(combined_audio))
+        elif next_line:
+            next_line.start = len(combined_audio)
+            next_line.end = next_line.start + (next_line.end - next_line.start)
+    return combined_audio
+
+
+def render_timeline(lines, segments):
+    timeline = AbusTimeline(duration_ms=lines[-1].end, sample_rate=SAMPLE_RATE)
+    for line, segment in zip(lines, segments):
+        timeline.place_audio(segment, line.start)
+    return timeline.to_audio()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segments", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--skip-concat-above", type=int, default=5000)
+    args = parser.parse_args()
+
+    for count in args.segments:
+        lines = make_subtitles(count)
+        segments = make_segments(lines)
+
+        start = time.perf_counter()
+        timeline_audio = render_timeline(lines, segments)
+        timeline_time = time.perf_counter() - start
+
+        if count > args.skip_concat_above:
+            print(f"{count:6d} segments: timeline {timeline_time:8.2f}s, concat skipped")
+            continue
+
+        start = time.perf_counter()
+        concat_audio = render_concat(lines, segments)
+        concat_time = time.perf_counter() - start
+
+        drift_ms = abs(len(concat_audio) - len(timeline_audio))
+        print(f"{count:6d} segments: concat {concat_time:8.2f}s, timeline {timeline_time:8.2f}s, "
+              f"speedup {concat_time / timeline_time:6.1f}x, length drift {drift_ms}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+무음 제거 마이크로벤치마크
+
+청크 단위 파이썬 루프로 dBFS를 계산하던 기존 구현과
+NumPy로 한 번에 계산하는 AbusAudio.trim_silence_audio / trim_silence_array를 비교합니다.
+
+    python -m benchmarks.bench_trim_silence --seconds 3 10 60
+"""
+import argparse
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+from app.abus_audio import AbusAudio
+
+
+def trim_silence_audio_reference(audio, start_silence_threshold=-50.0, end_silence_threshold=-50.0, chunk_size=10, padding_duration=100):
+    """기존 청크 루프 구현 (비교 기준)"""
+    def detect_first_sound_index(asg, threshold=-50.0, chunk_size=10):
+        for i in range(0, len(asg), chunk_size):
+            chunk = asg[i:i + chunk_size]
+            if chunk.dBFS > threshold and chunk.dBFS != float('-inf'):
+                return i
+        return len(asg)
+
+    def detect_last_sound_index(asg, threshold=-50.0, chunk_size=10):
+        reversed_audio = asg.reverse()
+        for i in range(0, len(reversed_audio), chunk_size):
+            chunk = reversed_audio[i:i + chunk_size]
+            if chunk.dBFS > threshold and chunk.dBFS != float('-inf'):
+                return len(asg) - (i + chunk_size)
+        return 0
+
+    start_index = detect_first_sound_index(audio, start_silence_threshold, chunk_size)
+    end_index = detect_last_sound_index(audio, end_silence_threshold, chunk_size)
+    trimmed_audio = audio[start_index:end_index]
+
+    if padding_duration > 0:
+        return trimmed_audio + AudioSegment.silent(duration=padding_duration)
+    return trimmed_audio
+
+
+def make_speech_like(seconds, sample_rate=48000, channels=2, lead=0.8, tail=1.2, seed=0):
+    """앞뒤에 무음이 있는 합성 음성 신호"""
+    rng = np.random.default_rng(seed)
+    total = int(sample_rate * (lead + seconds + tail))
+    samples = rng.normal(0, 1e-4, size=(total, channels))
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    voice = 0.3 * np.sin(2 * np.pi * 220 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    start = int(sample_rate * lead)
+    samples[start:start + len(voice)] += voice[:, np.newaxis]
+    return AbusAudio.array_to_audio(samples, sample_rate)
+
+
+def timeit(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, nargs="+", default=[3, 10, 60])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for seconds in args.seconds:
+        audio = make_speech_like(seconds)
+        samples = AbusAudio.audio_to_array(audio)
+
+        ref_time, ref = timeit(lambda: trim_silence_audio_reference(audio), args.repeat)
+        new_time, new = timeit(lambda: AbusAudio.trim_silence_audio(audio), args.repeat)
+        arr_time, arr = timeit(lambda: AbusAudio.trim_silence_array(samples, audio.frame_rate), args.repeat)
+
+        parity = ref.raw_data == new.raw_data
+        print(f"{seconds:6.1f}s audio: loop {ref_time * 1000:8.2f}ms, numpy {new_time * 1000:8.2f}ms "
+              f"({ref_time / new_time:5.1f}x), array {arr_time * 1000:8.2f}ms, parity {'OK' if parity else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+EdgeTTS 배치 합성 벤치마크 (오프라인)
+
+edge_tts.Communicate 대신 지연 시간만 흉내 내는 FakeCommunicate를 사용하여
+순차 합성(문장마다 asyncio.run)과 배치 합성(하나의 이벤트 루프 + 동시성 제한)을 비교합니다.
+
+    python -m benchmarks.bench_tts_edge --lines 300 --latency 0.2 --concurrency 8
+"""
+import io
+import argparse
+import asyncio
+import random
+import time
+import wave
+import struct
+import math
+
+from app.abus_tts_edge import EdgeTTS
+
+
+class FakeCommunicate:
+    """edge_tts.Communicate 와 같은 생성자/save() 인터페이스를 갖는 로컬 대체 객체."""
+    latency = 0.2
+    jitter = 0.1
+    failure_rate = 0.0
+    sample_rate = 24000
+
+    def __init__(self, text, voice, rate="+0%", volume="+0%", pitch="+0Hz"):
+        self.text = text
+        self.voice = voice
+
+    async def stream(self):
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if random.random() < self.failure_rate:
+            raise ConnectionError("fake edge-tts failure")
+
+        # 문장 길이에 비례하는 길이의 톤을 돌려준다 (순서 검증용)
+        num_samples = int(self.sample_rate * 0.05 * len(self.text))
+        frames = b"".join(struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * n / self.sample_rate))) for n in range(num_samples))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(frames)
+        yield {"type": "audio", "data": buffer.getvalue()}
+
+    async def save(self, output_file):
+        with open(output_file, "wb") as f:
+            async for chunk in self.stream():
+                f.write(chunk["data"])
+
+
+def expected_frames(text):
+    return int(FakeCommunicate.sample_rate * 0.05 * len(text))
+
+
+def read_frames(data):
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        return wav.getnframes()
+
+
+def bench_sequential(tts, texts):
+    start = time.perf_counter()
+    results = [asyncio.run(tts.generate_audio_retry(text, "fake-voice")) for text in texts]
+    return time.perf_counter() - start, results
+
+
+def bench_batch(tts, texts):
+    start = time.perf_counter()
+    results = asyncio.run(tts.generate_audio_batch(texts, "fake-voice"))
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    FakeCommunicate.latency = args.latency
+    FakeCommunicate.failure_rate = args.failure_rate
+    texts = [f"line {i} " + "x" * random.randint(5, 40) for i in range(args.lines)]
+
+    tts = EdgeTTS(concurrency=args.concurrency, max_retries=5, retry_delay=0.01, communicate=FakeCommunicate)
+
+    if not args.skip_sequential:
+        elapsed, _ = bench_sequential(tts, texts)
+        print(f"sequential : {elapsed:8.2f}s  {args.lines / elapsed:8.1f} lines/s")
+
+    elapsed, results = bench_batch(tts, texts)
+    print(f"batch (c={args.concurrency:<3}): {elapsed:8.2f}s  {args.lines / elapsed:8.1f} lines/s")
+
+    ordered = all(data is not None and read_frames(data) == expected_frames(text) for text, data in zip(texts, results))
+    print(f"ordering   : {'OK' if ordered else 'MISMATCH'}")
+
+if __name__ == "__main__":
+    main()
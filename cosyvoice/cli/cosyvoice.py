@@ -20,6 +20,7 @@ from modelscope import snapshot_download
 import torch
 from cosyvoice.cli.frontend import CosyVoiceFrontEnd
 from cosyvoice.cli.model import CosyVoiceModel, CosyVoice2Model
+from cosyvoice.flow.flow_matching import FlowSolver
 from cosyvoice.utils.file_utils import logging
 from cosyvoice.utils.class_utils import get_model_type
 
@@ -160,6 +161,20 @@ class CosyVoice2(CosyVoice):
     def inference_instruct(self, *args, **kwargs):
         raise NotImplementedError('inference_instruct is not implemented for CosyVoice2!')
 
+    def set_flow_solver(self, solver=None, **kwargs):
+        """Sets the flow decoder solver for every following call.
+
+        Args:
+            solver: FlowSolver, a FlowSolver.PRESETS name, or None for the 10 step euler reference
+            kwargs: FlowSolver arguments, applied on top of a preset name
+        """
+        if isinstance(solver, str):
+            solver = FlowSolver.from_preset(solver, **kwargs)
+        elif solver is None and kwargs:
+            solver = FlowSolver(**kwargs)
+        self.model.flow_solver = solver
+        logging.info('flow solver {}'.format(solver))
+
     def inference_instruct2(self, tts_text, instruct_text, prompt_speech_16k, stream=False, speed=1.0, text_frontend=True):
         assert isinstance(self.model, CosyVoice2Model), 'inference_instruct2 is only implemented for CosyVoice2!'
         for i in tqdm(self.frontend.text_normalize(tts_text, split=True, text_frontend=text_frontend)):
@@ -171,3 +186,42 @@ class CosyVoice2(CosyVoice):
                 logging.info('yield speech len {}, rtf {}'.format(speech_len, (time.time() - start_time) / speech_len))
                 yield model_output
                 start_time = time.time()
+
+    def inference_zero_shot_batch(self, tts_texts, prompt_text, prompt_speech_16k, speed=1.0, text_frontend=True, batch_size=8, flow_solver=None):
+        prompt_text = self.frontend.text_normalize(prompt_text, split=False, text_frontend=text_frontend)
+        return self._inference_batch(tts_texts, lambda i: self.frontend.frontend_zero_shot(i, prompt_text, prompt_speech_16k, self.sample_rate),
+                                     speed, text_frontend, batch_size, flow_solver)
+
+    def inference_cross_lingual_batch(self, tts_texts, prompt_speech_16k, speed=1.0, text_frontend=True, batch_size=8, flow_solver=None):
+        return self._inference_batch(tts_texts, lambda i: self.frontend.frontend_cross_lingual(i, prompt_speech_16k, self.sample_rate),
+                                     speed, text_frontend, batch_size, flow_solver)
+
+    def inference_instruct2_batch(self, tts_texts, instruct_text, prompt_speech_16k, speed=1.0, text_frontend=True, batch_size=8, flow_solver=None):
+        return self._inference_batch(tts_texts, lambda i: self.frontend.frontend_instruct2(i, instruct_text, prompt_speech_16k, self.sample_rate),
+                                     speed, text_frontend, batch_size, flow_solver)
+
+    def _inference_batch(self, tts_texts, frontend, speed, text_frontend, batch_size, flow_solver):
+        """Synthesizes many texts with one speaker prompt, returns one (1, samples) tensor per text (None if empty).
+
+        flow_solver (FlowSolver) overrides set_flow_solver for this call.
+        """
+        texts, owners = [], []
+        for n, tts_text in enumerate(tts_texts):
+            for i in self.frontend.text_normalize(tts_text, split=True, text_frontend=text_frontend):
+                texts.append(i)
+                owners.append(n)
+        if len(texts) == 0:
+            return [None] * len(tts_texts)
+        # the prompt part of model_input is the same for every text, only tokenize the rest
+        model_input = frontend(texts[0])
+        text_token = [model_input.pop('text')] + [self.frontend._extract_text_token(i)[0] for i in texts[1:]]
+        model_input.pop('text_len')
+        start_time = time.time()
+        logging.info('synthesis {} texts in {} pieces'.format(len(tts_texts), len(texts)))
+        tts_speech = self.model.tts_batch(text_token, **model_input, speed=speed, batch_size=batch_size, flow_solver=flow_solver)
+        pieces = [[] for _ in tts_texts]
+        for n, speech in zip(owners, tts_speech):
+            pieces[n].append(speech)
+        speech_len = sum(speech.shape[1] for speech in tts_speech) / self.sample_rate
+        logging.info('speech len {}, rtf {}'.format(speech_len, (time.time() - start_time) / max(speech_len, 1e-6)))
+        return [torch.concat(speech, dim=1) if speech else None for speech in pieces]
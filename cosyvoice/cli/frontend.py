@@ -33,6 +33,7 @@ except ImportError:
     from tn.english.normalizer import Normalizer as EnNormalizer
     use_ttsfrd = False
 from cosyvoice.utils.file_utils import logging
+from cosyvoice.cli.prompt_cache import SpeakerPromptCache
 from cosyvoice.utils.frontend_utils import contains_chinese, replace_blank, replace_corner_mark, remove_bracket, spell_out_number, split_paragraph, is_only_punctuation
 
 
@@ -60,6 +61,8 @@ class CosyVoiceFrontEnd:
         else:
             self.spk2info = {}
         self.allowed_special = allowed_special
+        self.speech_tokenizer_model = speech_tokenizer_model
+        self.prompt_cache = SpeakerPromptCache()
         self.use_ttsfrd = use_ttsfrd
         if self.use_ttsfrd:
             self.frd = ttsfrd.TtsFrontendEngine()
@@ -154,8 +157,7 @@ class CosyVoiceFrontEnd:
         model_input = {'text': tts_text_token, 'text_len': tts_text_token_len, 'llm_embedding': embedding, 'flow_embedding': embedding}
         return model_input
 
-    def frontend_zero_shot(self, tts_text, prompt_text, prompt_speech_16k, resample_rate):
-        tts_text_token, tts_text_token_len = self._extract_text_token(tts_text)
+    def _extract_prompt(self, prompt_text, prompt_speech_16k, resample_rate):
         prompt_text_token, prompt_text_token_len = self._extract_text_token(prompt_text)
         prompt_speech_resample = torchaudio.transforms.Resample(orig_freq=16000, new_freq=resample_rate)(prompt_speech_16k)
         speech_feat, speech_feat_len = self._extract_speech_feat(prompt_speech_resample)
@@ -166,12 +168,21 @@ class CosyVoiceFrontEnd:
             speech_feat, speech_feat_len[:] = speech_feat[:, :2 * token_len], 2 * token_len
             speech_token, speech_token_len[:] = speech_token[:, :token_len], token_len
         embedding = self._extract_spk_embedding(prompt_speech_16k)
-        model_input = {'text': tts_text_token, 'text_len': tts_text_token_len,
-                       'prompt_text': prompt_text_token, 'prompt_text_len': prompt_text_token_len,
-                       'llm_prompt_speech_token': speech_token, 'llm_prompt_speech_token_len': speech_token_len,
-                       'flow_prompt_speech_token': speech_token, 'flow_prompt_speech_token_len': speech_token_len,
-                       'prompt_speech_feat': speech_feat, 'prompt_speech_feat_len': speech_feat_len,
-                       'llm_embedding': embedding, 'flow_embedding': embedding}
+        return {'prompt_text': prompt_text_token, 'prompt_text_len': prompt_text_token_len,
+                'llm_prompt_speech_token': speech_token, 'llm_prompt_speech_token_len': speech_token_len,
+                'flow_prompt_speech_token': speech_token, 'flow_prompt_speech_token_len': speech_token_len,
+                'prompt_speech_feat': speech_feat, 'prompt_speech_feat_len': speech_feat_len,
+                'llm_embedding': embedding, 'flow_embedding': embedding}
+
+    def frontend_prompt(self, prompt_text, prompt_speech_16k, resample_rate):
+        # the prompt is the same for every line of a job, only the tts text changes
+        key = self.prompt_cache.make_key(prompt_speech_16k, prompt_text, resample_rate, self.speech_tokenizer_model)
+        return self.prompt_cache.get(key, partial(self._extract_prompt, prompt_text, prompt_speech_16k, resample_rate), self.device)
+
+    def frontend_zero_shot(self, tts_text, prompt_text, prompt_speech_16k, resample_rate):
+        tts_text_token, tts_text_token_len = self._extract_text_token(tts_text)
+        model_input = {'text': tts_text_token, 'text_len': tts_text_token_len}
+        model_input.update(self.frontend_prompt(prompt_text, prompt_speech_16k, resample_rate))
         return model_input
 
     def frontend_cross_lingual(self, tts_text, prompt_speech_16k, resample_rate):
@@ -20,7 +20,7 @@ import time
 from torch.nn import functional as F
 from contextlib import nullcontext
 import uuid
-from cosyvoice.utils.common import fade_in_out
+from cosyvoice.utils.common import fade_in_out, pad_list
 from cosyvoice.utils.file_utils import convert_onnx_to_trt
 
 
@@ -307,6 +307,8 @@ class CosyVoice2Model(CosyVoiceModel):
         self.speech_window = np.hamming(2 * self.source_cache_len)
         # rtf and decoding related
         self.stream_scale_factor = 1
+        # flow decoder ODE solver, None runs the 10 step euler the model was tuned with
+        self.flow_solver = None
         self.llm_context = torch.cuda.stream(torch.cuda.Stream(self.device)) if torch.cuda.is_available() else nullcontext()
         self.lock = threading.Lock()
         # dict used to store session related variable
@@ -326,7 +328,8 @@ class CosyVoice2Model(CosyVoiceModel):
                                          prompt_feat=prompt_feat.to(self.device),
                                          prompt_feat_len=torch.tensor([prompt_feat.shape[1]], dtype=torch.int32).to(self.device),
                                          embedding=embedding.to(self.device),
-                                         finalize=finalize)
+                                         finalize=finalize,
+                                         solver=self.flow_solver)
         tts_mel = tts_mel[:, :, token_offset * self.flow.token_mel_ratio:]
         # append hift cache
         if self.hift_cache_dict[uuid] is not None:
@@ -409,3 +412,63 @@ class CosyVoice2Model(CosyVoiceModel):
             self.tts_speech_token_dict.pop(this_uuid)
             self.llm_end_dict.pop(this_uuid)
         torch.cuda.empty_cache()
+
+    def tts_batch(self, text, flow_embedding, llm_embedding=torch.zeros(0, 192),
+                  prompt_text=torch.zeros(1, 0, dtype=torch.int32),
+                  llm_prompt_speech_token=torch.zeros(1, 0, dtype=torch.int32),
+                  flow_prompt_speech_token=torch.zeros(1, 0, dtype=torch.int32),
+                  prompt_speech_feat=torch.zeros(1, 0, 80), speed=1.0, batch_size=8, flow_solver=None, **kwargs):
+        """Non-streaming synthesis of many texts that share one speaker prompt.
+
+        The LM decodes texts of similar length together, then flow and hift run on
+        batches of similar speech token length.
+
+        Args:
+            text: list of text token tensors, each (1, text_len)
+            batch_size: number of utterances per LM / flow / hift batch
+            flow_solver: FlowSolver for this call, None uses self.flow_solver
+
+        Returns:
+            list of speech tensors (1, samples) on cpu, in input order
+        """
+        # 1. llm, batched by text length
+        speech_token = [None] * len(text)
+        order = sorted(range(len(text)), key=lambda i: text[i].shape[1])
+        for start in range(0, len(order), batch_size):
+            group = order[start:start + batch_size]
+            with self.llm_context:
+                tokens = self.llm.inference_batch(text=pad_list([text[i][0] for i in group], 0).to(self.device),
+                                                  text_len=torch.tensor([text[i].shape[1] for i in group], dtype=torch.int32).to(self.device),
+                                                  prompt_text=prompt_text.to(self.device),
+                                                  prompt_text_len=torch.tensor([prompt_text.shape[1]], dtype=torch.int32).to(self.device),
+                                                  prompt_speech_token=llm_prompt_speech_token.to(self.device),
+                                                  prompt_speech_token_len=torch.tensor([llm_prompt_speech_token.shape[1]], dtype=torch.int32).to(self.device),
+                                                  embedding=llm_embedding.to(self.device))
+            for i, token in zip(group, tokens):
+                speech_token[i] = token
+
+        # 2. flow and hift, batched by speech token length
+        tts_speech = [torch.zeros(1, 0)] * len(text)
+        order = sorted([i for i in range(len(text)) if len(speech_token[i]) > 0], key=lambda i: len(speech_token[i]))
+        for start in range(0, len(order), batch_size):
+            group = order[start:start + batch_size]
+            tts_mel = self.flow.inference_batch(token=pad_list([torch.tensor(speech_token[i]) for i in group], 0).to(self.device),
+                                                token_len=torch.tensor([len(speech_token[i]) for i in group], dtype=torch.int32).to(self.device),
+                                                prompt_token=flow_prompt_speech_token.to(self.device),
+                                                prompt_token_len=torch.tensor([flow_prompt_speech_token.shape[1]], dtype=torch.int32).to(self.device),
+                                                prompt_feat=prompt_speech_feat.to(self.device),
+                                                prompt_feat_len=torch.tensor([prompt_speech_feat.shape[1]], dtype=torch.int32).to(self.device),
+                                                embedding=flow_embedding.to(self.device),
+                                                solver=flow_solver or self.flow_solver)
+            if speed != 1.0:
+                tts_mel = [F.interpolate(mel, size=int(mel.shape[2] / speed), mode='linear') for mel in tts_mel]
+            # pad by repeating the last frame, a zero log-mel frame is not silence
+            mel_len = [mel.shape[2] for mel in tts_mel]
+            max_mel_len = max(mel_len)
+            batch_mel = torch.concat([F.pad(mel, (0, max_mel_len - mel.shape[2]), mode='replicate') for mel in tts_mel], dim=0)
+            speech, _ = self.hift.inference(speech_feat=batch_mel, cache_source=torch.zeros(1, 1, 0))
+            hop_len = speech.shape[1] // max_mel_len
+            for j, i in enumerate(group):
+                tts_speech[i] = speech[j:j + 1, :mel_len[j] * hop_len].cpu()
+        torch.cuda.empty_cache()
+        return tts_speech
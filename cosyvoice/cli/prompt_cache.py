@@ -0,0 +1,119 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+from cosyvoice.utils.file_utils import logging
+
+
+class SpeakerPromptCache:
+    """
+    LRU cache of speaker-prompt features for zero-shot, cross-lingual and instruct2 inference.
+
+    The prompt text tokens, prompt speech feat / speech tokens and the CAMPPlus embedding depend
+    only on the prompt audio, the prompt text and the output sample rate, so they are computed once
+    and reused for every line of a job. Cached tensors are shared between calls and must be treated
+    as read-only. With cache_dir set, entries are also written to disk and survive a restart.
+    """
+
+    def __init__(self, max_entries=16, cache_dir=None):
+        """
+        Args:
+            max_entries: Number of prompts kept in memory. 0 disables the cache.
+            cache_dir: Optional directory for persistent entries.
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(prompt_speech_16k, prompt_text, resample_rate, model_id=''):
+        """
+        Returns a key for a prompt: hash of the audio samples, prompt text, sample rate and model.
+
+        Args:
+            prompt_speech_16k: Prompt audio tensor at 16 kHz.
+            prompt_text: Normalized prompt text.
+            resample_rate: Output sample rate of the model.
+            model_id: Identifies the speech tokenizer, so entries of different models do not mix.
+        """
+        speech = prompt_speech_16k.detach().cpu().contiguous()
+        digest = hashlib.sha1()
+        digest.update('{}{}'.format(speech.dtype, tuple(speech.shape)).encode())
+        digest.update(speech.numpy().tobytes())
+        digest.update('\0{}\0{}\0{}'.format(prompt_text, resample_rate, model_id).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, '{}.pt'.format(key))
+
+    def _load(self, key, map_location):
+        if not self.cache_dir or not os.path.exists(self._path(key)):
+            return None
+        try:
+            return torch.load(self._path(key), map_location=map_location)
+        except Exception as e:
+            logging.warning('failed to load speaker prompt {}: {}'.format(key, e))
+            return None
+
+    def _save(self, key, prompt):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            torch.save({k: v.cpu() for k, v in prompt.items()}, path + '.tmp')
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            logging.warning('failed to save speaker prompt {}: {}'.format(key, e))
+
+    def get(self, key, compute, map_location=None):
+        """
+        Returns the cached prompt features for key, computing (or loading from disk) on a miss.
+
+        Args:
+            key: Key from make_key.
+            compute: Callable returning a dict of prompt tensors.
+            map_location: Device for entries loaded from disk.
+        """
+        if self.max_entries <= 0 and not self.cache_dir:
+            self.misses += 1
+            return compute()
+        with self._lock:
+            prompt = self._entries.get(key)
+            if prompt is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return prompt
+
+        prompt = self._load(key, map_location)
+        if prompt is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            prompt = compute()
+            self._save(key, prompt)
+
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = prompt
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return prompt
+
+    def clear(self):
+        """Drops the in-memory entries. Files in cache_dir are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'entries': len(self._entries), 'max_entries': self.max_entries, 'cache_dir': self.cache_dir}
@@ -110,7 +110,8 @@ class MaskedDiffWithXvec(torch.nn.Module):
                   prompt_feat,
                   prompt_feat_len,
                   embedding,
-                  flow_cache):
+                  flow_cache,
+                  solver=None):
         if self.fp16 is True:
             prompt_feat = prompt_feat.half()
             embedding = embedding.half()
@@ -145,7 +146,8 @@ class MaskedDiffWithXvec(torch.nn.Module):
             cond=conds,
             n_timesteps=10,
             prompt_len=mel_len1,
-            flow_cache=flow_cache
+            flow_cache=flow_cache,
+            solver=solver
         )
         feat = feat[:, :, mel_len1:]
         assert feat.shape[2] == mel_len2
@@ -199,7 +201,8 @@ class CausalMaskedDiffWithXvec(torch.nn.Module):
                   prompt_feat,
                   prompt_feat_len,
                   embedding,
-                  finalize):
+                  finalize,
+                  solver=None):
         if self.fp16 is True:
             prompt_feat = prompt_feat.half()
             embedding = embedding.half()
@@ -232,8 +235,66 @@ class CausalMaskedDiffWithXvec(torch.nn.Module):
             mask=mask.unsqueeze(1),
             spks=embedding,
             cond=conds,
-            n_timesteps=10
+            n_timesteps=10,
+            solver=solver
         )
         feat = feat[:, :, mel_len1:]
         assert feat.shape[2] == mel_len2
         return feat.float(), None
+
+    @torch.inference_mode()
+    def inference_batch(self,
+                        token,
+                        token_len,
+                        prompt_token,
+                        prompt_token_len,
+                        prompt_feat,
+                        prompt_feat_len,
+                        embedding,
+                        solver=None):
+        """Non-streaming inference of several utterances that share one prompt.
+
+        Args:
+            token: right-padded speech tokens, (batch, max_token_len)
+            token_len: token lengths, (batch,)
+            prompt_token, prompt_feat, embedding: the shared prompt, batch size 1
+            solver: FlowSolver for the decoder, None runs the 10 step euler
+
+        Returns:
+            mel of every utterance without the prompt part, each (1, 80, mel_len)
+        """
+        if self.fp16 is True:
+            prompt_feat = prompt_feat.half()
+            embedding = embedding.half()
+
+        batch = token.shape[0]
+        # xvec projection
+        embedding = F.normalize(embedding, dim=1)
+        embedding = self.spk_embed_affine_layer(embedding).expand(batch, -1)
+
+        # concat text and prompt_text
+        token = torch.concat([prompt_token.expand(batch, -1), token], dim=1)
+        token_len = prompt_token_len + token_len
+        mask = (~make_pad_mask(token_len)).unsqueeze(-1).to(embedding)
+        token = self.input_embedding(torch.clamp(token, min=0)) * mask
+
+        # text encode
+        h, h_masks = self.encoder(token, token_len)
+        mel_len1 = prompt_feat.shape[1]
+        mel_len = h_masks.squeeze(1).sum(dim=1).tolist()
+        h = self.encoder_proj(h)
+
+        # get conditions
+        conds = torch.zeros([batch, h.shape[1], self.output_size], device=token.device).to(h.dtype)
+        conds[:, :mel_len1] = prompt_feat
+        conds = conds.transpose(1, 2)
+
+        feat, _ = self.decoder(
+            mu=h.transpose(1, 2).contiguous(),
+            mask=h_masks.to(h),
+            spks=embedding,
+            cond=conds,
+            n_timesteps=10,
+            solver=solver
+        )
+        return [feat[i:i + 1, :, mel_len1:mel_len[i]].float() for i in range(batch)]
@@ -17,6 +17,62 @@ import torch.nn.functional as F
 from matcha.models.components.flow_matching import BASECFM
 
 
+class FlowSolver:
+    """ODE solver settings used by ConditionalCFM at inference.
+
+    Args:
+        method: 'euler' (one estimator pass per step), 'midpoint' or 'heun' (two passes per step)
+        n_timesteps: number of solver steps
+        schedule: spacing of the time steps, 'linear', 'cosine' (dense near the noise end) or
+            'sway' (between the two, see sway_coef)
+        sway_coef: sway sampling coefficient in [-1, 1], -1 equals 'cosine' and 0 equals 'linear'
+        cfg_rate: classifier-free guidance strength, None uses the model's inference_cfg_rate, 0 turns it off
+        cfg_start: guidance only runs on steps with t >= cfg_start, earlier steps skip the unconditional pass
+    """
+    METHODS = ('euler', 'midpoint', 'heun')
+    SCHEDULES = ('linear', 'cosine', 'sway')
+    # starting points for bench_cosyvoice_solver, 'reference' is the original 10 step euler
+    PRESETS = {
+        'reference': dict(method='euler', n_timesteps=10, schedule='cosine'),
+        'balanced': dict(method='midpoint', n_timesteps=4, schedule='cosine'),
+        'fast': dict(method='euler', n_timesteps=6, schedule='cosine', cfg_start=0.5),
+        'draft': dict(method='euler', n_timesteps=4, schedule='cosine', cfg_rate=0.0),
+    }
+
+    def __init__(self, method='euler', n_timesteps=10, schedule='cosine', sway_coef=-1.0, cfg_rate=None, cfg_start=0.0):
+        if method not in self.METHODS:
+            raise ValueError('unknown flow solver method {}, use one of {}'.format(method, self.METHODS))
+        if schedule not in self.SCHEDULES:
+            raise ValueError('unknown flow solver schedule {}, use one of {}'.format(schedule, self.SCHEDULES))
+        if n_timesteps < 1:
+            raise ValueError('n_timesteps must be at least 1, got {}'.format(n_timesteps))
+        self.method = method
+        self.n_timesteps = n_timesteps
+        self.schedule = schedule
+        self.sway_coef = sway_coef
+        self.cfg_rate = cfg_rate
+        self.cfg_start = cfg_start
+
+    @classmethod
+    def from_preset(cls, name, **overrides):
+        if name not in cls.PRESETS:
+            raise ValueError('unknown flow solver preset {}, use one of {}'.format(name, tuple(cls.PRESETS)))
+        return cls(**dict(cls.PRESETS[name], **overrides))
+
+    def t_span(self, dtype=torch.float32, device=None):
+        """Returns the n_timesteps + 1 time points from 0 to 1 as a tensor of dtype."""
+        t_span = torch.linspace(0, 1, self.n_timesteps + 1, device=device, dtype=dtype)
+        if self.schedule == 'cosine':
+            t_span = 1 - torch.cos(t_span * 0.5 * torch.pi)
+        elif self.schedule == 'sway':
+            t_span = t_span + self.sway_coef * (torch.cos(t_span * 0.5 * torch.pi) - 1 + t_span)
+        return t_span
+
+    def __repr__(self):
+        return 'FlowSolver(method={}, n_timesteps={}, schedule={}, sway_coef={}, cfg_rate={}, cfg_start={})'.format(
+            self.method, self.n_timesteps, self.schedule, self.sway_coef, self.cfg_rate, self.cfg_start)
+
+
 class ConditionalCFM(BASECFM):
     def __init__(self, in_channels, cfm_params, n_spks=1, spk_emb_dim=64, estimator: torch.nn.Module = None):
         super().__init__(
@@ -34,7 +90,7 @@ class ConditionalCFM(BASECFM):
         self.lock = threading.Lock()
 
     @torch.inference_mode()
-    def forward(self, mu, mask, n_timesteps, temperature=1.0, spks=None, cond=None, prompt_len=0, flow_cache=torch.zeros(1, 80, 0, 2)):
+    def forward(self, mu, mask, n_timesteps, temperature=1.0, spks=None, cond=None, prompt_len=0, flow_cache=torch.zeros(1, 80, 0, 2), solver=None):
         """Forward diffusion
 
         Args:
@@ -47,6 +103,7 @@ class ConditionalCFM(BASECFM):
             spks (torch.Tensor, optional): speaker ids. Defaults to None.
                 shape: (batch_size, spk_emb_dim)
             cond: Not used but kept for future purposes
+            solver (FlowSolver, optional): overrides n_timesteps and the model's t_scheduler
 
         Returns:
             sample: generated mel-spectrogram
@@ -63,18 +120,16 @@ class ConditionalCFM(BASECFM):
         mu_cache = torch.concat([mu[:, :, :prompt_len], mu[:, :, -34:]], dim=2)
         flow_cache = torch.stack([z_cache, mu_cache], dim=-1)
 
-        t_span = torch.linspace(0, 1, n_timesteps + 1, device=mu.device, dtype=mu.dtype)
-        if self.t_scheduler == 'cosine':
-            t_span = 1 - torch.cos(t_span * 0.5 * torch.pi)
-        return self.solve_euler(z, t_span=t_span, mu=mu, mask=mask, spks=spks, cond=cond), flow_cache
+        if solver is None:
+            solver = FlowSolver(n_timesteps=n_timesteps, schedule='cosine' if self.t_scheduler == 'cosine' else 'linear')
+        return self.solve(z, mu=mu, mask=mask, spks=spks, cond=cond, solver=solver), flow_cache
 
-    def solve_euler(self, x, t_span, mu, mask, spks, cond):
+    def solve(self, x, mu, mask, spks, cond, solver):
         """
-        Fixed euler solver for ODEs.
+        Fixed step ODE solver.
         Args:
             x (torch.Tensor): random noise
-            t_span (torch.Tensor): n_timesteps interpolated
-                shape: (n_timesteps + 1,)
+                shape: (batch_size, n_feats, mel_timesteps)
             mu (torch.Tensor): output of encoder
                 shape: (batch_size, n_feats, mel_timesteps)
             mask (torch.Tensor): output_mask
@@ -82,56 +137,80 @@ class ConditionalCFM(BASECFM):
             spks (torch.Tensor, optional): speaker ids. Defaults to None.
                 shape: (batch_size, spk_emb_dim)
             cond: Not used but kept for future purposes
+            solver (FlowSolver): method, time steps and guidance
         """
-        t, _, dt = t_span[0], t_span[-1], t_span[1] - t_span[0]
-        t = t.unsqueeze(dim=0)
-
-        # I am storing this because I can later plot it by putting a debugger here and saving it to a file
-        # Or in future might add like a return_all_steps flag
-        sol = []
+        t_span = solver.t_span(x.dtype, x.device)
+        # python copies of the time points only decide where guidance runs, the solver itself
+        # steps with t / dt tensors of x.dtype like the original solve_euler
+        t_points = t_span.tolist()
+        cfg_rate = self.inference_cfg_rate if solver.cfg_rate is None else solver.cfg_rate
+        # the TensorRT engine is built for a fixed batch of 2 (cond + uncond), it always runs the full batch
+        # one (cond, uncond) pair at a time
+        full_batch = not isinstance(self.estimator, torch.nn.Module)
 
         # Do not use concat, it may cause memory format changed and trt infer with wrong results!
-        x_in = torch.zeros([2, 80, x.size(2)], device=x.device, dtype=x.dtype)
-        mask_in = torch.zeros([2, 1, x.size(2)], device=x.device, dtype=x.dtype)
-        mu_in = torch.zeros([2, 80, x.size(2)], device=x.device, dtype=x.dtype)
-        t_in = torch.zeros([2], device=x.device, dtype=x.dtype)
-        spks_in = torch.zeros([2, 80], device=x.device, dtype=x.dtype)
-        cond_in = torch.zeros([2, 80, x.size(2)], device=x.device, dtype=x.dtype)
-        for step in range(1, len(t_span)):
+        # the first half of the batch is conditional, the second half is the unconditional CFG branch
+        batch = x.size(0)
+        x_in = torch.zeros([2 * batch, 80, x.size(2)], device=x.device, dtype=x.dtype)
+        mask_in = torch.zeros([2 * batch, 1, x.size(2)], device=x.device, dtype=x.dtype)
+        mu_in = torch.zeros([2 * batch, 80, x.size(2)], device=x.device, dtype=x.dtype)
+        t_in = torch.zeros([2 * batch], device=x.device, dtype=x.dtype)
+        spks_in = torch.zeros([2 * batch, 80], device=x.device, dtype=x.dtype)
+        cond_in = torch.zeros([2 * batch, 80, x.size(2)], device=x.device, dtype=x.dtype)
+        mask_in[:batch] = mask
+        mask_in[batch:] = mask
+        mu_in[:batch] = mu
+        spks_in[:batch] = spks
+        cond_in[:batch] = cond
+
+        def velocity(x, t, t_point):
             # Classifier-Free Guidance inference introduced in VoiceBox
-            x_in[:] = x
-            mask_in[:] = mask
-            mu_in[0] = mu
-            t_in[:] = t.unsqueeze(0)
-            spks_in[0] = spks
-            cond_in[0] = cond
-            dphi_dt = self.forward_estimator(
-                x_in, mask_in,
-                mu_in, t_in,
-                spks_in,
-                cond_in
-            )
-            dphi_dt, cfg_dphi_dt = torch.split(dphi_dt, [x.size(0), x.size(0)], dim=0)
-            dphi_dt = ((1.0 + self.inference_cfg_rate) * dphi_dt - self.inference_cfg_rate * cfg_dphi_dt)
+            use_cfg = cfg_rate > 0 and t_point >= solver.cfg_start
+            size = 2 * batch if use_cfg or full_batch else batch
+            x_in[:batch] = x
+            if size > batch:
+                x_in[batch:] = x
+            t_in[:] = t
+            if full_batch and batch > 1:
+                dphi_dt = torch.empty_like(x_in)
+                for b in range(batch):
+                    # indexing with a list copies the pair into a contiguous batch of 2
+                    pair = [b, batch + b]
+                    dphi_dt[pair] = self.forward_estimator(x_in[pair], mask_in[pair], mu_in[pair], t_in[pair], spks_in[pair], cond_in[pair])
+            else:
+                dphi_dt = self.forward_estimator(x_in[:size], mask_in[:size], mu_in[:size], t_in[:size], spks_in[:size], cond_in[:size])
+            if not use_cfg:
+                # the trt engine writes its output into x_in, which the next pass overwrites
+                return dphi_dt[:batch].clone()
+            dphi_dt, cfg_dphi_dt = torch.split(dphi_dt, [batch, batch], dim=0)
+            return (1.0 + cfg_rate) * dphi_dt - cfg_rate * cfg_dphi_dt
+
+        t, dt = t_span[0], t_span[1] - t_span[0]
+        for step in range(1, len(t_span)):
+            t_point = t_points[step - 1]
+            dphi_dt = velocity(x, t, t_point)
+            if solver.method == 'midpoint':
+                dphi_dt = velocity(x + 0.5 * dt * dphi_dt, t + 0.5 * dt, 0.5 * (t_point + t_points[step]))
+            elif solver.method == 'heun':
+                dphi_dt = 0.5 * (dphi_dt + velocity(x + dt * dphi_dt, t + dt, t_points[step]))
             x = x + dt * dphi_dt
             t = t + dt
-            sol.append(x)
             if step < len(t_span) - 1:
                 dt = t_span[step + 1] - t
 
-        return sol[-1].float()
+        return x.float()
 
     def forward_estimator(self, x, mask, mu, t, spks, cond):
         if isinstance(self.estimator, torch.nn.Module):
             return self.estimator.forward(x, mask, mu, t, spks, cond)
         else:
             with self.lock:
-                self.estimator.set_input_shape('x', (2, 80, x.size(2)))
-                self.estimator.set_input_shape('mask', (2, 1, x.size(2)))
-                self.estimator.set_input_shape('mu', (2, 80, x.size(2)))
-                self.estimator.set_input_shape('t', (2,))
-                self.estimator.set_input_shape('spks', (2, 80))
-                self.estimator.set_input_shape('cond', (2, 80, x.size(2)))
+                self.estimator.set_input_shape('x', (x.size(0), 80, x.size(2)))
+                self.estimator.set_input_shape('mask', (x.size(0), 1, x.size(2)))
+                self.estimator.set_input_shape('mu', (x.size(0), 80, x.size(2)))
+                self.estimator.set_input_shape('t', (x.size(0),))
+                self.estimator.set_input_shape('spks', (x.size(0), 80))
+                self.estimator.set_input_shape('cond', (x.size(0), 80, x.size(2)))
                 # run trt engine
                 self.estimator.execute_v2([x.contiguous().data_ptr(),
                                            mask.contiguous().data_ptr(),
@@ -190,7 +269,7 @@ class CausalConditionalCFM(ConditionalCFM):
         self.rand_noise = torch.randn([1, 80, 50 * 300])
 
     @torch.inference_mode()
-    def forward(self, mu, mask, n_timesteps, temperature=1.0, spks=None, cond=None):
+    def forward(self, mu, mask, n_timesteps, temperature=1.0, spks=None, cond=None, solver=None):
         """Forward diffusion
 
         Args:
@@ -203,15 +282,15 @@ class CausalConditionalCFM(ConditionalCFM):
             spks (torch.Tensor, optional): speaker ids. Defaults to None.
                 shape: (batch_size, spk_emb_dim)
             cond: Not used but kept for future purposes
+            solver (FlowSolver, optional): overrides n_timesteps and the model's t_scheduler
 
         Returns:
             sample: generated mel-spectrogram
                 shape: (batch_size, n_feats, mel_timesteps)
         """
 
-        z = self.rand_noise[:, :, :mu.size(2)].to(mu.device).to(mu.dtype) * temperature
-        # fix prompt and overlap part mu and z
-        t_span = torch.linspace(0, 1, n_timesteps + 1, device=mu.device, dtype=mu.dtype)
-        if self.t_scheduler == 'cosine':
-            t_span = 1 - torch.cos(t_span * 0.5 * torch.pi)
-        return self.solve_euler(z, t_span=t_span, mu=mu, mask=mask, spks=spks, cond=cond), None
+        # every utterance of a batch starts from the same fixed noise, as it would on its own
+        z = self.rand_noise[:, :, :mu.size(2)].to(mu.device).to(mu.dtype).expand(mu.size(0), -1, -1) * temperature
+        if solver is None:
+            solver = FlowSolver(n_timesteps=n_timesteps, schedule='cosine' if self.t_scheduler == 'cosine' else 'linear')
+        return self.solve(z, mu=mu, mask=mask, spks=spks, cond=cond, solver=solver), None
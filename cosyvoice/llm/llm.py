@@ -12,10 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from typing import Dict, Optional, Callable, List, Generator
+import threading
 import torch
 from torch import nn
 import torch.nn.functional as F
-from transformers import Qwen2ForCausalLM
+from transformers import Qwen2ForCausalLM, StaticCache
 from torch.nn.utils.rnn import pad_sequence, unpad_sequence
 from cosyvoice.utils.common import IGNORE_ID
 from cosyvoice.transformer.label_smoothing_loss import LabelSmoothingLoss
@@ -224,10 +225,44 @@ class TransformerLM(torch.nn.Module):
             lm_input = self.speech_embedding.weight[top_ids].reshape(1, 1, -1)
 
 
+class StaticDecodeCache:
+    """Preallocated transformers StaticCache of one utterance with its causal mask and positions."""
+
+    def __init__(self, config, max_cache_len, dtype, device):
+        self.config = config
+        self.dtype = dtype
+        self.device = torch.device(device)
+        self.cache = None
+        self.grow(max_cache_len)
+
+    def grow(self, max_cache_len, keep=0):
+        """(Re)allocate for max_cache_len positions, copying the first keep positions of the old cache."""
+        max_cache_len = (max_cache_len + 255) // 256 * 256
+        cache = StaticCache(config=self.config, max_batch_size=1, max_cache_len=max_cache_len, device=self.device, dtype=self.dtype)
+        if not hasattr(cache, 'key_cache'):
+            raise RuntimeError('StaticCache without key_cache / value_cache, install transformers>=4.46,<4.56')
+        if keep > 0:
+            for old, new in zip(self.cache.key_cache + self.cache.value_cache, cache.key_cache + cache.value_cache):
+                new[:, :, :keep] = old[:, :, :keep]
+        self.cache = cache
+        self.max_cache_len = max_cache_len
+        # additive causal mask for every position, a step only takes a view of its own rows
+        self.mask = torch.full((max_cache_len, max_cache_len), torch.finfo(self.dtype).min, dtype=self.dtype, device=self.device).triu(1)[None, None]
+        self.cache_position = torch.arange(max_cache_len, device=self.device)
+
+    def reset(self):
+        self.cache.reset()
+
+
 class Qwen2Encoder(torch.nn.Module):
+    STATIC_POOL_SIZE = 4
+
     def __init__(self, pretrain_path):
         super().__init__()
         self.model = Qwen2ForCausalLM.from_pretrained(pretrain_path)
+        # preallocated kv caches for single-utterance decoding, see acquire_static_cache
+        self._static_pool = []
+        self._static_lock = threading.Lock()
 
     def forward_one_step(self, xs, masks, cache=None):
         input_masks = masks[:, -1, :]
@@ -243,6 +278,61 @@ class Qwen2Encoder(torch.nn.Module):
         new_cache = outs.past_key_values
         return xs, new_cache
 
+    def acquire_static_cache(self, max_cache_len, dtype, device):
+        """Borrow a preallocated kv cache for a new utterance of up to max_cache_len positions.
+
+        Every decode gets its own cache, so concurrent llm jobs on one model never share one.
+        Finished caches are returned with release_static_cache and reused while large enough.
+        """
+        with self._static_lock:
+            for i, cache in enumerate(self._static_pool):
+                if cache.max_cache_len >= max_cache_len and cache.dtype == dtype and cache.device == torch.device(device):
+                    cache = self._static_pool.pop(i)
+                    cache.reset()
+                    return cache
+        return StaticDecodeCache(self.model.config, max_cache_len, dtype, device)
+
+    def release_static_cache(self, cache):
+        with self._static_lock:
+            self._static_pool.append(cache)
+            # keep the largest few, one per concurrent decode is enough
+            self._static_pool.sort(key=lambda c: c.max_cache_len, reverse=True)
+            del self._static_pool[self.STATIC_POOL_SIZE:]
+
+    def forward_static_step(self, xs, offset, cache):
+        """Decode xs at positions [offset, offset + len) with the static kv cache.
+
+        Returns:
+            last hidden states and the next offset
+        """
+        end = offset + xs.shape[1]
+        if end > cache.max_cache_len:
+            # only inference_bistream can outgrow its initial size, grow geometrically
+            cache.grow(end * 2, keep=offset)
+        # the lm head is not needed, only the last hidden state is decoded by llm_decoder
+        outs = self.model.model(
+            inputs_embeds=xs,
+            attention_mask=cache.mask[:, :, offset:end],
+            past_key_values=cache.cache,
+            use_cache=True,
+            cache_position=cache.cache_position[offset:end],
+            return_dict=True,
+        )
+        return outs.last_hidden_state, end
+
+    def forward_batch_step(self, xs, attention_mask, position_ids, cache=None):
+        # left-padded batch: padding is masked out and positions start at each sequence's first real token
+        outs = self.model(
+            inputs_embeds=xs,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            output_hidden_states=True,
+            return_dict=True,
+            use_cache=True,
+            past_key_values=cache,
+        )
+        return outs.hidden_states[-1], outs.past_key_values
+
 
 class Qwen2LM(TransformerLM):
     def __init__(
@@ -317,21 +407,100 @@ class Qwen2LM(TransformerLM):
 
         # 5. step by step decode
         out_tokens = []
+        offset = 0
+        static_cache = self.llm.acquire_static_cache(lm_input.shape[1] + max_len, lm_input.dtype, device)
+        try:
+            for i in range(max_len):
+                y_pred, offset = self.llm.forward_static_step(lm_input, offset, static_cache)
+                logp = self.llm_decoder(y_pred[:, -1]).log_softmax(dim=-1)
+                top_ids = self.sampling_ids(logp.squeeze(dim=0), out_tokens, sampling, ignore_eos=True if i < min_len else False).item()
+                if top_ids == self.speech_token_size:
+                    break
+                if top_ids > self.speech_token_size:
+                    continue
+                # in stream mode, yield token one by one
+                yield top_ids
+                out_tokens.append(top_ids)
+                lm_input = self.speech_embedding.weight[top_ids].reshape(1, 1, -1)
+        finally:
+            self.llm.release_static_cache(static_cache)
+
+    @torch.inference_mode()
+    def inference_batch(
+            self,
+            text: torch.Tensor,
+            text_len: torch.Tensor,
+            prompt_text: torch.Tensor,
+            prompt_text_len: torch.Tensor,
+            prompt_speech_token: torch.Tensor,
+            prompt_speech_token_len: torch.Tensor,
+            embedding: torch.Tensor,
+            sampling: int = 25,
+            max_token_text_ratio: float = 20,
+            min_token_text_ratio: float = 2,
+    ) -> List[List[int]]:
+        """Decode several texts sharing one prompt in a single left-padded batch.
+
+        Args:
+            text: right-padded text tokens, (batch, max_text_len)
+            text_len: text lengths, (batch,)
+            prompt_text, prompt_speech_token: the shared prompt, batch size 1
+
+        Returns:
+            speech tokens of every text, each sequence stops at its own eos
+        """
+        device = text.device
+        batch = text.shape[0]
+        text_len = text_len.tolist()
+        text_emb = self.llm.model.model.embed_tokens(text)
+        prompt_text_emb = self.llm.model.model.embed_tokens(prompt_text)
+
+        sos_eos_emb = self.llm_embedding.weight[self.sos_eos].reshape(1, 1, -1)
+        task_id_emb = self.llm_embedding.weight[self.task_id].reshape(1, 1, -1)
+        if prompt_speech_token_len != 0:
+            prompt_speech_token_emb = self.speech_embedding(prompt_speech_token)
+        else:
+            prompt_speech_token_emb = torch.zeros(1, 0, self.llm_input_size, dtype=text_emb.dtype).to(device)
+        rows = [torch.concat([sos_eos_emb, prompt_text_emb, text_emb[i:i + 1, :text_len[i]], task_id_emb, prompt_speech_token_emb], dim=1)
+                for i in range(batch)]
+
+        # left pad, so that every sequence's next token is at the last position
+        max_input_len = max(row.shape[1] for row in rows)
+        lm_input = torch.zeros(batch, max_input_len, self.llm_input_size, dtype=text_emb.dtype, device=device)
+        attention_mask = torch.zeros(batch, max_input_len, dtype=torch.long, device=device)
+        for i, row in enumerate(rows):
+            lm_input[i, max_input_len - row.shape[1]:] = row[0]
+            attention_mask[i, max_input_len - row.shape[1]:] = 1
+        position_ids = (attention_mask.cumsum(dim=1) - 1).clamp(min=0)
+
+        min_len = [int(n * min_token_text_ratio) for n in text_len]
+        max_len = [int(n * max_token_text_ratio) for n in text_len]
+        last_input = [row[0, -1] for row in rows]
+        out_tokens = [[] for _ in range(batch)]
+        finished = [n <= 0 for n in max_len]
         cache = None
-        for i in range(max_len):
-            y_pred, cache = self.llm.forward_one_step(lm_input,
-                                                      masks=torch.tril(torch.ones((1, lm_input.shape[1], lm_input.shape[1]), device=lm_input.device)).to(torch.bool),
-                                                      cache=cache)
+        step = 0
+        while not all(finished):
+            y_pred, cache = self.llm.forward_batch_step(lm_input, attention_mask, position_ids, cache=cache)
             logp = self.llm_decoder(y_pred[:, -1]).log_softmax(dim=-1)
-            top_ids = self.sampling_ids(logp.squeeze(dim=0), out_tokens, sampling, ignore_eos=True if i < min_len else False).item()
-            if top_ids == self.speech_token_size:
-                break
-            if top_ids > self.speech_token_size:
-                continue
-            # in stream mode, yield token one by one
-            yield top_ids
-            out_tokens.append(top_ids)
-            lm_input = self.speech_embedding.weight[top_ids].reshape(1, 1, -1)
+            for i in range(batch):
+                if finished[i]:
+                    continue
+                top_ids = self.sampling_ids(logp[i], out_tokens[i], sampling, ignore_eos=True if step < min_len[i] else False).item()
+                if top_ids == self.speech_token_size:
+                    finished[i] = True
+                elif top_ids < self.speech_token_size:
+                    out_tokens[i].append(top_ids)
+                    last_input[i] = self.speech_embedding.weight[top_ids]
+                # other special tokens are skipped and the previous input is fed again
+                if step + 1 >= max_len[i]:
+                    finished[i] = True
+            step += 1
+            # finished sequences keep decoding their last input until the whole batch is done
+            lm_input = torch.stack(last_input).unsqueeze(dim=1)
+            attention_mask = torch.concat([attention_mask, attention_mask.new_ones(batch, 1)], dim=1)
+            position_ids = position_ids[:, -1:] + 1
+        return out_tokens
 
     @torch.inference_mode()
     def inference_bistream(
@@ -359,76 +528,75 @@ class Qwen2LM(TransformerLM):
 
         # 2. iterate text
         out_tokens = []
-        cache = None
-        # NOTE init prompt_text as text_cache as it is basically impossible prompt_speech_token/prompt_text < 15/5
-        text_cache = self.llm.model.model.embed_tokens(prompt_text)
-        next_fill_index = -1
-        for this_text in text:
-            text_cache = torch.concat([text_cache, self.llm.model.model.embed_tokens(this_text)], dim=1)
-            # prompt_speech_token_emb not empty, try append to lm_input
-            while prompt_speech_token_emb.size(1) != 0:
-                if text_cache.size(1) >= self.mix_ratio[0]:
-                    lm_input_text, lm_input_speech = text_cache[:, :self.mix_ratio[0]], prompt_speech_token_emb[:, :self.mix_ratio[1]]
-                    logging.info('append {} text token {} speech token'.format(lm_input_text.size(1), lm_input_speech.size(1)))
-                    lm_input = torch.concat([lm_input, lm_input_text, lm_input_speech], dim=1)
-                    text_cache, prompt_speech_token_emb = text_cache[:, self.mix_ratio[0]:], prompt_speech_token_emb[:, self.mix_ratio[1]:]
-                else:
-                    logging.info('not enough text token to decode, wait for more')
-                    break
-            # no prompt_speech_token_emb remain, can decode some speech token
-            if prompt_speech_token_emb.size(1) == 0:
-                if (len(out_tokens) != 0 and out_tokens[-1] == self.speech_token_size + 2) or (len(out_tokens) == 0 and lm_input.size(1) == 1):
-                    logging.info('get fill token, need to append more text token')
+        offset = 0
+        # the text length is unknown here, the static cache grows when needed
+        static_cache = self.llm.acquire_static_cache(prompt_text.shape[1] + prompt_speech_token_emb.shape[1] + 256, sos_eos_emb.dtype, device)
+        try:
+            # NOTE init prompt_text as text_cache as it is basically impossible prompt_speech_token/prompt_text < 15/5
+            text_cache = self.llm.model.model.embed_tokens(prompt_text)
+            next_fill_index = -1
+            for this_text in text:
+                text_cache = torch.concat([text_cache, self.llm.model.model.embed_tokens(this_text)], dim=1)
+                # prompt_speech_token_emb not empty, try append to lm_input
+                while prompt_speech_token_emb.size(1) != 0:
                     if text_cache.size(1) >= self.mix_ratio[0]:
-                        lm_input_text = text_cache[:, :self.mix_ratio[0]]
-                        logging.info('append {} text token'.format(lm_input_text.size(1)))
-                        if len(out_tokens) != 0 and out_tokens[-1] == self.speech_token_size + 2:
-                            lm_input = lm_input_text
-                        else:
-                            lm_input = torch.concat([lm_input, lm_input_text], dim=1)
-                        text_cache = text_cache[:, self.mix_ratio[0]:]
+                        lm_input_text, lm_input_speech = text_cache[:, :self.mix_ratio[0]], prompt_speech_token_emb[:, :self.mix_ratio[1]]
+                        logging.info('append {} text token {} speech token'.format(lm_input_text.size(1), lm_input_speech.size(1)))
+                        lm_input = torch.concat([lm_input, lm_input_text, lm_input_speech], dim=1)
+                        text_cache, prompt_speech_token_emb = text_cache[:, self.mix_ratio[0]:], prompt_speech_token_emb[:, self.mix_ratio[1]:]
                     else:
                         logging.info('not enough text token to decode, wait for more')
-                        continue
-                while True:
-                    seq_len = lm_input.shape[1] if cache is None else lm_input.shape[1] + cache[0][0].size(2)
-                    y_pred, cache = self.llm.forward_one_step(lm_input,
-                                                masks=torch.tril(torch.ones((1, seq_len, seq_len), device=lm_input.device)).to(torch.bool),
-                                                cache=cache)
-                    logp = self.llm_decoder(y_pred[:, -1]).log_softmax(dim=-1)
-                    if next_fill_index != -1 and len(out_tokens) == next_fill_index:
-                        top_ids = self.speech_token_size + 2
-                        next_fill_index += (self.mix_ratio[1] + 1)
-                    else:
-                        top_ids = self.sampling_ids(logp.squeeze(dim=0), out_tokens, sampling, ignore_eos=True).item()
-                    if top_ids == self.speech_token_size + 2:
-                        next_fill_index = len(out_tokens) + self.mix_ratio[1] + 1
-                        logging.info('fill_token index {} next fill_token index {}'.format(len(out_tokens), next_fill_index))
-                    out_tokens.append(top_ids)
-                    if top_ids >= self.speech_token_size:
-                        if top_ids == self.speech_token_size + 2:
-                            break
+                        break
+                # no prompt_speech_token_emb remain, can decode some speech token
+                if prompt_speech_token_emb.size(1) == 0:
+                    if (len(out_tokens) != 0 and out_tokens[-1] == self.speech_token_size + 2) or (len(out_tokens) == 0 and lm_input.size(1) == 1):
+                        logging.info('get fill token, need to append more text token')
+                        if text_cache.size(1) >= self.mix_ratio[0]:
+                            lm_input_text = text_cache[:, :self.mix_ratio[0]]
+                            logging.info('append {} text token'.format(lm_input_text.size(1)))
+                            if len(out_tokens) != 0 and out_tokens[-1] == self.speech_token_size + 2:
+                                lm_input = lm_input_text
+                            else:
+                                lm_input = torch.concat([lm_input, lm_input_text], dim=1)
+                            text_cache = text_cache[:, self.mix_ratio[0]:]
                         else:
-                            raise ValueError('should not get token {}'.format(top_ids))
-                    yield top_ids
-                    lm_input = self.speech_embedding.weight[top_ids].reshape(1, 1, -1)
-
-        # 3. final decode
-        lm_input = torch.concat([lm_input, text_cache, task_id_emb], dim=1)
-        logging.info('no more text token, decode until met eos')
-        while True:
-            seq_len = lm_input.shape[1] if cache is None else lm_input.shape[1] + cache[0][0].size(2)
-            y_pred, cache = self.llm.forward_one_step(lm_input,
-                                                      masks=torch.tril(torch.ones((1, seq_len, seq_len), device=lm_input.device)).to(torch.bool),
-                                                      cache=cache)
-            logp = self.llm_decoder(y_pred[:, -1]).log_softmax(dim=-1)
-            top_ids = self.sampling_ids(logp.squeeze(dim=0), out_tokens, sampling, ignore_eos=False).item()
-            out_tokens.append(top_ids)
-            if top_ids >= self.speech_token_size:
-                if top_ids == self.speech_token_size:
-                    break
-                else:
-                    raise ValueError('should not get token {}'.format(top_ids))
-            # in stream mode, yield token one by one
-            yield top_ids
-            lm_input = self.speech_embedding.weight[top_ids].reshape(1, 1, -1)
+                            logging.info('not enough text token to decode, wait for more')
+                            continue
+                    while True:
+                        y_pred, offset = self.llm.forward_static_step(lm_input, offset, static_cache)
+                        logp = self.llm_decoder(y_pred[:, -1]).log_softmax(dim=-1)
+                        if next_fill_index != -1 and len(out_tokens) == next_fill_index:
+                            top_ids = self.speech_token_size + 2
+                            next_fill_index += (self.mix_ratio[1] + 1)
+                        else:
+                            top_ids = self.sampling_ids(logp.squeeze(dim=0), out_tokens, sampling, ignore_eos=True).item()
+                        if top_ids == self.speech_token_size + 2:
+                            next_fill_index = len(out_tokens) + self.mix_ratio[1] + 1
+                            logging.info('fill_token index {} next fill_token index {}'.format(len(out_tokens), next_fill_index))
+                        out_tokens.append(top_ids)
+                        if top_ids >= self.speech_token_size:
+                            if top_ids == self.speech_token_size + 2:
+                                break
+                            else:
+                                raise ValueError('should not get token {}'.format(top_ids))
+                        yield top_ids
+                        lm_input = self.speech_embedding.weight[top_ids].reshape(1, 1, -1)
+
+            # 3. final decode
+            lm_input = torch.concat([lm_input, text_cache, task_id_emb], dim=1)
+            logging.info('no more text token, decode until met eos')
+            while True:
+                y_pred, offset = self.llm.forward_static_step(lm_input, offset, static_cache)
+                logp = self.llm_decoder(y_pred[:, -1]).log_softmax(dim=-1)
+                top_ids = self.sampling_ids(logp.squeeze(dim=0), out_tokens, sampling, ignore_eos=False).item()
+                out_tokens.append(top_ids)
+                if top_ids >= self.speech_token_size:
+                    if top_ids == self.speech_token_size:
+                        break
+                    else:
+                        raise ValueError('should not get token {}'.format(top_ids))
+                # in stream mode, yield token one by one
+                yield top_ids
+                lm_input = self.speech_embedding.weight[top_ids].reshape(1, 1, -1)
+        finally:
+            self.llm.release_static_cache(static_cache)
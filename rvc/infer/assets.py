@@ -0,0 +1,160 @@
+import os
+import gc
+import threading
+import time
+
+import torch
+import faiss
+
+from rvc.lib.predictors.RMVPE import RMVPE0Predictor
+from rvc.lib.predictors.FCPE import FCPEF0Predictor
+from rvc.lib.utils import load_embedding
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class AssetCache:
+    """
+    Keeps RVC inference assets resident between conversions.
+
+    F0 predictors, embedder models and per-voice FAISS indexes (with their reconstructed
+    big_npy arrays) are loaded once and keyed by file path and mtime, so a file that changes
+    on disk is reloaded on the next request. Assets stay loaded until evicted explicitly.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._assets = {}
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0
+
+    def _get(self, kind, path, extra, loader):
+        """
+        Returns the cached asset for (kind, path, mtime, extra), loading it on a miss.
+
+        Args:
+            kind: Asset type ("rmvpe", "fcpe", "embedder", "index").
+            path: File the asset is loaded from.
+            extra: Hashable loader options that change the loaded object (device, dtype, ...).
+            loader: Callable that loads the asset.
+        """
+        key = (kind, os.path.abspath(path), extra)
+        mtime = _mtime(path)
+        with self._lock:
+            cached = self._assets.get(key)
+            if cached is not None and cached[0] == mtime:
+                self.hits += 1
+                return cached[1]
+
+            self.misses += 1
+            start_time = time.perf_counter()
+            asset = loader()
+            self.load_time += time.perf_counter() - start_time
+            self._assets[key] = (mtime, asset)
+            return asset
+
+    def rmvpe(self, model_path, is_half, device):
+        """
+        Returns a resident RMVPE F0 predictor.
+        """
+        return self._get(
+            "rmvpe",
+            model_path,
+            (is_half, str(device)),
+            lambda: RMVPE0Predictor(model_path, is_half=is_half, device=device),
+        )
+
+    def fcpe(self, model_path, f0_min, f0_max, device, sampling_rate):
+        """
+        Returns a resident FCPE F0 predictor. The F0 range is fixed at construction, so it is part of the key.
+        """
+        return self._get(
+            "fcpe",
+            model_path,
+            (int(f0_min), int(f0_max), str(device), sampling_rate),
+            lambda: FCPEF0Predictor(
+                model_path,
+                f0_min=int(f0_min),
+                f0_max=int(f0_max),
+                dtype=torch.float32,
+                device=device,
+                sampling_rate=sampling_rate,
+                threshold=0.03,
+            ),
+        )
+
+    def embedder(self, embedder_model, embedder_model_custom, device, is_half):
+        """
+        Returns a resident embedder (HuBERT / ContentVec) in eval mode on the given device.
+        """
+
+        def loader():
+            models, _, _ = load_embedding(embedder_model, embedder_model_custom)
+            model = models[0].to(device)
+            model = model.half() if is_half else model.float()
+            return model.eval()
+
+        path = embedder_model_custom or os.path.join("rvc", "models", "embedders")
+        return self._get(
+            "embedder", path, (embedder_model, str(device), is_half), loader
+        )
+
+    def index(self, file_index):
+        """
+        Returns (index, big_npy) for a voice's FAISS index, or (None, None) if it cannot be read.
+        """
+
+        def loader():
+            try:
+                index = faiss.read_index(file_index)
+                big_npy = index.reconstruct_n(0, index.ntotal)
+            except Exception as error:
+                print(error)
+                return None, None
+            return index, big_npy
+
+        return self._get("index", file_index, None, loader)
+
+    def evict(self, kind=None, path=None):
+        """
+        Drops cached assets. Without arguments every asset is dropped.
+
+        Args:
+            kind: Only drop assets of this type.
+            path: Only drop assets loaded from this file.
+
+        Returns:
+            Number of assets dropped.
+        """
+        path = os.path.abspath(path) if path else None
+        with self._lock:
+            keys = [
+                key
+                for key in self._assets
+                if (kind is None or key[0] == kind) and (path is None or key[1] == path)
+            ]
+            for key in keys:
+                del self._assets[key]
+        if keys:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "load_time": self.load_time,
+                "assets": [(key[0], key[1]) for key in self._assets],
+            }
+
+
+asset_cache = AssetCache()
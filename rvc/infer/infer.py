@@ -7,8 +7,9 @@ import librosa
 import noisereduce as nr
 from scipy.io import wavfile
 from rvc.infer.pipeline import Pipeline as VC
+from rvc.infer.assets import asset_cache
 # from audio_upscaler import upscale
-from rvc.lib.utils import load_audio, load_embedding
+from rvc.lib.utils import load_audio
 from rvc.lib.tools.split_audio import process_audio, merge_audio
 from rvc.lib.algorithm.synthesizers import (
     SynthesizerV1_F0,
@@ -52,14 +53,12 @@ class VoiceConverter:
             embedder_model: Path to the pre-trained embedder model.
             embedder_model_custom: Path to a custom embedder model (if any).
         """
-        models, _, _ = load_embedding(embedder_model, embedder_model_custom)
-        self.hubert_model = models[0].to(self.config.device)
-        self.hubert_model = (
-            self.hubert_model.half()
-            if self.config.is_half
-            else self.hubert_model.float()
+        self.hubert_model = asset_cache.embedder(
+            embedder_model,
+            embedder_model_custom,
+            self.config.device,
+            self.config.is_half,
         )
-        self.hubert_model.eval()
 
     @staticmethod
     def remove_audio_noise(input_audio_path, reduction_strength=0.7):
@@ -292,6 +291,120 @@ class VoiceConverter:
         except Exception as error:
             print(error)
 
+    def convert_batch(
+        self,
+        audios,
+        sample_rate,
+        sid=0,
+        f0_up_key=0,
+        f0_method="rmvpe",
+        file_index="",
+        index_rate=0.3,
+        resample_sr=0,
+        rms_mix_rate=1,
+        protect=0.33,
+        hop_length=128,
+        f0_autotune=False,
+        filter_radius=3,
+        embedder_model="contentvec",
+        embedder_model_custom=None,
+        clean_audio=False,
+        clean_strength=0.7,
+        batch_size=8,
+    ):
+        """
+        Converts several in-memory segments (e.g. TTS lines) with the loaded voice model.
+
+        Segments of similar length are padded into batches, and every batch goes through the
+        embedder and net_g.infer in a single call (see Pipeline.pipeline_batch).
+
+        Args:
+            audios: Input waveforms, 1-D or (samples, channels) float arrays.
+            sample_rate: Sampling rate of the input waveforms.
+            sid: Speaker ID for the target voice.
+            f0_up_key: Pitch shift value in semitones.
+            f0_method: F0 estimation method to use.
+            file_index: Path to the FAISS index for speaker embedding retrieval.
+            index_rate: Weighting factor for speaker embedding retrieval.
+            resample_sr: Target sampling rate for resampling.
+            rms_mix_rate: Mixing ratio for adjusting RMS levels.
+            protect: Protection level for preserving the original pitch.
+            hop_length: Hop length for F0 estimation.
+            f0_autotune: Whether to apply autotune to the F0 contour.
+            filter_radius: Radius for median filtering of the F0 contour.
+            embedder_model: Path to the embedder model.
+            embedder_model_custom: Path to a custom embedder model.
+            clean_audio: Whether to apply noise reduction to the outputs.
+            clean_strength: Noise reduction strength.
+            batch_size: Maximum number of segments converted together.
+
+        Returns:
+            A tuple containing the output sampling rate and a list of float32 waveforms in
+            input order (None for empty segments).
+        """
+        if not self.hubert_model:
+            self.load_hubert(embedder_model, embedder_model_custom)
+        if_f0 = self.cpt.get("f0", 1)
+        file_index = (
+            (file_index or "")
+            .strip()
+            .strip('"')
+            .strip("\n")
+            .strip('"')
+            .strip()
+            .replace("trained", "added")
+        )
+        output_sr = resample_sr if resample_sr >= 16000 else self.tgt_sr
+
+        inputs, positions = [], []
+        for i, audio in enumerate(audios):
+            if audio is None or len(audio) == 0:
+                continue
+            audio = np.asarray(audio, dtype=np.float32)
+            if audio.ndim > 1:
+                audio = audio.mean(axis=1)
+            if sample_rate != 16000:
+                audio = librosa.resample(audio, orig_sr=sample_rate, target_sr=16000)
+            audio_max = np.abs(audio).max() / 0.95
+            if audio_max > 1:
+                audio /= audio_max
+            inputs.append(audio)
+            positions.append(i)
+
+        outputs = self.vc.pipeline_batch(
+            self.hubert_model,
+            self.net_g,
+            sid,
+            inputs,
+            int(f0_up_key),
+            f0_method,
+            file_index,
+            index_rate,
+            if_f0,
+            filter_radius,
+            self.tgt_sr,
+            resample_sr,
+            rms_mix_rate,
+            self.version,
+            protect,
+            hop_length,
+            f0_autotune,
+            batch_size=batch_size,
+        )
+
+        results = [None] * len(audios)
+        for i, audio_opt in zip(positions, outputs):
+            audio_opt = audio_opt.astype(np.float32) / 32768
+            if clean_audio:
+                audio_opt = nr.reduce_noise(
+                    y=audio_opt,
+                    sr=output_sr,
+                    prop_decrease=max(0.0, min(1.0, float(clean_strength))),
+                    use_torch=False,
+                ).astype(np.float32)
+            results[i] = audio_opt
+        return output_sr, results
+
     def get_vc(self, weight_root, sid):
         """
         Loads the voice conversion model and sets up the pipeline.
@@ -1,5 +1,6 @@
 import os
 import gc
+import hashlib
 import re
 import sys
 import torch
@@ -7,7 +8,6 @@ import torch.nn.functional as F
 import parselmouth
 import torchcrepe
 import pyworld
-import faiss
 import librosa
 import numpy as np
 from scipy import signal
@@ -16,8 +16,7 @@ from torch import Tensor
 
 now_dir = os.getcwd()
 sys.path.append(now_dir)
-from rvc.lib.predictors.RMVPE import RMVPE0Predictor
-from rvc.lib.predictors.FCPE import FCPEF0Predictor
+from rvc.infer.assets import asset_cache
 
 
 # Constants for high-pass filter
@@ -30,6 +29,9 @@ bh, ah = signal.butter(
 
 input_audio_path2wav = {}
 
+# (kernel, stride) of the HuBERT / ContentVec convolutional feature extractor
+EMBEDDER_CONV_LAYERS = [(10, 5)] + [(3, 2)] * 4 + [(2, 2)] * 2
+
 
 class AudioProcessor:
     """
@@ -304,7 +306,7 @@ class Pipeline:
                     x, f0_min, f0_max, p_len, int(hop_length)
                 )
             elif method == "rmvpe":
-                self.model_rmvpe = RMVPE0Predictor(
+                self.model_rmvpe = asset_cache.rmvpe(
                     os.path.join("rvc", "models", "predictors", "rmvpe.pt"),
                     is_half=self.is_half,
                     device=self.device,
@@ -312,18 +314,14 @@ class Pipeline:
                 f0 = self.model_rmvpe.infer_from_audio(x, thred=0.03)
                 f0 = f0[1:]
             elif method == "fcpe":
-                self.model_fcpe = FCPEF0Predictor(
+                self.model_fcpe = asset_cache.fcpe(
                     os.path.join("rvc", "models", "predictors", "fcpe.pt"),
                     f0_min=int(f0_min),
                     f0_max=int(f0_max),
-                    dtype=torch.float32,
                     device=self.device,
                     sampling_rate=self.sample_rate,
-                    threshold=0.03,
                 )
                 f0 = self.model_fcpe.compute_f0(x, p_len=p_len)
-                del self.model_fcpe
-                gc.collect()
             f0_computation_stack.append(f0)
 
         f0_computation_stack = [fc for fc in f0_computation_stack if fc is not None]
@@ -404,25 +402,21 @@ class Pipeline:
                 x, self.f0_min, self.f0_max, p_len, int(hop_length), "tiny"
             )
         elif f0_method == "rmvpe":
-            self.model_rmvpe = RMVPE0Predictor(
+            self.model_rmvpe = asset_cache.rmvpe(
                 os.path.join("rvc", "models", "predictors", "rmvpe.pt"),
                 is_half=self.is_half,
                 device=self.device,
             )
             f0 = self.model_rmvpe.infer_from_audio(x, thred=0.03)
         elif f0_method == "fcpe":
-            self.model_fcpe = FCPEF0Predictor(
+            self.model_fcpe = asset_cache.fcpe(
                 os.path.join("rvc", "models", "predictors", "fcpe.pt"),
                 f0_min=int(self.f0_min),
                 f0_max=int(self.f0_max),
-                dtype=torch.float32,
                 device=self.device,
                 sampling_rate=self.sample_rate,
-                threshold=0.03,
             )
             f0 = self.model_fcpe.compute_f0(x, p_len=p_len)
-            del self.model_fcpe
-            gc.collect()
         elif "hybrid" in f0_method:
             input_audio_path2wav[input_audio_path] = x.astype(np.double)
             f0 = self.get_f0_hybrid(
@@ -623,12 +617,7 @@ class Pipeline:
             The voice-converted audio signal.
         """
         if file_index != "" and os.path.exists(file_index) == True and index_rate != 0:
-            try:
-                index = faiss.read_index(file_index)
-                big_npy = index.reconstruct_n(0, index.ntotal)
-            except Exception as error:
-                print(error)
-                index = big_npy = None
+            index, big_npy = asset_cache.index(file_index)
         else:
             index = big_npy = None
         audio = signal.filtfilt(bh, ah, audio)
@@ -751,6 +740,28 @@ class Pipeline:
                 )[self.t_pad_tgt : -self.t_pad_tgt]
             )
         audio_opt = np.concatenate(audio_opt)
+        audio_opt = self.postprocess(
+            audio, audio_opt, tgt_sr, resample_sr, rms_mix_rate
+        )
+        del pitch, pitchf, sid
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return audio_opt
+
+    def postprocess(self, audio, audio_opt, tgt_sr, resample_sr, rms_mix_rate):
+        """
+        Applies RMS mixing and resampling to a converted signal and scales it to int16.
+
+        Args:
+            audio: The filtered input signal (16 kHz) used as the RMS reference.
+            audio_opt: The converted signal at tgt_sr.
+            tgt_sr: Sampling rate of the converted signal.
+            resample_sr: Resampling rate for the output audio.
+            rms_mix_rate: Blending rate for adjusting the RMS level of the output audio.
+
+        Returns:
+            The output signal as int16.
+        """
         if rms_mix_rate != 1:
             audio_opt = AudioProcessor.change_rms(
                 audio, self.sample_rate, audio_opt, tgt_sr, rms_mix_rate
@@ -763,8 +774,307 @@ class Pipeline:
         max_int16 = 32768
         if audio_max > 1:
             max_int16 /= audio_max
-        audio_opt = (audio_opt * max_int16).astype(np.int16)
-        del pitch, pitchf, sid
+        return (audio_opt * max_int16).astype(np.int16)
+
+    @staticmethod
+    def embedder_frames(length):
+        """
+        Returns the number of embedder frames produced for an input of the given length.
+
+        Args:
+            length: Number of input samples (16 kHz).
+        """
+        for kernel, stride in EMBEDDER_CONV_LAYERS:
+            length = (length - kernel) // stride + 1
+        return max(0, length)
+
+    @staticmethod
+    def length_buckets(lengths, batch_size, max_padding=0.25):
+        """
+        Groups segment indices into batches of similar length.
+
+        Segments are sorted by length (longest first) and a batch is closed when it holds
+        batch_size segments or when the next segment would need more than max_padding
+        (relative to its own length) of padding.
+
+        Args:
+            lengths: Segment lengths.
+            batch_size: Maximum number of segments per batch.
+            max_padding: Maximum padding ratio allowed inside a batch.
+
+        Returns:
+            A list of index lists.
+        """
+        buckets = []
+        for i in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+            if (
+                buckets
+                and len(buckets[-1]) < batch_size
+                and lengths[buckets[-1][0]] <= lengths[i] * (1 + max_padding)
+            ):
+                buckets[-1].append(i)
+            else:
+                buckets.append([i])
+        return buckets
+
+    def voice_conversion_batch(
+        self,
+        model,
+        net_g,
+        sid,
+        audios,
+        pitches,
+        pitchfs,
+        index,
+        big_npy,
+        index_rate,
+        version,
+        protect,
+    ):
+        """
+        Performs voice conversion on several audio segments with one embedder and one generator call.
+
+        Segments are zero-padded to the longest one. Padded samples are masked in the embedder,
+        and net_g.infer receives the per-segment lengths, so its output is only cut per segment.
+
+        Args:
+            model: The feature extractor model.
+            net_g: The generative model for synthesizing speech.
+            sid: Speaker ID for the target voice.
+            audios: The input audio segments (1-D arrays).
+            pitches: Quantized F0 contours, one per segment, or None without pitch guidance.
+            pitchfs: Original F0 contours, one per segment, or None without pitch guidance.
+            index: FAISS index for speaker embedding retrieval.
+            big_npy: Speaker embeddings stored in a NumPy array.
+            index_rate: Blending rate for speaker embedding retrieval.
+            version: Model version ("v1" or "v2").
+            protect: Protection level for preserving the original pitch.
+
+        Returns:
+            The voice-converted audio segments, in input order.
+        """
+        batch = len(audios)
+        lengths = [audio.shape[0] for audio in audios]
+        source = np.zeros((batch, max(lengths)), dtype=np.float32)
+        padding_mask = torch.zeros((batch, max(lengths)), dtype=torch.bool)
+        for i, audio in enumerate(audios):
+            source[i, : lengths[i]] = audio
+            padding_mask[i, lengths[i] :] = True
+        feats = torch.from_numpy(source)
+        feats = feats.half() if self.is_half else feats.float()
+
+        inputs = {
+            "source": feats.to(self.device),
+            "padding_mask": padding_mask.to(self.device),
+            "output_layer": 9 if version == "v1" else 12,
+        }
+        with torch.no_grad():
+            logits = model.extract_features(**inputs)
+            feats = model.final_proj(logits[0]) if version == "v1" else logits[0]
+        frames = [min(self.embedder_frames(length), feats.shape[1]) for length in lengths]
+
+        use_pitch = pitches is not None and pitchfs is not None
+        if protect < 0.5 and use_pitch:
+            feats0 = feats.clone()
+        if index is not None and big_npy is not None and index_rate != 0:
+            # one search over the valid frames of every segment
+            npy = torch.cat([feats[i, : frames[i]] for i in range(batch)]).cpu().numpy()
+            if self.is_half:
+                npy = npy.astype("float32")
+
+            score, ix = index.search(npy, k=8)
+            weight = np.square(1 / score)
+            weight /= weight.sum(axis=1, keepdims=True)
+            npy = np.sum(big_npy[ix] * np.expand_dims(weight, axis=2), axis=1)
+
+            if self.is_half:
+                npy = npy.astype("float16")
+            retrieved = torch.zeros_like(feats)
+            offset = 0
+            for i in range(batch):
+                retrieved[i, : frames[i]] = torch.from_numpy(
+                    npy[offset : offset + frames[i]]
+                ).to(self.device)
+                offset += frames[i]
+            feats = retrieved * index_rate + (1 - index_rate) * feats
+
+        feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
+        if protect < 0.5 and use_pitch:
+            feats0 = F.interpolate(feats0.permute(0, 2, 1), scale_factor=2).permute(
+                0, 2, 1
+            )
+        p_lens = [
+            min(length // self.window, frames[i] * 2) for i, length in enumerate(lengths)
+        ]
+        p_max = max(p_lens)
+        feats = feats[:, :p_max]
+
+        pitch = pitchf = None
+        if use_pitch:
+            pitch = torch.zeros((batch, p_max), dtype=torch.long)
+            pitchf = torch.zeros((batch, p_max), dtype=torch.float32)
+            for i in range(batch):
+                pitch[i, : p_lens[i]] = torch.from_numpy(
+                    np.asarray(pitches[i][: p_lens[i]], dtype=np.int64)
+                )
+                pitchf[i, : p_lens[i]] = torch.from_numpy(
+                    np.asarray(pitchfs[i][: p_lens[i]], dtype=np.float32)
+                )
+            pitch = pitch.to(self.device)
+            pitchf = pitchf.to(self.device)
+
+        if protect < 0.5 and use_pitch:
+            feats0 = feats0[:, :p_max]
+            pitchff = pitchf.clone()
+            pitchff[pitchf > 0] = 1
+            pitchff[pitchf < 1] = protect
+            pitchff = pitchff.unsqueeze(-1)
+            feats = feats * pitchff + feats0 * (1 - pitchff)
+            feats = feats.to(feats0.dtype)
+        p_len = torch.tensor(p_lens, device=self.device).long()
+        sid = torch.full((batch,), int(sid), device=self.device).long()
+        with torch.no_grad():
+            if use_pitch:
+                audio1 = net_g.infer(feats, p_len, pitch, pitchf, sid)[0]
+            else:
+                audio1 = net_g.infer(feats, p_len, sid)[0]
+        audio1 = audio1[:, 0].data.cpu().float().numpy()
+        upsample = audio1.shape[-1] // p_max
+        outputs = [audio1[i, : p_lens[i] * upsample] for i in range(batch)]
+        del feats, p_len, padding_mask, pitch, pitchf, sid
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
-        return audio_opt
+        return outputs
+
+    def pipeline_batch(
+        self,
+        model,
+        net_g,
+        sid,
+        audios,
+        f0_up_key,
+        f0_method,
+        file_index,
+        index_rate,
+        pitch_guidance,
+        filter_radius,
+        tgt_sr,
+        resample_sr,
+        rms_mix_rate,
+        version,
+        protect,
+        hop_length,
+        f0_autotune,
+        batch_size=8,
+        max_padding=0.25,
+    ):
+        """
+        Converts several short audio segments, batching them by length.
+
+        F0 is estimated per segment. Segments are then bucketed by length (see length_buckets)
+        and each bucket runs through voice_conversion_batch. Segments longer than x_max seconds
+        go through the regular pipeline, which splits them at quiet points.
+
+        Args:
+            model: The feature extractor model.
+            net_g: The generative model for synthesizing speech.
+            sid: Speaker ID for the target voice.
+            audios: The input audio segments (1-D arrays at 16 kHz).
+            f0_up_key: Key to adjust the pitch of the F0 contour.
+            f0_method: Method to use for F0 estimation.
+            file_index: Path to the FAISS index file for speaker embedding retrieval.
+            index_rate: Blending rate for speaker embedding retrieval.
+            pitch_guidance: Whether to use pitch guidance during voice conversion.
+            filter_radius: Radius for median filtering the F0 contour.
+            tgt_sr: Target sampling rate for the output audio.
+            resample_sr: Resampling rate for the output audio.
+            rms_mix_rate: Blending rate for adjusting the RMS level of the output audio.
+            version: Model version.
+            protect: Protection level for preserving the original pitch.
+            hop_length: Hop length for F0 estimation methods.
+            f0_autotune: Whether to apply autotune to the F0 contour.
+            batch_size: Maximum number of segments per batch. 1 converts one segment at a time.
+            max_padding: Maximum padding ratio allowed inside a batch.
+
+        Returns:
+            The voice-converted segments as int16 arrays, in input order.
+        """
+        if file_index != "" and os.path.exists(file_index) == True and index_rate != 0:
+            index, big_npy = asset_cache.index(file_index)
+        else:
+            index = big_npy = None
+
+        results = [None] * len(audios)
+        filtered, padded, pitches, pitchfs, positions = [], [], [], [], []
+        for i, audio in enumerate(audios):
+            # harvest caches F0 by path, so in-memory segments are keyed by their content
+            audio_key = hashlib.md5(np.ascontiguousarray(audio).tobytes()).hexdigest()
+            if audio.shape[0] + self.window > self.t_max:
+                results[i] = self.pipeline(
+                    model,
+                    net_g,
+                    sid,
+                    audio,
+                    audio_key,
+                    f0_up_key,
+                    f0_method,
+                    file_index,
+                    index_rate,
+                    pitch_guidance,
+                    filter_radius,
+                    tgt_sr,
+                    resample_sr,
+                    rms_mix_rate,
+                    version,
+                    protect,
+                    hop_length,
+                    f0_autotune,
+                    f0_file=None,
+                )
+                continue
+
+            audio = signal.filtfilt(bh, ah, audio)
+            audio_pad = np.pad(audio, (self.t_pad, self.t_pad), mode="reflect")
+            if pitch_guidance == 1:
+                p_len = audio_pad.shape[0] // self.window
+                pitch, pitchf = self.get_f0(
+                    audio_key,
+                    audio_pad,
+                    p_len,
+                    f0_up_key,
+                    f0_method,
+                    filter_radius,
+                    hop_length,
+                    f0_autotune,
+                )
+                pitches.append(pitch[:p_len])
+                pitchfs.append(pitchf[:p_len])
+            filtered.append(audio)
+            padded.append(audio_pad)
+            positions.append(i)
+
+        for bucket in self.length_buckets(
+            [audio.shape[0] for audio in padded], batch_size, max_padding
+        ):
+            outputs = self.voice_conversion_batch(
+                model,
+                net_g,
+                sid,
+                [padded[j] for j in bucket],
+                [pitches[j] for j in bucket] if pitch_guidance == 1 else None,
+                [pitchfs[j] for j in bucket] if pitch_guidance == 1 else None,
+                index,
+                big_npy,
+                index_rate,
+                version,
+                protect,
+            )
+            for j, audio_opt in zip(bucket, outputs):
+                results[positions[j]] = self.postprocess(
+                    filtered[j],
+                    audio_opt[self.t_pad_tgt : -self.t_pad_tgt],
+                    tgt_sr,
+                    resample_sr,
+                    rms_mix_rate,
+                )
+        return results
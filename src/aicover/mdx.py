@@ -24,6 +24,11 @@ stem_naming = {'Vocals': 'Instrumental', 'Other': 'Instruments', 'Instrumental':
 
 DEFAULT_SR = 48000
 
+# Batched inference: one chunk needs roughly ACTIVATION_FACTOR times its spectrogram size inside ORT
+DEFAULT_BATCH_MEMORY_MB = 512
+ACTIVATION_FACTOR = 16
+MAX_BATCH_SIZE = 16
+
 
 class MDXModel:
     def __init__(self, device, dim_f, dim_t, n_fft, hop=1024, stem_name=None, compensation=1.000):
@@ -68,7 +73,7 @@ class MDX:
     DEFAULT_CHUNK_SIZE = 0 * DEFAULT_SR
     DEFAULT_MARGIN_SIZE = 1 * DEFAULT_SR
 
-    def __init__(self, model_path: str, params: MDXModel):
+    def __init__(self, model_path: str, params: MDXModel, intra_op_threads: int = 1, inter_op_threads: int = 1):
 
         # Set the device and the provider (CPU or CUDA)
         self.device = torch.device('cuda:0') if torch.cuda.is_available() else torch.device('cpu')
@@ -79,22 +84,16 @@ class MDX:
         # Load the ONNX model using ONNX Runtime
         # self.ort = ort.InferenceSession(model_path, providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
         
+        # intra_op_threads = 0 : onnxruntime default (physical cores)
+        sess_options = ort.SessionOptions()
+        sess_options.log_severity_level = 3
+        sess_options.inter_op_num_threads = inter_op_threads
+        sess_options.intra_op_num_threads = intra_op_threads
         if 'CUDAExecutionProvider' in ort.get_available_providers():
             # providers = [("CUDAExecutionProvider", {"device_id": torch.cuda.current_device(),
             #                                         "user_compute_stream": str(torch.cuda.current_stream().cuda_stream)})]
-            # sess_options = ort.SessionOptions()
-            # self.ort = ort.InferenceSession(model_path, sess_options=sess_options, providers=providers)             
-
-            sess_options = ort.SessionOptions()
-            sess_options.log_severity_level = 3
-            sess_options.inter_op_num_threads = 1
-            sess_options.intra_op_num_threads = 1            
             self.ort = ort.InferenceSession(model_path, sess_options=sess_options, providers=['CUDAExecutionProvider'])
         else:
-            sess_options = ort.SessionOptions()
-            sess_options.log_severity_level = 3
-            sess_options.inter_op_num_threads = 1
-            sess_options.intra_op_num_threads = 1            
             self.ort = ort.InferenceSession(model_path, sess_options=sess_options, providers=['CPUExecutionProvider'])
                 
         logger.debug(f'MDX onnx device is {ort.get_device()}')
@@ -193,11 +192,25 @@ class MDX:
             waves = np.array(wave_p[:, i:i + self.model.chunk_size])
             mix_waves.append(waves)
 
-        mix_waves = torch.tensor(mix_waves, dtype=torch.float32).to(self.device)
+        mix_waves = torch.tensor(np.array(mix_waves), dtype=torch.float32).to(self.device)
 
         return mix_waves, pad, trim
 
-    def _process_wave(self, mix_waves, trim, pad, q: queue.Queue, _id: int):
+    def batch_size_for(self, memory_mb=DEFAULT_BATCH_MEMORY_MB):
+        """
+        Number of chunks per ORT call that fits in the memory budget
+
+        Args:
+            memory_mb: (int) Memory budget for one ORT call, in MB
+
+        Returns:
+            int: Batch size (at least 1)
+        """
+        spec_bytes = 4 * self.model.n_bins * self.model.dim_t * 4       # float32 (4, n_bins, dim_t)
+        chunk_bytes = spec_bytes * ACTIVATION_FACTOR
+        return int(max(1, min(MAX_BATCH_SIZE, memory_mb * 1024 * 1024 // chunk_bytes)))
+
+    def _process_wave(self, mix_waves, trim, pad, q: queue.Queue, _id: int, batch_size: int = 1):
         """
         Process each wave segment in a multi-threaded environment
 
@@ -207,37 +220,43 @@ class MDX:
             pad: (int) Number of samples padded during padding
             q: (queue.Queue) Queue to hold the processed wave segments
             _id: (int) Identifier of the processed wave segment
+            batch_size: (int) Number of chunks stacked into one ORT call
 
         Returns:
             numpy array: Processed wave segment
         """
         
         progress=gr.Progress()
-        mix_waves = mix_waves.split(1)
+        mix_waves = mix_waves.split(batch_size)
         with torch.no_grad():
             pw = []
             for mix_wave in progress.tqdm(mix_waves, desc="MDX-Net"):
                 # self.prog.update()
                 spec = self.model.stft(mix_wave)
                 processed_spec = torch.tensor(self.process(spec))
-                processed_wav = self.model.istft(processed_spec.to(self.device))
+                # freq_pad is expanded (not copied) to the batch size
+                freq_pad = self.model.freq_pad.expand(processed_spec.shape[0], -1, -1, -1)
+                processed_wav = self.model.istft(processed_spec.to(self.device), freq_pad)
                 processed_wav = processed_wav[:, :, trim:-trim].transpose(0, 1).reshape(2, -1).cpu().numpy()
                 pw.append(processed_wav)
         processed_signal = np.concatenate(pw, axis=-1)[:, :-pad]
         q.put({_id: processed_signal})
         return processed_signal
 
-    def process_wave(self, wave: np.array, mt_threads=1):
+    def process_wave(self, wave: np.array, mt_threads=1, batch_size=1):
         """
         Process the wave array in a multi-threaded environment
 
         Args:
             wave: (np.array) Wave array to be processed
             mt_threads: (int) Number of threads to be used for processing
+            batch_size: (int) Number of chunks per ORT call, 0 picks it from the memory budget
 
         Returns:
             numpy array: Processed wave array
         """
+        if batch_size <= 0:
+            batch_size = self.batch_size_for()
         # self.prog = progress.tqdm(total=0)
         chunk = wave.shape[-1] // mt_threads
         waves = self.segment(wave, False, chunk)
@@ -247,7 +266,7 @@ class MDX:
         threads = []
         for c, batch in enumerate(waves):
             mix_waves, pad, trim = self.pad_wave(batch)
-            self._process_wave(mix_waves, trim, pad, q, c)
+            self._process_wave(mix_waves, trim, pad, q, c, batch_size)
             # self.prog.total = len(mix_waves) * mt_threads
         #     thread = threading.Thread(target=self._process_wave, args=(mix_waves, trim, pad, q, c))
         #     thread.start()
@@ -20,6 +20,7 @@ Examples
 See the end of this module (if __name__ == "__main__")
 """
 
+import math
 import subprocess
 
 import torch as th
@@ -27,9 +28,9 @@ import torchaudio as ta
 
 from dora.log import fatal
 from pathlib import Path
-from typing import Optional, Callable, Dict, Tuple, Union
+from typing import Optional, Callable, Dict, Iterator, Tuple, Union
 
-from .apply import apply_model, _replace_dict
+from .apply import apply_model, apply_model_stream, _replace_dict, DEFAULT_BATCH_MEMORY_MB
 from .audio import AudioFile, convert_audio, save_audio
 from .pretrained import get_model, _parse_remote_files, REMOTE_ROOT
 from .repo import RemoteRepo, LocalRepo, ModelOnlyRepo, BagOnlyRepo
@@ -61,6 +62,10 @@ class Separator:
         split: bool = True,
         segment: Optional[int] = None,
         jobs: int = 0,
+        segment_batch: int = 1,
+        batch_memory_mb: float = DEFAULT_BATCH_MEMORY_MB,
+        parallel_jobs: int = 0,
+        threads_per_job: int = 0,
         progress: bool = False,
         callback: Optional[Callable[[dict], None]] = None,
         callback_arg: Optional[dict] = None,
@@ -91,6 +96,14 @@ class Separator:
             will be stored on `wav.device`. If not specified, will use the command line option.
         jobs: Number of jobs. This can increase memory usage but will be much faster when \
             multiple cores are available. If not specified, will use the command line option.
+        segment_batch: Number of segments given to the model in one forward pass (only \
+            available if `split` is `True`). 0 picks the number from `batch_memory_mb`.
+        batch_memory_mb: Memory budget (in MB) of one forward pass when `segment_batch` is 0.
+        parallel_jobs: If > 1, the models of a bag and the shifts run concurrently on that many \
+            threads. The model weights are shared between the threads.
+        threads_per_job: Intra-op threads of each parallel job. 0 splits the current number of \
+            threads between the jobs. `torch.set_num_threads` is process-wide, so the count \
+            applies to all torch work until the jobs finish.
         callback: A function will be called when the separation of a chunk starts or finished. \
             The argument passed to the function will be a dict. For more information, please see \
             the Callback section.
@@ -118,7 +131,9 @@ class Separator:
         self._repo = repo
         self._load_model()
         self.update_parameter(device=device, shifts=shifts, overlap=overlap, split=split,
-                              segment=segment, jobs=jobs, progress=progress, callback=callback,
+                              segment=segment, jobs=jobs, segment_batch=segment_batch,
+                              batch_memory_mb=batch_memory_mb, parallel_jobs=parallel_jobs,
+                              threads_per_job=threads_per_job, progress=progress, callback=callback,
                               callback_arg=callback_arg)
 
     def update_parameter(
@@ -129,6 +144,10 @@ class Separator:
         split: Union[bool, _NotProvided] = NotProvided,
         segment: Optional[Union[int, _NotProvided]] = NotProvided,
         jobs: Union[int, _NotProvided] = NotProvided,
+        segment_batch: Union[int, _NotProvided] = NotProvided,
+        batch_memory_mb: Union[float, _NotProvided] = NotProvided,
+        parallel_jobs: Union[int, _NotProvided] = NotProvided,
+        threads_per_job: Union[int, _NotProvided] = NotProvided,
         progress: Union[bool, _NotProvided] = NotProvided,
         callback: Optional[
             Union[Callable[[dict], None], _NotProvided]
@@ -158,6 +177,14 @@ class Separator:
             will be stored on `wav.device`. If not specified, will use the command line option.
         jobs: Number of jobs. This can increase memory usage but will be much faster when \
             multiple cores are available. If not specified, will use the command line option.
+        segment_batch: Number of segments given to the model in one forward pass (only \
+            available if `split` is `True`). 0 picks the number from `batch_memory_mb`.
+        batch_memory_mb: Memory budget (in MB) of one forward pass when `segment_batch` is 0.
+        parallel_jobs: If > 1, the models of a bag and the shifts run concurrently on that many \
+            threads. The model weights are shared between the threads.
+        threads_per_job: Intra-op threads of each parallel job. 0 splits the current number of \
+            threads between the jobs. `torch.set_num_threads` is process-wide, so the count \
+            applies to all torch work until the jobs finish.
         callback: A function will be called when the separation of a chunk starts or finished. \
             The argument passed to the function will be a dict. For more information, please see \
             the Callback section.
@@ -193,6 +220,14 @@ class Separator:
             self._segment = segment
         if not isinstance(jobs, _NotProvided):
             self._jobs = jobs
+        if not isinstance(segment_batch, _NotProvided):
+            self._segment_batch = segment_batch
+        if not isinstance(batch_memory_mb, _NotProvided):
+            self._batch_memory_mb = batch_memory_mb
+        if not isinstance(parallel_jobs, _NotProvided):
+            self._parallel_jobs = parallel_jobs
+        if not isinstance(threads_per_job, _NotProvided):
+            self._threads_per_job = threads_per_job
         if not isinstance(progress, _NotProvided):
             self._progress = progress
         if not isinstance(callback, _NotProvided):
@@ -276,6 +311,10 @@ class Separator:
                 overlap=self._overlap,
                 device=self._device,
                 num_workers=self._jobs,
+                segment_batch=self._segment_batch,
+                batch_memory_mb=self._batch_memory_mb,
+                parallel_jobs=self._parallel_jobs,
+                threads_per_job=self._threads_per_job,
                 callback=self._callback,
                 callback_arg=_replace_dict(
                     self._callback_arg, ("audio_length", wav.shape[1])
@@ -306,6 +345,62 @@ class Separator:
         """
         return self.separate_tensor(self._load_audio(file), self.samplerate)
 
+    def separate_audio_file_stream(
+        self, file: Path, block_seconds: float = 10.
+    ) -> Iterator[Dict[str, th.Tensor]]:
+        """
+        Separate an audio file with a memory use that does not depend on its duration.
+
+        The file is read twice by blocks: once for the normalization statistics, once for
+        the separation. The result is the same as `separate_audio_file` (with the same random
+        shifts), but given as consecutive regions that can be written to disk as they come.
+        `split`, `jobs`, `segment_batch` and `parallel_jobs` are not used.
+
+        Parameters
+        ----------
+        file: Path of the file to be separated.
+        block_seconds: Duration of the blocks read from the file.
+
+        Returns
+        -------
+        An iterator of dicts, whose keys are the name of stems and values are the separated
+        waves of consecutive regions of the file.
+        """
+        audio = AudioFile(file)
+        block_size = int(block_seconds * self._samplerate)
+
+        def blocks():
+            return audio.stream(block_size, samplerate=self._samplerate,
+                                channels=self._audio_channels)
+
+        # Same normalization as `separate_tensor`, from running sums.
+        length, total, total_sq = 0, 0., 0.
+        for block in blocks():
+            ref = block.mean(0).double()
+            length += ref.shape[0]
+            total += ref.sum().item()
+            total_sq += ref.square().sum().item()
+        if not length:
+            raise LoadAudioError(f"{file} has no audio.")
+        mean = total / length
+        std = math.sqrt(max(total_sq - length * mean ** 2, 0.) / max(length - 1, 1))
+
+        out = apply_model_stream(
+                self._model,
+                ((block - mean) / (std + 1e-8) for block in blocks()),
+                length,
+                segment=self._segment,
+                shifts=self._shifts,
+                overlap=self._overlap,
+                device=self._device,
+                callback=self._callback,
+                callback_arg=_replace_dict(self._callback_arg, ("audio_length", length)),
+            )
+        for region in out:
+            region *= std + 1e-8
+            region += mean
+            yield dict(zip(self._model.sources, region))
+
     @property
     def samplerate(self):
         return self._samplerate
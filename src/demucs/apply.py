@@ -25,6 +25,12 @@ from .utils import center_trim, DummyPoolExecutor
 
 Model = tp.Union[Demucs, HDemucs, HTDemucs]
 
+# Batched split mode: one segment needs roughly ACTIVATION_FACTOR times its input size
+# during the forward pass (measured on HTDemucs, float32).
+DEFAULT_BATCH_MEMORY_MB = 1024
+ACTIVATION_FACTOR = 170
+MAX_SEGMENT_BATCH = 16
+
 
 class BagOfModels(nn.Module):
     def __init__(self, models: tp.List[Model],
@@ -142,6 +148,138 @@ def _replace_dict(_dict: tp.Optional[dict], *subs: tp.Tuple[tp.Hashable, tp.Any]
     return _dict
 
 
+def _valid_length(model: Model, length: int, segment: tp.Optional[float]) -> int:
+    if isinstance(model, HTDemucs) and segment is not None:
+        return int(segment * model.samplerate)
+    elif hasattr(model, 'valid_length'):
+        return model.valid_length(length)  # type: ignore
+    else:
+        return length
+
+
+def segment_batch_size(model: Model, valid_length: int, batch: int = 1,
+                       memory_mb: float = DEFAULT_BATCH_MEMORY_MB) -> int:
+    """
+    Number of segments per forward pass that fits in the memory budget.
+
+    Args:
+        model (nn.Module): the model the segments are given to.
+        valid_length (int): padded length of one segment.
+        batch (int): batch size of the mix.
+        memory_mb (float): memory budget for one forward pass, in MB.
+    """
+    segment_bytes = 4 * batch * model.audio_channels * valid_length * ACTIVATION_FACTOR
+    return int(max(1, min(MAX_SEGMENT_BATCH, memory_mb * 1024 * 1024 // segment_bytes)))
+
+
+def _apply_segments(model: Model, chunks: tp.List[TensorChunk], offsets: tp.List[int],
+                    valid_length: int, device, lock,
+                    callback: tp.Optional[tp.Callable[[dict], None]],
+                    callback_arg: dict) -> tp.List[th.Tensor]:
+    """
+    Run the model once on several segments stacked along the batch dimension.
+    Returns the output of each segment, trimmed to the segment length.
+    """
+    padded_mix = th.cat([chunk.padded(valid_length) for chunk in chunks]).to(device)
+    with lock:
+        if callback is not None:
+            for offset in offsets:
+                callback(_replace_dict(callback_arg, ("segment_offset", offset), ("state", "start")))
+    with th.no_grad():
+        out = model(padded_mix)
+    with lock:
+        if callback is not None:
+            for offset in offsets:
+                callback(_replace_dict(callback_arg, ("segment_offset", offset), ("state", "end")))
+    batch = chunks[0].shape[0]
+    return [center_trim(chunk_out, chunk.length)
+            for chunk_out, chunk in zip(out.split(batch), chunks)]
+
+
+def _apply_parallel(model: tp.Union[BagOfModels, Model], mix: tp.Union[th.Tensor, TensorChunk],
+                    shifts: int, device, kwargs: tp.Dict[str, tp.Any],
+                    callback: tp.Optional[tp.Callable[[dict], None]], callback_arg: dict,
+                    parallel_jobs: int, threads_per_job: int) -> th.Tensor:
+    """
+    Run the bag members and the shift replicas of `apply_model` concurrently.
+
+    Every (model, shift) pair becomes one job on a thread pool of `parallel_jobs` workers.
+    The jobs share the model weights (read-only, nothing is copied). The intra-op thread
+    count is set to `threads_per_job` (0: the current count divided by the jobs) before the
+    jobs start and restored when they finish. `th.set_num_threads` is process-wide: every
+    job uses the same count, and other torch work running in the meantime sees it as well.
+    The shift offsets are drawn up front, so the result only differs from the sequential
+    path by the random offsets themselves.
+    """
+    if isinstance(model, BagOfModels):
+        models, model_weights = list(model.models), model.weights
+        callback_arg["models"] = len(models)
+    else:
+        models, model_weights = [model], [[1.] * len(model.sources)]
+        callback_arg.setdefault("models", 1)
+    length = mix.shape[-1]
+    original_devices = [next(iter(sub_model.parameters())).device for sub_model in models]
+    jobs = []
+    for model_idx, sub_model in enumerate(models):
+        sub_model.to(device)
+        sub_model.eval()
+        if not shifts:
+            jobs.append((model_idx, 0, sub_model, mix, 0))
+            continue
+        max_shift = int(0.5 * sub_model.samplerate)
+        mix_chunk = tensor_chunk(mix)
+        padded_mix = mix_chunk.padded(length + 2 * max_shift)
+        for shift_idx in range(shifts):
+            offset = random.randint(0, max_shift)
+            shifted = TensorChunk(padded_mix, offset, length + max_shift - offset)
+            jobs.append((model_idx, shift_idx, sub_model, shifted, max_shift - offset))
+
+    num_threads = th.get_num_threads()
+    threads_per_job = threads_per_job or max(1, num_threads // min(parallel_jobs, len(jobs)))
+    job_kwargs = dict(kwargs, shifts=0, parallel_jobs=0)
+
+    def run(model_idx, shift_idx, sub_model, chunk):
+        job_callback = ((lambda d: callback(_replace_dict(
+            d, ("model_idx_in_bag", model_idx), ("shift_idx", shift_idx))))
+            if callback else None)
+        return apply_model(sub_model, chunk, **job_kwargs, callback=job_callback,
+                           callback_arg=callback_arg)
+
+    # Set once here, the worker threads pick the count up when they first run a parallel op.
+    th.set_num_threads(threads_per_job)
+    try:
+        with ThreadPoolExecutor(min(parallel_jobs, len(jobs))) as executor:
+            futures = [executor.submit(run, model_idx, shift_idx, sub_model, chunk)
+                       for model_idx, shift_idx, sub_model, chunk, _ in jobs]
+            results = [future.result() for future in futures]
+    finally:
+        th.set_num_threads(num_threads)
+        for sub_model, original_device in zip(models, original_devices):
+            sub_model.to(original_device)
+
+    # Same reduction order as the sequential path.
+    estimates: tp.Union[float, th.Tensor] = 0.
+    totals = [0.] * len(models[0].sources)
+    for model_idx, weights in enumerate(model_weights):
+        out: tp.Union[float, th.Tensor] = 0.
+        for (job_model_idx, _, _, _, trim), res in zip(jobs, results):
+            if job_model_idx == model_idx:
+                out += res[..., trim:]
+        if shifts:
+            out /= shifts
+        assert isinstance(out, th.Tensor)
+        if not isinstance(model, BagOfModels):
+            return out
+        for k, inst_weight in enumerate(weights):
+            out[:, k, :, :] *= inst_weight
+            totals[k] += inst_weight
+        estimates += out
+    assert isinstance(estimates, th.Tensor)
+    for k in range(estimates.shape[1]):
+        estimates[:, k, :, :] /= totals[k]
+    return estimates
+
+
 def apply_model(model: tp.Union[BagOfModels, Model],
                 mix: tp.Union[th.Tensor, TensorChunk],
                 shifts: int = 1, split: bool = True,
@@ -150,7 +288,10 @@ def apply_model(model: tp.Union[BagOfModels, Model],
                 num_workers: int = 0, segment: tp.Optional[float] = None,
                 pool=None, lock=None,
                 callback: tp.Optional[tp.Callable[[dict], None]] = None,
-                callback_arg: tp.Optional[dict] = None) -> th.Tensor:
+                callback_arg: tp.Optional[dict] = None,
+                segment_batch: int = 1,
+                batch_memory_mb: float = DEFAULT_BATCH_MEMORY_MB,
+                parallel_jobs: int = 0, threads_per_job: int = 0) -> th.Tensor:
     """
     Apply model to a given mixture.
 
@@ -170,6 +311,13 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         num_workers (int): if non zero, device is 'cpu', how many threads to
             use in parallel.
         segment (float or None): override the model segment parameter.
+        segment_batch (int): with `split`, number of segments stacked into one forward
+            pass. 1 runs each segment on its own, 0 picks the number from `batch_memory_mb`.
+        batch_memory_mb (float): memory budget of one forward pass when `segment_batch` is 0.
+        parallel_jobs (int): if > 1, the models of a bag and the shift replicas run
+            concurrently on that many threads, sharing the model weights.
+        threads_per_job (int): intra-op threads of each parallel job, 0 splits the current
+            number of threads between the jobs. The count is process-wide while the jobs run.
     """
     if device is None:
         device = mix.device
@@ -195,9 +343,15 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         'pool': pool,
         'segment': segment,
         'lock': lock,
+        'segment_batch': segment_batch,
+        'batch_memory_mb': batch_memory_mb,
     }
     out: tp.Union[float, th.Tensor]
     res: tp.Union[float, th.Tensor]
+    if parallel_jobs > 1 and (isinstance(model, BagOfModels) or shifts > 1):
+        assert transition_power >= 1, "transition_power < 1 leads to weird behavior."
+        return _apply_parallel(model, mix, shifts, device, kwargs, callback, callback_arg,
+                               parallel_jobs, threads_per_job)
     if isinstance(model, BagOfModels):
         # Special treatment for bag of model.
         # We explicitely apply multiple times `apply_model` so that the random shifts
@@ -275,6 +429,41 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         # transition_power is 1.
         weight = (weight / weight.max())**transition_power
         futures = []
+        if segment_batch != 1:
+            # Batched split mode: segments with the same padded length are stacked and
+            # given to the model together, the results are scattered back below.
+            groups: tp.List[tp.Tuple[int, tp.List[int]]] = []
+            max_batch = segment_batch
+            for offset in offsets:
+                chunk_length = min(segment_length, length - offset)
+                valid_length = _valid_length(model, chunk_length, kwargs['segment'])
+                if not max_batch:
+                    max_batch = segment_batch_size(model, valid_length, batch, batch_memory_mb)
+                if groups and groups[-1][0] == valid_length and len(groups[-1][1]) < max_batch:
+                    groups[-1][1].append(offset)
+                else:
+                    groups.append((valid_length, [offset]))
+            for valid_length, group in groups:
+                future = pool.submit(_apply_segments, model,
+                                     [TensorChunk(mix, offset, segment_length) for offset in group],
+                                     group, valid_length, device, lock, callback, callback_arg)
+                futures.append((future, group))
+            if progress:
+                futures = tqdm.tqdm(futures, unit_scale=scale * max_batch, ncols=120, unit='seconds')
+            for future, group in futures:
+                try:
+                    chunk_outs = future.result()
+                except Exception:
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise
+                for offset, chunk_out in zip(group, chunk_outs):
+                    chunk_length = chunk_out.shape[-1]
+                    out[..., offset:offset + segment_length] += (
+                        weight[:chunk_length] * chunk_out).to(mix.device)
+                    sum_weight[offset:offset + segment_length] += weight[:chunk_length].to(mix.device)
+            assert sum_weight.min() > 0
+            out /= sum_weight
+            return out
         for offset in offsets:
             chunk = TensorChunk(mix, offset, segment_length)
             future = pool.submit(apply_model, model, chunk, **kwargs, callback_arg=callback_arg,
@@ -300,13 +489,7 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         assert isinstance(out, th.Tensor)
         return out
     else:
-        valid_length: int
-        if isinstance(model, HTDemucs) and segment is not None:
-            valid_length = int(segment * model.samplerate)
-        elif hasattr(model, 'valid_length'):
-            valid_length = model.valid_length(length)  # type: ignore
-        else:
-            valid_length = length
+        valid_length = _valid_length(model, length, segment)
         mix = tensor_chunk(mix)
         assert isinstance(mix, TensorChunk)
         padded_mix = mix.padded(valid_length).to(device)
@@ -320,3 +503,189 @@ def apply_model(model: tp.Union[BagOfModels, Model],
                 callback(_replace_dict(callback_arg, ("state", "end")))  # type: ignore
         assert isinstance(out, th.Tensor)
         return center_trim(out, length)
+
+
+class _StreamLane:
+    """
+    One pass of `apply_model_stream`: a single model, with or without a random shift,
+    and its overlap-add buffers. Lane position `u` reads the mix at `u + delay`.
+    """
+    def __init__(self, model: Model, model_idx: int, shift_idx: int, delay: int, length: int,
+                 segment: tp.Optional[float], overlap: float, transition_power: float):
+        self.model = model
+        self.model_idx = model_idx
+        self.shift_idx = shift_idx
+        self.delay = delay
+        self.lane_length = length - delay
+        self.segment = segment
+        segment_length = int(model.samplerate * (segment if segment is not None else model.segment))
+        self.segment_length = segment_length
+        self.stride = int((1 - overlap) * segment_length)
+        self.full_valid_length = _valid_length(model, segment_length, segment)
+        # Same triangle weight as the split mode of `apply_model`.
+        weight = th.cat([th.arange(1, segment_length // 2 + 1),
+                         th.arange(segment_length - segment_length // 2, 0, -1)])
+        self.weight = (weight / weight.max())**transition_power
+        self.offset = 0
+        self.out: tp.Optional[th.Tensor] = None
+        self.sum_weight: tp.Optional[th.Tensor] = None
+
+    @property
+    def done(self) -> bool:
+        return self.offset >= self.lane_length
+
+    @property
+    def position(self) -> int:
+        """Mix position before which this lane will not add anything anymore."""
+        return self.offset + self.delay
+
+    def window(self) -> tp.Tuple[int, int, int]:
+        """Mix position and padded length of the next segment, and its unpadded length."""
+        chunk_length = min(self.segment_length, self.lane_length - self.offset)
+        if chunk_length == self.segment_length:
+            valid_length = self.full_valid_length
+        else:
+            valid_length = _valid_length(self.model, chunk_length, self.segment)
+        start = self.offset - (valid_length - chunk_length) // 2 + self.delay
+        return start, valid_length, chunk_length
+
+    def accumulate(self, chunk_out: th.Tensor, start: int, emitted: int, length: int):
+        """Adds the weighted output of a segment starting at mix position `start`."""
+        chunk_length = chunk_out.shape[-1]
+        weight = self.weight[:chunk_length]
+        begin, end = max(start, emitted, 0), min(start + chunk_length, length)
+        if begin >= end:
+            return
+        chunk_out = chunk_out[..., begin - start:end - start]
+        weight = weight[begin - start:end - start]
+        size = end - emitted
+        if self.out is None:
+            self.out = chunk_out.new_zeros(*chunk_out.shape[:-1], 0)
+            self.sum_weight = weight.new_zeros(0)
+        assert self.sum_weight is not None
+        if self.out.shape[-1] < size:
+            grow = size - self.out.shape[-1]
+            self.out = th.cat([self.out, self.out.new_zeros(*self.out.shape[:-1], grow)], -1)
+            self.sum_weight = th.cat([self.sum_weight, self.sum_weight.new_zeros(grow)])
+        self.out[..., begin - emitted:end - emitted] += weight * chunk_out
+        self.sum_weight[begin - emitted:end - emitted] += weight
+
+    def pop(self, size: int) -> th.Tensor:
+        """Removes and returns the normalized output of the next `size` samples."""
+        assert self.out is not None and self.sum_weight is not None
+        assert self.sum_weight[:size].min() > 0
+        out = self.out[..., :size] / self.sum_weight[:size]
+        self.out = self.out[..., size:].clone()
+        self.sum_weight = self.sum_weight[size:].clone()
+        return out
+
+
+def apply_model_stream(model: tp.Union[BagOfModels, Model],
+                       blocks: tp.Iterable[th.Tensor], length: int,
+                       shifts: int = 1, overlap: float = 0.25, transition_power: float = 1.,
+                       device=None, segment: tp.Optional[float] = None,
+                       callback: tp.Optional[tp.Callable[[dict], None]] = None,
+                       callback_arg: tp.Optional[dict] = None) -> tp.Iterator[th.Tensor]:
+    """
+    Streaming version of `apply_model` in split mode, with memory use independent of
+    the duration of the mix.
+
+    The mix is given as consecutive `[C, T]` blocks of any size, and the separated
+    sources are yielded as consecutive `[S, C, T]` regions as soon as no later segment
+    can contribute to them anymore. Segments, overlap-add weights, shifts and bag weights
+    are the same as `apply_model(model, mix[None], split=True)`, so the concatenated
+    output matches it up to float rounding (with the same random shifts).
+
+    Args:
+        blocks (iterable of tensors): the mix, as `[C, T]` blocks.
+        length (int): total length of the mix, in samples.
+        shifts, overlap, transition_power, segment: see `apply_model`.
+        device (torch.device, str, or None): device of the model, the mix and the
+            output are kept on the CPU.
+    """
+    device = th.device(device) if device is not None else th.device('cpu')
+    models = list(model.models) if isinstance(model, BagOfModels) else [model]
+    model_weights = model.weights if isinstance(model, BagOfModels) else None
+    callback_arg = _replace_dict(callback_arg, ("models", len(models)))
+    lanes = []
+    for model_idx, sub_model in enumerate(models):
+        sub_model.to(device)
+        sub_model.eval()
+        if not shifts:
+            lanes.append(_StreamLane(sub_model, model_idx, 0, 0, length, segment,
+                                     overlap, transition_power))
+            continue
+        max_shift = int(0.5 * sub_model.samplerate)
+        for shift_idx in range(shifts):
+            offset = random.randint(0, max_shift)
+            lanes.append(_StreamLane(sub_model, model_idx, shift_idx, offset - max_shift, length,
+                                     segment, overlap, transition_power))
+
+    blocks = iter(blocks)
+    buffer: tp.Optional[th.Tensor] = None
+    buffer_start = 0
+    emitted = 0
+    while emitted < length:
+        pending = [lane for lane in lanes if not lane.done]
+        lane = min(pending, key=lambda lane: lane.position) if pending else None
+        if lane is not None:
+            start, valid_length, chunk_length = lane.window()
+            buffer_end = buffer_start + (buffer.shape[-1] if buffer is not None else 0)
+            if start + valid_length > buffer_end and buffer_end < length:
+                block = next(blocks, None)
+                if block is None:
+                    raise ValueError(f"The blocks hold {buffer_end} samples, expected {length}.")
+                block = block[..., :length - buffer_end]
+                buffer = block if buffer is None else th.cat([buffer, block], -1)
+                continue
+            assert buffer is not None
+            # Zero padded outside of the mix, as `TensorChunk.padded`.
+            chunk = buffer.new_zeros(buffer.shape[0], valid_length)
+            begin, end = max(start, buffer_start), min(start + valid_length, buffer_end)
+            chunk[:, begin - start:end - start] = buffer[:, begin - buffer_start:end - buffer_start]
+            info = (("model_idx_in_bag", lane.model_idx), ("shift_idx", lane.shift_idx),
+                    ("segment_offset", lane.offset))
+            if callback is not None:
+                callback(_replace_dict(callback_arg, *info, ("state", "start")))
+            with th.no_grad():
+                chunk_out = lane.model(chunk[None].to(device))
+            if callback is not None:
+                callback(_replace_dict(callback_arg, *info, ("state", "end")))
+            chunk_out = center_trim(chunk_out, chunk_length)[0].to(buffer.device)
+            lane.accumulate(chunk_out, lane.position, emitted, length)
+            lane.offset += lane.stride
+
+        finished = min([lane.position for lane in lanes if not lane.done], default=length)
+        finished = min(max(finished, 0), length)
+        if finished > emitted:
+            size = finished - emitted
+            estimates: tp.Union[float, th.Tensor] = 0.
+            totals = [0.] * len(models[0].sources)
+            for model_idx in range(len(models)):
+                out: tp.Union[float, th.Tensor] = 0.
+                for model_lane in lanes:
+                    if model_lane.model_idx == model_idx:
+                        out += model_lane.pop(size)
+                if shifts:
+                    out /= shifts
+                assert isinstance(out, th.Tensor)
+                if model_weights is None:
+                    estimates = out
+                    break
+                for k, inst_weight in enumerate(model_weights[model_idx]):
+                    out[k, :, :] *= inst_weight
+                    totals[k] += inst_weight
+                estimates += out
+            assert isinstance(estimates, th.Tensor)
+            if model_weights is not None:
+                for k in range(estimates.shape[0]):
+                    estimates[k, :, :] /= totals[k]
+            yield estimates
+            emitted = finished
+            # Keep only the mix still needed by the next segments.
+            keep = min([lane.position - lane.full_valid_length for lane in lanes if not lane.done],
+                       default=length)
+            keep = max(keep, buffer_start)
+            if buffer is not None and keep > buffer_start:
+                buffer = buffer[:, keep - buffer_start:].clone()
+                buffer_start = keep
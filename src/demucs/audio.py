@@ -140,6 +140,43 @@ class AudioFile:
         return wav
 
 
+    def stream(self, block_size, stream=0, samplerate=None, channels=None):
+        """
+        Reads the file block by block from a single ffmpeg process, so that memory use does
+        not depend on the duration of the file.
+
+        Args:
+            block_size (int): number of samples (at the output samplerate) per block.
+            stream (int): index of the audio stream.
+            samplerate (int): if provided, will resample on the fly.
+            channels (int): number of channels, see :method:`read`.
+
+        Yields:
+            [C, T] tensors with T <= block_size, the last block may be shorter.
+        """
+        src_channels = self.channels(stream)
+        command = ['ffmpeg', '-loglevel', 'panic', '-nostdin', '-i', str(self.path)]
+        command += ['-map', f'0:{self._audio_streams[stream]}', '-threads', '1', '-f', 'f32le']
+        if samplerate is not None:
+            command += ['-ar', str(samplerate)]
+        command += ['pipe:1']
+        frame_size = 4 * src_channels
+        with sp.Popen(command, stdout=sp.PIPE) as process:
+            assert process.stdout is not None
+            while True:
+                data = process.stdout.read(block_size * frame_size)
+                data = data[:len(data) - len(data) % frame_size]
+                if not data:
+                    break
+                wav = torch.from_numpy(np.frombuffer(data, dtype=np.float32).copy())
+                wav = wav.view(-1, src_channels).t()
+                if channels is not None:
+                    wav = convert_audio_channels(wav, channels)
+                yield wav
+        if process.returncode:
+            raise sp.CalledProcessError(process.returncode, command)
+
+
 def convert_audio_channels(wav, channels=2):
     """Convert audio to the given number of channels."""
     *shape, src_channels, length = wav.shape
@@ -13,6 +13,8 @@ import hashlib
 import inspect
 import io
 from pathlib import Path
+import pickle
+import types
 import warnings
 
 from omegaconf import OmegaConf
@@ -47,6 +49,19 @@ def get_quantizer(model, args, optimizer=None):
     return quantizer
 
 
+class _Unpickler(pickle.Unpickler):
+    """Released checkpoints pickle the model class as `demucs.<module>.<class>`. Resolve it in
+    this package so that the isinstance checks in `apply_model` see the same classes, whether
+    or not the `demucs` package is also installed."""
+    def find_class(self, module, name):
+        if module == 'demucs' or module.startswith('demucs.'):
+            module = __package__ + module[len('demucs'):]
+        return super().find_class(module, name)
+
+
+_pickle_module = types.SimpleNamespace(Unpickler=_Unpickler, load=pickle.load, __name__='demucs_pickle')
+
+
 def load_model(path_or_package, strict=False):
     """Load a model from the given serialized model, either given as a dict (already loaded)
     or a path to a file on disk."""
@@ -56,7 +71,7 @@ def load_model(path_or_package, strict=False):
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             path = path_or_package
-            package = torch.load(path, 'cpu')
+            package = torch.load(path, 'cpu', pickle_module=_pickle_module, weights_only=False)
     else:
         raise ValueError(f"Invalid type for {path_or_package}.")
 
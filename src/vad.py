@@ -2,6 +2,7 @@
 
 import os
 import subprocess
+import threading
 import torch
 import numpy as np
 import onnxruntime
@@ -30,6 +31,8 @@ class VoiceActivityDetection():
 
         self.reset_states()
         self.sample_rates = [8000, 16000]
+        # _h / _c 는 호출마다 갱신되는 RNN 상태라 여러 스레드가 같은 인스턴스를 쓰면 audio_forward 를 한 번에 하나씩 실행한다
+        self._lock = threading.Lock()
 
     def _validate_input(self, x, sr: int):
         if x.dim() == 1:
@@ -89,15 +92,64 @@ class VoiceActivityDetection():
             pad_num = num_samples - (x.shape[1] % num_samples)
             x = torch.nn.functional.pad(x, (0, pad_num), 'constant', value=0.0)
 
-        self.reset_states(x.shape[0])
-        for i in range(0, x.shape[1], num_samples):
-            wavs_batch = x[:, i:i+num_samples]
-            out_chunk = self.__call__(wavs_batch, sr)
-            outs.append(out_chunk)
+        with self._lock:
+            self.reset_states(x.shape[0])
+            for i in range(0, x.shape[1], num_samples):
+                wavs_batch = x[:, i:i+num_samples]
+                out_chunk = self.__call__(wavs_batch, sr)
+                outs.append(out_chunk)
 
         stacked = torch.cat(outs, dim=1)
         return stacked.cpu()
 
+    def speech_timestamps(self, audio: np.ndarray, sr: int = 16000, threshold: float = 0.5,
+                          min_speech_duration_ms: int = 250, min_silence_duration_ms: int = 100,
+                          speech_pad_ms: int = 30, num_samples: int = 512):
+        """
+        Returns speech regions as a list of {'start': sample, 'end': sample} dicts
+        (same rules as get_speech_timestamps in silero-vad utils_vad.py).
+        """
+        probs = self.audio_forward(torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32)), sr, num_samples)[0].numpy()
+        neg_threshold = threshold - 0.15
+        min_speech_samples = sr * min_speech_duration_ms // 1000
+        min_silence_samples = sr * min_silence_duration_ms // 1000
+        speech_pad_samples = sr * speech_pad_ms // 1000
+        audio_length = len(audio)
+
+        speeches = []
+        triggered = False
+        start = temp_end = 0
+        for i, speech_prob in enumerate(probs):
+            position = num_samples * i
+            if speech_prob >= threshold and temp_end:
+                temp_end = 0
+            if speech_prob >= threshold and not triggered:
+                triggered = True
+                start = position
+                continue
+            if speech_prob < neg_threshold and triggered:
+                if not temp_end:
+                    temp_end = position
+                if position - temp_end < min_silence_samples:
+                    continue
+                if temp_end - start > min_speech_samples:
+                    speeches.append({'start': start, 'end': temp_end})
+                triggered = False
+                temp_end = 0
+
+        if triggered and audio_length - start > min_speech_samples:
+            speeches.append({'start': start, 'end': audio_length})
+
+        for i, speech in enumerate(speeches):
+            speech['start'] = max(0, speech['start'] - speech_pad_samples)
+            speech['end'] = min(audio_length, speech['end'] + speech_pad_samples)
+            if i > 0 and speech['start'] < speeches[i - 1]['end']:
+                middle = (speech['start'] + speeches[i - 1]['end']) // 2
+                speeches[i - 1]['end'] = middle
+                speech['start'] = middle
+
+        return speeches
+
     @staticmethod
     def download(model_url="https://github.com/snakers4/silero-vad/blob/master/files/silero_vad.onnx"):
         target_dir = os.path.expanduser("~/.cache/whisper-live/")
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+import torch
+
+from src.demucs.apply import apply_model, apply_model_stream, BagOfModels
+from src.demucs.demucs import Demucs
+from src.demucs.htdemucs import HTDemucs
+
+
+SOURCES = ['drums', 'bass', 'other', 'vocals']
+
+
+def make_models():
+    torch.manual_seed(0)
+    htdemucs = HTDemucs(sources=SOURCES, channels=8, t_layers=1, segment=2).eval()
+    demucs = [Demucs(sources=SOURCES, channels=8, depth=3, segment=2).eval() for _ in range(2)]
+    bag = BagOfModels(demucs, weights=[[1., 1., 1., 1.], [0.5, 1., 1., 2.]])
+    return {'htdemucs': htdemucs, 'demucs': demucs[0], 'bag': bag}
+
+
+MODELS = make_models()
+
+
+def stream(model, mix, block_size, shifts):
+    return torch.cat(list(apply_model_stream(model, mix.split(block_size, -1), mix.shape[-1], shifts=shifts)), -1)
+
+
+@pytest.mark.parametrize('name, shifts', [('htdemucs', 0), ('demucs', 0), ('demucs', 2), ('bag', 2)])
+@pytest.mark.parametrize('length', [30000, int(44100 * 5.3)])
+@pytest.mark.parametrize('block_size', [7000, 100000])
+def test_stream_matches_apply_model(name, shifts, length, block_size):
+    model = MODELS[name]
+    mix = torch.randn(2, length)
+
+    # Demucs 는 forward 에서 난수를 쓰지 않으므로 같은 seed 면 shift 위치가 같다
+    random.seed(3)
+    reference = apply_model(model, mix[None], shifts=shifts, split=True)[0]
+    random.seed(3)
+    out = stream(model, mix, block_size, shifts)
+
+    assert out.shape == reference.shape
+    assert torch.allclose(out, reference, atol=1e-5)
+
+
+def test_stream_memory_does_not_grow_with_duration():
+    model = MODELS['demucs']
+    block_size = 44100
+    mix = torch.randn(2, 44100 * 30)
+    consumed = []
+
+    def blocks():
+        for i, block in enumerate(mix.split(block_size, -1)):
+            consumed.append(i)
+            yield block
+
+    regions = []
+    for region in apply_model_stream(model, blocks(), mix.shape[-1], shifts=1):
+        # 출력은 입력을 따라가며 나오고, 한 번에 내보내는 구간은 조각 하나(+ shift) 이하다
+        assert (len(consumed) * block_size) - sum(regions) <= 44100 * 5
+        regions.append(region.shape[-1])
+    assert sum(regions) == mix.shape[-1]
+    assert max(regions) <= 44100 * 2
+    assert len(regions) > 10
@@ -0,0 +1,52 @@
+import sys
+from unittest import mock
+
+import numpy as np
+import pytest
+import torch
+
+# src.shared 가 import 할 때 sys.argv 를 파싱하므로 pytest 인자를 숨긴다
+with mock.patch.object(sys, 'argv', sys.argv[:1]):
+    from app.abus_tts_f5 import F5TTS, target_sample_rate
+from benchmarks.bench_f5_batch import make_model, make_vocoder, make_reference
+
+
+SHORT = 'The quick brown fox jumps.'
+LONGER = [
+    'Seven bright stars shine above the quiet harbor.',
+    'Seven bright stars shine above the quiet harbor and distant ships return home tonight.',
+]
+
+
+@pytest.fixture(scope='module')
+def f5():
+    """체크포인트 없이 작은 랜덤 DiT / Vocos 로 만든 F5TTS"""
+    torch.manual_seed(0)
+    tts = F5TTS.__new__(F5TTS)
+    tts.ema_model = make_model(64, 2)
+    tts.vocoder = make_vocoder(64)
+    return tts, make_reference(tts.ema_model)
+
+
+def relative_error(expected, actual):
+    return np.sqrt(np.mean((expected - actual) ** 2)) / (np.sqrt(np.mean(expected ** 2)) + 1e-9)
+
+
+@pytest.mark.parametrize('longer', LONGER)
+def test_chunk_in_mixed_bucket_matches_chunk_alone(f5, longer):
+    tts, reference = f5
+    short = F5TTS.split_chunks(reference, SHORT, 1.0)[0]
+    long = F5TTS.split_chunks(reference, longer, 1.0)[0]
+    assert long[1] > short[1]
+
+    # CFM.sample 은 조각 순서대로 초기 잡음을 뽑으므로 같은 seed 면 첫 조각의 잡음이 같다
+    torch.manual_seed(3)
+    alone = tts.sample_batch(reference, [short], nfe_step=4)[0]
+    torch.manual_seed(3)
+    mixed = tts.sample_batch(reference, [short, long], nfe_step=4)[0]
+
+    assert mixed.shape == alone.shape
+    assert relative_error(alone, mixed) < 1e-4
+    # 패딩이 보코더를 거쳐 새어 들어오던 끝부분 0.3 초
+    tail = int(0.3 * target_sample_rate)
+    assert relative_error(alone[-tail:], mixed[-tail:]) < 1e-4
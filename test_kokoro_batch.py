@@ -0,0 +1,129 @@
+import sys
+from unittest import mock
+
+import numpy as np
+import pytest
+import torch
+
+from kokoro import KPipeline, KModel
+
+# src.shared 가 import 할 때 sys.argv 를 파싱하므로 pytest 인자를 숨긴다
+with mock.patch.object(sys, 'argv', sys.argv[:1]):
+    import app.abus_tts_kokoro as abus_tts_kokoro
+from app.abus_tts_kokoro import KokoroTTS, kokoro_forward_batch
+from app.abus_voice_kokoro import KokoroVoice
+
+
+SYMBOLS = ' .,!?abcdefghijklmnopqrstuvwxyz'
+
+LINES = [
+    'Hello there.',
+    'The quick brown fox jumps over the lazy dog.',
+    'Seven bright stars shine above the quiet harbor tonight.',
+    'Go!',
+    'Distant ships return home.',
+]
+
+
+def make_model(tmp_path):
+    """
+    체크포인트 없이 Kokoro-82M 과 같은 구조의 작은 랜덤 KModel.
+    디코더 채널 수가 고정값이라 hidden_dim 은 512 이고, max_dur 를 줄여 토큰당 프레임 수를 작게 둡니다.
+    """
+    torch.manual_seed(0)
+    config = {
+        'vocab': {symbol: i + 1 for i, symbol in enumerate(SYMBOLS)},
+        'n_token': len(SYMBOLS) + 1,
+        'plbert': dict(hidden_size=64, num_attention_heads=2, intermediate_size=128,
+                       max_position_embeddings=512, num_hidden_layers=2, dropout=0.1),
+        'hidden_dim': 512,
+        'style_dim': 128,
+        'n_layer': 1,
+        'max_dur': 4,
+        'dropout': 0.2,
+        'text_encoder_kernel_size': 5,
+        'n_mels': 80,
+        'istftnet': dict(upsample_kernel_sizes=[20, 12], upsample_rates=[10, 6], gen_istft_hop_size=5,
+                         gen_istft_n_fft=20, resblock_dilation_sizes=[[1, 3, 5]] * 3,
+                         resblock_kernel_sizes=[3, 7, 11], upsample_initial_channel=512),
+    }
+    weights = tmp_path / 'empty.pth'
+    torch.save({}, weights)
+    return KModel(repo_id=abus_tts_kokoro.KOKORO_REPO_ID, config=config, model=str(weights)).eval()
+
+
+def make_pipeline(voice_code):
+    """G2P 없이 글자를 그대로 음소로 쓰는 파이프라인 (영어 외 언어의 조각 나누기 경로)"""
+    pipeline = KPipeline.__new__(KPipeline)
+    pipeline.lang_code = 'e'
+    pipeline.repo_id = abus_tts_kokoro.KOKORO_REPO_ID
+    pipeline.model = None
+    pipeline.g2p = lambda text: (text.lower(), None)
+    pipeline.voices = {voice_code: torch.randn(510, 1, 256) * 0.1}
+    return pipeline
+
+
+@pytest.fixture(scope='module')
+def kokoro(tmp_path_factory):
+    model = make_model(tmp_path_factory.mktemp('kokoro'))
+    pipeline = make_pipeline('ef_test')
+    voice = KokoroVoice('', 'e', 'ef_test', '', 'ef_test', '')
+    return pipeline, model, voice
+
+
+@pytest.fixture
+def pool(kokoro, monkeypatch):
+    pipeline, model, _ = kokoro
+    monkeypatch.setattr(abus_tts_kokoro.kokoro_pipeline_pool, 'acquire', lambda lang_code, voice_code: (pipeline, model))
+    monkeypatch.setattr(abus_tts_kokoro.kokoro_pipeline_pool, 'release', lambda lang_code: None)
+
+
+@pytest.fixture
+def no_noise(monkeypatch):
+    # SineGen 의 잡음 / 초기 위상을 끄면 줄별 합성과 배치 합성을 직접 비교할 수 있다
+    monkeypatch.setattr(torch, 'randn_like', lambda x, *args, **kwargs: torch.zeros_like(x))
+    monkeypatch.setattr(torch, 'rand', lambda *size, **kwargs: torch.zeros(*size, device=kwargs.get('device')))
+
+
+def test_batch_size_one_matches_synthesize(kokoro, pool):
+    _, _, voice = kokoro
+    tts = KokoroTTS()
+
+    torch.manual_seed(1)
+    reference = [tts.synthesize(line, voice, 1.0) for line in LINES]
+    torch.manual_seed(1)
+    results = tts.synthesize_batch(LINES, voice, 1.0, batch_size=1)
+
+    assert len(results) == len(LINES)
+    for expected, samples in zip(reference, results):
+        assert samples is not None
+        assert samples.shape == expected.shape
+        np.testing.assert_array_equal(samples, expected)
+
+
+@pytest.mark.parametrize('speed', [1.0, 1.3])
+def test_padded_batch_matches_single_lines(kokoro, no_noise, speed):
+    pipeline, model, voice = kokoro
+    pack = pipeline.load_voice(voice.voice_code)
+    phonemes = [KokoroTTS.phonemize(pipeline, line) for line in LINES]
+
+    reference = [KPipeline.infer(model, ps, pack, speed).audio for ps in phonemes]
+    ref_s = torch.cat([pack[len(ps) - 1] for ps in phonemes])
+    audios = kokoro_forward_batch(model, phonemes, ref_s, speed)
+
+    for expected, audio in zip(reference, audios):
+        # 길이 예측은 줄마다 같고, 파형은 패딩 경계 근처의 STFT 차이만 남는다
+        assert audio.shape == expected.shape
+        error = torch.sqrt(torch.mean((audio - expected) ** 2)) / (torch.sqrt(torch.mean(expected ** 2)) + 1e-9)
+        assert error < 1e-2
+
+
+def test_batch_keeps_line_order_and_empty_lines(kokoro, pool):
+    _, _, voice = kokoro
+    lines = LINES[:2] + [''] + LINES[2:]
+    results = KokoroTTS().synthesize_batch(lines, voice, 1.0, batch_size=4)
+
+    assert len(results) == len(lines)
+    assert results[2] is None
+    assert all(samples is not None for samples in results[:2] + results[3:])
+    assert len(results[3]) > len(results[4])       # 'Seven bright stars ...' 가 'Go!' 보다 길다
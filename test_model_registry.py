@@ -0,0 +1,78 @@
+import time
+
+from app.abus_model_registry import AbusModelRegistry
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return object()
+
+
+def test_acquire_reuses_model():
+    registry = AbusModelRegistry(budget_mb=0, idle_timeout=0)
+    loader = Loader()
+    key = ('faster-whisper', 'medium', 'float16', 'cuda')
+
+    first = registry.acquire(key, loader, size_mb=100)
+    registry.release(key)
+    second = registry.acquire(key, loader, size_mb=100)
+    registry.release(key)
+
+    assert first is second
+    assert loader.calls == 1
+    stats = registry.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['saved_time'] == stats['load_time']
+
+
+def test_lru_eviction_under_budget():
+    registry = AbusModelRegistry(budget_mb=250, idle_timeout=0)
+    for name in ('a', 'b'):
+        with registry.borrow(name, Loader(), size_mb=100):
+            pass
+
+    # a 를 다시 사용해 b 가 가장 오래된 모델이 되도록 한다
+    with registry.borrow('a', Loader(), size_mb=100):
+        pass
+    with registry.borrow('c', Loader(), size_mb=100):
+        pass
+
+    keys = [model['key'] for model in registry.stats()['models']]
+    assert keys == ['a', 'c']
+    assert registry.used_mb() == 200
+
+
+def test_borrowed_and_pinned_models_are_not_evicted():
+    registry = AbusModelRegistry(budget_mb=150, idle_timeout=0)
+    registry.pin('a')
+    with registry.borrow('a', Loader(), size_mb=100):
+        pass
+    registry.acquire('b', Loader(), size_mb=100)
+    registry.acquire('c', Loader(), size_mb=100)
+
+    # 예산을 넘더라도 고정되었거나 빌려간 모델은 유지된다
+    assert {model['key'] for model in registry.stats()['models']} == {'a', 'b', 'c'}
+
+    registry.release('b')
+    assert {model['key'] for model in registry.stats()['models']} == {'a', 'c'}
+
+    registry.unpin('a')
+    assert {model['key'] for model in registry.stats()['models']} == {'c'}
+
+
+def test_idle_timeout_unloads_unused_models():
+    registry = AbusModelRegistry(budget_mb=0, idle_timeout=0.05)
+    registry.pin('pinned')
+    for key in ('idle', 'busy', 'pinned'):
+        registry.acquire(key, Loader())
+    registry.release('idle')
+    registry.release('pinned')
+
+    time.sleep(0.1)
+    assert registry.sweep_idle() == ['idle']
+    assert {model['key'] for model in registry.stats()['models']} == {'busy', 'pinned'}
@@ -0,0 +1,148 @@
+import os
+import time
+
+from app.abus_stem_cache import AbusStemCache
+
+
+class Separator:
+    """입력 파일 이름으로 시작하는 스템 파일을 만드는 가짜 분리기"""
+    def __init__(self, size=1000):
+        self.calls = 0
+        self.size = size
+
+    def __call__(self, input_path, output_dir):
+        self.calls += 1
+        basename = os.path.splitext(os.path.basename(input_path))[0]
+        outputs = []
+        for stem in ('inst', 'vocal'):
+            output_file = os.path.join(output_dir, f'{basename}_htdemucs_{stem}.flac')
+            with open(output_file, 'wb') as f:
+                f.write(stem.encode() * self.size)
+            outputs.append(output_file)
+        return tuple(outputs) + (None,)
+
+
+def make_input(folder, name, content=b'audio'):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def run(cache, separator, input_path, output_dir, identity=None):
+    identity = identity or {'model': 'htdemucs'}
+    return cache.fetch_or_separate('demucs', input_path, output_dir, identity,
+                                   lambda: separator(input_path, output_dir))
+
+
+def test_hit_skips_separation(tmp_path):
+    cache = AbusStemCache(cache_dir=str(tmp_path / 'cache'), max_mb=10)
+    separator = Separator()
+    input_path = make_input(tmp_path / 'a', 'song.wav')
+
+    first = run(cache, separator, input_path, str(tmp_path / 'a'))
+    os.remove(first[1])
+    second = run(cache, separator, input_path, str(tmp_path / 'a'))
+
+    assert separator.calls == 1
+    assert second == first
+    assert second[2] is None
+    with open(second[1], 'rb') as f:
+        assert f.read() == b'vocal' * 1000
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_same_content_under_another_name(tmp_path):
+    cache = AbusStemCache(cache_dir=str(tmp_path / 'cache'), max_mb=10)
+    separator = Separator()
+    run(cache, separator, make_input(tmp_path / 'a', 'song.wav'), str(tmp_path / 'a'))
+
+    # 다른 탭의 작업 폴더로 옮긴 같은 음원
+    outputs = run(cache, separator, make_input(tmp_path / 'b', 'copy.wav'), str(tmp_path / 'b'))
+
+    assert separator.calls == 1
+    assert outputs[:2] == (str(tmp_path / 'b' / 'copy_htdemucs_inst.flac'), str(tmp_path / 'b' / 'copy_htdemucs_vocal.flac'))
+    assert all(os.path.exists(output) for output in outputs[:2])
+
+
+def test_in_place_rewrite_keeps_entry(tmp_path):
+    # 분리기는 ffmpeg -y 처럼 기존 출력 파일을 제자리에서 덮어쓴다
+    cache = AbusStemCache(cache_dir=str(tmp_path / 'cache'), max_mb=10)
+    output_dir = str(tmp_path / 'a')
+    input_path = make_input(output_dir, 'song.wav', b'original')
+
+    def separate():
+        with open(input_path, 'rb') as f:
+            content = f.read()
+        output_file = os.path.join(output_dir, 'song_htdemucs_vocal.flac')
+        with open(output_file, 'wb') as f:
+            f.write(content * 100)
+        return (output_file,)
+
+    cache.fetch_or_separate('demucs', input_path, output_dir, {'model': 'htdemucs'}, separate)
+    time.sleep(0.01)
+    make_input(output_dir, 'song.wav', b'edited')
+    cache.fetch_or_separate('demucs', input_path, output_dir, {'model': 'htdemucs'}, separate)
+    time.sleep(0.01)
+    make_input(output_dir, 'song.wav', b'original')
+    outputs = cache.fetch_or_separate('demucs', input_path, output_dir, {'model': 'htdemucs'}, separate)
+
+    assert cache.stats()['hits'] == 1
+    with open(outputs[0], 'rb') as f:
+        assert f.read() == b'original' * 100
+
+    # 돌려준 파일을 고쳐 써도 캐시 항목은 그대로다
+    with open(outputs[0], 'wb') as f:
+        f.write(b'post-processed')
+    outputs = cache.fetch_or_separate('demucs', input_path, output_dir, {'model': 'htdemucs'}, separate)
+    with open(outputs[0], 'rb') as f:
+        assert f.read() == b'original' * 100
+
+
+def test_key_includes_content_and_identity(tmp_path):
+    cache = AbusStemCache(cache_dir=str(tmp_path / 'cache'), max_mb=10)
+    separator = Separator()
+    input_path = make_input(tmp_path / 'a', 'song.wav')
+    run(cache, separator, input_path, str(tmp_path / 'a'))
+
+    run(cache, separator, input_path, str(tmp_path / 'a'), identity={'model': 'htdemucs_ft'})
+    time.sleep(0.01)
+    make_input(tmp_path / 'a', 'song.wav', b'other audio')
+    run(cache, separator, input_path, str(tmp_path / 'a'))
+
+    assert separator.calls == 3
+    assert cache.stats()['entries'] == 3
+
+
+def test_lru_eviction_under_budget(tmp_path):
+    # 항목 하나가 약 0.5MB, 예산 1MB 에는 두 항목만 남는다
+    cache = AbusStemCache(cache_dir=str(tmp_path / 'cache'), max_mb=1)
+    separator = Separator(size=50000)
+    inputs = [make_input(tmp_path / name, f'{name}.wav', name.encode()) for name in ('a', 'b', 'c')]
+
+    run(cache, separator, inputs[0], str(tmp_path / 'a'))
+    run(cache, separator, inputs[1], str(tmp_path / 'b'))
+    run(cache, separator, inputs[0], str(tmp_path / 'a'))      # a 를 다시 사용해 b 가 가장 오래된 항목이 된다
+    run(cache, separator, inputs[2], str(tmp_path / 'c'))
+
+    assert sorted(meta['source'] for meta in cache.entries()) == ['a', 'c']
+    assert cache.stats()['evictions'] == 1
+    run(cache, separator, inputs[1], str(tmp_path / 'b'))
+    assert separator.calls == 4
+
+
+def test_prune_and_disabled(tmp_path):
+    cache = AbusStemCache(cache_dir=str(tmp_path / 'cache'), max_mb=10)
+    separator = Separator()
+    run(cache, separator, make_input(tmp_path / 'a', 'song.wav'), str(tmp_path / 'a'))
+    assert cache.prune(older_than_days=1) == 0
+    assert cache.prune(max_mb=10, older_than_days=-1) == 1
+    assert cache.entries() == []
+
+    disabled = AbusStemCache(cache_dir=str(tmp_path / 'off'), max_mb=0)
+    for _ in range(2):
+        run(disabled, separator, make_input(tmp_path / 'a', 'song.wav'), str(tmp_path / 'a'))
+    assert separator.calls == 3
+    assert not os.path.exists(tmp_path / 'off')
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from pydub import AudioSegment
+
+from app.abus_audio import AbusAudio
+
+
+def trim_silence_audio_reference(audio, start_silence_threshold=-50.0, end_silence_threshold=-50.0, chunk_size=10, padding_duration=100):
+    """기존 청크 루프 구현 (pydub AudioSegment.dBFS 로 계산하는 비교 기준)"""
+    def detect_first_sound_index(asg, threshold=-50.0, chunk_size=10):
+        for i in range(0, len(asg), chunk_size):
+            chunk = asg[i:i + chunk_size]
+            if chunk.dBFS > threshold and chunk.dBFS != float('-inf'):
+                return i
+        return len(asg)
+
+    def detect_last_sound_index(asg, threshold=-50.0, chunk_size=10):
+        reversed_audio = asg.reverse()
+        for i in range(0, len(reversed_audio), chunk_size):
+            chunk = reversed_audio[i:i + chunk_size]
+            if chunk.dBFS > threshold and chunk.dBFS != float('-inf'):
+                return len(asg) - (i + chunk_size)
+        return 0
+
+    start_index = detect_first_sound_index(audio, start_silence_threshold, chunk_size)
+    end_index = detect_last_sound_index(audio, end_silence_threshold, chunk_size)
+    trimmed_audio = audio[start_index:end_index]
+
+    if padding_duration > 0:
+        return trimmed_audio + AudioSegment.silent(duration=padding_duration)
+    return trimmed_audio
+
+
+def make_audio(sample_rate, channels, lead, voice, tail, amplitude=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    total = int(sample_rate * (lead + voice + tail))
+    samples = rng.normal(0, 1e-4, size=(total, channels))
+    start = int(sample_rate * lead)
+    length = int(sample_rate * voice)
+    t = np.arange(length) / sample_rate
+    samples[start:start + length] += amplitude * np.sin(2 * np.pi * 220 * t)[:, np.newaxis]
+    return AbusAudio.array_to_audio(samples, sample_rate)
+
+
+@pytest.mark.parametrize("sample_rate", [16000, 22050, 24000, 44100, 48000])
+@pytest.mark.parametrize("channels", [1, 2])
+def test_trim_silence_audio_parity(sample_rate, channels):
+    audio = make_audio(sample_rate, channels, lead=0.37, voice=1.23, tail=0.51)
+    expected = trim_silence_audio_reference(audio)
+    result = AbusAudio.trim_silence_audio(audio)
+    assert result.raw_data == expected.raw_data
+
+
+@pytest.mark.parametrize("lead, voice, tail", [
+    (0.0, 0.5, 0.0),        # 무음 없음
+    (0.2, 0.0, 0.3),        # 전체 무음
+    (0.0, 0.004, 0.0),      # 청크보다 짧은 소리
+    (0.001, 0.013, 0.0),    # 길이가 청크의 배수가 아님
+    (1.5, 0.02, 2.0),       # 블록 경계를 넘는 긴 무음
+])
+def test_trim_silence_audio_edge_cases(lead, voice, tail):
+    audio = make_audio(22050, 2, lead, voice, tail)
+    expected = trim_silence_audio_reference(audio)
+    result = AbusAudio.trim_silence_audio(audio)
+    assert result.raw_data == expected.raw_data
+
+
+@pytest.mark.parametrize("threshold", [-60.0, -40.0, -20.0])
+@pytest.mark.parametrize("padding", [0, 100])
+def test_trim_silence_audio_options(threshold, padding):
+    audio = make_audio(44100, 2, lead=0.3, voice=0.8, tail=0.4, amplitude=0.05)
+    expected = trim_silence_audio_reference(audio, threshold, threshold, 10, padding)
+    result = AbusAudio.trim_silence_audio(audio, threshold, threshold, 10, padding)
+    assert result.raw_data == expected.raw_data
+
+
+def test_trim_silence_array_matches_audio():
+    audio = make_audio(24000, 1, lead=0.41, voice=0.9, tail=0.33)
+    samples = AbusAudio.audio_to_array(audio)
+    trimmed = AbusAudio.trim_silence_array(samples, audio.frame_rate, padding_duration=0)
+
+    expected = AbusAudio.audio_to_array(AbusAudio.trim_silence_audio(audio, padding_duration=0))
+    assert trimmed.shape == expected.shape
+    np.testing.assert_allclose(trimmed, expected, atol=2 / 32768)
+
+    padded = AbusAudio.trim_silence_array(samples, audio.frame_rate, padding_duration=100)
+    assert len(padded) == len(trimmed) + 2400
+    assert not padded[len(trimmed):].any()
+
+
+def test_trim_silence_array_all_silent():
+    samples = np.zeros((48000, 2), dtype=np.float32)
+    trimmed = AbusAudio.trim_silence_array(samples, 48000, padding_duration=0)
+    assert trimmed.shape == (0, 2)